@@ -4,7 +4,6 @@ import sys
 import argparse
 import json
 import glob
-import base64
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -16,6 +15,7 @@ load_dotenv()
 sys.path.append(os.getcwd())
 
 from utils.logger import setup_logger, update_context, log_section
+from utils.image_prep import image_data_url
 logger = setup_logger("Agent0_Extractor")
 
 SYSTEM_PROMPT = """You are Agent 0: Product Extractor (Multimodal).
@@ -85,8 +85,8 @@ def get_images_from_dir(directory: str) -> List[str]:
     return image_paths
 
 def encode_image(image_path: str) -> str:
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    """Data URL de la imagen preparada (reescalada una vez por archivo, cache compartido)."""
+    return image_data_url(image_path)
 
 def load_json_file(path: str) -> Optional[Dict[str, Any]]:
     if not os.path.exists(path):
@@ -183,11 +183,10 @@ def main():
     
     for idx, p in enumerate(image_paths):
         try:
-            base64_image = encode_image(p)
             images_content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
+                    "url": encode_image(p)
                 }
             })
             images_list_str_parts.append(f"img:{idx+1} = {os.path.basename(p)}")
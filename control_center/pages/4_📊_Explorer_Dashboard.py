@@ -1,9 +1,9 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import json
 import altair as alt
 import os
+import sys
 from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
@@ -19,90 +19,33 @@ st.set_page_config(
 # --- Constants & Setup ---
 # Fixing path to point to explorer/store/product_memory.db from control_center/pages/
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent
-DB_NAME = "product_memory.db"
-DB_PATH = ROOT_DIR / "explorer" / "store" / DB_NAME
 ENV_PATH = ROOT_DIR / ".env"
 
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+from explorer import dashboard_data
+from explorer.dashboard_data import get_product_drilldown, load_winners
+from explorer.store import get_db_path
+
+DB_PATH = get_db_path()
+
 load_dotenv(ENV_PATH)
 
 # --- Helpers ---
-@st.cache_resource
-def get_connection():
-    if not os.path.exists(DB_PATH):
-        st.error(f"Database not found at {DB_PATH}")
-        return None
-    return sqlite3.connect(str(DB_PATH), check_same_thread=False)
-
+# Queries live in explorer/dashboard_data.py (parameterized, cached per run + ingest watermark)
 def get_openai_client():
     return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def load_runs():
-    conn = get_connection()
-    if not conn: return pd.DataFrame()
+    if not os.path.exists(DB_PATH):
+        st.error(f"Database not found at {DB_PATH}")
+        return pd.DataFrame()
     try:
-        df = pd.read_sql("SELECT run_id, timestamp, unique_advertisers, raw_count FROM runs ORDER BY timestamp DESC", conn)
-        return df
+        return dashboard_data.load_runs()
     except Exception as e:
         st.error(f"Error loading runs: {e}")
         return pd.DataFrame()
 
-def load_winners(run_id, limit=200):
-    conn = get_connection()
-    if not conn: return pd.DataFrame()
-    query = f"""
-    SELECT
-      p.product_id,
-      p.canonical_name,
-      p.category,
-      p.subcategory,
-      p.candidate_score,
-      o.ads_count,
-      o.advertisers_count,
-      o.avg_confidence,
-      p.signals_json,
-      p.rationale_json,
-      p.first_seen_at,
-      -- Aggregate search tags for filtering
-      (
-        SELECT GROUP_CONCAT(DISTINCT s._query_matched)
-        FROM ad_to_product map
-        JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
-        WHERE map.product_id = p.product_id AND map.run_id = o.run_id
-      ) as search_tags
-    FROM product_concepts p
-    JOIN product_observations o ON o.product_id = p.product_id
-    WHERE o.run_id = '{run_id}'
-      AND p.product_id <> 'unknown_cluster'
-    ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
-    LIMIT {limit};
-    """
-    return pd.read_sql(query, conn)
-
-def get_product_drilldown(run_id, product_id):
-    conn = get_connection()
-    if not conn: return pd.DataFrame()
-    query = f"""
-    SELECT 
-        s.ad_id,
-        s.title,
-        s.body_text,
-        s.link_url,
-        s.cta_type,
-        a.advertiser_id,
-        a.current_page_name,
-        a.current_profile_uri,
-        (SELECT image_url FROM ad_media m WHERE m.ad_id = s.ad_id LIMIT 1) as image_url,
-        s.observed_at
-    FROM ad_to_product map
-    JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
-    JOIN advertisers a ON a.advertiser_id = map.advertiser_id
-    WHERE map.run_id = '{run_id}'
-      AND map.product_id = '{product_id}'
-    ORDER BY s.observed_at DESC
-    LIMIT 20
-    """
-    return pd.read_sql(query, conn)
-
 def is_dropship_compliant(tags_str):
     if not tags_str or not isinstance(tags_str, str): return False
     tags = tags_str.lower()
@@ -13,168 +13,152 @@ Objetivo:
 
 import argparse
 import json
+import os
 import sqlite3
+import sys
+import time
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, List, Optional
 
-DB_NAME = "product_memory.db"
-
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.store import connect
+from explorer.trends import update_advertiser_trends
 
 def now_iso() -> str:
     from datetime import timezone
     return datetime.now(timezone.utc).isoformat()
 
-def ensure_schema(conn: sqlite3.Connection):
-    # Tabla para snapshots de estadisticas del anunciante por run
-    conn.executescript("""
-    CREATE TABLE IF NOT EXISTS advertiser_run_stats (
-        run_id TEXT,
-        advertiser_id TEXT,
-        total_ads INTEGER,
-        ads_with_cod INTEGER,
-        ads_with_free_shipping INTEGER,
-        ads_with_video INTEGER,
-        main_category TEXT,
-        created_at TEXT,
-        PRIMARY KEY (run_id, advertiser_id)
-    );
-    
-    -- Estado actual y fechas clave (ya existe en memory_agent.py parcialmente, aqui expandimos)
-    -- Si 'advertisers' ya existe, le agregamos columnas si faltan (manualmente o con alter, aqui asumimos tabla 'advertiser_state' separada para logica de agente)
-    CREATE TABLE IF NOT EXISTS advertiser_state (
-        advertiser_id TEXT PRIMARY KEY,
-        current_status TEXT, -- 'new', 'monitoring', 'candidate_pool', 'dormant', 'winner'
-        first_seen_at TEXT,
-        last_seen_at TEXT,
-        total_runs_seen INTEGER DEFAULT 0,
-        last_run_id TEXT,
-        notes TEXT,
-        updated_at TEXT
-    );
-    
-    CREATE INDEX IF NOT EXISTS idx_adv_run_stats_run ON advertiser_run_stats(run_id);
-    CREATE INDEX IF NOT EXISTS idx_adv_state_status ON advertiser_state(current_status);
-    """)
-    conn.commit()
+def json_truthy(doc: str, path: str) -> str:
+    """
+    Expresión SQL equivalente a bool(json.loads(doc).get(<path>)) en Python.
+    Sólo json_type / json_extract / json_array_length (JSON1 desde SQLite 3.9): el operador `->`
+    pide SQLite >= 3.38 y muchas instalaciones de Python traen uno anterior.
+    """
+    value = f"json_extract({doc}, '{path}')"
+    return f"""(CASE json_type({doc}, '{path}')
+        WHEN 'true' THEN 1
+        WHEN 'integer' THEN {value} <> 0
+        WHEN 'real' THEN {value} <> 0
+        WHEN 'text' THEN {value} <> ''
+        WHEN 'array' THEN json_array_length({doc}, '{path}') > 0
+        WHEN 'object' THEN {value} <> '{{}}'
+        ELSE 0 END)"""
 
-def compute_run_stats(conn: sqlite3.Connection, run_id: str):
-    print(f"Calculando estadísticas para run {run_id}...")
-    
-    # 1. Obtener todos los ads del run (snapshots + extractions si existen)
-    # Join con extractions para signals (si ya corrio Agent 2)
-    # Join con ad_media para saber si es video (si media hash detecto algo video-like? Dificil. Mejor usar snapshots raw properties si se guardaron)
-    # Por ahora usaremos signals de extractions si estan, sino snapshots raw del ingest.
-    
-    # Supongamos que memory_agent guardó snapshot.* en ad_snapshots. 
-    # Pero ad_snapshots tiene campos limitados. 
-    # Lo mejor es re-leer el ad_snapshots.signals_json de extractions si queremos precision de COD, etc.
-    
-    # Vamos a basarnos en ad_extractions que tiene signals_json (Agent 2 output).
-    # Si no corrio Agent 2, stats seran 0.
-    
-    cur = conn.cursor()
-    
-    # Traer ads del run con sus signals
-    cur.execute("""
-        SELECT e.ad_id, e.signals_json, e.category, s.domain, a.advertiser_id
-        FROM ad_extractions e
-        JOIN ad_snapshots s ON s.ad_id = e.ad_id AND s.run_id = e.run_id
-        JOIN ads a ON a.ad_id = e.ad_id
-        WHERE e.run_id = ?
+def stage_stats(conn: sqlite3.Connection, run_id: str) -> int:
+    """
+    TEMP as_stats: una fila por anunciante del run con los conteos de señales (JSON1 sobre
+    signals_json, sin json.loads en Python) y la categoría principal (moda; empate -> la categoría
+    con el menor ad_id, el orden en que la versión fila a fila las recorría).
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.as_stats")
+    conn.execute(f"""
+        CREATE TEMP TABLE as_stats AS
+        WITH ads_run AS (
+            SELECT e.ad_id, a.advertiser_id,
+                   NULLIF(e.category, '') AS category,
+                   CASE WHEN json_valid(e.signals_json) AND json_type(e.signals_json) = 'object'
+                        THEN e.signals_json END AS sig
+            FROM ad_extractions e
+            JOIN ad_snapshots s ON s.ad_id = e.ad_id AND s.run_id = e.run_id
+            JOIN ads a ON a.ad_id = e.ad_id
+            WHERE e.run_id = ?
+        ),
+        by_cat AS (
+            -- (anunciante, categoría): un solo GROUP BY sobre los ads del run; rn = 1 es la categoría principal
+            SELECT advertiser_id, category,
+                   COUNT(*) AS n,
+                   SUM({json_truthy("sig", "$.cod")}) AS cod,
+                   SUM({json_truthy("sig", "$.free_shipping")} OR {json_truthy("sig", "$.nationwide_shipping")}) AS free_shipping,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY advertiser_id ORDER BY category IS NULL, COUNT(*) DESC, MIN(ad_id)
+                   ) AS rn
+            FROM ads_run
+            GROUP BY advertiser_id, category
+        )
+        SELECT advertiser_id,
+               SUM(n) AS total_ads,
+               SUM(cod) AS ads_with_cod,
+               SUM(free_shipping) AS ads_with_free_shipping,
+               0 AS ads_with_video, -- Dificil sin analizar tipo, asumimos 0 por ahora
+               COALESCE(MAX(CASE WHEN rn = 1 THEN category END), 'Otros') AS main_category
+        FROM by_cat
+        GROUP BY advertiser_id
+        ORDER BY advertiser_id
     """, (run_id,))
-    
-    rows = cur.fetchall()
-    
-    stats = {} # advertiser_id -> {metrics}
-
-    for row in rows:
-        ad_id, sig_json, cat, domain, adv_id = row
-        signals = json.loads(sig_json) if sig_json else {}
-        
-        if adv_id not in stats:
-            stats[adv_id] = {
-                "total_ads": 0,
-                "cod": 0,
-                "free_shipping": 0,
-                "video": 0, # Dificil sin analizar tipo, asumimos 0 por ahora o sacamos de otro lado
-                "categories": {},
-                # "page_name": page_name # Removed, managed by memory_agent
-            }
-        
-        s = stats[adv_id]
-        s["total_ads"] += 1
-        if signals.get("cod"): s["cod"] += 1
-        if signals.get("free_shipping") or signals.get("nationwide_shipping"): s["free_shipping"] += 1
-        
-        if cat:
-            s["categories"][cat] = s["categories"].get(cat, 0) + 1
-
-    # Persistir stats
+    return conn.execute("SELECT COUNT(*) FROM as_stats").fetchone()[0]
+
+def persist_stats(conn: sqlite3.Connection, run_id: str, ts: str) -> int:
+    """
+    advertiser_run_stats del run + transición de estado de todos los anunciantes en un solo
+    INSERT ... SELECT ... ON CONFLICT:
+      nuevo -> 'new'; 'new'/'dormant' -> 'monitoring'; resto (monitoring, winner, ...) se mantiene.
+    """
+    conn.execute("""
+        INSERT OR REPLACE INTO advertiser_run_stats
+        (run_id, advertiser_id, total_ads, ads_with_cod, ads_with_free_shipping, ads_with_video, main_category, created_at)
+        SELECT ?, advertiser_id, total_ads, ads_with_cod, ads_with_free_shipping, ads_with_video, main_category, ?
+        FROM as_stats
+    """, (run_id, ts))
+    # El WHERE es obligatorio para que SQLite no lea ON CONFLICT como parte del SELECT;
+    # además deja fuera advertiser_id NULL (ON CONFLICT no aplica y cada run insertaría otra fila).
+    cur = conn.execute("""
+        INSERT INTO advertiser_state (advertiser_id, current_status, first_seen_at, last_seen_at, total_runs_seen, last_run_id, updated_at)
+        SELECT advertiser_id, 'new', ?, ?, 1, ?, ?
+        FROM as_stats
+        WHERE advertiser_id IS NOT NULL
+        ON CONFLICT(advertiser_id) DO UPDATE SET
+            current_status = CASE advertiser_state.current_status
+                WHEN 'new' THEN 'monitoring'
+                WHEN 'dormant' THEN 'monitoring' -- Reactivated
+                ELSE advertiser_state.current_status END,
+            last_seen_at = excluded.last_seen_at,
+            total_runs_seen = COALESCE(advertiser_state.total_runs_seen, 0) + 1,
+            last_run_id = excluded.last_run_id,
+            updated_at = excluded.updated_at
+    """, (ts, ts, run_id, ts))
+    return cur.rowcount
+
+def compute_run_stats(conn: sqlite3.Connection, run_id: str) -> Dict[str, Any]:
+    """
+    Estadísticas por anunciante del run (ads, COD, free shipping) a partir de ad_extractions
+    (signals_json de Agent 2; si no corrió, no hay filas) y actualización de advertiser_state.
+    Todo set-based en SQLite; devuelve conteos y tiempos por fase.
+    """
+    started = time.perf_counter()
     ts = now_iso()
-    for adv_id, s in stats.items():
-        # Main category
-        main_cat = "Otros"
-        if s["categories"]:
-            main_cat = max(s["categories"], key=s["categories"].get)
-            
-        cur.execute("""
-            INSERT OR REPLACE INTO advertiser_run_stats 
-            (run_id, advertiser_id, total_ads, ads_with_cod, ads_with_free_shipping, ads_with_video, main_category, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (run_id, adv_id, s["total_ads"], s["cod"], s["free_shipping"], s["video"], main_cat, ts))
-        
-        # Update State logic
-        # Check current state
-        cur.execute("SELECT current_status, total_runs_seen, first_seen_at FROM advertiser_state WHERE advertiser_id=?", (adv_id,))
-        curr = cur.fetchone()
-        
-        new_status = "monitoring"
-        total_runs = 1
-        first_seen = ts
-        
-        if curr:
-            old_status, runs_seen, fs = curr
-            total_runs = (runs_seen or 0) + 1
-            first_seen = fs or ts
-            
-            # Simple state machine
-            if old_status == "new":
-                new_status = "monitoring"
-            elif old_status == "dormant":
-                new_status = "monitoring" # Reactivated
-            else:
-                new_status = old_status # Keep existing (e.g. winner, blacklisted)
-        else:
-            new_status = "new"
-            
-        cur.execute("""
-            INSERT INTO advertiser_state (advertiser_id, current_status, first_seen_at, last_seen_at, total_runs_seen, last_run_id, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(advertiser_id) DO UPDATE SET
-                current_status=excluded.current_status,
-                last_seen_at=excluded.last_seen_at,
-                total_runs_seen=excluded.total_runs_seen,
-                last_run_id=excluded.last_run_id,
-                updated_at=excluded.updated_at
-        """, (adv_id, new_status, first_seen, ts, total_runs, run_id, ts))
-    
-    conn.commit()
-    print(f"Estadísticas calculadas para {len(stats)} anunciantes.")
+    stats: Dict[str, Any] = {"run_id": run_id}
+
+    with conn:
+        t = time.perf_counter()
+        stats["advertisers"] = stage_stats(conn, run_id)
+        stats["aggregate_sec"] = round(time.perf_counter() - t, 3)
 
-def main():
+        t = time.perf_counter()
+        stats["states_upserted"] = persist_stats(conn, run_id, ts)
+        stats["persist_sec"] = round(time.perf_counter() - t, 3)
+    conn.execute("DROP TABLE IF EXISTS temp.as_stats")
+
+    stats["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
     parser = argparse.ArgumentParser()
     parser.add_argument("--run-id", required=True)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    conn = sqlite3.connect(str(get_db_path()))
-    ensure_schema(conn)
+    conn = connect()
     
-    compute_run_stats(conn, args.run_id)
+    stats = compute_run_stats(conn, args.run_id)
+
+    # Serie total_ads por anunciante -> advertiser_trends (ventana de runs anteriores)
+    t = time.perf_counter()
+    stats.update(update_advertiser_trends(conn, args.run_id))
+    stats["trends_sec"] = round(time.perf_counter() - t, 3)
     
     conn.close()
 
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return stats
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/apify_pool.py
+
+Pool de tokens Apify + scheduler de shards por cuota restante.
+
+- load_apify_tokens(): todos los tokens configurados (APIFY_API_TOKEN, APIFY_APY_KEY, APIFY_APY_KEY_2, _3, ...),
+  sin repetir valores. Se identifican por nombre de variable (nunca se persiste el token).
+- probe_tokens(): cuota mensual restante (USD) y jobs concurrentes libres vía user("me").limits().
+- plan_shards(): parte la lista de URLs en n shards contiguos y balanceados.
+- TokenScheduler: asigna cada shard al token con más presupuesto restante (descontando lo ya asignado)
+  y con slots de concurrencia libres; next_token() da el reemplazo cuando un token falla (failover).
+
+Uso:
+  python explorer/apify_pool.py   # imprime cuota por token
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+TOKEN_ENVS = ("APIFY_API_TOKEN", "APIFY_APY_KEY")
+TOKEN_ENV_RE = re.compile(r"^APIFY_APY_KEY_(\d+)$")
+
+# Costo estimado por ad scrapeado (curious_coder/facebook-ads-library-scraper, ~0.75 USD / 1000 ads)
+USD_PER_AD = 0.00075
+
+@dataclass
+class TokenSlot:
+    name: str
+    client: Any
+    remaining_usd: Optional[float] = None
+    free_jobs: Optional[int] = None
+    assigned_usd: float = 0.0
+    assigned_jobs: int = 0
+    failed: bool = False
+    error: Optional[str] = None
+
+    def budget(self) -> float:
+        # sin datos de cuota (limits() falló): al final de la fila, pero usable
+        if self.remaining_usd is None:
+            return -1.0 - self.assigned_usd
+        return self.remaining_usd - self.assigned_usd
+
+    def has_job_slot(self) -> bool:
+        return self.free_jobs is None or self.assigned_jobs < self.free_jobs
+
+def load_apify_tokens(environ: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+    env = os.environ if environ is None else environ
+    names = [n for n in TOKEN_ENVS if env.get(n)]
+    numbered = sorted((int(m.group(1)), n) for n in env if (m := TOKEN_ENV_RE.match(n)) and env.get(n))
+    names += [n for _, n in numbered]
+    seen, out = set(), []
+    for n in names:
+        if env[n] in seen:
+            continue
+        seen.add(env[n])
+        out.append((n, env[n]))
+    return out
+
+def probe_tokens(tokens: List[Tuple[str, Any]], make_client: Optional[Callable[[str], Any]] = None) -> List[TokenSlot]:
+    """tokens: [(nombre, token)] o [(nombre, client)] si make_client es None y ya vienen clientes."""
+    slots = []
+    for name, tok in tokens:
+        client = make_client(tok) if make_client else tok
+        slot = TokenSlot(name, client)
+        try:
+            info = client.user("me").limits() or {}
+            limits, current = info.get("limits") or {}, info.get("current") or {}
+            if limits.get("maxMonthlyUsageUsd") is not None:
+                slot.remaining_usd = float(limits["maxMonthlyUsageUsd"]) - float(current.get("monthlyUsageUsd") or 0.0)
+            if limits.get("maxConcurrentActorJobs") is not None:
+                slot.free_jobs = max(0, int(limits["maxConcurrentActorJobs"]) - int(current.get("activeActorJobCount") or 0))
+        except Exception as e:
+            slot.error = str(e)[:200]
+        slots.append(slot)
+    return slots
+
+def plan_shards(items: List[Any], n_shards: int) -> List[List[Any]]:
+    n_shards = max(1, min(n_shards, len(items)))
+    size, extra = divmod(len(items), n_shards)
+    out, i = [], 0
+    for k in range(n_shards):
+        j = i + size + (1 if k < extra else 0)
+        out.append(items[i:j])
+        i = j
+    return out
+
+class TokenScheduler:
+    def __init__(self, slots: List[TokenSlot]):
+        if not slots:
+            raise ValueError("Missing APIFY_API_TOKEN (ningún token Apify configurado)")
+        self.slots = slots
+        self._lock = threading.Lock()
+
+    def by_name(self, name: str) -> Optional[TokenSlot]:
+        return next((s for s in self.slots if s.name == name), None)
+
+    def _pick(self, cost_usd: float, exclude: Tuple[str, ...] = ()) -> Optional[TokenSlot]:
+        alive = [s for s in self.slots if not s.failed and s.name not in exclude]
+        if not alive:
+            return None
+        # preferir tokens con slot de concurrencia libre; entre ellos, el de más presupuesto restante
+        pool = [s for s in alive if s.has_job_slot()] or alive
+        slot = max(pool, key=lambda s: s.budget())
+        slot.assigned_usd += cost_usd
+        slot.assigned_jobs += 1
+        return slot
+
+    def assign(self, costs_usd: List[float]) -> List[TokenSlot]:
+        """Asignación inicial: shards más caros primero (greedy tipo LPT), en orden de shard al devolver."""
+        with self._lock:
+            order = sorted(range(len(costs_usd)), key=lambda i: -costs_usd[i])
+            out: List[Optional[TokenSlot]] = [None] * len(costs_usd)
+            for i in order:
+                out[i] = self._pick(costs_usd[i])
+            return out
+
+    def claim(self, slot: TokenSlot, cost_usd: float):
+        """Reserva explícita (resume: el shard vuelve a su token original)."""
+        with self._lock:
+            slot.assigned_usd += cost_usd
+            slot.assigned_jobs += 1
+
+    def release(self, slot: TokenSlot, cost_usd: float):
+        with self._lock:
+            slot.assigned_usd -= cost_usd
+            slot.assigned_jobs -= 1
+
+    def next_token(self, failed: TokenSlot, cost_usd: float, error: str, tried: Tuple[str, ...] = ()) -> Optional[TokenSlot]:
+        """Marca `failed` como caído y devuelve el mejor token restante (o None)."""
+        with self._lock:
+            failed.failed = True
+            failed.error = error[:200]
+            failed.assigned_usd -= cost_usd
+            failed.assigned_jobs -= 1
+            return self._pick(cost_usd, exclude=tried)
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [{"token": s.name, "remaining_usd": None if s.remaining_usd is None else round(s.remaining_usd, 2),
+                 "free_jobs": s.free_jobs, "assigned_jobs": s.assigned_jobs,
+                 "assigned_usd": round(s.assigned_usd, 2), "failed": s.failed, "error": s.error} for s in self.slots]
+
+def main():
+    from dotenv import load_dotenv
+    from apify_client import ApifyClient
+
+    load_dotenv()
+    slots = probe_tokens(load_apify_tokens(), ApifyClient)
+    print(json.dumps(TokenScheduler(slots).report() if slots else [], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_advertiser_state.py
+
+Benchmark offline de advertiser_state_agent.compute_run_stats: versión set-based (json_extract +
+INSERT ... SELECT ... ON CONFLICT) vs la versión anterior (json.loads en Python + SELECT/upsert por
+anunciante), materializada desde git (--baseline-rev).
+
+- --runs runs sintéticos con --advertisers anunciantes y ~--ads-per-adv anuncios cada uno; señales
+  JSON con booleanos, algún 0/1, strings vacíos y signals_json vacío/NULL.
+- Estados previos mezclados (new/monitoring/dormant/winner) para ejercitar las transiciones.
+- Cada versión corre sobre su propia copia de la DB; se comparan advertiser_run_stats y advertiser_state
+  (sin timestamps).
+
+Uso:
+  python explorer/bench/bench_advertiser_state.py --advertisers 20000
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer import advertiser_state_agent
+from explorer.store import connect
+
+REPO = Path(__file__).resolve().parents[2]
+STATUSES = ["new", "monitoring", "dormant", "winner", "candidate_pool"]
+
+def random_signals(rnd: random.Random):
+    r = rnd.random()
+    if r < 0.03:
+        return None
+    if r < 0.05:
+        return ""
+    sig = {k: rnd.random() < 0.35 for k in ("cod", "free_shipping", "nationwide_shipping", "discount")}
+    if rnd.random() < 0.05:
+        sig["cod"] = rnd.choice([0, 1, "", "si"])
+    return json.dumps(sig)
+
+def build_db(path: Path, n_adv: int, ads_per_adv: int, runs: int, seed: int = 19):
+    rnd = random.Random(seed)
+    conn = connect(path)
+    cats = ["Hogar", "Belleza", "Salud", "Tecnología", "Mascotas", "", None]
+    advs = [f"adv{i}" for i in range(n_adv)]
+    # parte de los anunciantes ya tiene estado (runs anteriores)
+    conn.executemany("""
+        INSERT INTO advertiser_state (advertiser_id, current_status, first_seen_at, total_runs_seen)
+        VALUES (?, ?, '2026-09-01T00:00:00', ?)
+    """, [(a, rnd.choice(STATUSES), rnd.randrange(1, 20)) for a in advs if rnd.random() < 0.6])
+    for r in range(runs):
+        run_id = f"bench_run_{r}"
+        conn.execute("INSERT INTO runs (run_id, timestamp) VALUES (?, ?)", (run_id, f"2026-10-{r + 1:02d}T00:00:00"))
+        ads = [(str(rnd.getrandbits(48)), rnd.choice(advs)) for _ in range(n_adv * ads_per_adv)]
+        conn.executemany("INSERT OR IGNORE INTO ads (ad_id, advertiser_id) VALUES (?, ?)", ads)
+        conn.executemany("INSERT OR IGNORE INTO ad_snapshots (run_id, ad_id) VALUES (?, ?)",
+                         [(run_id, a) for a, _ in ads])
+        conn.executemany("""
+            INSERT OR IGNORE INTO ad_extractions (run_id, ad_id, category, signals_json) VALUES (?, ?, ?, ?)
+        """, [(run_id, a, rnd.choice(cats), random_signals(rnd)) for a, _ in ads])
+    conn.commit()
+    conn.close()
+
+def load_baseline(rev: str, tmp: Path):
+    src = subprocess.run(["git", "show", f"{rev}:explorer/advertiser_state_agent.py"], cwd=REPO,
+                         capture_output=True, text=True, check=True).stdout
+    path = tmp / "advertiser_state_baseline.py"
+    path.write_text(src, encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("advertiser_state_baseline", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def run_all(mod, db: Path, runs: int) -> list:
+    conn = connect(db)
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        times = []
+        for r in range(runs):
+            t = time.perf_counter()
+            mod.compute_run_stats(conn, f"bench_run_{r}")
+            times.append(round(time.perf_counter() - t, 3))
+        return times
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+        conn.close()
+
+def table(db: Path, sql: str) -> dict:
+    conn = connect(db)
+    try:
+        return {r[0]: r[1:] for r in conn.execute(sql)}
+    finally:
+        conn.close()
+
+def compare(db_old: Path, db_new: Path) -> dict:
+    out = {}
+    for name, q in {
+        "advertiser_run_stats": """
+            SELECT run_id || '|' || advertiser_id, total_ads, ads_with_cod, ads_with_free_shipping,
+                   ads_with_video, main_category
+            FROM advertiser_run_stats""",
+        "advertiser_state": """
+            SELECT advertiser_id, current_status, total_runs_seen, last_run_id, first_seen_at IS NULL
+            FROM advertiser_state""",
+    }.items():
+        old, new = table(db_old, q), table(db_new, q)
+        out[name] = {"rows": len(new), "diff": sum(1 for k in set(old) | set(new) if old.get(k) != new.get(k))}
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--advertisers", type=int, default=20000)
+    parser.add_argument("--ads-per-adv", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--baseline-rev", default="b624cfd", help="Commit con la versión fila a fila")
+    args = parser.parse_args()
+
+    report = {"advertisers": args.advertisers, "ads_per_run": args.advertisers * args.ads_per_adv, "runs": args.runs}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        seed_db = tmp / "seed.db"
+        t = time.perf_counter()
+        build_db(seed_db, args.advertisers, args.ads_per_adv, args.runs)
+        report["build_sec"] = round(time.perf_counter() - t, 2)
+        db_old, db_new = tmp / "old.db", tmp / "new.db"
+        shutil.copy(seed_db, db_old)
+        shutil.copy(seed_db, db_new)
+
+        report["baseline_sec_per_run"] = run_all(load_baseline(args.baseline_rev, tmp), db_old, args.runs)
+        report["set_based_sec_per_run"] = run_all(advertiser_state_agent, db_new, args.runs)
+        report["speedup"] = round(sum(report["baseline_sec_per_run"]) / sum(report["set_based_sec_per_run"]), 1)
+        report["compare"] = compare(db_old, db_new)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_dashboard_data.py
+
+Benchmark offline de dashboard_data (fuera del runtime de Streamlit; st.cache_data funciona igual):
+- "Render" de página = load_runs + load_winners(5000) + 5 drilldowns + directorio de anunciantes.
+- Frío (sin cache) vs re-render (cache hit: sólo la consulta de watermark).
+- Nuevo run + refresh_rollups -> el watermark cambia y el siguiente render vuelve a leer la DB.
+- trends.py recalcula product_trends -> el watermark cambia y load_winners trae la tendencia nueva.
+- Los DataFrames cacheados son idénticos a un pd.read_sql directo.
+
+Uso:
+  python explorer/bench/bench_dashboard_data.py --runs 365 --ads 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer import dashboard_data
+from explorer.bench.bench_rollups import build_db
+from explorer.rollups import refresh_rollups
+from explorer.store import connect
+from explorer.trends import update_product_trends
+
+def render(run_id: str):
+    runs = dashboard_data.load_runs()
+    winners = dashboard_data.load_winners(run_id, limit=5000)
+    drill = [dashboard_data.get_product_drilldown(run_id, p) for p in winners["product_id"][:5]]
+    advs = dashboard_data.get_advertiser_directory(run_id)
+    return runs, winners, drill, advs
+
+def timed_render(run_id: str):
+    t = time.perf_counter()
+    out = render(run_id)
+    return out, round((time.perf_counter() - t) * 1000, 2)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=365)
+    parser.add_argument("--ads", type=int, default=2000)
+    parser.add_argument("--rerenders", type=int, default=50)
+    args = parser.parse_args()
+
+    report = {"runs": args.runs, "ads_per_run": args.ads}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "bench.db"
+        build_db(db, args.runs, args.ads)
+        conn = connect(db, check_same_thread=False)
+        dashboard_data.get_connection = lambda: conn
+        dashboard_data.clear_cache()
+        run_id = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+
+        # 1) primer render: rollups perezosos (run sin refrescar) + lecturas
+        _, report["first_render_ms"] = timed_render(run_id)
+        # 2) render frío con rollups ya calculados
+        dashboard_data.clear_cache()
+        (runs, winners, drill, advs), report["cold_render_ms"] = timed_render(run_id)
+        # 3) re-renders (interacciones con widgets)
+        lat = [timed_render(run_id)[1] for _ in range(args.rerenders)]
+        report["warm_render_ms"] = {"p50": sorted(lat)[len(lat) // 2], "max": max(lat)}
+
+        t = time.perf_counter()
+        for _ in range(200):
+            dashboard_data.ingest_watermark()
+        report["watermark_ms"] = round((time.perf_counter() - t) / 200 * 1000, 3)
+
+        # 4) correctitud vs lectura directa
+        direct = pd.read_sql(dashboard_data.WINNERS_SQL, conn, params=(run_id, 5000))
+        report["winners_equal"] = bool(direct.equals(winners))
+        direct = pd.read_sql(dashboard_data.ADVERTISERS_SQL, conn, params=(run_id,))
+        report["advertisers_equal"] = bool(direct.equals(advs))
+
+        # 5) nueva ingesta: el watermark cambia y el cache se invalida solo
+        wm = dashboard_data.ingest_watermark()
+        conn.execute("INSERT INTO runs (run_id, timestamp) VALUES ('run_new', '2099-01-01T00:00:00')")
+        conn.commit()
+        refresh_rollups(conn, "run_new")
+        (runs2, *_), report["after_ingest_render_ms"] = timed_render(run_id)
+        report["watermark_changed"] = wm != dashboard_data.ingest_watermark()
+        report["new_run_visible"] = "run_new" in set(runs2["run_id"]) and "run_new" not in set(runs["run_id"])
+
+        # 6) tendencias calculadas después del primer render (trends.py corre aparte del grouper)
+        wm = dashboard_data.ingest_watermark()
+        update_product_trends(conn, run_id)
+        winners3 = dashboard_data.load_winners(run_id, limit=5000)
+        report["trends_watermark_changed"] = wm != dashboard_data.ingest_watermark()
+        direct = pd.read_sql(dashboard_data.WINNERS_SQL, conn, params=(run_id, 5000))
+        report["winners_after_trends_equal"] = bool(direct.equals(winners3)) and not direct.equals(winners)
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
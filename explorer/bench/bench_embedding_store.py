@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_embedding_store.py
+
+Benchmark offline de embedding_store.EmbeddingStore (embed_fn sintético, sin OpenAI):
+- Run 1: todos misses. Runs siguientes con --overlap de nombres repetidos: hits sin llamar a embed_fn.
+- Fidelidad float16: coseno entre vector cacheado y el original.
+- Tamaño en disco vs list-of-lists de Python / float32.
+- evict(keep_runs) + compact(): archivo más chico, filas vivas idénticas, filas huérfanas recuperadas.
+
+Uso:
+  python explorer/bench/bench_embedding_store.py --names 20000 --runs 4 --dim 1536
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.embedding_store import EmbeddingStore
+from explorer.store import connect
+
+def make_embedder(dim: int):
+    calls = {"texts": 0, "requests": 0}
+
+    def embed(texts):
+        calls["texts"] += len(texts)
+        calls["requests"] += 1
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            r = np.random.default_rng(int(hashlib.md5(t.encode()).hexdigest()[:8], 16))
+            v = r.normal(size=dim)
+            out[i] = v / np.linalg.norm(v)
+        return out
+
+    return embed, calls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=20000, help="Nombres únicos por run")
+    parser.add_argument("--overlap", type=float, default=0.7, help="Fracción de nombres ya vistos en el run anterior")
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    embed, calls = make_embedder(args.dim)
+    report = {"names_per_run": args.names, "overlap": args.overlap, "dim": args.dim, "runs": []}
+    rng = np.random.default_rng(3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(Path(tmp) / "bench.db")
+        store = EmbeddingStore(conn, "synthetic")
+        prev, next_id = [], 0
+        for r in range(args.runs):
+            keep = list(rng.choice(prev, size=int(args.names * args.overlap), replace=False)) if prev else []
+            names = keep + [f"Producto  {i}" for i in range(next_id, next_id + args.names - len(keep))]
+            next_id += args.names - len(keep)
+            calls["texts"] = calls["requests"] = 0
+            h0, m0 = store.hits, store.misses
+
+            t = time.perf_counter()
+            X = store.get_or_embed(names, embed, f"run{r}")
+            sec = time.perf_counter() - t
+
+            ref = embed(names[:500])
+            cos = (X[:500] * ref).sum(axis=1) / np.linalg.norm(X[:500], axis=1)
+            report["runs"].append({
+                "run": f"run{r}", "sec": round(sec, 3),
+                "hits": store.hits - h0, "misses": store.misses - m0,
+                "embed_fn_texts": calls["texts"] - 500, "min_cosine_vs_original": round(float(cos.min()), 6),
+            })
+            prev = names
+
+        f = store.file_stats()
+        report["disk"] = {
+            "file_mb": f["file_mb"],
+            "float32_mb": round(f["indexed"] * args.dim * 4 / 1024 / 1024, 2),
+            "python_lists_mb_est": round(f["indexed"] * (56 + args.dim * (8 + 24)) / 1024 / 1024, 2),
+        }
+
+        # ---- filas huérfanas (crash entre reserva e índice) + evict + compact ----
+        store._reserve(1000, args.dim)
+        last = prev[:1000]
+        before = store.get_or_embed(last, embed, f"run{args.runs - 1}")
+        evicted = store.evict(keep_runs=1)
+        t = time.perf_counter()
+        comp = store.compact()
+        comp_sec = time.perf_counter() - t
+        calls["texts"] = 0
+        after = store.get_or_embed(last, embed, f"run{args.runs - 1}")
+        report["evict_compact"] = {
+            "evicted": evicted, **comp, "compact_sec": round(comp_sec, 3),
+            "file_mb_after": store.file_stats()["file_mb"],
+            "live_vectors_identical": bool(np.array_equal(before, after)),
+            "embed_fn_calls_after_compact": calls["texts"],
+            "files_in_root": sorted(p.name for p in store.root.iterdir()),
+        }
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_extractor.py
+
+Benchmark offline de extractor_agent Pass 1 contra fake_openai.py:
+- concurrency=1 (equivalente al loop síncrono anterior) vs concurrency=N.
+- Ads con __FAIL__ / __DROP__ para verificar circuit breaker y archivo de errores.
+- Segunda corrida sobre el mismo run_dir: resume append-only (no debe reescribir nada).
+- Cache (llm_cache): run nuevo con los mismos creativos -> servido desde cache, sin requests.
+
+Uso:
+  python explorer/bench/bench_extractor.py --n 600 --concurrency 16 --latency-ms 800
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_openai import DROP_MARKER, FAIL_MARKER, running_fake_openai
+from explorer.extractor_agent import RunPaths, load_processed_ids, run_text_pass
+from explorer.llm_cache import LLMCache
+from explorer.store import connect
+
+def write_dedup(path: Path, n: int, n_fail: int, n_drop: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            title = f"Producto {i} envío gratis contraentrega"
+            if i < n_fail:
+                title += f" {FAIL_MARKER}"
+            elif i < n_fail + n_drop:
+                title += f" {DROP_MARKER}"
+            f.write(json.dumps({"ad_archive_id": str(1000 + i), "page_id": "p1",
+                                "snapshot": {"title": title, "body": {"text": "Paga al recibir. Solo hoy 50%"}}},
+                               ensure_ascii=False) + "\n")
+
+def make_args(run_id: str, concurrency: int, batch_size: int, rpm: float, tpm: float):
+    return argparse.Namespace(
+        run_id=run_id, limit=0, batch_size=batch_size, model_text="gpt-4o", temperature=0.2,
+        concurrency=concurrency, rpm=rpm, tpm=tpm, retries=4, timeout=60.0,
+    )
+
+async def one_run(tmp: Path, name: str, n: int, concurrency: int, args_cli, cache=None) -> dict:
+    run_dir = tmp / name
+    run_dir.mkdir()
+    rp = RunPaths(run_dir, run_dir / "dedup_ads.jsonl", run_dir / "ads_enriched.jsonl", run_dir / "ads_enriched.errors.jsonl")
+    write_dedup(rp.dedup_path, n, args_cli.n_fail, args_cli.n_drop)
+    args = make_args(name, concurrency, args_cli.batch_size, args_cli.rpm, args_cli.tpm)
+
+    stats = await run_text_pass(args, rp, load_processed_ids(rp.out_path), cache)
+    errors = rp.err_path.read_text(encoding="utf-8").splitlines() if rp.err_path.exists() else []
+    stats["error_lines"] = len(errors)
+    resume = await run_text_pass(args, rp, load_processed_ids(rp.out_path))
+    stats["resume_requests"] = resume["requests"]
+    stats["resume_written"] = resume["written"]
+    return stats
+
+async def bench(args_cli) -> dict:
+    report = {"n": args_cli.n, "batch_size": args_cli.batch_size, "latency_ms": args_cli.latency_ms}
+    async with running_fake_openai(latency_ms=args_cli.latency_ms, per_ad_ms=args_cli.per_ad_ms,
+                                   rpm=args_cli.server_rpm) as (base_url, app):
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            if not args_cli.skip_serial:
+                report["concurrency_1"] = await one_run(tmp, "serial", args_cli.n, 1, args_cli)
+            app["stats"]["inflight_max"] = 0
+            report[f"concurrency_{args_cli.concurrency}"] = await one_run(tmp, "async", args_cli.n, args_cli.concurrency, args_cli)
+
+            conn = connect(tmp / "cache.db")
+            report["cache_cold"] = await one_run(tmp, "cache_cold", args_cli.n, args_cli.concurrency, args_cli, LLMCache(conn))
+            report["cache_warm"] = await one_run(tmp, "cache_warm", args_cli.n, args_cli.concurrency, args_cli, LLMCache(conn))
+            conn.close()
+        report["server"] = app["stats"]
+    return report
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=600)
+    parser.add_argument("--batch-size", type=int, default=15)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--per-ad-ms", type=float, default=50.0)
+    parser.add_argument("--rpm", type=float, default=500.0, help="Límite client-side")
+    parser.add_argument("--tpm", type=float, default=2_000_000.0, help="Límite client-side")
+    parser.add_argument("--server-rpm", type=float, default=0.0, help="Límite server-side (429)")
+    parser.add_argument("--n-fail", type=int, default=2)
+    parser.add_argument("--n-drop", type=int, default=1)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
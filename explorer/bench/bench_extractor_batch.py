@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_extractor_batch.py
+
+Chequeo offline de extractor_agent --mode batch contra fake_openai.py (endpoints de Batch API) y fake_cdn.py:
+- online vs batch: mismo set de ads y mismos objetos (sin _ts / _explorer_run_id) en ads_enriched.jsonl.
+- Batch expirado con output parcial (--expire-first): lo no respondido se re-envía en la ronda siguiente.
+- Crash entre submit e ingesta: el siguiente run retoma el batch de batch_state.text.json sin re-enviarlo.
+- Pass 2 (visión) por batch: vision_overrides.jsonl igual al del modo online.
+
+Uso:
+  python explorer/bench/bench_extractor_batch.py --n 300 --expire-first 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_cdn import running_fake_cdn
+from explorer.bench.fake_openai import DROP_MARKER, FAIL_MARKER, running_fake_openai
+import explorer.extractor_agent as extractor
+from explorer.extractor_agent import (
+    RunPaths, load_processed_ids, run_text_pass, run_text_pass_batch, run_vision_pass, run_vision_pass_batch,
+)
+
+VOLATILE = ("_ts", "_explorer_run_id")
+
+def write_dedup(path: Path, n: int, n_fail: int, n_drop: int, cdn_url: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            # 1 de cada 10 sin título -> needs_vision (Pass 2)
+            title = "" if i % 10 == 9 else f"Producto {i} envío gratis contraentrega"
+            if i < n_fail:
+                title += f" {FAIL_MARKER}"
+            elif i < n_fail + n_drop:
+                title += f" {DROP_MARKER}"
+            f.write(json.dumps({"ad_archive_id": str(1000 + i), "page_id": "p1",
+                                "snapshot": {"title": title, "body": {"text": "Paga al recibir. Solo hoy 50%"},
+                                             "images": [{"resized_image_url": f"{cdn_url}/img/{i}.jpg"}]}},
+                               ensure_ascii=False) + "\n")
+
+def make_args(run_id: str, args_cli):
+    return argparse.Namespace(
+        run_id=run_id, limit=0, batch_size=args_cli.batch_size, model_text="gpt-4o", model_vision="gpt-4o",
+        temperature=0.2, concurrency=8, rpm=5000, tpm=5_000_000, retries=2, timeout=60.0, sleep=0.0,
+        vision_threshold=0.55, batch_poll_sec=0.2, batch_max_rounds=5, batch_completion_window="24h",
+    )
+
+def make_run(tmp: Path, name: str, args_cli, cdn_url: str) -> RunPaths:
+    run_dir = tmp / name
+    run_dir.mkdir()
+    rp = RunPaths(run_dir, run_dir / "dedup_ads.jsonl", run_dir / "ads_enriched.jsonl", run_dir / "ads_enriched.errors.jsonl")
+    write_dedup(rp.dedup_path, args_cli.n, args_cli.n_fail, args_cli.n_drop, cdn_url)
+    return rp
+
+def load_objs(path: Path) -> dict:
+    out = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            o = json.loads(line)
+            out[o["ad_archive_id"]] = {k: v for k, v in o.items() if k not in VOLATILE}
+    return out
+
+def error_stages(path: Path) -> dict:
+    stages = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            stage = json.loads(line)["stage"]
+            stages[stage] = stages.get(stage, 0) + 1
+    return stages
+
+async def bench(args_cli) -> dict:
+    report = {"n": args_cli.n, "batch_size": args_cli.batch_size, "expire_first": args_cli.expire_first}
+    async with running_fake_cdn() as (cdn_url, _), \
+            running_fake_openai(batch_delay_sec=0.2, expire_first=args_cli.expire_first) as (base_url, app):
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+
+            # ---- online (referencia) ----
+            rp_on = make_run(tmp, "online", args_cli, cdn_url)
+            args = make_args("online", args_cli)
+            await run_text_pass(args, rp_on, load_processed_ids(rp_on.out_path))
+            await asyncio.to_thread(run_vision_pass, args, rp_on, None, None)
+
+            # ---- batch, con crash simulado tras el primer submit ----
+            rp_b = make_run(tmp, "batch", args_cli, cdn_url)
+            args = make_args("batch", args_cli)
+            real_wait = extractor.BatchRunner.wait
+
+            def crash(self, job):
+                raise KeyboardInterrupt("crash simulado")
+
+            extractor.BatchRunner.wait = crash
+            try:
+                await asyncio.to_thread(run_text_pass_batch, args, rp_b, load_processed_ids(rp_b.out_path))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                extractor.BatchRunner.wait = real_wait
+            state = json.loads((rp_b.run_dir / "batch_state.text.json").read_text(encoding="utf-8"))
+            report["jobs_in_state_after_crash"] = len(state["jobs"])
+            batches_before = app["batch_stats"]["batches"]
+
+            stats = await asyncio.to_thread(run_text_pass_batch, args, rp_b, load_processed_ids(rp_b.out_path))
+            report["batch_text"] = stats
+            report["resume_resubmitted_first_job"] = app["batch_stats"]["batches"] - batches_before > stats["batch_jobs"]
+            report["batch_vision"] = await asyncio.to_thread(run_vision_pass_batch, args, rp_b, None, None)
+
+            errors_batch = error_stages(rp_b.err_path)
+
+            # re-run: solo re-intenta los ads con error definitivo (igual que el resume online)
+            batches_before = app["batch_stats"]["batches"]
+            await asyncio.to_thread(run_text_pass_batch, args, rp_b, load_processed_ids(rp_b.out_path))
+            await asyncio.to_thread(run_vision_pass_batch, args, rp_b, None, None)
+            report["rerun_new_batches"] = app["batch_stats"]["batches"] - batches_before
+
+            on, b = load_objs(rp_on.out_path), load_objs(rp_b.out_path)
+            von = load_objs(rp_on.run_dir / "ads_enriched.vision_overrides.jsonl")
+            vb = load_objs(rp_b.run_dir / "ads_enriched.vision_overrides.jsonl")
+            report["compare"] = {
+                "text_online": len(on), "text_batch": len(b), "text_equal": on == b,
+                "vision_online": len(von), "vision_batch": len(vb), "vision_equal": von == vb,
+                "errors_online": error_stages(rp_on.err_path),
+                "errors_batch": errors_batch,
+            }
+        report["server"] = {**app["stats"], **app["batch_stats"]}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=15)
+    parser.add_argument("--n-fail", type=int, default=2)
+    parser.add_argument("--n-drop", type=int, default=1)
+    parser.add_argument("--expire-first", type=int, default=5, help="Requests respondidas antes de expirar el primer batch")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_hash_index.py
+
+Benchmark del índice Hamming (hash_index.py) con dHash sintéticos:
+- Familias de "creativos": un hash base + variantes con 1..max_flip bits cambiados (re-encodes/recortes).
+- Agrupamiento exacto (k=0, product_id = vhash_<hash>) vs k=4 / k=8: tiempo y grupos resultantes.
+- Latencia de consulta: HammingIndex en memoria y tabla SQLite hash_index (query_db).
+
+Uso:
+  python explorer/bench/bench_hash_index.py --families 20000 --variants 4 --db-hashes 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.hash_index import HammingIndex, group_hashes, query_db, split_bands
+from explorer.store import connect
+
+def make_hashes(families: int, variants: int, max_flip: int, seed: int = 11):
+    rng = random.Random(seed)
+    hashes = []
+    for _ in range(families):
+        base = rng.getrandbits(64)
+        hashes.append(f"{base:016x}")
+        for _ in range(variants):
+            v = base
+            for b in rng.sample(range(64), rng.randint(1, max_flip)):
+                v ^= 1 << b
+            hashes.append(f"{v:016x}")
+    return hashes
+
+def latency_ms(fn, queries):
+    times = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    return {"p50": round(statistics.median(times), 4), "p99": round(times[int(len(times) * 0.99) - 1], 4)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--families", type=int, default=20000)
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--max-flip", type=int, default=4)
+    parser.add_argument("--db-hashes", type=int, default=1_000_000, help="Tamaño del índice para medir latencia")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    hashes = make_hashes(args.families, args.variants, args.max_flip)
+    report = {"hashes": len(hashes), "families": args.families, "grouping": {}}
+
+    for k in (0, 4, 8):
+        t = time.perf_counter()
+        rep = group_hashes(hashes, k)
+        dt = time.perf_counter() - t
+        report["grouping"][f"k={k}"] = {"sec": round(dt, 3), "groups": len(set(rep.values()))}
+
+    # índice grande: familias + ruido aleatorio
+    rng = random.Random(3)
+    big = hashes + [f"{rng.getrandbits(64):016x}" for _ in range(max(0, args.db_hashes - len(hashes)))]
+    queries = rng.sample(hashes, min(args.queries, len(hashes)))
+
+    t = time.perf_counter()
+    idx = HammingIndex(big)
+    report["memory_index"] = {"size": len(idx), "build_sec": round(time.perf_counter() - t, 2)}
+    for k in (4, 8):
+        report["memory_index"][f"query_ms_k={k}"] = latency_ms(lambda q: idx.query(q, k), queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(Path(tmp) / "bench.db")
+        t = time.perf_counter()
+        conn.executemany("INSERT OR IGNORE INTO hash_index (dhash64, b0, b1, b2, b3) VALUES (?, ?, ?, ?, ?)",
+                         ((h, *split_bands(int(h, 16))) for h in big))
+        conn.commit()
+        report["sqlite_index"] = {"build_sec": round(time.perf_counter() - t, 2)}
+        for k in (4, 8):
+            report["sqlite_index"][f"query_ms_k={k}"] = latency_ms(lambda q: query_db(conn, q, k), queries[:500])
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_hashing.py
+
+Benchmark offline de decode + hash (sin red):
+- legacy: dhash64 original (PIL + list(getdata()) + bit-shifting en Python), una imagen a la vez.
+- batch: image_hashing.HashPool exacto (dHash + pHash), decode en process pool.
+- draft: HashPool con Image.draft (JPEG a escala reducida).
+
+Reporta imágenes/min y coincidencia bit a bit contra legacy
+(batch debe dar 100%; draft reporta fracción exacta y bits distintos máx).
+
+Uso:
+  python explorer/bench/bench_hashing.py --n 2000 --size 1080 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_cdn import make_images
+from explorer.image_hashing import HashPool
+
+def legacy_dhash64(content: bytes) -> str:
+    # copia del dhash64 anterior a image_hashing (referencia de compatibilidad)
+    img = Image.open(BytesIO(content)).convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(img.getdata())
+    rows = [pixels[i*9:(i+1)*9] for i in range(8)]
+    bits = 0
+    for r in rows:
+        for c in range(8):
+            bits = (bits << 1) | (1 if r[c+1] > r[c] else 0)
+    return f"{bits:016x}"
+
+def timed(n: int, fn):
+    t = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t
+    return out, {"sec": round(dt, 2), "images_per_min": round(n / dt * 60)}
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=1080, help="Lado de los JPEG sintéticos")
+    parser.add_argument("--pool-size", type=int, default=128, help="Imágenes distintas (se repiten hasta n)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    pool_imgs = make_images(args.pool_size, size=args.size)
+    contents = [pool_imgs[i % len(pool_imgs)] for i in range(args.n)]
+    report = {"n": args.n, "size": args.size, "workers": args.workers, "cpu_count": os.cpu_count()}
+
+    legacy, report["legacy"] = timed(args.n, lambda: [legacy_dhash64(c) for c in contents])
+
+    with HashPool(workers=args.workers) as pool:
+        exact, report["batch"] = timed(args.n, lambda: pool.hash_many(contents, args.batch_size))
+    report["batch"]["dhash_matches_legacy"] = all(h and h[0] == l for h, l in zip(exact, legacy))
+
+    with HashPool(workers=args.workers, draft=True) as pool:
+        drafted, report["draft"] = timed(args.n, lambda: pool.hash_many(contents, args.batch_size))
+    dists = [hamming(h[0], l) for h, l in zip(drafted, legacy) if h]
+    report["draft"]["dhash_exact_frac"] = round(sum(d == 0 for d in dists) / max(1, len(dists)), 3)
+    report["draft"]["dhash_max_bits"] = max(dists, default=0)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_media_fetch.py
+
+Benchmark offline de descarga + dHash contra fake_cdn.py:
+- legacy: ThreadPoolExecutor(12) + requests.get sin sesión compartida (motor anterior).
+- async: AsyncImageFetcher (aiohttp, keep-alive por host) + decode en process pool + hash por lotes.
+- revalidate: segunda pasada con ETag -> todo 304, sin decode.
+
+Uso:
+  python explorer/bench/bench_media_fetch.py --n 2000 --latency-ms 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_cdn import running_fake_cdn
+from explorer.media_fetcher import AsyncImageFetcher, FetchRequest
+from explorer.media_hash_agent import dhash64, fetch_and_hash_all
+
+def legacy_fetch_and_hash(url: str):
+    import requests
+    from PIL import Image
+    r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=20)
+    return dhash64(Image.open(BytesIO(r.content)))
+
+async def bench(n: int, latency_ms: float, workers: int, per_host: int, legacy: bool):
+    report = {"n": n, "latency_ms": latency_ms}
+    async with running_fake_cdn(latency_ms=latency_ms) as (base_url, app):
+        urls = [f"{base_url}/img/{i}.jpg" for i in range(n)]
+        loop = asyncio.get_running_loop()
+
+        if legacy:
+            t = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=12) as ex:
+                legacy_hashes = await asyncio.gather(*[loop.run_in_executor(ex, legacy_fetch_and_hash, u) for u in urls])
+            dt = time.perf_counter() - t
+            report["legacy_threads12"] = {"sec": round(dt, 2), "images_per_min": round(n / dt * 60)}
+
+        fetcher = AsyncImageFetcher(workers=workers, per_host=per_host)
+        t = time.perf_counter()
+        results = {}
+        validators = {}
+        async for res, h, _ in fetch_and_hash_all(fetcher, [FetchRequest(u) for u in urls], os.cpu_count() or 4):
+            results[res.url] = h
+            validators[res.url] = res.etag
+        dt = time.perf_counter() - t
+        report["async"] = {"sec": round(dt, 2), "images_per_min": round(n / dt * 60),
+                           "failed": sum(1 for h in results.values() if not h)}
+        if legacy:
+            report["async"]["matches_legacy"] = all(results[u] == h for u, h in zip(urls, legacy_hashes))
+
+        t = time.perf_counter()
+        not_modified = 0
+        async for res, _, _ in fetch_and_hash_all(fetcher, [FetchRequest(u, etag=validators[u]) for u in urls], 1):
+            not_modified += res.status == "not_modified"
+        dt = time.perf_counter() - t
+        report["revalidate"] = {"sec": round(dt, 2), "not_modified": not_modified}
+
+        capped = AsyncImageFetcher(workers=1, max_bytes=1024 * 1024)
+        async for res, _, _ in fetch_and_hash_all(capped, [FetchRequest(f"{base_url}/big.jpg")], 1):
+            report["max_bytes_check"] = res.error
+    return report
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--per-host", type=int, default=16)
+    parser.add_argument("--no-legacy", action="store_true", help="No correr el motor anterior (requests)")
+    args = parser.parse_args()
+    report = asyncio.run(bench(args.n, args.latency_ms, args.workers, args.per_host, not args.no_legacy))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_parquet_export.py
+
+Benchmark offline de parquet_export (historial sintético de bench_rollups.build_db):
+- export --all de todos los runs y export incremental de un run nuevo.
+- Lecturas típicas de análisis: pd.read_sql sobre SQLite vs pyarrow.dataset con pruning/pushdown
+  (todas las extracciones de N runs; una categoría en todos los runs; 3 columnas de observaciones).
+- Igualdad de resultados y tamaño en disco (DB vs Parquet).
+
+Uso:
+  python explorer/bench/bench_parquet_export.py --runs 365 --ads 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.bench_rollups import build_db
+from explorer.parquet_export import export_run, pending_runs, read_table
+from explorer.store import connect
+
+def timed(fn, repeat: int = 3):
+    """Mejor de `repeat` ejecuciones (ms)."""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        ms = (time.perf_counter() - t) * 1000
+        best = ms if best is None else min(best, ms)
+    return out, round(best, 1)
+
+def dir_mb(path: Path) -> float:
+    return round(sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) / 1024 / 1024, 1)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=365)
+    parser.add_argument("--ads", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=90, help="Runs leídos en la consulta por ventana")
+    args = parser.parse_args()
+
+    report = {"runs": args.runs, "ads_per_run": args.ads}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db, root = tmp / "bench.db", tmp / "parquet"
+        build_db(db, args.runs, args.ads)
+        conn = connect(db)
+        conn.execute("""
+            UPDATE ad_snapshots SET body_text = 'texto del anuncio ' || ad_id, domain = 'shop' || (id % 50) || '.co',
+                                    is_active = CASE WHEN id % 10 = 0 THEN NULL ELSE id % 3 <> 0 END
+        """)
+        conn.execute("UPDATE ad_extractions SET product_name_guess = 'producto ' || (rowid % 700), confidence = (rowid % 100) / 100.0")
+        conn.commit()
+
+        t = time.perf_counter()
+        for run_id in pending_runs(conn):
+            export_run(conn, run_id, root)
+        report["export_all_sec"] = round(time.perf_counter() - t, 2)
+        report["export_per_run_ms"] = round(report["export_all_sec"] * 1000 / args.runs, 1)
+        report["pending_after"] = len(pending_runs(conn))
+        report["db_mb"] = round(db.stat().st_size / 1024 / 1024, 1)
+        report["parquet_mb"] = dir_mb(root)
+
+        run_ids = [r[0] for r in conn.execute("SELECT run_id FROM runs ORDER BY run_id DESC LIMIT ?", (args.window,))]
+        marks = ",".join("?" * len(run_ids))
+        cases = {}
+
+        # 1) ventana de N runs, todas las columnas de ad_extractions
+        sql_df, ms_sql = timed(lambda: pd.read_sql(
+            f"SELECT run_id, ad_id, product_name_guess, category, subcategory, confidence FROM ad_extractions WHERE run_id IN ({marks})",
+            conn, params=run_ids))
+        pq_df, ms_pq = timed(lambda: read_table(
+            "ad_extractions", ["run_id", "ad_id", "product_name_guess", "category", "subcategory", "confidence"],
+            run_ids=run_ids, root=root).to_pandas())
+        key = ["run_id", "ad_id"]
+        a = sql_df.sort_values(key).reset_index(drop=True)
+        b = pq_df.astype({"category": str, "subcategory": object}).sort_values(key).reset_index(drop=True)
+        b["subcategory"] = b["subcategory"].where(b["subcategory"].notna(), None)
+        cases[f"extractions_{args.window}_runs"] = {"rows": len(sql_df), "sqlite_ms": ms_sql, "parquet_ms": ms_pq,
+                                                   "equal": bool(a.astype(str).equals(b.astype(str)))}
+
+        # 2) una categoría en todo el historial (pushdown sobre category)
+        sql_df, ms_sql = timed(lambda: pd.read_sql(
+            "SELECT run_id, ad_id, confidence FROM ad_extractions WHERE category = ?", conn, params=("Mascotas",)))
+        pq_df, ms_pq = timed(lambda: read_table(
+            "ad_extractions", ["run_id", "ad_id", "confidence"], categories=["Mascotas"], root=root).to_pandas())
+        cases["extractions_one_category"] = {"rows": len(sql_df), "sqlite_ms": ms_sql, "parquet_ms": ms_pq,
+                                             "equal": len(sql_df) == len(pq_df)}
+
+        # 3) serie temporal: 3 columnas de product_observations en todos los runs
+        sql_df, ms_sql = timed(lambda: pd.read_sql(
+            "SELECT o.run_id, o.product_id, o.ads_count FROM product_observations o", conn))
+        pq_df, ms_pq = timed(lambda: read_table(
+            "product_observations", ["run_id", "product_id", "ads_count"], root=root).to_pandas())
+        cases["observations_all_runs"] = {"rows": len(sql_df), "sqlite_ms": ms_sql, "parquet_ms": ms_pq,
+                                          "equal": len(sql_df) == len(pq_df) and int(sql_df.ads_count.sum()) == int(pq_df.ads_count.sum())}
+
+        # 4) snapshots de todo el historial sin body_text (lectura columnar)
+        sql_df, ms_sql = timed(lambda: pd.read_sql("SELECT run_id, ad_id, domain, _query_matched FROM ad_snapshots", conn))
+        pq_df, ms_pq = timed(lambda: read_table(
+            "ad_snapshots", ["run_id", "ad_id", "domain", "_query_matched"], root=root).to_pandas())
+        cases["snapshots_4_columns"] = {"rows": len(sql_df), "sqlite_ms": ms_sql, "parquet_ms": ms_pq,
+                                        "equal": len(sql_df) == len(pq_df)}
+        # 5) is_active (0/1/NULL en SQLite) ida y vuelta
+        sql_df, ms_sql = timed(lambda: pd.read_sql(f"SELECT run_id, id, is_active FROM ad_snapshots WHERE run_id IN ({marks})",
+                                                   conn, params=run_ids))
+        pq_df, ms_pq = timed(lambda: read_table("ad_snapshots", ["run_id", "id", "is_active"], run_ids=run_ids,
+                                                root=root).to_pandas())
+        a = {(r, i): None if pd.isna(v) else bool(v) for r, i, v in sql_df.itertuples(index=False)}
+        b = {(str(r), i): None if pd.isna(v) else bool(v) for r, i, v in pq_df.itertuples(index=False)}
+        cases[f"snapshots_is_active_{args.window}_runs"] = {"rows": len(sql_df), "sqlite_ms": ms_sql, "parquet_ms": ms_pq,
+                                                            "equal": a == b}
+        report["reads"] = cases
+
+        # 6) run nuevo -> sólo su partición
+        conn.execute("INSERT INTO runs (run_id, timestamp) VALUES ('run_new', '2099-01-01T00:00:00')")
+        conn.commit()
+        pending = pending_runs(conn)
+        _, ms = timed(lambda: [export_run(conn, r, root) for r in pending], repeat=1)
+        report["incremental"] = {"pending": pending, "ms": ms}
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
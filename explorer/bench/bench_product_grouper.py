@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_product_grouper.py
+
+Benchmark offline de product_grouper_agent: versión set-based (GROUP BY en SQLite) vs la versión
+anterior (dicts/Counters + escrituras fila a fila), materializada desde git (--baseline-rev).
+
+- Run sintético de --extractions extracciones (nombres Zipf, señales/evidencias JSON, dHash para una
+  fracción de anuncios, semantic_map para una fracción de nombres).
+- Cada versión corre sobre su propia copia de la DB; se comparan product_concepts, product_observations,
+  advertiser_product_state y ad_to_product.
+- ad_to_product difiere a propósito en los anuncios con cluster semántico: la versión anterior los
+  mapeaba a text_* (producto inexistente); ahora apuntan al mismo sem_* que la agregación.
+
+Uso:
+  python explorer/bench/bench_product_grouper.py --extractions 200000
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer import product_grouper_agent
+from explorer.product_grouper_agent import WEIGHTS
+from explorer.store import connect
+
+RUN_ID = "bench_run"
+REPO = Path(__file__).resolve().parents[2]
+
+def build_db(path: Path, n: int, seed: int = 11):
+    rnd = random.Random(seed)
+    conn = connect(path)
+    n_adv = max(1, n // 10)
+    vocab = [f"producto {w} {rnd.choice(['pro', 'max', 'plus', 'mini', ''])}".strip() for w in range(max(10, n // 7))]
+    weights = [1.0 / (i + 1) ** 0.9 for i in range(len(vocab))]
+    cats = ["Hogar", "Belleza", "Salud", "Tecnología", "Mascotas", "Otros"]
+    hashes = [f"{rnd.getrandbits(64):016x}" for _ in range(max(1, n // 40))]
+
+    ad_ids = [str(rnd.getrandbits(48)) for _ in range(n)]  # orden de inserción != orden de ad_id
+    names = rnd.choices(vocab, weights=weights, k=n)
+    conn.execute("INSERT INTO runs (run_id, timestamp) VALUES (?, '2026-10-01T00:00:00')", (RUN_ID,))
+    conn.executemany("INSERT OR IGNORE INTO ads (ad_id, advertiser_id) VALUES (?, ?)",
+                     [(a, f"adv{rnd.randrange(n_adv)}") for a in ad_ids])
+    conn.executemany("INSERT OR IGNORE INTO ad_snapshots (run_id, ad_id, observed_at) VALUES (?, ?, ?)",
+                     [(RUN_ID, a, f"2026-10-01T{rnd.randrange(24):02d}:{rnd.randrange(60):02d}:00") for a in ad_ids])
+    rows = []
+    for a, name in zip(ad_ids, names):
+        sig = {k: rnd.random() < 0.3 for k in WEIGHTS}
+        ev = {k: [f"{k} span {rnd.randrange(6)}" for _ in range(rnd.randrange(4))] for k, v in sig.items() if v}
+        rows.append((RUN_ID, a, name if rnd.random() > 0.02 else None, rnd.choice(cats), rnd.choice(cats + [None]),
+                     json.dumps(sig), json.dumps(ev), round(rnd.random(), 3)))
+    conn.executemany("INSERT OR IGNORE INTO ad_extractions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT OR IGNORE INTO ad_media (run_id, ad_id, image_url, dhash64) VALUES (?, ?, ?, ?)",
+                     [(RUN_ID, a, f"https://cdn/{a}.jpg", rnd.choice(hashes)) for a in ad_ids if rnd.random() < 0.3])
+    sem_names = [v for v in vocab if rnd.random() < 0.4]
+    conn.executemany("INSERT OR IGNORE INTO semantic_map (run_id, original_name, cluster_id, canonical_name) VALUES (?, ?, ?, ?)",
+                     [(RUN_ID, v, i // 3, sem_names[(i // 3) * 3]) for i, v in enumerate(sem_names)])
+    conn.commit()
+    conn.close()
+
+def load_baseline(rev: str, tmp: Path):
+    src = subprocess.run(["git", "show", f"{rev}:explorer/product_grouper_agent.py"], cwd=REPO,
+                         capture_output=True, text=True, check=True).stdout
+    path = tmp / "product_grouper_baseline.py"
+    path.write_text(src, encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("product_grouper_baseline", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def run_module(mod, db: Path, extra_args=()) -> float:
+    mod.connect = lambda *a, **kw: connect(db)
+    argv = sys.argv
+    sys.argv = ["product_grouper_agent.py", "--run-id", RUN_ID, *extra_args]
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        t = time.perf_counter()
+        mod.main()
+        return time.perf_counter() - t
+    finally:
+        sys.stdout = stdout
+        sys.argv = argv
+        devnull.close()
+
+def table(db: Path, sql: str) -> dict:
+    conn = connect(db)
+    try:
+        return {r[0]: r[1:] for r in conn.execute(sql)}
+    finally:
+        conn.close()
+
+def compare(db_old: Path, db_new: Path) -> dict:
+    out = {}
+    q = "SELECT product_id, canonical_name, category, subcategory, signals_json, rationale_json, candidate_score, first_seen_at, last_seen_at FROM product_concepts"
+    old, new = table(db_old, q), table(db_new, q)
+    diffs = {"keys": len(set(old) ^ set(new)), "name_cat": 0, "signals": 0, "evidence": 0, "evidence_order_only": 0, "score": 0, "seen": 0}
+    for pid in set(old) & set(new):
+        o, n = old[pid], new[pid]
+        diffs["name_cat"] += o[:3] != n[:3]
+        diffs["signals"] += json.loads(o[3]) != json.loads(n[3])
+        ro, rn = json.loads(o[4]), json.loads(n[4])
+        if ro["evidence"] != rn["evidence"]:
+            same_sets = {k: sorted(v) for k, v in ro["evidence"].items()} == {k: sorted(v) for k, v in rn["evidence"].items()}
+            diffs["evidence_order_only" if same_sets else "evidence"] += 1
+        diffs["score"] += abs(o[5] - n[5]) > 1e-9 or sorted(ro["reasons"]) != sorted(rn["reasons"])
+        diffs["seen"] += o[6:] != n[6:]
+    out["product_concepts"] = {"rows": len(new), **diffs}
+
+    q = "SELECT product_id, ads_count, advertisers_count, avg_confidence FROM product_observations"
+    old, new = table(db_old, q), table(db_new, q)
+    out["product_observations"] = {"rows": len(new), "diff": sum(
+        1 for k in set(old) | set(new)
+        if k not in old or k not in new or old[k][:2] != new[k][:2] or abs(old[k][2] - new[k][2]) > 1e-9)}
+
+    q = "SELECT advertiser_id || '|' || product_id, first_seen_at, last_seen_at, status FROM advertiser_product_state"
+    old, new = table(db_old, q), table(db_new, q)
+    out["advertiser_product_state"] = {"rows": len(new), "diff": sum(1 for k in set(old) | set(new) if old.get(k) != new.get(k))}
+
+    q = "SELECT ad_id, product_id, match_basis FROM ad_to_product"
+    old, new = table(db_old, q), table(db_new, q)
+    sem = {k for k, v in new.items() if v[1] == "semantic"}
+    out["ad_to_product"] = {
+        "rows": len(new),
+        "diff_non_semantic": sum(1 for k in (set(old) | set(new)) - sem if old.get(k) != new.get(k)),
+        "semantic_remapped": len(sem),
+    }
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--extractions", type=int, default=200000)
+    parser.add_argument("--baseline-rev", default="81f12e2", help="Commit con la versión fila a fila")
+    args = parser.parse_args()
+
+    report = {"extractions": args.extractions}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        seed_db = tmp / "seed.db"
+        t = time.perf_counter()
+        build_db(seed_db, args.extractions)
+        report["build_sec"] = round(time.perf_counter() - t, 2)
+        db_old, db_new = tmp / "old.db", tmp / "new.db"
+        shutil.copy(seed_db, db_old)
+        shutil.copy(seed_db, db_new)
+
+        report["baseline_sec"] = round(run_module(load_baseline(args.baseline_rev, tmp), db_old), 2)
+        report["set_based_sec"] = round(run_module(product_grouper_agent, db_new), 2)
+        report["speedup"] = round(report["baseline_sec"] / report["set_based_sec"], 1)
+        report["compare"] = compare(db_old, db_new)
+
+        # segunda pasada (upsert sobre filas existentes)
+        report["rerun_baseline_sec"] = round(run_module(load_baseline(args.baseline_rev, tmp), db_old), 2)
+        report["rerun_set_based_sec"] = round(run_module(product_grouper_agent, db_new), 2)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
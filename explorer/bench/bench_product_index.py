@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_product_index.py
+
+Benchmark offline de product_index (qdrant modo local + EmbeddingStore, embed_fn sintético):
+- sync_index() inicial sobre --products product_concepts y re-sync incremental tras renombrar --renamed.
+- Latencia de similar_products() (p50/p95) y recall@k vs kNN exacto por fuerza bruta (NumPy).
+- Costo de la alternativa actual: distancias pairwise de todos los nombres (O(n²)).
+- similar_products() no escribe embedding_index (orden de evict intacto) y open_index() con el modo
+  local tomado por otro cliente devuelve None en vez de fallar.
+
+Uso:
+  python explorer/bench/bench_product_index.py --products 20000 --dim 256 --queries 200
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.embedding_store import EmbeddingStore
+from explorer.product_index import ProductIndex, open_index, similar_products, sync_index, _INDEXES
+from explorer.store import connect
+
+def make_embedder(topics: int, dim: int, noise: float = 0.04, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    calls = {"texts": 0}
+
+    def embed(texts):
+        calls["texts"] += len(texts)
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            seed_i = int(hashlib.md5(t.encode()).hexdigest()[:8], 16)
+            out[i] = centers[seed_i % topics] + np.random.default_rng(seed_i).normal(scale=noise, size=dim)
+        return out
+
+    return embed, calls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--renamed", type=int, default=500)
+    args = parser.parse_args()
+
+    embed, calls = make_embedder(args.topics, args.dim)
+    report = {"products": args.products, "dim": args.dim, "k": args.k}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(Path(tmp) / "bench.db")
+        conn.executemany(
+            "INSERT INTO product_concepts (product_id, canonical_name, category) VALUES (?, ?, ?)",
+            [(f"text_{i}", f"producto {i}", f"cat{i % 12}") for i in range(args.products)],
+        )
+        conn.commit()
+
+        store = EmbeddingStore(conn, "synthetic")
+        index = ProductIndex.open(conn, "synthetic")
+        _INDEXES["synthetic"] = index
+
+        t = time.perf_counter()
+        s1 = sync_index(conn, index, store, embed)
+        report["sync_initial"] = {**s1, "sec": round(time.perf_counter() - t, 2), "embedded": calls["texts"]}
+
+        conn.executemany("UPDATE product_concepts SET canonical_name = canonical_name || ' v2' WHERE product_id=?",
+                         [(f"text_{i}",) for i in range(args.renamed)])
+        conn.execute("DELETE FROM product_concepts WHERE product_id='text_%d'" % (args.products - 1))
+        conn.commit()
+        calls["texts"] = 0
+        t = time.perf_counter()
+        s2 = sync_index(conn, index, store, embed)
+        report["sync_incremental"] = {**s2, "sec": round(time.perf_counter() - t, 3), "embedded": calls["texts"],
+                                      "index_size": index.count()}
+
+        # ---- consultas ----
+        rows = conn.execute("SELECT product_id, canonical_name FROM product_concepts ORDER BY product_id").fetchall()
+        ids = np.array([r[0] for r in rows])
+        M = store.get_or_embed([r[1] for r in rows], embed)
+        M /= np.linalg.norm(M, axis=1, keepdims=True)
+
+        rng = np.random.default_rng(0)
+        qrows = rng.choice(len(rows), size=args.queries, replace=False)
+        calls["texts"] = 0
+        usage_sql = "SELECT text_key, last_used_run_id, last_used_at FROM embedding_index ORDER BY text_key"
+        usage = conn.execute(usage_sql).fetchall()
+        lat, recall = [], []
+        for qi in qrows:
+            t = time.perf_counter()
+            hits = similar_products(rows[qi][1], args.k, conn=conn, model="synthetic", embed_fn=embed)
+            lat.append((time.perf_counter() - t) * 1000)
+            exact = set(ids[np.argsort(-(M @ M[qi]))[:args.k]])
+            recall.append(len(exact & {h["product_id"] for h in hits}) / args.k)
+        report["similar_products"] = {
+            "p50_ms": round(float(np.percentile(lat, 50)), 2),
+            "p95_ms": round(float(np.percentile(lat, 95)), 2),
+            f"recall_at_{args.k}": round(float(np.mean(recall)), 4),
+            "embed_fn_calls": calls["texts"],
+        }
+        similar_products("nombre nunca visto", args.k, conn=conn, model="synthetic", embed_fn=embed)
+        report["similar_products"]["embedding_index_unchanged"] = usage == conn.execute(usage_sql).fetchall()
+
+        # otro cliente (dashboard, otro grouper) tiene el directorio local: se omite el ANN
+        _INDEXES.clear()
+        report["locked_open_index_is_none"] = open_index(conn, "synthetic") is None
+        _INDEXES["synthetic"] = index
+
+        t = time.perf_counter()
+        for i in range(0, len(M), 4096):
+            _ = M[i:i + 4096] @ M.T
+        report["pairwise_all_sec"] = round(time.perf_counter() - t, 2)
+
+        index.close()
+        _INDEXES.clear()
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_rollups.py
+
+Benchmark offline de rollups.py: consultas de los dashboards con subconsultas correlacionadas
+(versión anterior) vs lecturas de las tablas rollup_* (migración v13).
+
+- Historial sintético de --runs runs con --ads anuncios cada uno (un año diario por defecto), con
+  product_concepts / observations / ad_to_product / ad_media / ad_extractions.
+- refresh_rollups() por run (costo incremental al final de cada grouper).
+- load_winners, get_product_drilldown y el directorio de anunciantes sobre --sample runs:
+  latencia p50/p95 y diferencias de resultado (search tags comparados como conjuntos).
+- ensure_rollups(): costo del chequeo de source_mark por lectura, y un run con rollups calculados
+  a mitad del pipeline (antes de ad_to_product) que se recalcula al completarse.
+
+Uso:
+  python explorer/bench/bench_rollups.py --runs 365 --ads 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.rollups import ensure_rollups, refresh_rollups
+from explorer.store import connect
+
+OLD_WINNERS = """
+SELECT p.product_id, p.canonical_name, o.ads_count, o.advertisers_count,
+  (
+    SELECT GROUP_CONCAT(DISTINCT s._query_matched)
+    FROM ad_to_product map
+    JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
+    WHERE map.product_id = p.product_id AND map.run_id = o.run_id
+  ) as search_tags
+FROM product_concepts p
+JOIN product_observations o ON o.product_id = p.product_id
+WHERE o.run_id = ? AND p.product_id <> 'unknown_cluster'
+ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
+LIMIT 200
+"""
+
+NEW_WINNERS = """
+SELECT p.product_id, p.canonical_name, o.ads_count, o.advertisers_count, r.search_tags
+FROM product_concepts p
+JOIN product_observations o ON o.product_id = p.product_id
+LEFT JOIN rollup_product_run r ON r.run_id = o.run_id AND r.product_id = o.product_id
+WHERE o.run_id = ? AND p.product_id <> 'unknown_cluster'
+ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
+LIMIT 200
+"""
+
+OLD_DRILLDOWN = """
+SELECT map.ad_id, a.advertiser_id,
+    (SELECT image_url FROM ad_media m WHERE m.ad_id = s.ad_id LIMIT 1) as image_url,
+    s.observed_at
+FROM ad_to_product map
+JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
+JOIN advertisers a ON a.advertiser_id = map.advertiser_id
+WHERE map.run_id = ? AND map.product_id = ?
+ORDER BY s.observed_at DESC, map.ad_id
+"""
+
+NEW_DRILLDOWN = """
+SELECT map.ad_id, a.advertiser_id, img.image_url, s.observed_at
+FROM ad_to_product map
+JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
+JOIN advertisers a ON a.advertiser_id = map.advertiser_id
+LEFT JOIN rollup_ad_image img ON img.ad_id = map.ad_id
+WHERE map.run_id = ? AND map.product_id = ?
+ORDER BY s.observed_at DESC, map.ad_id
+"""
+
+OLD_ADVERTISERS = """
+SELECT a.advertiser_id, COUNT(DISTINCT s.ad_id) as ads_in_run,
+    GROUP_CONCAT(DISTINCT e.category) as categories_seen,
+    GROUP_CONCAT(DISTINCT s._query_matched) as search_tags
+FROM advertisers a
+JOIN ads ad ON ad.advertiser_id = a.advertiser_id
+JOIN ad_snapshots s ON s.ad_id = ad.ad_id
+LEFT JOIN ad_extractions e ON e.run_id = s.run_id AND e.ad_id = s.ad_id
+WHERE s.run_id = ?
+GROUP BY a.advertiser_id
+ORDER BY ads_in_run DESC
+"""
+
+NEW_ADVERTISERS = """
+SELECT a.advertiser_id, r.ads_in_run, r.categories_seen, r.search_tags
+FROM rollup_advertiser_run r
+JOIN advertisers a ON a.advertiser_id = r.advertiser_id
+WHERE r.run_id = ?
+ORDER BY r.ads_in_run DESC
+"""
+
+QUERIES = ["chicas fitness", "cocina", "mascotas", "gadgets", "belleza", "hogar", "bebes", "auto"]
+CATS = ["Hogar", "Belleza", "Salud", "Tecnología", "Mascotas", "Otros"]
+
+def build_db(path: Path, runs: int, ads: int, seed: int = 7):
+    """Anuncios que persisten entre runs (rotación diaria de ~10%), productos Zipf, 1-2 imágenes por anuncio."""
+    rnd = random.Random(seed)
+    conn = connect(path)
+    n_adv, n_prod = max(10, ads // 4), max(10, ads // 3)
+    conn.executemany("INSERT INTO advertisers (advertiser_id, current_page_name, status) VALUES (?, ?, 'active')",
+                     [(f"adv{i}", f"Página {i}") for i in range(n_adv)])
+    conn.executemany("INSERT INTO product_concepts (product_id, canonical_name, category, candidate_score) VALUES (?, ?, ?, ?)",
+                     [(f"text_{i}", f"producto {i}", rnd.choice(CATS), rnd.random() * 10) for i in range(n_prod)])
+    weights = [1.0 / (i + 1) for i in range(n_prod)]
+
+    live, next_ad, ad_info = [], 0, {}
+    for r in range(runs):
+        run_id = f"run{r:04d}"
+        conn.execute("INSERT INTO runs (run_id, timestamp) VALUES (?, ?)", (run_id, f"2025-01-01T00:00:00+{r:04d}"))
+        live = [a for a in live if rnd.random() > 0.1]
+        while len(live) < ads:
+            a = f"ad{next_ad}"
+            next_ad += 1
+            ad_info[a] = (f"adv{rnd.randrange(n_adv)}", f"text_{rnd.choices(range(n_prod), weights)[0]}")
+            live.append(a)
+        conn.executemany("INSERT OR IGNORE INTO ads (ad_id, advertiser_id) VALUES (?, ?)",
+                         [(a, ad_info[a][0]) for a in live])
+        conn.executemany("INSERT INTO ad_snapshots (run_id, ad_id, observed_at, _query_matched) VALUES (?, ?, ?, ?)",
+                         [(run_id, a, f"2025-{r:04d}T{rnd.randrange(24):02d}", rnd.choice(QUERIES)) for a in live])
+        conn.executemany("INSERT INTO ad_extractions (run_id, ad_id, category) VALUES (?, ?, ?)",
+                         [(run_id, a, rnd.choice(CATS)) for a in live if rnd.random() < 0.9])
+        conn.executemany("INSERT OR IGNORE INTO ad_media (run_id, ad_id, image_url) VALUES (?, ?, ?)",
+                         [(run_id, a, f"https://cdn/{a}/{rnd.randrange(2)}.jpg") for a in live for _ in range(rnd.randrange(1, 3))
+                          if rnd.random() < 0.7])
+        conn.executemany("INSERT INTO ad_to_product (run_id, ad_id, product_id, advertiser_id) VALUES (?, ?, ?, ?)",
+                         [(run_id, a, ad_info[a][1], ad_info[a][0]) for a in live])
+        conn.execute("""
+            INSERT INTO product_observations (run_id, product_id, ads_count, advertisers_count)
+            SELECT run_id, product_id, COUNT(*), COUNT(DISTINCT advertiser_id)
+            FROM ad_to_product WHERE run_id = ? GROUP BY product_id
+        """, (run_id,))
+    conn.commit()
+    conn.close()
+
+def timed(conn, sql, params):
+    t = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    return rows, (time.perf_counter() - t) * 1000
+
+def tags(v):
+    return frozenset((v or "").split(",")) - {""}
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(len(xs) * p))], 2)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=365)
+    parser.add_argument("--ads", type=int, default=2000, help="Anuncios por run")
+    parser.add_argument("--sample", type=int, default=20, help="Runs consultados")
+    args = parser.parse_args()
+
+    report = {"runs": args.runs, "ads_per_run": args.ads}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "bench.db"
+        t = time.perf_counter()
+        build_db(db, args.runs, args.ads)
+        report["build_sec"] = round(time.perf_counter() - t, 1)
+
+        conn = connect(db)
+        run_ids = [r[0] for r in conn.execute("SELECT run_id FROM runs ORDER BY run_id")]
+        refresh = []
+        for run_id in run_ids:
+            t = time.perf_counter()
+            refresh_rollups(conn, run_id)
+            refresh.append((time.perf_counter() - t) * 1000)
+        report["refresh_ms_per_run"] = {"p50": pct(refresh, 0.5), "p95": pct(refresh, 0.95),
+                                        "last": round(refresh[-1], 2)}
+
+        rnd = random.Random(1)
+        sample = rnd.sample(run_ids, min(args.sample, len(run_ids)))
+        lat = {k: [] for k in ("winners_old", "winners_new", "drilldown_old", "drilldown_new",
+                               "advertisers_old", "advertisers_new")}
+
+        # versión anterior sobre el esquema previo a v13 (sin idx_ad_to_product_run_prod)
+        conn.execute("DROP INDEX idx_ad_to_product_run_prod")
+        old_rows = {}
+        for run_id in sample:
+            winners, ms = timed(conn, OLD_WINNERS, (run_id,))
+            lat["winners_old"].append(ms)
+            drill = []
+            for (product_id, *_rest) in winners[:5]:
+                rows, ms = timed(conn, OLD_DRILLDOWN, (run_id, product_id))
+                lat["drilldown_old"].append(ms)
+                drill.append(rows)
+            advs, ms = timed(conn, OLD_ADVERTISERS, (run_id,))
+            lat["advertisers_old"].append(ms)
+            old_rows[run_id] = (winners, drill, advs)
+        conn.execute("CREATE INDEX idx_ad_to_product_run_prod ON ad_to_product(run_id, product_id)")
+
+        diffs = {"winners": 0, "drilldown": 0, "advertisers": 0}
+        norm = lambda rows: sorted((r[0], r[1], tags(r[2]), tags(r[3])) for r in rows)
+        for run_id in sample:
+            old_w, old_d, old_a = old_rows[run_id]
+            winners, ms = timed(conn, NEW_WINNERS, (run_id,))
+            lat["winners_new"].append(ms)
+            diffs["winners"] += [(*r[:4], tags(r[4])) for r in old_w] != [(*r[:4], tags(r[4])) for r in winners]
+            for (product_id, *_rest), old in zip(winners[:5], old_d):
+                rows, ms = timed(conn, NEW_DRILLDOWN, (run_id, product_id))
+                lat["drilldown_new"].append(ms)
+                diffs["drilldown"] += old != rows
+            advs, ms = timed(conn, NEW_ADVERTISERS, (run_id,))
+            lat["advertisers_new"].append(ms)
+            diffs["advertisers"] += norm(old_a) != norm(advs)
+
+        # chequeo que hace read_df en cada lectura: sin datos nuevos no refresca
+        check, noop_refreshed = [], 0
+        for run_id in sample:
+            t = time.perf_counter()
+            noop_refreshed += ensure_rollups(conn, run_id)
+            check.append((time.perf_counter() - t) * 1000)
+        report["ensure_noop_ms"] = {"p50": pct(check, 0.5), "p95": pct(check, 0.95), "refreshed": noop_refreshed}
+
+        # dashboard abierto a mitad del pipeline: rollups sin ad_to_product, después llega el grouper
+        run_id = sample[0]
+        mapping = conn.execute("SELECT run_id, ad_id, product_id, advertiser_id FROM ad_to_product WHERE run_id=?",
+                               (run_id,)).fetchall()
+        with conn:
+            conn.execute("DELETE FROM ad_to_product WHERE run_id=?", (run_id,))
+        refresh_rollups(conn, run_id)
+        with conn:
+            conn.executemany("INSERT INTO ad_to_product (run_id, ad_id, product_id, advertiser_id) VALUES (?, ?, ?, ?)",
+                             mapping)
+        report["partial_run_refreshed"] = ensure_rollups(conn, run_id)
+        winners = conn.execute(NEW_WINNERS, (run_id,)).fetchall()
+        diffs["partial_run"] = int([(*r[:4], tags(r[4])) for r in old_rows[run_id][0]]
+                                   != [(*r[:4], tags(r[4])) for r in winners])
+        conn.close()
+
+    report["latency_ms"] = {k: {"p50": pct(v, 0.5), "p95": pct(v, 0.95), "mean": round(statistics.mean(v), 2)}
+                            for k, v in lat.items()}
+    report["diff_runs"] = diffs
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
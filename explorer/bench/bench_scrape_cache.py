@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_scrape_cache.py
+
+Benchmark offline del cache de scrapes compartido (explorer/scrape_cache.py) contra explorer/bench/fake_apify.py:
+- --products productos del spy_agent con --queries querys cada uno; --overlap de ellas salen de un pool
+  común (variantes de la misma búsqueda: mayúsculas, espacios), como pasa con productos parecidos.
+- Después corre el explorer (scraper_runner, modo normal) con seeds que repiten querys de los productos.
+- sin cache: cada producto y el explorer scrapean todas sus URLs (lo de antes).
+- con cache: las URLs ya scrapeadas (por cualquiera de los dos) salen de product_memory.db.
+- Reporta URLs/items pagados al actor, tiempo y compara los _dedupe_key / _dedup_key de cada salida.
+
+Uso:
+  python explorer/bench/bench_scrape_cache.py --products 10 --queries 30 --overlap 0.5
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer import scraper_runner
+from explorer.bench.fake_apify import FakeApifyClient, fake_ad
+from explorer.scrape_cache import ScrapeCache, normalize_search_url
+from explorer.store import connect
+from spy_agent import apify_actor
+from spy_agent.apify_actor import build_ads_library_search_url, normalize_country, run_apify_actor, slugify
+
+class NormalizingFakeClient(FakeApifyClient):
+    """
+    Como el actor real: URLs equivalentes (aunque difiera el string) traen el mismo contenido, y
+    limitPerSource=60 trae los primeros 60 de lo que trae limitPerSource=80.
+    """
+
+    STRIDE = 10_000
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.canonical = {normalize_search_url(u): u for u in self.urls}
+        self.actor_urls = 0
+
+    def start(self, run_input=None, **kwargs):
+        urls = [{"url": self.canonical.get(normalize_search_url(u["url"]), u["url"])} for u in run_input["urls"]]
+        self.actor_urls += len(urls)
+        return super().start(dict(run_input, urls=urls), **kwargs)
+
+    def _items(self, run, start, end):
+        out = []
+        per = run["per_url"]
+        for i in range(start, end):
+            u, j = run["urls"][i // per], i % per
+            qi = self.urls.index(u)
+            n = (qi - 1) * self.STRIDE + j + 1 if qi and j % self.dup_every == 0 else qi * self.STRIDE + j
+            out.append(fake_ad(n, 0, self.urls, qi))
+        return out
+
+def build_queries(n_products: int, n_queries: int, overlap: float, seed: int = 24):
+    rnd = random.Random(seed)
+    pool = [f"ashwagandha oferta {i}" for i in range(max(1, n_queries))]
+    products = {}
+    for k in range(n_products):
+        shared = rnd.sample(pool, int(n_queries * overlap))
+        # variantes que normalizan a la misma búsqueda
+        shared = [q.upper() if rnd.random() < 0.3 else q.replace(" ", "  ") if rnd.random() < 0.3 else q for q in shared]
+        own = [f"producto {k} variante {q}" for q in range(n_queries - len(shared))]
+        products[f"Producto Cache {k}"] = shared + own
+    seeds = [{"category_intent": "bench", "queries": rnd.sample(pool, len(pool) // 2)
+              + [f"producto {k} variante 0" for k in range(n_products)]}]
+    return products, seeds
+
+def setup(root: Path, products: dict, seeds: list) -> Path:
+    for name, queries in products.items():
+        folder = slugify(name)
+        (root / "output" / folder).mkdir(parents=True)
+        (root / "output" / folder / f"querys_fblibrary_{folder}.json").write_text(
+            json.dumps({"canonical_product_name": name, "querys": queries}, ensure_ascii=False), encoding="utf-8")
+    seed_path = root / "seed_queries.json"
+    seed_path.write_text(json.dumps(seeds, ensure_ascii=False), encoding="utf-8")
+    return seed_path
+
+def all_urls(products: dict, seeds: list) -> list:
+    country = normalize_country("CO")
+    urls = [build_ads_library_search_url(q, country, apify_actor.ACTIVE_STATUS, apify_actor.AD_TYPE,
+                                         apify_actor.SEARCH_TYPE, apify_actor.MEDIA_TYPE)
+            for queries in products.values() for q in queries]
+    urls += [scraper_runner.build_ads_library_search_url(q) for grp in seeds for q in grp["queries"]]
+    return list(dict.fromkeys(urls))
+
+def run_all(root: Path, products: dict, seed_path: Path, client, args, max_age: float) -> dict:
+    apify_actor.ROOT_DIR = root
+    t = time.perf_counter()
+    for name in products:
+        run_apify_actor(name=name, country_code="CO", limit_per_source=args.limit_per_source, client=client,
+                        cache_max_age_hours=max_age)
+    explorer = scraper_runner.run_scraper(client=client, runs_dir=root / "runs", seed_path=seed_path,
+                                          cache_max_age_hours=max_age)
+    sec = round(time.perf_counter() - t, 2)
+
+    keys = {}
+    for name in products:
+        folder = slugify(name)
+        with (root / "output" / folder / "apify_results" / f"fblibrary_ads_dedup_{folder}.jsonl").open(encoding="utf-8") as f:
+            keys[name] = {json.loads(line)["_dedupe_key"] for line in f}
+    with open(explorer["paths"]["dedup"], encoding="utf-8") as f:
+        keys["explorer"] = {json.loads(line)["_dedup_key"] for line in f}
+    return {"sec": sec, "actor_runs": client.stats["actor_starts"], "actor_urls": client.actor_urls,
+            "explorer_cache": explorer.get("cache"), "keys": keys}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--overlap", type=float, default=0.5, help="Fracción de querys de cada producto que salen del pool común")
+    parser.add_argument("--limit-per-source", type=int, default=80)
+    parser.add_argument("--items-per-sec", type=float, default=4000.0, help="Ritmo de producción por run del actor")
+    args = parser.parse_args()
+
+    products, seeds = build_queries(args.products, args.queries, args.overlap)
+    urls = all_urls(products, seeds)
+    report = {"products": args.products, "queries_per_product": args.queries, "overlap": args.overlap,
+              "distinct_urls": len({normalize_search_url(u) for u in urls})}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        conn = connect(tmp / "cache.db")
+        open_cache = lambda hours, db_path=None: ScrapeCache(conn, hours) if hours else None
+        apify_actor.open_cache = open_cache
+        scraper_runner.open_cache = open_cache
+
+        devnull = open(os.devnull, "w")
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = {}
+            for mode, max_age in (("no_cache", 0), ("cache", 72)):
+                root = tmp / mode
+                seed_path = setup(root, products, seeds)
+                client = NormalizingFakeClient(items_per_sec=args.items_per_sec, urls=urls, per_url=True, dup_every=10)
+                results[mode] = run_all(root, products, seed_path, client, args, max_age)
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+
+        for mode, res in results.items():
+            report[mode] = {k: v for k, v in res.items() if k != "keys"}
+        report["actor_urls_saved"] = results["no_cache"]["actor_urls"] - results["cache"]["actor_urls"]
+        report["speedup"] = round(results["no_cache"]["sec"] / results["cache"]["sec"], 1)
+        report["dedup_keys_equal"] = results["no_cache"]["keys"] == results["cache"]["keys"]
+        report["cache_db"] = ScrapeCache(conn).summary()
+        conn.close()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_scraper_shards.py
+
+Benchmark offline de scraper_runner --shards contra fake_apify.py (un cliente fake por token):
+- Exploración de --queries queries: wall-clock con 1, 2, 4, 8 shards (cada run del actor produce a ritmo fijo).
+- Scheduler: tokens con distinta cuota restante; un token sin cuota (start falla) -> failover de sus shards.
+- Crash de un shard a mitad de descarga -> RuntimeError -> --resume retoma sólo ese shard.
+- Mismo set de _dedup_key en todos los casos (dedup entre shards).
+
+Uso:
+  python explorer/bench/bench_scraper_shards.py --queries 300 --items-per-sec 3000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_apify import FakeApifyClient
+from explorer.jsonl_io import open_jsonl
+from explorer.scraper_runner import build_ads_library_search_url, run_scraper
+
+def write_seeds(path: Path, n: int) -> list:
+    queries = [f"producto tendencia {i}" for i in range(n)]
+    path.write_text(json.dumps([{"category_intent": "Hogar", "queries": queries}], ensure_ascii=False), encoding="utf-8")
+    return [build_ads_library_search_url(q) for q in queries]
+
+def dedup_keys(path: str) -> set:
+    with open_jsonl(path) as f:
+        return {json.loads(line)["_dedup_key"] for line in f}
+
+def make_tokens(urls, args_cli, crash_after_pages: int = 0):
+    kw = dict(items_per_sec=args_cli.items_per_sec, urls=urls, per_url=True, dup_every=args_cli.dup_every)
+    return [
+        ("APIFY_APY_KEY", FakeApifyClient(monthly_usd=49.0, used_usd=40.0, **kw)),
+        ("APIFY_APY_KEY_2", FakeApifyClient(monthly_usd=49.0, used_usd=30.0, crash_after_pages=crash_after_pages, **kw)),
+        ("APIFY_APY_KEY_3", FakeApifyClient(monthly_usd=49.0, used_usd=0.0, fail_starts=True, **kw)),
+    ]
+
+def one_run(runs_dir: Path, seeds: Path, urls, args_cli, shards: int) -> dict:
+    tokens = make_tokens(urls, args_cli)
+    t = time.perf_counter()
+    summary = run_scraper(stream=True, shards=shards, poll_sec=0.05, page_size=args_cli.page_size,
+                          client=tokens[1][1], token_clients=tokens, runs_dir=runs_dir, seed_path=seeds,
+                          cache_max_age_hours=0)
+    out = {"elapsed_sec": round(time.perf_counter() - t, 2), "raw_count": summary["raw_count"],
+           "dedup_count": summary["dedup_count"], "unique_advertisers": summary["unique_advertisers"]}
+    if shards > 1:
+        out["shards_per_token"] = {}
+        for sh in summary["shards"]:
+            out["shards_per_token"][sh["token"]] = out["shards_per_token"].get(sh["token"], 0) + 1
+        out["failed_tokens"] = [t["token"] for t in summary["tokens"] if t["failed"]]
+    time.sleep(1.1)  # run_id por timestamp al segundo
+    return out, dedup_keys(summary["paths"]["dedup"])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--items-per-sec", type=float, default=3000.0, help="Ritmo de producción por run del actor")
+    parser.add_argument("--dup-every", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--shards", default="1,2,4,8")
+    args_cli = parser.parse_args()
+
+    report = {"queries": args_cli.queries, "items_per_sec_per_run": args_cli.items_per_sec}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        seeds = tmp / "seeds.json"
+        urls = write_seeds(seeds, args_cli.queries)
+        runs_dir = tmp / "runs"
+        runs_dir.mkdir()
+
+        reference = None
+        for n in [int(x) for x in args_cli.shards.split(",")]:
+            res, keys = one_run(runs_dir, seeds, urls, args_cli, n)
+            reference = reference or keys
+            res["dedup_equal"] = keys == reference
+            report[f"shards_{n}"] = res
+
+        # ---- crash de un shard + resume ----
+        tokens = make_tokens(urls, args_cli, crash_after_pages=6)
+        try:
+            run_scraper(stream=True, shards=4, poll_sec=0.05, page_size=args_cli.page_size,
+                        token_clients=tokens, runs_dir=runs_dir, seed_path=seeds, cache_max_age_hours=0)
+            report["resume"] = {"crashed": False}
+        except RuntimeError as e:
+            run_id = sorted(p.name for p in runs_dir.iterdir() if (p / "shards.json").exists())[-1]
+            starts_before = sum(c.stats["actor_starts"] for _, c in tokens)
+            summary = run_scraper(resume_run_id=run_id, poll_sec=0.05, page_size=args_cli.page_size,
+                                  token_clients=tokens, runs_dir=runs_dir, seed_path=seeds, cache_max_age_hours=0)
+            report["resume"] = {
+                "crashed": True, "error": str(e)[:120],
+                "new_actor_starts": sum(c.stats["actor_starts"] for _, c in tokens) - starts_before,
+                "dedup_count": summary["dedup_count"],
+                "dedup_equal": dedup_keys(summary["paths"]["dedup"]) == reference,
+            }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_scraper_stream.py
+
+Benchmark offline de scraper_runner contra fake_apify.py:
+- modo call (actor.call + iterate_items, JSONL plano) vs --stream (páginas mientras corre, zstd).
+- Crash a mitad de descarga + frame a medio escribir: --resume retoma desde el offset sin re-arrancar el actor.
+- dedup_ads del stream == dedup_ads del modo call (ignorando _explorer_run_id).
+- Memoria del set de dedup: f-strings vs digests int64.
+
+Uso:
+  python explorer/bench/bench_scraper_stream.py --total 20000 --items-per-sec 4000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_apify import FakeApifyClient, fake_ad
+from explorer.jsonl_io import open_jsonl
+from explorer.scraper_runner import (
+    build_ads_library_search_url, compute_ad_dedupe_key, key_digest, load_seed_queries, run_scraper,
+)
+
+def dedup_lines(path: Path) -> list:
+    out = []
+    with open_jsonl(path) as f:
+        for line in f:
+            o = json.loads(line)
+            o.pop("_explorer_run_id", None)
+            out.append(json.dumps(o, sort_keys=True, ensure_ascii=False))
+    return out
+
+def key_set_memory(args_cli, urls) -> dict:
+    items = [fake_ad(i, args_cli.dup_every, urls) for i in range(args_cli.total)]
+    keys = [compute_ad_dedupe_key(it) for it in items]
+    out = {}
+    for name, build in (("fstring_set", lambda a, b: f"{a}::{b}"), ("digest_set", lambda a, b: key_digest(f"{a}::{b}"))):
+        tracemalloc.start()
+        s = set()
+        for a, b in keys:
+            s.add(build(a, b))
+        out[f"{name}_kb"] = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+        tracemalloc.stop()
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=20000)
+    parser.add_argument("--items-per-sec", type=float, default=4000.0)
+    parser.add_argument("--dup-every", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--crash-after-pages", type=int, default=5)
+    args_cli = parser.parse_args()
+
+    root = Path(__file__).resolve().parent.parent
+    urls = [build_ads_library_search_url(q["query"]) for q in load_seed_queries(root / "seed_queries.json")]
+    report = {"total": args_cli.total, "items_per_sec": args_cli.items_per_sec, "page_size": args_cli.page_size}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs_dir = Path(tmp)
+
+        # ---- call (bloquea hasta el fin del run, luego descarga) ----
+        client = FakeApifyClient(args_cli.total, args_cli.items_per_sec, args_cli.dup_every, urls)
+        t = time.perf_counter()
+        call_summary = run_scraper(client=client, runs_dir=runs_dir, cache_max_age_hours=0)
+        report["call"] = {"elapsed_sec": round(time.perf_counter() - t, 2),
+                          "raw_count": call_summary["raw_count"], "dedup_count": call_summary["dedup_count"],
+                          "raw_bytes": Path(call_summary["paths"]["raw"]).stat().st_size,
+                          "dedup_bytes": Path(call_summary["paths"]["dedup"]).stat().st_size}
+        time.sleep(1.1)  # run_id por timestamp al segundo
+
+        # ---- stream con crash ----
+        client = FakeApifyClient(args_cli.total, args_cli.items_per_sec, args_cli.dup_every, urls,
+                                 crash_after_pages=args_cli.crash_after_pages)
+        t = time.perf_counter()
+        run_id = None
+        try:
+            run_scraper(stream=True, poll_sec=0.05, page_size=args_cli.page_size, client=client, runs_dir=runs_dir,
+                        cache_max_age_hours=0)
+        except ConnectionError:
+            run_id = sorted(p.name for p in runs_dir.iterdir() if (p / "stream_state.json").exists())[-1]
+        state = json.loads((runs_dir / run_id / "stream_state.json").read_text(encoding="utf-8"))
+        report["crash_at_offset"] = state["offset"]
+
+        # frame a medio escribir después del checkpoint (crash dentro de f.write)
+        with open(runs_dir / run_id / "dedup_ads.jsonl.zst", "ab") as f:
+            f.write(b"\x28\xb5\x2f\xfd\x00garbage")
+
+        stream_summary = run_scraper(resume_run_id=run_id, poll_sec=0.05, page_size=args_cli.page_size,
+                                     client=client, runs_dir=runs_dir, cache_max_age_hours=0)
+        report["stream"] = {"elapsed_sec": round(time.perf_counter() - t, 2),
+                            "raw_count": stream_summary["raw_count"], "dedup_count": stream_summary["dedup_count"],
+                            "unique_advertisers": stream_summary["unique_advertisers"],
+                            "raw_bytes": Path(stream_summary["paths"]["raw"]).stat().st_size,
+                            "dedup_bytes": Path(stream_summary["paths"]["dedup"]).stat().st_size,
+                            "actor_starts": client.stats["actor_starts"], "list_calls": client.stats["list_calls"]}
+        report["dedup_equal"] = dedup_lines(Path(call_summary["paths"]["dedup"])) == dedup_lines(Path(stream_summary["paths"]["dedup"]))
+        report["advertisers_equal"] = call_summary["unique_advertisers"] == stream_summary["unique_advertisers"]
+
+    report["memory"] = key_set_memory(args_cli, urls)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_semantic.py
+
+Benchmark offline de semantic_grouper --mode full vs --mode incremental con embeddings sintéticos
+(tópicos = centros aleatorios unitarios + ruido por nombre; sin llamadas a OpenAI).
+
+- Simula --runs runs; cada run trae nombres ya vistos (--repeat) + nombres nuevos.
+- full: AgglomerativeClustering de todos los nombres del run (O(n²)); ids locales al run.
+- incremental: assign_incremental() con centroides persistidos; sólo embebe/agrupa lo nuevo.
+- Reporta tiempo por run, nombres embebidos, estabilidad de cluster_id de nombres repetidos y ARI vs tópicos.
+
+Uso:
+  python explorer/bench/bench_semantic.py --topics 400 --names-per-run 3000 --runs 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.semantic_clusters import assign_incremental, cluster_residue, normalize_rows
+from explorer.store import connect
+
+THRESHOLD = 0.45
+
+def make_embedder(topics: int, dim: int, noise: float, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(topics, dim)))
+    calls = {"texts": 0}
+
+    def embed(texts):
+        calls["texts"] += len(texts)
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            topic = int(t.split("-")[0][5:])
+            r = np.random.default_rng(int(hashlib.md5(t.encode()).hexdigest()[:8], 16))
+            out[i] = centers[topic] + r.normal(scale=noise, size=dim)
+        return out
+
+    return embed, calls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=400)
+    parser.add_argument("--names-per-run", type=int, default=3000)
+    parser.add_argument("--repeat", type=float, default=0.6, help="Fracción de nombres del run ya vistos antes")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--noise", type=float, default=0.012)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    embed, calls = make_embedder(args.topics, args.dim, args.noise)
+    seen, next_variant = [], 0
+    report = {"topics": args.topics, "names_per_run": args.names_per_run, "repeat": args.repeat, "runs": []}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(Path(tmp) / "bench.db")
+        prev_ids = {}
+        for r in range(args.runs):
+            n_rep = int(args.names_per_run * args.repeat) if seen else 0
+            names = list(rng.choice(seen, size=min(n_rep, len(seen)), replace=False)) if n_rep else []
+            for _ in range(args.names_per_run - len(names)):
+                names.append(f"topic{rng.integers(args.topics)}-v{next_variant}")
+                next_variant += 1
+            names = list(dict.fromkeys(names))
+            truth = [int(n.split("-")[0][5:]) for n in names]
+            counts = {n: 1 for n in names}
+            run_id = f"run{r}"
+
+            # ---- full ----
+            t = time.perf_counter()
+            calls["texts"] = 0
+            labels_full = cluster_residue(normalize_rows(embed(names)), THRESHOLD)
+            full_sec = time.perf_counter() - t
+            full_embedded = calls["texts"]
+
+            # ---- incremental ----
+            t = time.perf_counter()
+            calls["texts"] = 0
+            rows, stats = assign_incremental(conn, run_id, names, counts, embed, "synthetic", THRESHOLD)
+            conn.commit()
+            inc_sec = time.perf_counter() - t
+            ids = {row[1]: row[2] for row in rows}
+
+            repeated = [n for n in names if n in prev_ids]
+            stable = sum(1 for n in repeated if ids[n] == prev_ids[n])
+            report["runs"].append({
+                "run": run_id,
+                "names": len(names),
+                "full": {"sec": round(full_sec, 3), "embedded": full_embedded,
+                         "ari": round(adjusted_rand_score(truth, labels_full), 4)},
+                "incremental": {"sec": round(inc_sec, 3), "embedded": calls["texts"],
+                                "ari": round(adjusted_rand_score(truth, [ids[n] for n in names]), 4),
+                                "assigned_existing": stats["assigned_existing"], "residue": stats["residue"],
+                                "clusters_total": stats["clusters_total"],
+                                "repeated_names_stable": f"{stable}/{len(repeated)}"},
+            })
+            prev_ids.update(ids)
+            seen = list(dict.fromkeys(seen + names))
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/bench_trends.py
+
+Benchmark offline de trends.py sobre un historial sintético:
+- --products productos por run con advertisers_count estable (Poisson) y una fracción --planted que
+  escala (x1.2-1.6 por run desde un run aleatorio); anunciantes análogos en advertiser_run_stats.
+- update_product_trends / update_advertiser_trends run a run (costo por run ~constante: sólo lee la
+  ventana) vs recalcular las métricas sobre todo el historial con pandas en cada run.
+- Precisión / recall de scaling contra los productos plantados que están escalando en el último run,
+  y posición de los plantados en el ranking por velocity.
+
+Uso:
+  python explorer/bench/bench_trends.py --runs 365 --products 3000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.store import connect
+from explorer.trends import TREND_WINDOW, top_products, update_advertiser_trends, update_product_trends
+
+def build_db(path: Path, runs: int, products: int, planted: float, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    conn = connect(path)
+    base = rng.integers(1, 6, size=products).astype(float)
+    start = np.where(rng.random(products) < planted, rng.integers(runs // 2, runs - 4, size=products), -1)
+    rate = rng.uniform(1.2, 1.6, size=products)
+    ts = pd.date_range("2025-01-01", periods=runs, freq="D", tz="UTC")
+
+    conn.executemany("INSERT INTO runs (run_id, timestamp) VALUES (?, ?)",
+                     [(f"run{r:04d}", t.strftime("%Y-%m-%dT%H:%M:%SZ")) for r, t in enumerate(ts)])
+    conn.executemany("INSERT INTO product_concepts (product_id, canonical_name, first_seen_at) VALUES (?, ?, ?)",
+                     [(f"p{i}", f"producto {i}", ts[0].isoformat()) for i in range(products)])
+    conn.executemany("INSERT INTO advertisers (advertiser_id, first_seen_at) VALUES (?, ?)",
+                     [(f"adv{i}", ts[0].isoformat()) for i in range(products)])
+    for r in range(runs):
+        steps = np.where((start >= 0) & (r >= start), r - start, 0)
+        lam = np.minimum(base * rate ** steps, 400)
+        adv = rng.poisson(lam)
+        present = (adv > 0) & (rng.random(products) < 0.9)
+        idx = np.nonzero(present)[0]
+        conn.executemany("INSERT INTO product_observations (run_id, product_id, ads_count, advertisers_count) VALUES (?, ?, ?, ?)",
+                         [(f"run{r:04d}", f"p{i}", int(adv[i] * 3), int(adv[i])) for i in idx])
+        conn.executemany("INSERT INTO advertiser_run_stats (run_id, advertiser_id, total_ads) VALUES (?, ?, ?)",
+                         [(f"run{r:04d}", f"adv{i}", int(adv[i] * 2)) for i in idx])
+    conn.commit()
+    conn.close()
+    # escalando en el último run: arrancó hace >= 2 runs y todavía no llegó al techo de 400
+    last = runs - 1
+    lam_prev = base * rate ** np.maximum(last - 1 - start, 0)
+    return {f"p{i}" for i in range(products) if 0 <= start[i] <= last - 2 and lam_prev[i] < 400}
+
+def full_history_pandas(conn, run_id: str, window: int) -> pd.DataFrame:
+    """Alternativa sin estado incremental: leer todo el historial y calcular la pendiente por grupo."""
+    df = pd.read_sql("""
+        SELECT o.product_id, o.run_id, o.advertisers_count, r.timestamp
+        FROM product_observations o JOIN runs r ON r.run_id = o.run_id
+        WHERE r.timestamp <= (SELECT timestamp FROM runs WHERE run_id = ?)
+    """, conn, params=(run_id,))
+    wide = df.pivot_table(index="product_id", columns="timestamp", values="advertisers_count", fill_value=0)
+    L = np.log1p(wide.to_numpy()[:, -window:])
+    t = np.arange(L.shape[1]) - (L.shape[1] - 1) / 2.0
+    return pd.DataFrame({"rolling_growth": (L - L.mean(axis=1, keepdims=True)) @ t / (t @ t)}, index=wide.index)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=365)
+    parser.add_argument("--products", type=int, default=3000)
+    parser.add_argument("--planted", type=float, default=0.03)
+    parser.add_argument("--window", type=int, default=TREND_WINDOW)
+    args = parser.parse_args()
+
+    report = {"runs": args.runs, "products": args.products, "window": args.window}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "bench.db"
+        truth = build_db(db, args.runs, args.products, args.planted)
+        conn = connect(db)
+        run_ids = [r[0] for r in conn.execute("SELECT run_id FROM runs ORDER BY timestamp")]
+
+        lat = []
+        for run_id in run_ids:
+            t = time.perf_counter()
+            update_product_trends(conn, run_id, args.window)
+            update_advertiser_trends(conn, run_id, args.window)
+            lat.append((time.perf_counter() - t) * 1000)
+        report["incremental_ms_per_run"] = {"first": round(lat[0], 1), "p50": round(float(np.median(lat)), 1),
+                                            "last": round(lat[-1], 1), "total_sec": round(sum(lat) / 1000, 2)}
+
+        t = time.perf_counter()
+        ref = full_history_pandas(conn, run_ids[-1], args.window)
+        report["full_history_pandas_ms_last_run"] = round((time.perf_counter() - t) * 1000, 1)
+
+        last = run_ids[-1]
+        got = dict(conn.execute("SELECT product_id, rolling_growth FROM product_trends WHERE run_id=?", (last,)).fetchall())
+        common = [p for p in got if p in ref.index]
+        report["max_abs_diff_vs_pandas"] = float(np.max(np.abs(np.array([got[p] for p in common]) - ref.loc[common, "rolling_growth"].to_numpy())))
+
+        flagged = {r[0] for r in conn.execute("SELECT product_id FROM product_trends WHERE run_id=? AND scaling=1", (last,))}
+        present = set(got)
+        truth_present = truth & present
+        tp = len(flagged & truth_present)
+        report["scaling"] = {
+            "planted_present": len(truth_present),
+            "flagged": len(flagged),
+            "precision": round(tp / max(len(flagged), 1), 3),
+            "recall": round(tp / max(len(truth_present), 1), 3),
+        }
+        top = [r["product_id"] for r in top_products(conn, last, limit=len(truth_present) or 1)]
+        report["planted_in_top_by_velocity"] = round(len(set(top) & truth_present) / max(len(truth_present), 1), 3)
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/fake_apify.py
+
+Stand-in en proceso de ApifyClient (interfaz dict de apify_client 2.x) para benchmarks offline de scraper_runner.
+
+- actor(...).start() / .call(): un run que "produce" items_per_sec items hasta total (con duplicados).
+  per_url=True: el run produce limitPerSource items por URL del run_input (shards); URLs distintas
+  comparten ads cada dup_every items (duplicados entre shards).
+- run(id).get(): status RUNNING -> SUCCEEDED cuando el dataset está completo.
+- dataset(id).list_items(offset, limit) / iterate_items(): sólo lo producido hasta ahora.
+- user("me").limits(): cuota mensual (USD) y jobs concurrentes, para el scheduler de tokens.
+- crash_after_pages: la N-ésima llamada a list_items lanza ConnectionError (una vez), para el resume.
+- fail_starts: start() lanza error (token sin cuota / inválido) para probar el failover.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+def fake_ad(i: int, dup_every: int, urls: List[str], url_index: Optional[int] = None) -> Dict[str, Any]:
+    # cada dup_every items se repite un ad anterior (mismo page + archive id)
+    n = i - 1 if dup_every and i % dup_every == dup_every - 1 else i
+    url = urls[url_index] if url_index is not None else (urls[n % len(urls)] if urls else None)
+    return {
+        "adArchiveID": str(900000 + n),
+        "pageID": str(100 + n % 97),
+        "pageName": f"Tienda {n % 97}",
+        "url": url,
+        "isActive": True,
+        "startDate": 1768000000 + n,
+        "snapshot": {
+            "title": f"Producto {n} envío gratis contraentrega",
+            "body": {"text": f"Paga al recibir. Solo hoy {n % 50}% de descuento. Escríbenos por WhatsApp."},
+            "cta_type": "MESSAGE_PAGE",
+            "images": [{"original_image_url": f"https://scontent.example/img/{n}.jpg",
+                        "resized_image_url": f"https://scontent.example/img/{n}_600.jpg"}],
+        },
+    }
+
+class FakeApifyClient:
+    def __init__(self, total: int = 5000, items_per_sec: float = 2000.0, dup_every: int = 20,
+                 urls: Optional[List[str]] = None, crash_after_pages: int = 0, per_url: bool = False,
+                 monthly_usd: float = 49.0, used_usd: float = 0.0, max_jobs: int = 25, fail_starts: bool = False):
+        self.total = total
+        self.items_per_sec = items_per_sec
+        self.dup_every = dup_every
+        self.urls = urls or []
+        self.crash_after_pages = crash_after_pages
+        self.per_url = per_url
+        self.monthly_usd = monthly_usd
+        self.used_usd = used_usd
+        self.max_jobs = max_jobs
+        self.fail_starts = fail_starts
+        self.runs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"actor_starts": 0, "list_calls": 0, "crashes": 0}
+
+    def _items(self, run: Dict[str, Any], start: int, end: int) -> List[Dict[str, Any]]:
+        if not run["urls"]:
+            return [fake_ad(i, self.dup_every, self.urls) for i in range(start, end)]
+        out = []
+        per = run["per_url"]
+        for i in range(start, end):
+            u, j = run["urls"][i // per], i % per
+            qi = self.urls.index(u) if u in self.urls else 0
+            # ads de la query anterior reaparecen en esta (duplicados entre shards)
+            n = (qi - 1) * per + j + 1 if qi and self.dup_every and j % self.dup_every == 0 else qi * per + j
+            out.append(fake_ad(n, 0, self.urls, qi))
+        return out
+
+    def _produced(self, run: Dict[str, Any]) -> int:
+        return min(run["total"], int((time.monotonic() - run["started_at"]) * self.items_per_sec))
+
+    def _status(self, run: Dict[str, Any]) -> str:
+        return "SUCCEEDED" if self._produced(run) >= run["total"] else "RUNNING"
+
+    # --- actor ---
+    def actor(self, actor_id: str) -> "FakeApifyClient":
+        return self
+
+    def start(self, run_input: Any = None, **kwargs) -> Dict[str, Any]:
+        if self.fail_starts:
+            raise RuntimeError("fake: Monthly usage hard limit exceeded")
+        with self._lock:
+            self.stats["actor_starts"] += 1
+            run_id = f"fake-run-{self.stats['actor_starts']}"
+            urls = [u["url"] for u in (run_input or {}).get("urls", [])] if self.per_url else []
+            per = (run_input or {}).get("limitPerSource", 60)
+            self.runs[run_id] = {"started_at": time.monotonic(), "urls": urls, "per_url": per,
+                                 "total": len(urls) * per if urls else self.total}
+        return {"id": run_id, "defaultDatasetId": run_id, "status": "RUNNING"}
+
+    def call(self, run_input: Any = None, **kwargs) -> Dict[str, Any]:
+        run = self.start(run_input)
+        time.sleep(self.runs[run["id"]]["total"] / self.items_per_sec)
+        run["status"] = "SUCCEEDED"
+        return run
+
+    # --- run ---
+    def run(self, run_id: str) -> SimpleNamespace:
+        return SimpleNamespace(get=lambda: {"id": run_id, "status": self._status(self.runs[run_id])})
+
+    # --- user ---
+    def user(self, user_id: str = "me") -> SimpleNamespace:
+        def limits():
+            active = sum(1 for r in self.runs.values() if self._status(r) == "RUNNING")
+            return {"limits": {"maxMonthlyUsageUsd": self.monthly_usd, "maxConcurrentActorJobs": self.max_jobs},
+                    "current": {"monthlyUsageUsd": self.used_usd, "activeActorJobCount": active}}
+        return SimpleNamespace(limits=limits)
+
+    # --- dataset ---
+    def dataset(self, dataset_id: str) -> SimpleNamespace:
+        run = self.runs[dataset_id]
+        return SimpleNamespace(
+            list_items=lambda offset=0, limit=1000, **kw: self.list_items(run, offset, limit),
+            iterate_items=lambda **kw: iter(self._items(run, 0, self._produced(run))),
+        )
+
+    def list_items(self, run: Dict[str, Any], offset: int = 0, limit: int = 1000) -> SimpleNamespace:
+        with self._lock:
+            self.stats["list_calls"] += 1
+            crash = self.crash_after_pages and self.stats["list_calls"] == self.crash_after_pages
+            if crash:
+                self.stats["crashes"] += 1
+        if crash:
+            raise ConnectionError("fake: conexión cortada")
+        produced = self._produced(run)
+        end = min(produced, offset + limit)
+        items = self._items(run, offset, end)
+        return SimpleNamespace(items=items, total=produced, offset=offset, count=len(items), limit=limit)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/fake_cdn.py
+
+Stand-in local de un CDN de imágenes (tipo fbcdn) para benchmarks offline de media_hash_agent.
+
+- GET /img/<n>.jpg -> JPEG determinístico (pool de imágenes pre-generadas).
+- ETag / Last-Modified; responde 304 a If-None-Match / If-Modified-Since.
+- Latencia artificial por request (--latency-ms) para simular RTT.
+- GET /big.jpg -> respuesta mayor a cualquier max_bytes razonable (test del tope).
+
+Uso:
+  python explorer/bench/fake_cdn.py --port 8765 --latency-ms 40
+"""
+
+import argparse
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import List
+
+from aiohttp import web
+from PIL import Image
+
+LAST_MODIFIED = "Sat, 17 Jan 2026 18:00:00 GMT"
+
+def make_images(n: int = 64, size: int = 600, seed: int = 7) -> List[bytes]:
+    """Genera n JPEGs distintos (gradiente + bloques) de size x size."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        img = Image.new("RGB", (size, size))
+        base = Image.linear_gradient("L").resize((size, size)).rotate(rng.randint(0, 359))
+        img.paste(Image.merge("RGB", (base, base.rotate(90), base.rotate(180))))
+        for _ in range(6):
+            x, y = rng.randint(0, size - 80), rng.randint(0, size - 80)
+            img.paste((rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)), (x, y, x + 80, y + 80))
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        out.append(buf.getvalue())
+    return out
+
+def build_app(latency_ms: float = 0.0, pool_size: int = 64) -> web.Application:
+    images = make_images(pool_size)
+    app = web.Application()
+    app["hits"] = 0
+
+    async def image(request: web.Request) -> web.StreamResponse:
+        app["hits"] += 1
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        try:
+            n = int(request.match_info["n"])
+        except ValueError:
+            raise web.HTTPNotFound()
+        etag = f'"img-{n}"'
+        headers = {"ETag": etag, "Last-Modified": LAST_MODIFIED, "Cache-Control": "max-age=86400"}
+        if request.headers.get("If-None-Match") == etag or request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=images[n % len(images)], content_type="image/jpeg", headers=headers)
+
+    async def big(request: web.Request) -> web.StreamResponse:
+        resp = web.StreamResponse(headers={"Content-Type": "image/jpeg"})
+        await resp.prepare(request)
+        chunk = b"\0" * 65536
+        try:
+            for _ in range(1024):  # 64 MB sin Content-Length
+                await resp.write(chunk)
+        except ConnectionError:
+            pass  # el cliente corta al pasar su max_bytes
+        return resp
+
+    app.router.add_get("/img/{n}.jpg", image)
+    app.router.add_get("/big.jpg", big)
+    return app
+
+@asynccontextmanager
+async def running_fake_cdn(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+    """Levanta el CDN en el loop actual; entrega (base_url, app)."""
+    app = build_app(latency_ms=latency_ms)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}", app
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+    web.run_app(build_app(latency_ms=args.latency_ms), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/bench/fake_openai.py
+
+Stand-in local de la API de OpenAI (chat.completions) para tests/benchmarks offline de extractor_agent.
+
+- POST /v1/chat/completions: responde JSONL (Pass 1, prompt con "Ads:") o un JSON (Pass 2, visión)
+  con el mismo esquema que pide el prompt. Determinístico a partir del texto del ad.
+- Latencia artificial (--latency-ms + --per-ad-ms) y límite server-side de RPM -> 429 con Retry-After.
+- Fallas inyectadas por texto del ad:
+    __FAIL__  -> 400 para todo el batch (ejercita el circuit breaker / split)
+    __DROP__  -> el ad se omite de la respuesta (text_batch_missing)
+- Batch API (extractor_agent --mode batch): POST /v1/files, GET /v1/files/{id}/content,
+  POST /v1/batches, GET /v1/batches/{id}, POST /v1/batches/{id}/cancel. Cada línea del input pasa por
+  el mismo chat_completion(); 200 -> output file, resto -> error file.
+    --batch-delay-sec   tiempo en "in_progress" antes de completar
+    --expire-first N    el primer batch termina "expired" tras N requests (output parcial, para resume)
+
+Uso:
+  python explorer/bench/fake_openai.py --port 8766 --latency-ms 800
+  OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=fake python explorer/extractor_agent.py --run-id X
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+FAIL_MARKER = "__FAIL__"
+DROP_MARKER = "__DROP__"
+
+def fake_extraction(ad: Dict[str, Any]) -> Dict[str, Any]:
+    text = " ".join(str(ad.get(k) or "") for k in ("title", "body", "text")).lower()
+    title = (ad.get("title") or "").strip()
+    signals = {
+        "free_shipping": "envío gratis" in text or "envio gratis" in text,
+        "nationwide_shipping": "todo colombia" in text,
+        "cod": "contraentrega" in text,
+        "whatsapp_cta": "whatsapp" in text,
+        "discount_offer": "%" in text or "2x1" in text,
+        "urgency": "solo hoy" in text,
+        "guarantee_trust": "garantía" in text,
+        "cash_price": "$" in text,
+    }
+    return {
+        "ad_archive_id": str(ad.get("ad_archive_id") or ""),
+        "product_name_guess": title.lower() or "desconocido",
+        "category": "Hogar",
+        "subcategory": "Cocina",
+        "is_bundle": "2x1" in text,
+        "signals": signals,
+        "evidence": {k: [k] for k, v in signals.items() if v},
+        "confidence": 0.7 if title else 0.4,
+        "needs_vision": not title,
+    }
+
+def _after(marker: str, text: str):
+    i = text.find(marker)
+    return json.loads(text[i + len(marker):].strip()) if i >= 0 else None
+
+def _user_text(messages: List[Dict[str, Any]]) -> (str, bool):
+    for m in messages:
+        if m.get("role") != "user":
+            continue
+        content = m.get("content")
+        if isinstance(content, list):
+            return " ".join(p.get("text", "") for p in content if p.get("type") == "text"), True
+        return content or "", False
+    return "", False
+
+def chat_completion(body: Dict[str, Any]) -> (int, Dict[str, Any]):
+    """(status, payload) para un body de /v1/chat/completions."""
+    text, is_vision = _user_text(body.get("messages") or [])
+    if is_vision:
+        ad = _after("Texto del ad:\n", text) or {}
+        ads = [ad]
+    else:
+        ads = _after("Ads:\n", text) or []
+
+    if FAIL_MARKER in text:
+        return 400, {"error": {"message": "This model's maximum context length is exceeded (fake)",
+                               "type": "invalid_request_error", "code": "context_length_exceeded"}}
+
+    objs = [fake_extraction(ad) for ad in ads if DROP_MARKER not in json.dumps(ad, ensure_ascii=False)]
+    if is_vision:
+        content = json.dumps(objs[0], ensure_ascii=False) if objs else "no puedo"
+    else:
+        content = "\n".join(json.dumps(o, ensure_ascii=False) for o in objs)
+
+    prompt_tokens = sum(len(json.dumps(m, ensure_ascii=False)) for m in body.get("messages") or []) // 4
+    completion_tokens = len(content) // 4
+    return 200, {
+        "id": f"chatcmpl-fake-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or "fake",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+def _batch_line(custom_id: str, status: int, payload: Dict[str, Any]) -> str:
+    return json.dumps({
+        "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+        "custom_id": custom_id,
+        "response": {"status_code": status, "request_id": uuid.uuid4().hex, "body": payload},
+        "error": None,
+    }, ensure_ascii=False)
+
+def add_batch_routes(app: web.Application, batch_delay_sec: float = 0.0, expire_first: int = 0):
+    """Files + Batches en memoria. Los batches se procesan en background en el loop del server."""
+    files: Dict[str, Dict[str, Any]] = {}
+    batches: Dict[str, Dict[str, Any]] = {}
+    app["batch_stats"] = {"files": 0, "batches": 0, "batch_requests": 0, "expired": 0}
+
+    def put_file(content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        fid = f"file-{uuid.uuid4().hex[:24]}"
+        files[fid] = {"id": fid, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                      "filename": filename, "purpose": purpose, "status": "processed", "_content": content}
+        app["batch_stats"]["files"] += 1
+        return files[fid]
+
+    def public(obj: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+    async def process(batch: Dict[str, Any]):
+        await asyncio.sleep(batch_delay_sec)
+        lines = files[batch["input_file_id"]]["_content"].decode("utf-8").splitlines()
+        lines = [json.loads(l) for l in lines if l.strip()]
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        batch["request_counts"]["total"] = len(lines)
+        expire_at = expire_first if (expire_first and app["batch_stats"]["expired"] == 0) else 0
+        out, err = [], []
+        for i, req in enumerate(lines):
+            if batch["_cancel"] or (expire_at and i >= expire_at):
+                break
+            status, payload = chat_completion(req.get("body") or {})
+            (out if status == 200 else err).append(_batch_line(req.get("custom_id"), status, payload))
+            batch["request_counts"]["completed" if status == 200 else "failed"] += 1
+            app["batch_stats"]["batch_requests"] += 1
+        if out:
+            batch["output_file_id"] = put_file(("\n".join(out) + "\n").encode("utf-8"), "batch_output.jsonl", "batch_output")["id"]
+        if err:
+            batch["error_file_id"] = put_file(("\n".join(err) + "\n").encode("utf-8"), "batch_error.jsonl", "batch_output")["id"]
+        now = int(time.time())
+        if batch["_cancel"]:
+            batch["status"], batch["cancelled_at"] = "cancelled", now
+        elif expire_at and len(out) + len(err) < len(lines):
+            batch["status"], batch["expired_at"] = "expired", now
+            app["batch_stats"]["expired"] += 1
+        else:
+            batch["status"], batch["completed_at"] = "completed", now
+
+    async def upload(request: web.Request) -> web.Response:
+        form = await request.post()
+        f = form["file"]
+        return web.json_response(public(put_file(f.file.read(), f.filename, form.get("purpose", "batch"))))
+
+    async def file_content(request: web.Request) -> web.Response:
+        f = files.get(request.match_info["file_id"])
+        if not f:
+            return web.json_response({"error": {"message": "No such file"}}, status=404)
+        return web.Response(body=f["_content"], content_type="application/octet-stream")
+
+    async def create_batch(request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get("input_file_id") not in files:
+            return web.json_response({"error": {"message": "No such file"}}, status=400)
+        bid = f"batch_{uuid.uuid4().hex[:24]}"
+        batches[bid] = {
+            "id": bid, "object": "batch", "endpoint": body.get("endpoint"), "errors": None,
+            "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+            "status": "validating", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "metadata": body.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}, "_cancel": False,
+        }
+        app["batch_stats"]["batches"] += 1
+        batches[bid]["_task"] = asyncio.get_running_loop().create_task(process(batches[bid]))
+        return web.json_response(public(batches[bid]))
+
+    async def get_batch(request: web.Request) -> web.Response:
+        b = batches.get(request.match_info["batch_id"])
+        if not b:
+            return web.json_response({"error": {"message": "No such batch"}}, status=404)
+        return web.json_response(public(b))
+
+    async def cancel_batch(request: web.Request) -> web.Response:
+        b = batches.get(request.match_info["batch_id"])
+        if not b:
+            return web.json_response({"error": {"message": "No such batch"}}, status=404)
+        b["_cancel"] = True
+        if b["status"] not in ("completed", "expired", "failed", "cancelled"):
+            b["status"] = "cancelling"
+        return web.json_response(public(b))
+
+    app.router.add_post("/v1/files", upload)
+    app.router.add_get("/v1/files/{file_id}/content", file_content)
+    app.router.add_post("/v1/batches", create_batch)
+    app.router.add_get("/v1/batches/{batch_id}", get_batch)
+    app.router.add_post("/v1/batches/{batch_id}/cancel", cancel_batch)
+
+def build_app(latency_ms: float = 0.0, per_ad_ms: float = 0.0, rpm: float = 0.0,
+              batch_delay_sec: float = 0.0, expire_first: int = 0) -> web.Application:
+    app = web.Application(client_max_size=256 * 1024 * 1024)
+    app["stats"] = {"requests": 0, "rate_limited": 0, "inflight": 0, "inflight_max": 0}
+    add_batch_routes(app, batch_delay_sec, expire_first)
+    window: deque = deque()
+
+    async def completions(request: web.Request) -> web.Response:
+        stats = app["stats"]
+        stats["requests"] += 1
+        now = time.monotonic()
+        while window and now - window[0] > 60:
+            window.popleft()
+        if rpm and len(window) >= rpm:
+            stats["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429, headers={"retry-after": "1"})
+        window.append(now)
+
+        body = await request.json()
+        stats["inflight"] += 1
+        stats["inflight_max"] = max(stats["inflight_max"], stats["inflight"])
+        try:
+            status, payload = chat_completion(body)
+            n_ads = payload["choices"][0]["message"]["content"].count("\n") + 1 if status == 200 else 1
+            await asyncio.sleep((latency_ms + per_ad_ms * n_ads) / 1000)
+        finally:
+            stats["inflight"] -= 1
+        return web.json_response(payload, status=status)
+
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+@asynccontextmanager
+async def running_fake_openai(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """Levanta el server en el loop actual; entrega (base_url, app). base_url ya incluye /v1."""
+    app = build_app(**kwargs)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}/v1", app
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--per-ad-ms", type=float, default=50.0)
+    parser.add_argument("--rpm", type=float, default=0.0, help="0 = sin límite server-side")
+    parser.add_argument("--batch-delay-sec", type=float, default=2.0)
+    parser.add_argument("--expire-first", type=int, default=0, help="0 = ningún batch expira")
+    args = parser.parse_args()
+    app = build_app(args.latency_ms, args.per_ad_ms, args.rpm, args.batch_delay_sec, args.expire_first)
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
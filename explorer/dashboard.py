@@ -1,7 +1,6 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
 import json
+import sys
 from pathlib import Path
 
 # Page Config
@@ -12,43 +11,11 @@ st.set_page_config(
 )
 
 # --- Constants & Setup ---
-DB_NAME = "product_memory.db"
-DB_PATH = Path(__file__).resolve().parent / "store" / DB_NAME
-
-# --- Helpers ---
-@st.cache_resource
-def get_connection():
-    return sqlite3.connect(str(DB_PATH), check_same_thread=False)
-
-def load_runs():
-    conn = get_connection()
-    df = pd.read_sql("SELECT run_id, timestamp, unique_advertisers, raw_count FROM runs ORDER BY timestamp DESC", conn)
-    return df
-
-def load_winners(run_id, limit=50):
-    conn = get_connection()
-    query = f"""
-    SELECT
-      p.product_id,
-      p.canonical_name,
-      p.category,
-      p.subcategory,
-      p.candidate_score,
-      o.ads_count,
-      o.advertisers_count,
-      o.avg_confidence,
-      p.signals_json,
-      p.rationale_json,
-      p.first_seen_at
-    FROM product_concepts p
-    JOIN product_observations o ON o.product_id = p.product_id
-    WHERE o.run_id = '{run_id}'
-      AND p.product_id <> 'unknown_cluster'
-    ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
-    LIMIT {limit};
-    """
-    df = pd.read_sql(query, conn)
-    return df
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+# Queries live in explorer/dashboard_data.py (parameterized, cached per run + ingest watermark)
+from explorer.dashboard_data import load_runs, load_winners
 
 # --- UI Layout ---
 
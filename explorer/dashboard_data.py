@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/dashboard_data.py
+
+Acceso a datos compartido por los dashboards de Streamlit (explorer/dashboard.py, dashboard_v2.py y
+control_center/pages/4_📊_Explorer_Dashboard.py).
+
+- Todas las consultas son SQL parametrizado (sin f-strings): el texto SQL es constante y SQLite
+  reutiliza el plan preparado (cache de statements de sqlite3).
+- Resultados memoizados con st.cache_data. La clave incluye los parámetros (run_id, product_id, ...)
+  y el watermark de ingesta (ingest_watermark): cada interacción con un widget cuesta una consulta
+  trivial sobre runs/rollup_runs/trend_runs/advertisers, y los DataFrames se invalidan solos cuando
+  aterriza una ingesta nueva, un product_grouper refresca los rollups o trends.py recalcula tendencias.
+
+Uso:
+  from explorer.dashboard_data import load_runs, load_winners
+  winners_df = load_winners(run_id, limit=200)
+"""
+
+import os
+import sys
+from typing import Optional, Sequence
+
+import pandas as pd
+import streamlit as st
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.product_index import similar_products
+from explorer.rollups import ensure_rollups
+from explorer.store import connect
+
+# =============================
+# CONFIG
+# =============================
+
+CACHE_MAX_ENTRIES = 256  # DataFrames por función (run x producto x límite)
+
+# Cambia con cada run registrado (memory_agent), cada refresco de rollups (product_grouper,
+# ensure_rollups), cada cálculo de tendencias (trends.py) y cada actualización de advertisers.
+# Todo sale de índices / tablas chicas.
+WATERMARK_SQL = """
+SELECT
+    (SELECT COUNT(*) || '|' || IFNULL(MAX(timestamp), '') FROM runs),
+    (SELECT IFNULL(MAX(refreshed_at), '') FROM rollup_runs),
+    (SELECT IFNULL(MAX(computed_at), '') FROM trend_runs),
+    (SELECT IFNULL(MAX(last_seen_at), '') FROM advertisers)
+"""
+
+RUNS_SQL = "SELECT run_id, timestamp, unique_advertisers, raw_count FROM runs ORDER BY timestamp DESC"
+
+WINNERS_SQL = """
+SELECT
+  p.product_id,
+  p.canonical_name,
+  p.category,
+  p.subcategory,
+  p.candidate_score,
+  o.ads_count,
+  o.advertisers_count,
+  o.avg_confidence,
+  p.signals_json,
+  p.rationale_json,
+  p.first_seen_at,
+  -- search tags precalculados por run (rollup_product_run)
+  r.search_tags,
+  -- tendencia del producto en el run (product_trends; NULL si no se calculó)
+  t.velocity,
+  t.rolling_growth,
+  t.growth_z,
+  t.scaling
+FROM product_concepts p
+JOIN product_observations o ON o.product_id = p.product_id
+LEFT JOIN rollup_product_run r ON r.run_id = o.run_id AND r.product_id = o.product_id
+LEFT JOIN product_trends t ON t.run_id = o.run_id AND t.product_id = o.product_id
+WHERE o.run_id = ?
+  AND p.product_id <> 'unknown_cluster'
+ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
+LIMIT ?
+"""
+
+DRILLDOWN_SQL = """
+SELECT
+    s.ad_id,
+    s.title,
+    s.body_text,
+    s.link_url,
+    s.cta_type,
+    a.advertiser_id,
+    a.current_page_name,
+    a.current_profile_uri,
+    img.image_url,
+    s.observed_at
+FROM ad_to_product map
+JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
+JOIN advertisers a ON a.advertiser_id = map.advertiser_id
+LEFT JOIN rollup_ad_image img ON img.ad_id = map.ad_id
+WHERE map.run_id = ?
+  AND map.product_id = ?
+ORDER BY s.observed_at DESC
+LIMIT ?
+"""
+
+CATEGORY_SQL = """
+SELECT category, COUNT(*) as count
+FROM product_concepts p
+JOIN product_observations o ON o.product_id = p.product_id
+WHERE o.run_id = ?
+GROUP BY category
+ORDER BY count DESC
+"""
+
+ADVERTISERS_SQL = """
+SELECT
+    a.advertiser_id,
+    a.current_page_name,
+    a.current_profile_uri,
+    a.status,
+    r.ads_in_run,
+    r.categories_seen,
+    r.search_tags
+FROM rollup_advertiser_run r
+JOIN advertisers a ON a.advertiser_id = r.advertiser_id
+WHERE r.run_id = ?
+ORDER BY r.ads_in_run DESC
+"""
+
+# =============================
+# Conexión + watermark
+# =============================
+
+@st.cache_resource
+def get_connection():
+    # WAL: el dashboard puede leer mientras corre la ingesta nocturna
+    return connect(check_same_thread=False)
+
+def ingest_watermark() -> str:
+    return "|".join(get_connection().execute(WATERMARK_SQL).fetchone())
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _read(sql: str, params: Sequence, watermark: str) -> pd.DataFrame:
+    # watermark sólo participa de la clave del cache
+    return pd.read_sql(sql, get_connection(), params=tuple(params))
+
+def read_df(sql: str, params: Sequence = (), run_id: Optional[str] = None) -> pd.DataFrame:
+    """
+    pd.read_sql memoizado por (sql, params, watermark).
+    Con run_id se completan antes los rollups del run (runs previos a v13 o con datos fuente nuevos,
+    ver rollups.ensure_rollups), así el refresco
+    queda reflejado en el watermark de esta misma llamada.
+    """
+    if run_id is not None:
+        ensure_rollups(get_connection(), run_id)
+    return _read(sql, tuple(params), ingest_watermark())
+
+# =============================
+# Consultas de los dashboards
+# =============================
+
+def load_runs() -> pd.DataFrame:
+    return read_df(RUNS_SQL)
+
+def load_winners(run_id: str, limit: int = 200) -> pd.DataFrame:
+    return read_df(WINNERS_SQL, (run_id, int(limit)), run_id=run_id)
+
+def get_product_drilldown(run_id: str, product_id: str, limit: int = 20) -> pd.DataFrame:
+    return read_df(DRILLDOWN_SQL, (run_id, product_id, int(limit)), run_id=run_id)
+
+def get_market_overview(run_id: str) -> pd.DataFrame:
+    return read_df(CATEGORY_SQL, (run_id,))
+
+def get_advertiser_directory(run_id: str) -> pd.DataFrame:
+    return read_df(ADVERTISERS_SQL, (run_id,), run_id=run_id)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _similar(name: str, product_id: str, k: int, watermark: str) -> pd.DataFrame:
+    return pd.DataFrame(similar_products(name, k, conn=get_connection(), exclude_product_id=product_id))
+
+def get_similar_products(name: str, product_id: str, k: int = 8) -> pd.DataFrame:
+    # kNN sobre el índice ANN (product_index.py); el watermark cubre los re-sync del grouper
+    return _similar(name, product_id, int(k), ingest_watermark())
+
+def clear_cache():
+    _read.clear()
+    _similar.clear()
@@ -1,7 +1,7 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import json
+import sys
 import altair as alt
 from pathlib import Path
 
@@ -14,120 +14,19 @@ st.set_page_config(
 )
 
 # --- Constants & Setup ---
-DB_NAME = "product_memory.db"
-DB_PATH = Path(__file__).resolve().parent / "store" / DB_NAME
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+from explorer.dashboard_data import (
+    get_advertiser_directory,
+    get_product_drilldown,
+    get_similar_products,
+    load_runs,
+    load_winners,
+)
 
 # --- Helpers ---
-@st.cache_resource
-def get_connection():
-    return sqlite3.connect(str(DB_PATH), check_same_thread=False)
-
-def load_runs():
-    conn = get_connection()
-    df = pd.read_sql("SELECT run_id, timestamp, unique_advertisers, raw_count FROM runs ORDER BY timestamp DESC", conn)
-    return df
-
-def get_market_overview(run_id):
-    conn = get_connection()
-    # Categories
-    df_cat = pd.read_sql(f"""
-        SELECT category, COUNT(*) as count 
-        FROM product_concepts p
-        JOIN product_observations o ON o.product_id = p.product_id
-        WHERE o.run_id = '{run_id}'
-        GROUP BY category
-        ORDER BY count DESC
-    """, conn)
-    
-    # Signals (Aggregated)
-    # This is a bit heavier, usually pre-calculated is better, but let's do simple aggregation
-    # We'll assume the 'signals' JSON structure is flat
-    
-    return df_cat
-
-def load_winners(run_id, limit=200):
-    conn = get_connection()
-    query = f"""
-    SELECT
-      p.product_id,
-      p.canonical_name,
-      p.category,
-      p.subcategory,
-      p.candidate_score,
-      o.ads_count,
-      o.advertisers_count,
-      o.avg_confidence,
-      p.signals_json,
-      p.rationale_json,
-      p.first_seen_at,
-      -- Aggregate search tags for filtering
-      (
-        SELECT GROUP_CONCAT(DISTINCT s._query_matched)
-        FROM ad_to_product map
-        JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
-        WHERE map.product_id = p.product_id AND map.run_id = o.run_id
-      ) as search_tags
-    FROM product_concepts p
-    JOIN product_observations o ON o.product_id = p.product_id
-    WHERE o.run_id = '{run_id}'
-      AND p.product_id <> 'unknown_cluster'
-    ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
-    LIMIT {limit};
-    """
-    df = pd.read_sql(query, conn)
-    return df
-
-def get_product_drilldown(run_id, product_id):
-    """
-    Fetches all ads related to this product to show:
-    - Thumbnails
-    - Landing Page Links
-    - Advertiser Profiles
-    """
-    conn = get_connection()
-    query = f"""
-    SELECT 
-        s.ad_id,
-        s.title,
-        s.body_text,
-        s.link_url,
-        s.cta_type,
-        a.advertiser_id,
-        a.current_page_name,
-        a.current_profile_uri,
-        (SELECT image_url FROM ad_media m WHERE m.ad_id = s.ad_id LIMIT 1) as image_url,
-        s.observed_at
-    FROM ad_to_product map
-    JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
-    JOIN advertisers a ON a.advertiser_id = map.advertiser_id
-    WHERE map.run_id = '{run_id}'
-      AND map.product_id = '{product_id}'
-    ORDER BY s.observed_at DESC
-    LIMIT 20
-    """
-    return pd.read_sql(query, conn)
-
-def get_advertiser_directory(run_id):
-    conn = get_connection()
-    # We can use advertiser_run_stats if populated, or calculate on the fly
-    # Let's calculate on the fly for freshness
-    query = f"""
-    SELECT 
-        a.advertiser_id,
-        a.current_page_name,
-        a.current_profile_uri,
-        a.status,
-        COUNT(DISTINCT s.ad_id) as ads_in_run,
-        GROUP_CONCAT(DISTINCT e.category) as categories_seen
-    FROM advertisers a
-    JOIN ads ad ON ad.advertiser_id = a.advertiser_id
-    JOIN ad_snapshots s ON s.ad_id = ad.ad_id
-    LEFT JOIN ad_extractions e ON e.run_id = s.run_id AND e.ad_id = s.ad_id
-    WHERE s.run_id = '{run_id}'
-    GROUP BY a.advertiser_id
-    ORDER BY ads_in_run DESC
-    """
-    return pd.read_sql(query, conn)
+# Queries live in explorer/dashboard_data.py (parameterized, cached per run + ingest watermark)
 
 def is_dropship_compliant(tags_str):
     """Checks if search tags contain dropshipping keywords and exclude services."""
@@ -279,6 +178,16 @@ def render_product_details(run_id, product_row):
     if sigs:
         st.write("🔥 **Signals Detected:**")
         st.write(" ".join([f"`{k}`" for k, v in sigs.items() if v]))
+
+    # Similar Products (ANN index)
+    try:
+        similar_df = get_similar_products(product_row['canonical_name'], product_row['product_id'])
+    except Exception as e:
+        similar_df = pd.DataFrame()
+        st.caption(f"Similar products unavailable: {e}")
+    if not similar_df.empty:
+        st.write("🧬 **Similar Products:**")
+        st.dataframe(similar_df[["canonical_name", "category", "score"]], hide_index=True, use_container_width=True)
     
     st.subheader(f"📡 Active Advertisers & Funnels ({product_row['advertisers_count']})")
     
@@ -384,12 +293,15 @@ with tab2:
     st.markdown("### 📋 Top Candidates Overview")
     st.dataframe(
         view_df,
-        column_order=["canonical_name", "category", "candidate_score", "advertisers_count", "ads_count", "avg_confidence"],
+        column_order=["canonical_name", "category", "candidate_score", "advertisers_count", "ads_count", "velocity", "scaling", "avg_confidence"],
         column_config={
             "canonical_name": st.column_config.TextColumn("Product Name", width="large"),
             "candidate_score": st.column_config.ProgressColumn("Score", format="%.2f", min_value=0, max_value=1),
             "advertisers_count": st.column_config.NumberColumn("Advertisers", format="%d"),
             "ads_count": st.column_config.NumberColumn("Total Ads", format="%d"),
+            # product_trends (empty until the run has trends computed)
+            "velocity": st.column_config.NumberColumn("Velocity", format="%.2f"),
+            "scaling": st.column_config.CheckboxColumn("Scaling"),
             "category": "Category",
             "avg_confidence": "Confidence"
         },
@@ -409,29 +321,7 @@ with tab2:
 with tab3:
     st.title("Competitor Directory")
     
-    # Update query to include search tags
-    def get_advertiser_directory_extended(run_id):
-        conn = get_connection()
-        query = f"""
-        SELECT 
-            a.advertiser_id,
-            a.current_page_name,
-            a.current_profile_uri,
-            a.status,
-            COUNT(DISTINCT s.ad_id) as ads_in_run,
-            GROUP_CONCAT(DISTINCT e.category) as categories_seen,
-            GROUP_CONCAT(DISTINCT s._query_matched) as search_tags
-        FROM advertisers a
-        JOIN ads ad ON ad.advertiser_id = a.advertiser_id
-        JOIN ad_snapshots s ON s.ad_id = ad.ad_id
-        LEFT JOIN ad_extractions e ON e.run_id = s.run_id AND e.ad_id = s.ad_id
-        WHERE s.run_id = '{run_id}'
-        GROUP BY a.advertiser_id
-        ORDER BY ads_in_run DESC
-        """
-        return pd.read_sql(query, conn)
-
-    adv_df = get_advertiser_directory_extended(selected_run_id)
+    adv_df = get_advertiser_directory(selected_run_id)
     
     # Filters
     c_search, c_filter_cat, c_filter_tag, c_filter_drop = st.columns(4)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/embedding_store.py
+
+Store persistente de embeddings por (modelo, texto normalizado).
+
+- Vectores en una matriz float16 por modelo (.npy abierto con np.load(mmap_mode)), en
+  store/embeddings/ junto a product_memory.db. El header .npy tiene tamaño fijo y se reescribe
+  en su lugar al crecer (capacidad x2 + truncate), así el archivo nunca se copia para agregar filas.
+- Índice de offsets en SQLite (embedding_index, migración v11): text_key -> fila, último run que la usó.
+- get_or_embed(): hits salen del mmap sin llamar a la API; sólo los misses (deduplicados) se embeben.
+- Escritura crash-safe: se reserva el rango de filas (BEGIN IMMEDIATE), se escriben los vectores
+  y recién después se indexan. Un crash deja filas huérfanas que compact() recupera.
+- evict(keep_runs): borra del índice lo no usado en los últimos N runs.
+- compact(): reescribe sólo las filas vivas en una generación nueva del archivo; el cambio de
+  archivo y de offsets se commitea en una transacción y luego se borra el archivo viejo.
+
+Uso:
+  store = EmbeddingStore(conn, "text-embedding-3-small")
+  X = store.get_or_embed(names, embed_fn, run_id)     # float32 (n, dim), alineado con names
+  python explorer/embedding_store.py --stats
+  python explorer/embedding_store.py --evict-keep-runs 10 --compact
+"""
+
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.llm_cache import normalize_text, now_iso
+
+DTYPE = np.float16
+HEADER_LEN = 128          # header .npy v1.0 de tamaño fijo (alineado a 64); shape cabe con margen
+INITIAL_CAPACITY = 4096
+COMPACT_CHUNK = 65536
+SQL_CHUNK = 900           # < SQLITE_MAX_VARIABLE_NUMBER
+
+# =============================
+# .npy header
+# =============================
+
+def npy_header(shape: Tuple[int, int]) -> bytes:
+    d = "{'descr': '%s', 'fortran_order': False, 'shape': (%d, %d), }" % (np.dtype(DTYPE).str, shape[0], shape[1])
+    body = d.ljust(HEADER_LEN - 10 - 1) + "\n"
+    if len(body) != HEADER_LEN - 10:
+        raise ValueError(f"Header .npy no cabe en {HEADER_LEN} bytes: {shape}")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(body)) + body.encode("latin1")
+
+def resize_npy(path: Path, capacity: int, dim: int):
+    """Crea o agranda la matriz: reescribe el header en su lugar y extiende el archivo (sparse)."""
+    mode = "r+b" if path.exists() else "w+b"
+    with open(path, mode) as f:
+        f.seek(0)
+        f.write(npy_header((capacity, dim)))
+        f.truncate(HEADER_LEN + capacity * dim * np.dtype(DTYPE).itemsize)
+
+def model_slug(model: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+
+def db_dir(conn) -> Path:
+    for _, name, file in conn.execute("PRAGMA database_list"):
+        if name == "main" and file:
+            return Path(file).resolve().parent
+    raise ValueError("EmbeddingStore necesita una DB en archivo (no :memory:) o root explícito")
+
+# =============================
+# Store
+# =============================
+
+class EmbeddingStore:
+    def __init__(self, conn, model: str, root: Optional[Path] = None):
+        self.conn = conn
+        self.model = model
+        self.root = Path(root) if root else db_dir(conn) / "embeddings"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._mm: Optional[np.memmap] = None
+        self._mm_key: Optional[Tuple[str, int]] = None
+
+    # ---- metadata / mmap ----
+
+    def _meta(self) -> Optional[Tuple[int, str, int, int, int]]:
+        return self.conn.execute(
+            "SELECT dim, file_name, generation, n_rows, capacity FROM embedding_matrices WHERE model=?",
+            (self.model,),
+        ).fetchone()
+
+    def _matrix(self, meta) -> np.memmap:
+        """memmap de la generación/capacidad vigente (se reabre si otro proceso creció o compactó)."""
+        key = (meta[1], meta[4])
+        if self._mm is None or self._mm_key != key:
+            self._mm = np.load(self.root / meta[1], mmap_mode="r+")
+            self._mm_key = key
+        return self._mm
+
+    def view(self) -> Optional[np.ndarray]:
+        """Vista zero-copy (float16, filas reservadas) de la matriz del modelo."""
+        meta = self._meta()
+        return self._matrix(meta)[:meta[3]] if meta else None
+
+    # ---- lectura ----
+
+    def lookup(self, keys: Sequence[str]) -> Dict[str, int]:
+        """text_key -> fila, sólo para las keys presentes en el índice."""
+        keys = list(keys)
+        found: Dict[str, int] = {}
+        for i in range(0, len(keys), SQL_CHUNK):
+            chunk = keys[i:i + SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            found.update(self.conn.execute(
+                f"SELECT text_key, row FROM embedding_index WHERE model=? AND text_key IN ({marks})",
+                [self.model, *chunk],
+            ).fetchall())
+        return found
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """Gather de filas del mmap a float32 (una sola copia, sin listas intermedias)."""
+        meta = self._meta()
+        if meta is None:
+            raise KeyError(self.model)
+        return self._matrix(meta)[rows].astype(np.float32)
+
+    # ---- escritura ----
+
+    def _reserve(self, k: int, dim: int) -> int:
+        """Reserva k filas (y agranda el archivo si hace falta). Devuelve la primera fila."""
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = self._meta()
+            if meta is None:
+                capacity = max(INITIAL_CAPACITY, k)
+                file_name = f"{model_slug(self.model)}.0.f16.npy"
+                resize_npy(self.root / file_name, capacity, dim)
+                self.conn.execute("""
+                    INSERT INTO embedding_matrices (model, dim, file_name, generation, n_rows, capacity, updated_at)
+                    VALUES (?, ?, ?, 0, ?, ?, ?)
+                """, (self.model, dim, file_name, k, capacity, now_iso()))
+                start = 0
+            else:
+                if meta[0] != dim:
+                    raise ValueError(f"Dimensión {dim} != {meta[0]} de la matriz de {self.model}")
+                start, capacity = meta[3], meta[4]
+                if start + k > capacity:
+                    while start + k > capacity:
+                        capacity *= 2
+                    resize_npy(self.root / meta[1], capacity, dim)
+                self.conn.execute(
+                    "UPDATE embedding_matrices SET n_rows=?, capacity=?, updated_at=? WHERE model=?",
+                    (start + k, capacity, now_iso(), self.model),
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return start
+
+    def put(self, keys: Sequence[str], X: np.ndarray, run_id: Optional[str]) -> np.ndarray:
+        """Agrega vectores (keys ya normalizadas y únicas). Devuelve las filas asignadas."""
+        X = np.asarray(X)
+        if not len(keys):
+            return np.empty(0, dtype=np.int64)
+        start = self._reserve(len(keys), X.shape[1])
+        mm = self._matrix(self._meta())
+        mm[start:start + len(keys)] = X.astype(DTYPE)
+        mm.flush()
+        ts = now_iso()
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO embedding_index (model, text_key, row, created_run_id, last_used_run_id, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(model, text_key) DO UPDATE SET
+                    row=excluded.row, last_used_run_id=excluded.last_used_run_id, last_used_at=excluded.last_used_at
+            """, [(self.model, key, start + i, run_id, run_id, ts) for i, key in enumerate(keys)])
+        self.writes += len(keys)
+        return np.arange(start, start + len(keys), dtype=np.int64)
+
+    def touch(self, keys: Sequence[str], run_id: Optional[str]):
+        ts = now_iso()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE embedding_index SET last_used_run_id=?, last_used_at=? WHERE model=? AND text_key=?",
+                [(run_id, ts, self.model, k) for k in keys],
+            )
+
+    def get_or_embed(
+        self,
+        texts: Sequence[str],
+        embed_fn: Callable[[List[str]], np.ndarray],
+        run_id: Optional[str] = None,
+        read_only: bool = False,
+    ) -> np.ndarray:
+        """
+        Vectores float32 (len(texts), dim) alineados con texts. Los hits no llaman a embed_fn;
+        los misses se embeben una vez por text_key (embed_fn recibe el texto original).
+        read_only=True (consultas de dashboard): no escribe embedding_index; los hits no se marcan
+        como usados y los misses no se guardan, así una lectura no altera el orden de evict().
+        """
+        keys = [normalize_text(t) for t in texts]
+        found = self.lookup(set(keys))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(set(keys)) - len(missing)
+        self.misses += len(missing)
+
+        if read_only:
+            fresh = {}
+            if missing:
+                X = np.asarray(embed_fn(list(missing.values()))).astype(DTYPE).astype(np.float32)
+                fresh = dict(zip(missing, X))
+            hits = [k for k in keys if k in found]
+            if hits:
+                fresh.update(zip(hits, self.take(np.array([found[k] for k in hits], dtype=np.int64))))
+            return np.stack([fresh[k] for k in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+        if found:
+            self.touch(list(found), run_id)
+        if missing:
+            new_rows = self.put(list(missing), embed_fn(list(missing.values())), run_id)
+            found.update(zip(missing, new_rows.tolist()))
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return self.take(np.array([found[k] for k in keys], dtype=np.int64))
+
+    # ---- mantenimiento ----
+
+    def evict(self, keep_runs: int) -> int:
+        """Borra del índice las entradas cuyo último uso no está entre los keep_runs runs más recientes."""
+        with self.conn:
+            return self.conn.execute("""
+                DELETE FROM embedding_index
+                WHERE model = ? AND COALESCE(last_used_run_id, '') NOT IN (
+                    SELECT COALESCE(last_used_run_id, '') FROM embedding_index WHERE model = ?
+                    GROUP BY last_used_run_id ORDER BY MAX(last_used_at) DESC LIMIT ?
+                )
+            """, (self.model, self.model, max(0, keep_runs))).rowcount
+
+    def compact(self) -> Dict[str, int]:
+        """Reescribe las filas vivas (orden de fila) en una generación nueva y libera las muertas."""
+        meta = self._meta()
+        if meta is None:
+            return {"rows_before": 0, "rows_after": 0}
+        dim, old_file, gen, n_rows, _ = meta
+        live = self.conn.execute(
+            "SELECT text_key, row FROM embedding_index WHERE model=? ORDER BY row", (self.model,)
+        ).fetchall()
+        capacity = max(INITIAL_CAPACITY, len(live))
+        new_file = f"{model_slug(self.model)}.{gen + 1}.f16.npy"
+        new_path = self.root / new_file
+        resize_npy(new_path, capacity, dim)
+
+        old = self._matrix(meta)
+        new = np.load(new_path, mmap_mode="r+")
+        rows = np.fromiter((r for _, r in live), dtype=np.int64, count=len(live))
+        for i in range(0, len(rows), COMPACT_CHUNK):
+            # capacity >= INITIAL_CAPACITY: el último bloque puede ser más corto que el slice destino
+            chunk = rows[i:i + COMPACT_CHUNK]
+            new[i:i + len(chunk)] = old[chunk]
+        new.flush()
+        del new
+
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE embedding_index SET row=? WHERE model=? AND text_key=?",
+                [(i, self.model, key) for i, (key, _) in enumerate(live)],
+            )
+            self.conn.execute("""
+                UPDATE embedding_matrices SET file_name=?, generation=?, n_rows=?, capacity=?, updated_at=?
+                WHERE model=?
+            """, (new_file, gen + 1, len(live), capacity, now_iso(), self.model))
+
+        self._mm = None
+        self._mm_key = None
+        # archivo viejo + huérfanos de compactaciones interrumpidas
+        for path in self.root.glob(f"{model_slug(self.model)}.*.f16.npy"):
+            if path.name != new_file:
+                path.unlink()
+        return {"rows_before": n_rows, "rows_after": len(live)}
+
+    def file_stats(self) -> Dict[str, int]:
+        meta = self._meta()
+        if meta is None:
+            return {"model": self.model, "indexed": 0}
+        path = self.root / meta[1]
+        return {
+            "model": self.model,
+            "dim": meta[0],
+            "generation": meta[2],
+            "indexed": self.conn.execute("SELECT COUNT(*) FROM embedding_index WHERE model=?", (self.model,)).fetchone()[0],
+            "rows_reserved": meta[3],
+            "capacity": meta[4],
+            "file_mb": round(path.stat().st_blocks * 512 / 1024 / 1024, 2) if path.exists() else 0,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"embed_cache_hits": self.hits, "embed_cache_misses": self.misses, "embed_cache_writes": self.writes}
+
+def main():
+    from explorer.store import connect
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--stats", action="store_true")
+    parser.add_argument("--evict-keep-runs", type=int, default=None,
+                        help="Borrar del índice lo no usado en los últimos N runs")
+    parser.add_argument("--compact", action="store_true", help="Reescribir la matriz sólo con filas vivas")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        store = EmbeddingStore(conn, args.model)
+        stats = {}
+        if args.evict_keep_runs is not None:
+            stats["evicted"] = store.evict(args.evict_keep_runs)
+        if args.compact:
+            t = time.perf_counter()
+            stats.update(store.compact())
+            stats["compact_sec"] = round(time.perf_counter() - t, 3)
+        stats.update(store.file_stats())
+    finally:
+        conn.close()
+
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
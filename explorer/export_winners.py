@@ -6,25 +6,31 @@ Explorer Agent - Export Winners
 Generates a Top Candidates file for Deep Analysis.
 """
 
-import sqlite3
 import json
 import argparse
+import os
+import sys
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-DB_NAME = "product_memory.db"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.store import connect
 
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
-
-def main():
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
     parser = argparse.ArgumentParser()
     parser.add_argument("--run-id", required=True)
     parser.add_argument("--limit", type=int, default=50)
-    args = parser.parse_args()
+    parser.add_argument("--rank-by", choices=["score", "velocity"], default="score",
+                        help="velocity: ordena por la tendencia del producto (product_trends) antes que por score")
+    args = parser.parse_args(argv)
 
-    conn = sqlite3.connect(str(get_db_path()))
+    conn = connect()
     cur = conn.cursor()
 
+    order_by = "p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC"
+    if args.rank_by == "velocity":
+        order_by = "COALESCE(t.velocity, 0) DESC, " + order_by
+
     # Query for winners
     cur.execute(f"""
     SELECT
@@ -37,12 +43,20 @@ def main():
       o.advertisers_count,
       o.avg_confidence,
       p.signals_json,
-      p.rationale_json
+      p.rationale_json,
+      t.velocity,
+      t.rolling_growth,
+      t.growth_z,
+      t.scaling,
+      t.delta,
+      t.days_since_first_seen,
+      t.is_new
     FROM product_concepts p
     JOIN product_observations o ON o.product_id = p.product_id
+    LEFT JOIN product_trends t ON t.run_id = o.run_id AND t.product_id = p.product_id
     WHERE o.run_id = ?
       AND p.product_id <> 'unknown_cluster'
-    ORDER BY p.candidate_score DESC, o.advertisers_count DESC, o.ads_count DESC
+    ORDER BY {order_by}
     LIMIT ?;
     """, (args.run_id, args.limit))
 
@@ -54,7 +68,8 @@ def main():
     count = 0
     with open(output_file, "w", encoding="utf-8") as f:
         for row in rows:
-            prod_id, name, cat, subcat, score, ads, advs, conf, sigs, rat = row
+            prod_id, name, cat, subcat, score, ads, advs, conf, sigs, rat = row[:10]
+            velocity, rolling, z, scaling, delta, days, is_new = row[10:]
             
             # Get some example ad_ids for deep analysis
             cur.execute("""
@@ -75,6 +90,16 @@ def main():
                     "ad_count": ads,
                     "median_confidence": float(conf)
                 },
+                # None si el run todavía no tiene product_trends (python explorer/trends.py --all)
+                "trend": {
+                    "velocity": velocity,
+                    "rolling_growth": rolling,
+                    "growth_z": z,
+                    "scaling": bool(scaling) if scaling is not None else None,
+                    "delta": delta,
+                    "days_since_first_seen": days,
+                    "is_new": bool(is_new) if is_new is not None else None,
+                },
                 "signals": json.loads(sigs) if sigs else {},
                 "rationale": json.loads(rat) if rat else {},
                 "sample_ad_archive_ids": sample_ads
@@ -84,6 +109,7 @@ def main():
             
     print(f"Exported {count} winners to: {output_file}")
     conn.close()
+    return {"run_id": args.run_id, "exported": count, "path": str(output_file)}
 
 if __name__ == "__main__":
     main()
@@ -11,58 +11,47 @@ Objetivo:
 
 import argparse
 import json
-import sqlite3
 import os
+import sqlite3
+import sys
 from pathlib import Path
+from typing import Any, Dict, Iterable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.store import connect
+
+UPSERT_SQL = """
+    INSERT INTO ad_extractions (run_id, ad_id, product_name_guess, category, subcategory, signals_json, evidence_json, confidence)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(run_id, ad_id) DO UPDATE SET
+      product_name_guess=excluded.product_name_guess,
+      category=excluded.category,
+      subcategory=excluded.subcategory,
+      signals_json=excluded.signals_json,
+      evidence_json=excluded.evidence_json,
+      confidence=excluded.confidence
+"""
 
-DB_NAME = "product_memory.db"
-
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--run-id", required=True)
-    parser.add_argument("--input", required=True, help="ads_enriched.jsonl (salida del Agente 2)")
-    args = parser.parse_args()
-
-    # Resolver input path
-    input_path = Path(args.input)
-    if not input_path.exists():
-        # Intentar relativo al run dir si no es absoluto
-        root_dir = Path(__file__).resolve().parent
-        potential_path = root_dir / "data" / "runs" / args.run_id / args.input
-        if potential_path.exists():
-            input_path = potential_path
-        else:
-            raise FileNotFoundError(f"Input file not found: {args.input}")
-
-    db_path = get_db_path()
-    conn = sqlite3.connect(str(db_path))
+def ingest_extractions(conn: sqlite3.Connection, run_id: str, rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Upsert en ad_extractions de los objetos del Extractor (ya parseados: líneas de ads_enriched.jsonl
+    o el sink en memoria de pipeline.py).
+    """
     cur = conn.cursor()
 
-    inserted = 0
     updated = 0
     skipped = 0
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                row = json.loads(line)
-            except:
-                skipped += 1
-                continue
-
-            ad_id = str(row.get("ad_archive_id") or row.get("adArchiveId") or row.get("ad_id") or "")
-            if not ad_id:
-                skipped += 1
-                continue
+    for row in rows:
+        ad_id = str(row.get("ad_archive_id") or row.get("adArchiveId") or row.get("ad_id") or "")
+        if not ad_id:
+            skipped += 1
+            continue
 
+        try:
             # Extraer campos, manejando posibles discrepancias de nombres
             payload = (
-                args.run_id,
+                run_id,
                 ad_id,
                 row.get("product_name_guess"),
                 row.get("category"),
@@ -71,33 +60,55 @@ def main():
                 json.dumps(row.get("evidence") or row.get("evidence_json") or {}),
                 float(row.get("confidence") or 0.0),
             )
-
-            try:
-                cur.execute("""
-                    INSERT INTO ad_extractions (run_id, ad_id, product_name_guess, category, subcategory, signals_json, evidence_json, confidence)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(run_id, ad_id) DO UPDATE SET
-                      product_name_guess=excluded.product_name_guess,
-                      category=excluded.category,
-                      subcategory=excluded.subcategory,
-                      signals_json=excluded.signals_json,
-                      evidence_json=excluded.evidence_json,
-                      confidence=excluded.confidence
-                """, payload)
-                updated += 1
-            except Exception as e:
-                # Log error opcional
-                skipped += 1
-                continue
+            cur.execute(UPSERT_SQL, payload)
+            updated += 1
+        except Exception as e:
+            # Log error opcional
+            skipped += 1
+            continue
 
     conn.commit()
-    conn.close()
 
-    print(json.dumps({
-        "run_id": args.run_id,
+    return {
+        "run_id": run_id,
         "updated": updated,
         "skipped": skipped
-    }, indent=2))
+    }
+
+def iter_rows(input_path: Path, counter: Dict[str, int]) -> Iterable[Dict[str, Any]]:
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except:
+                counter["skipped"] += 1
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", required=True)
+    parser.add_argument("--input", required=True, help="ads_enriched.jsonl (salida del Agente 2)")
+    args = parser.parse_args()
+
+    # Resolver input path
+    input_path = Path(args.input)
+    if not input_path.exists():
+        # Intentar relativo al run dir si no es absoluto
+        root_dir = Path(__file__).resolve().parent
+        potential_path = root_dir / "data" / "runs" / args.run_id / args.input
+        if potential_path.exists():
+            input_path = potential_path
+        else:
+            raise FileNotFoundError(f"Input file not found: {args.input}")
+
+    conn = connect()
+    bad_lines = {"skipped": 0}
+    stats = ingest_extractions(conn, args.run_id, iter_rows(input_path, bad_lines))
+    stats["skipped"] += bad_lines["skipped"]
+    conn.close()
+
+    print(json.dumps(stats, indent=2))
 
 if __name__ == "__main__":
     main()
@@ -12,30 +12,47 @@ Enriquece ads (dedup_ads.jsonl) con:
 - confidence (0..1): qué tan candidato es (para tu pipeline)
 
 Modo recomendado:
-1) Pass 1 (texto en batch) -> rápido/barato
+1) Pass 1 (texto en batch) -> rápido/barato; N batches concurrentes con límite RPM/TPM (llm_limiter.py)
 2) Pass 2 (visión opcional) -> solo ads con needs_vision=True o low_confidence
 """
 
 import argparse
+import asyncio
 import base64
 import json
 import os
 import re
+import sys
 import time
 from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
 import requests
 from PIL import Image
 
 # OpenAI SDK v1.x
-from openai import OpenAI
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.llm_limiter import RateLimiter, estimate_tokens
+from explorer.llm_cache import LLMCache, prompt_version
+from explorer.image_hashing import hash_batch
+from explorer.store import connect
+from explorer.jsonl_io import open_jsonl, resolve_jsonl
+
 # ----------------------------
 # Config
 # ----------------------------
@@ -152,7 +169,7 @@ def extract_preview_image_url(ad: Dict[str, Any]) -> Optional[str]:
 
     return None
 
-def download_image_as_base64(url: str, timeout: int = 20) -> Optional[str]:
+def download_image_bytes(url: str, timeout: int = 20) -> Optional[bytes]:
     headers = {
         "User-Agent": "Mozilla/5.0",
         "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
@@ -163,15 +180,35 @@ def download_image_as_base64(url: str, timeout: int = 20) -> Optional[str]:
         r = requests.get(url, headers=headers, timeout=(5, timeout))
         if r.status_code != 200 or not r.content:
             return None
+        return r.content
+    except Exception:
+        return None
+
+def to_jpeg_base64(content: bytes) -> Optional[str]:
+    try:
         # re-encode to jpeg (reduce size, normalize)
-        img = Image.open(BytesIO(r.content)).convert("RGB")
+        img = Image.open(BytesIO(content)).convert("RGB")
         buf = BytesIO()
         img.save(buf, format="JPEG", quality=85)
-        b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-        return b64
+        return base64.b64encode(buf.getvalue()).decode("utf-8")
     except Exception:
         return None
 
+def download_image_as_base64(url: str, timeout: int = 20) -> Optional[str]:
+    content = download_image_bytes(url, timeout=timeout)
+    return to_jpeg_base64(content) if content else None
+
+def image_dhash(conn, url: str, content: Optional[bytes] = None) -> Optional[str]:
+    """dHash de la imagen: image_cache (media_hash_agent) si ya existe, si no desde los bytes."""
+    if conn is not None:
+        row = conn.execute("SELECT dhash64 FROM image_cache WHERE image_url=?", (url,)).fetchone()
+        if row and row[0]:
+            return row[0]
+    if content:
+        hashes = hash_batch([content])[0]
+        return hashes[0] if hashes else None
+    return None
+
 # ----------------------------
 # LLM prompt
 # ----------------------------
@@ -245,6 +282,28 @@ Texto del ad:
 {json.dumps(ad_payload, ensure_ascii=False)}
 """.strip()
 
+# Versiones de prompt para el cache (cambian solas si cambia el template/taxonomía)
+TEXT_PROMPT_VERSION = prompt_version(SYSTEM_PROMPT, user_prompt_for_batch([]))
+VISION_PROMPT_VERSION = prompt_version(SYSTEM_PROMPT, user_prompt_for_vision({}))
+
+# Campos del payload que determinan la respuesta (sin ids ni métricas volátiles) -> key del cache
+CACHE_PAYLOAD_FIELDS = (
+    "title", "body", "link_description", "caption", "cta_text", "cta_type",
+    "link_url", "display_format", "page_name", "page_categories",
+)
+RESULT_META_FIELDS = ("ad_archive_id", "_explorer_run_id", "_ts", "_vision_image_url", "_cache_hit")
+
+def cache_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: payload.get(k) for k in CACHE_PAYLOAD_FIELDS}
+    # sin query/fragment: los parámetros de tracking cambian por ad
+    if out.get("link_url"):
+        parts = urlsplit(out["link_url"])
+        out["link_url"] = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, "", ""))
+    return out
+
+def cacheable(obj: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in obj.items() if k not in RESULT_META_FIELDS}
+
 def extract_json_objects(text: str) -> List[Dict[str, Any]]:
     """
     Intenta recuperar JSONL o JSON incluso si el modelo devuelve algo extra.
@@ -284,6 +343,11 @@ class RunPaths:
     dedup_path: Path
     out_path: Path
     err_path: Path
+    # dedup ya parseado en memoria (pipeline.py); None = leer dedup_path
+    ads: Optional[List[Dict[str, Any]]] = None
+
+    def iter_ads(self) -> Iterable[Dict[str, Any]]:
+        return self.ads if self.ads is not None else read_dedup_ads(self.dedup_path)
 
 def get_run_paths(run_id: str) -> RunPaths:
     root = Path(__file__).resolve().parent
@@ -309,76 +373,143 @@ def load_processed_ids(out_path: Path) -> Set[str]:
     return processed
 
 def read_dedup_ads(dedup_path: Path) -> Iterable[Dict[str, Any]]:
-    with open(dedup_path, "r", encoding="utf-8") as f:
+    with open_jsonl(dedup_path) as f:
         for line in f:
             if line.strip():
                 yield json.loads(line)
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--run-id", required=True)
-    parser.add_argument("--limit", type=int, default=0, help="0 = sin límite")
-    parser.add_argument("--batch-size", type=int, default=15)
-    parser.add_argument("--model-text", default=DEFAULT_MODEL_TEXT)
-    parser.add_argument("--model-vision", default=DEFAULT_MODEL_VISION)
-    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
-    parser.add_argument("--vision-pass", action="store_true", help="Ejecuta segundo pass con imagen para needs_vision o baja confianza")
-    parser.add_argument("--vision-threshold", type=float, default=0.55, help="Si confidence < threshold, entra a visión (si hay imagen)")
-    parser.add_argument("--sleep", type=float, default=0.0, help="Sleep entre llamadas (segundos) para cuidar rate limits")
-    args = parser.parse_args()
-
-    rp = get_run_paths(args.run_id)
-    rp.run_dir.mkdir(parents=True, exist_ok=True)
-    if not rp.dedup_path.exists():
-        raise FileNotFoundError(f"No existe: {rp.dedup_path}")
+# ----------------------------
+# Pass 1 (texto, async)
+# ----------------------------
 
-    client = OpenAI()
+TEXT_MAX_COMPLETION_TOKENS = 2000
+VISION_MAX_COMPLETION_TOKENS = 1200
 
-    processed_ids = load_processed_ids(rp.out_path)
+# Errores que se reintentan con el mismo batch; el resto activa el circuit breaker (split)
+TRANSIENT_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
-    # ---- Pass 1 (texto batch) ----
+def iter_pending_batches(
+    ads: Iterable[Dict[str, Any]],
+    processed_ids: Set[str],
+    batch_size: int,
+    limit: int = 0,
+    serve_cached: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Iterable[List[Dict[str, Any]]]:
+    """
+    Una sola pasada por los ads del dedup: payloads aún no procesados, en batches de batch_size.
+    serve_cached(payload) -> True si el ad ya se resolvió desde cache (no entra a ningún batch).
+    """
     buffer: List[Dict[str, Any]] = []
-    total_in = 0
-    written = 0
-
-    out_f = open(rp.out_path, "a", encoding="utf-8")
-    err_f = open(rp.err_path, "a", encoding="utf-8")
-
-    for ad in read_dedup_ads(rp.dedup_path):
-        total_in += 1
-        if args.limit and total_in > args.limit:
+    queued: Set[str] = set()
+    for total_in, ad in enumerate(ads, start=1):
+        if limit and total_in > limit:
             break
-
         payload = extract_text_blob(ad)
         adid = payload["ad_archive_id"]
-        if not adid or adid in processed_ids:
+        if not adid or adid in processed_ids or adid in queued:
+            continue
+        queued.add(adid)
+        if serve_cached and serve_cached(payload):
             continue
-
         buffer.append(payload)
+        if len(buffer) >= batch_size:
+            yield buffer
+            buffer = []
+    if buffer:
+        yield buffer
+
+def retry_after_seconds(e: Exception, attempt: int) -> float:
+    try:
+        return float(e.response.headers.get("retry-after"))
+    except Exception:
+        return min(30.0, 0.5 * (2 ** attempt))
+
+async def run_text_pass(
+    args,
+    rp: RunPaths,
+    processed_ids: Set[str],
+    cache: Optional[LLMCache] = None,
+    sink: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Pass 1: hasta args.concurrency batches en vuelo, acotados por RateLimiter (RPM + TPM).
+    Append-only a ads_enriched.jsonl; un re-run salta lo ya escrito (load_processed_ids).
+    Con cache: los ads con texto ya visto (cualquier run) se escriben sin llamar al modelo.
+    sink: además del archivo, cada resultado escrito se agrega a esta lista (pipeline.py).
+    """
+    limiter = RateLimiter(args.rpm, args.tpm)
+    slots = asyncio.Semaphore(max(1, args.concurrency))
+    stats = {"written": 0, "requests": 0, "retries": 0, "splits": 0, "tokens_est": 0, "tokens_used": 0}
+    started = time.perf_counter()
+
+    out_f = open(rp.out_path, "a", encoding="utf-8")
+    err_f = open(rp.err_path, "a", encoding="utf-8")
+
+    def cache_key(item: Dict[str, Any]) -> str:
+        return LLMCache.make_key("text", args.model_text, TEXT_PROMPT_VERSION, cache_payload(item))
+
+    def write_result(aid: str, o: Dict[str, Any]):
+        o["ad_archive_id"] = aid
+        o["_explorer_run_id"] = args.run_id
+        o["_ts"] = now_iso()
+        # una sola línea por write: el loop es single-thread, no se intercalan
+        out_f.write(json.dumps(o, ensure_ascii=False) + "\n")
+        if sink is not None:
+            sink.append(o)
+        processed_ids.add(aid)
+        stats["written"] += 1
+
+    def serve_cached(item: Dict[str, Any]) -> bool:
+        cached = cache.get(cache_key(item))
+        if cached is None:
+            return False
+        cached["_cache_hit"] = True
+        write_result(item["ad_archive_id"], cached)
+        return True
+
+    async def complete(client: AsyncOpenAI, batch: List[Dict[str, Any]]) -> str:
+        messages = text_messages(batch)
+        est = estimate_tokens(messages, args.model_text, TEXT_MAX_COMPLETION_TOKENS)
+        for attempt in range(args.retries + 1):
+            await limiter.acquire(est)
+            stats["requests"] += 1
+            stats["tokens_est"] += est
+            try:
+                resp = await client.chat.completions.create(
+                    model=args.model_text,
+                    messages=messages,
+                    temperature=args.temperature,
+                    max_completion_tokens=TEXT_MAX_COMPLETION_TOKENS,
+                )
+            except TRANSIENT_ERRORS as e:
+                if attempt >= args.retries:
+                    raise
+                stats["retries"] += 1
+                wait = retry_after_seconds(e, attempt)
+                if isinstance(e, RateLimitError):
+                    limiter.pause(wait)  # 429: frena a todos los workers, no solo a este
+                else:
+                    await asyncio.sleep(wait)
+                continue
+            used = resp.usage.total_tokens if resp.usage else None
+            limiter.settle(est, used)
+            stats["tokens_used"] += used or 0
+            return resp.choices[0].message.content or ""
+        return ""
 
     # ---- Helper for Circuit Breaker ----
-    def process_batch_recursive(batch: List[Dict[str, Any]], depth=0):
+    async def process_batch_recursive(client: AsyncOpenAI, batch: List[Dict[str, Any]], depth=0):
         # Base case
         if not batch:
             return
 
         try:
-            prompt = user_prompt_for_batch(batch)
-            resp = client.chat.completions.create(
-                model=args.model_text,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=args.temperature,
-                max_completion_tokens=2000,
-            )
-            content = resp.choices[0].message.content or ""
+            content = await complete(client, batch)
             objs = extract_json_objects(content)
-            
+
             # Write success
             out_map = {str(o.get("ad_archive_id") or ""): o for o in objs if isinstance(o, dict)}
-            
+
             for item in batch:
                 aid = item["ad_archive_id"]
                 o = out_map.get(aid)
@@ -394,20 +525,17 @@ def main():
                     # If larger batch, it might be just this item missing, but let's assume successful processing of the rest is fine
                     continue
 
-                o["ad_archive_id"] = aid
-                o["_explorer_run_id"] = args.run_id
-                o["_ts"] = now_iso()
-                out_f.write(json.dumps(o, ensure_ascii=False) + "\n")
-                out_f.flush()
-                processed_ids.add(aid)
-                
-            nonlocal written
-            written += len(out_map)
+                if cache:
+                    cache.put(cache_key(item), "text", args.model_text, cacheable(o))
+                write_result(aid, o)
+            out_f.flush()
+            if cache:
+                cache.flush()
 
         except Exception as e:
             # Circuit Breaker Logic
             err_msg = str(e)
-            
+
             # If batch is 1, we can't split anymore -> Log Error
             if len(batch) == 1:
                 err_f.write(json.dumps({
@@ -417,120 +545,172 @@ def main():
                     "error": err_msg,
                     "depth": depth
                 }, ensure_ascii=False) + "\n")
+                err_f.flush()
                 return
 
             # If it's a potentially recoverable error by splitting (Contex Length, or one bad apple)
-            # Strategy: Split in half and recurse
+            # Strategy: Split in half and recurse (dentro del mismo slot de concurrencia)
             mid = len(batch) // 2
             left = batch[:mid]
             right = batch[mid:]
-            
-            print(f"⚠️ Batch Error (len={len(batch)}). Splitting -> {len(left)} + {len(right)}. Error: {err_msg[:100]}...")
-            process_batch_recursive(left, depth + 1)
-            process_batch_recursive(right, depth + 1)
-
-    # ---- Main Loop ----
-    for ad in read_dedup_ads(rp.dedup_path):
-        total_in += 1
-        if args.limit and total_in > args.limit:
-            break
+            stats["splits"] += 1
 
-        payload = extract_text_blob(ad)
-        adid = payload["ad_archive_id"]
-        if not adid or adid in processed_ids:
-            continue
+            print(f"⚠️ Batch Error (len={len(batch)}). Splitting -> {len(left)} + {len(right)}. Error: {err_msg[:100]}...")
+            await process_batch_recursive(client, left, depth + 1)
+            await process_batch_recursive(client, right, depth + 1)
 
-        buffer.append(payload)
+    # max_retries=0: los reintentos pasan por el limiter (ver complete)
+    async with AsyncOpenAI(max_retries=0, timeout=args.timeout) as client:
+        tasks: Set[asyncio.Task] = set()
 
-        if len(buffer) >= args.batch_size:
-            process_batch_recursive(buffer)
-            buffer = []
-            if args.sleep:
-                time.sleep(args.sleep)
-
-    # flush remainder
-    if buffer:
-        process_batch_recursive(buffer)
+        async def run_slot(batch: List[Dict[str, Any]]):
+            try:
+                await process_batch_recursive(client, batch)
+            finally:
+                slots.release()
 
-    print(json.dumps({
-        "run_id": args.run_id,
-        "stage": "pass1_text_done",
-        "written": written,
-        "processed_total": len(processed_ids),
-        "limit": args.limit,
-    }, ensure_ascii=False, indent=2))
+        try:
+            batches = iter_pending_batches(rp.iter_ads(), processed_ids, args.batch_size, args.limit,
+                                           serve_cached=serve_cached if cache else None)
+            for batch in batches:
+                await slots.acquire()
+                task = asyncio.create_task(run_slot(batch))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            out_f.close()
+            err_f.close()
+            if cache:
+                cache.flush()
+
+    if cache:
+        stats.update(cache.stats())
+    elapsed = time.perf_counter() - started
+    stats["limiter_wait_sec"] = round(limiter.waited_sec, 2)
+    stats["elapsed_sec"] = round(elapsed, 2)
+    stats["ads_per_min"] = round(stats["written"] / elapsed * 60, 1) if elapsed > 0 else None
+    return stats
 
-    out_f.close()
-    err_f.close()
+# ----------------------------
+# Pass 2 (visión)
+# ----------------------------
 
-    # ---- Pass 2 (visión opcional) ----
-    if not args.vision_pass:
-        return
+def text_messages(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt_for_batch(batch)},
+    ]
+
+def vision_messages(payload: Dict[str, Any], b64: str) -> List[Dict[str, Any]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_prompt_for_vision(payload)},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}},
+            ],
+        },
+    ]
+
+def vision_paths(rp: RunPaths) -> Tuple[Path, Path]:
+    # Escribimos un archivo nuevo “vision_overrides.jsonl” con los resultados; luego lo mergeas si quieres
+    return rp.run_dir / "ads_enriched.vision_overrides.jsonl", rp.run_dir / "ads_enriched.vision.errors.jsonl"
 
+def load_vision_candidates(rp: RunPaths, threshold: float) -> List[Tuple[str, Dict[str, Any]]]:
+    """(ad_archive_id, ad) de los enriquecidos con needs_vision o confidence < threshold."""
     # Cargar enriquecidos y seleccionar los que necesitan visión
-    needs: List[Dict[str, Any]] = []
+    needs: List[str] = []
     with open(rp.out_path, "r", encoding="utf-8") as f:
         for line in f:
             try:
                 o = json.loads(line)
                 if not isinstance(o, dict):
                     continue
-                if bool(o.get("needs_vision")) or float(o.get("confidence") or 0.0) < args.vision_threshold:
-                    needs.append(o)
+                if bool(o.get("needs_vision")) or float(o.get("confidence") or 0.0) < threshold:
+                    needs.append(str(o.get("ad_archive_id") or ""))
             except Exception:
                 continue
 
     # Para poder usar imagen necesitamos volver a leer el dedup y mapear payloads (solo para esos IDs)
-    need_ids = {str(o.get("ad_archive_id") or "") for o in needs}
+    need_ids = set(needs)
     if not need_ids:
-        print(json.dumps({"run_id": args.run_id, "stage": "pass2_vision_done", "updated": 0}, ensure_ascii=False))
-        return
-
+        return []
     id_to_ad: Dict[str, Dict[str, Any]] = {}
-    for ad in read_dedup_ads(rp.dedup_path):
+    for ad in rp.iter_ads():
         aid = str(ad.get("ad_archive_id") or "")
         if aid in need_ids:
             id_to_ad[aid] = ad
+    return [(aid, id_to_ad[aid]) for aid in needs if aid in id_to_ad]
+
+def prepare_vision_item(args, conn, cache: Optional[LLMCache], aid: str, ad: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Imagen + key de cache para un ad. None si no hay imagen usable.
+    {"payload", "img_url", "vkey", "cached": obj | None, "b64": str | None}
+    """
+    payload = extract_text_blob(ad)
+    img_url = extract_preview_image_url(ad)
+    if not img_url:
+        return None
 
+    # key de visión = texto normalizado + dHash de la imagen (misma imagen en otra URL -> hit)
+    content = None
+    dh = image_dhash(conn, img_url)
+    if dh is None:
+        content = download_image_bytes(img_url, timeout=25)
+        if not content:
+            return None
+        dh = image_dhash(None, img_url, content)
+    item = {"payload": payload, "img_url": img_url, "vkey": None, "cached": None, "b64": None}
+    if cache and dh:
+        item["vkey"] = LLMCache.make_key("vision", args.model_vision, VISION_PROMPT_VERSION, cache_payload(payload), extra=dh)
+        item["cached"] = cache.get(item["vkey"])
+        if item["cached"] is not None:
+            return item
+
+    if content is None:
+        content = download_image_bytes(img_url, timeout=25)
+        if not content:
+            return None
+    item["b64"] = to_jpeg_base64(content)
+    return item if item["b64"] else None
+
+def vision_result(args, aid: str, img_url: str, v: Dict[str, Any], cache_hit: bool = False) -> Dict[str, Any]:
+    v["ad_archive_id"] = aid
+    v["_explorer_run_id"] = args.run_id
+    v["_ts"] = now_iso()
+    v["_vision_image_url"] = img_url
+    if cache_hit:
+        v["_cache_hit"] = True
+    return v
+
+def run_vision_pass(args, rp: RunPaths, conn, cache: Optional[LLMCache]) -> Dict[str, Any]:
+    candidates = load_vision_candidates(rp, args.vision_threshold)
+    vision_out_path, err_path2 = vision_paths(rp)
+    if not candidates:
+        return {"run_id": args.run_id, "stage": "pass2_vision_done", "updated": 0}
+
+    client = OpenAI()
     updated = 0
-    err_path2 = rp.run_dir / "ads_enriched.vision.errors.jsonl"
     err_f2 = open(err_path2, "a", encoding="utf-8")
-
-    # Escribimos un archivo nuevo “vision_overrides.jsonl” con los resultados; luego lo mergeas si quieres
-    vision_out_path = rp.run_dir / "ads_enriched.vision_overrides.jsonl"
     vout = open(vision_out_path, "a", encoding="utf-8")
 
-    for o in needs:
-        aid = str(o.get("ad_archive_id") or "")
-        ad = id_to_ad.get(aid)
-        if not ad:
+    for aid, ad in candidates:
+        item = prepare_vision_item(args, conn, cache, aid, ad)
+        if item is None:
             continue
-
-        payload = extract_text_blob(ad)
-        img_url = extract_preview_image_url(ad)
-        if not img_url:
-            continue
-
-        b64 = download_image_as_base64(img_url, timeout=25)
-        if not b64:
+        if item["cached"] is not None:
+            vout.write(json.dumps(vision_result(args, aid, item["img_url"], item["cached"], cache_hit=True), ensure_ascii=False) + "\n")
+            updated += 1
             continue
 
         try:
-            prompt = user_prompt_for_vision(payload)
             resp = client.chat.completions.create(
                 model=args.model_vision,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}},
-                        ],
-                    },
-                ],
+                messages=vision_messages(item["payload"], item["b64"]),
                 temperature=args.temperature,
-                max_completion_tokens=1200,
+                max_completion_tokens=VISION_MAX_COMPLETION_TOKENS,
             )
             content = resp.choices[0].message.content or ""
             objs = extract_json_objects(content)
@@ -538,12 +718,10 @@ def main():
                 raise ValueError("No JSON returned")
 
             v = objs[0]
-            v["ad_archive_id"] = aid
-            v["_explorer_run_id"] = args.run_id
-            v["_ts"] = now_iso()
-            v["_vision_image_url"] = img_url
-
-            vout.write(json.dumps(v, ensure_ascii=False) + "\n")
+            if item["vkey"]:
+                cache.put(item["vkey"], "vision", args.model_vision, cacheable(v))
+                cache.flush()
+            vout.write(json.dumps(vision_result(args, aid, item["img_url"], v), ensure_ascii=False) + "\n")
             vout.flush()
             updated += 1
 
@@ -561,13 +739,453 @@ def main():
     vout.close()
     err_f2.close()
 
-    print(json.dumps({
+    return {
         "run_id": args.run_id,
         "stage": "pass2_vision_done",
         "updated": updated,
         "vision_overrides_path": str(vision_out_path),
-    }, ensure_ascii=False, indent=2))
+    }
+
+# ----------------------------
+# Batch API (--mode batch)
+# ----------------------------
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL = {"completed", "failed", "expired", "cancelled"}
+BATCH_MAX_REQUESTS = 50_000            # límite de la Batch API por archivo
+BATCH_MAX_BYTES = 190 * 1024 * 1024     # límite 200 MB por archivo (con margen)
+
+def batch_request_line(custom_id: str, model: str, messages: List[Dict[str, Any]], temperature: float, max_completion_tokens: int) -> Dict[str, Any]:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_completion_tokens": max_completion_tokens,
+        },
+    }
+
+class BatchRunner:
+    """
+    Submit / poll / lectura de resultados de la Batch API para un stage ('text' | 'vision').
+
+    Estado en run_dir/batch_state.<stage>.json: jobs enviados y aún no ingeridos, con su manifest
+    (custom_id -> ads). Si el proceso muere mientras espera, el próximo run retoma el polling del
+    mismo batch en vez de re-enviar (y pagar) las requests.
+    """
+
+    def __init__(self, client: OpenAI, rp: RunPaths, stage: str, poll_sec: float = 30.0, completion_window: str = "24h"):
+        self.client = client
+        self.stage = stage
+        self.poll_sec = poll_sec
+        self.completion_window = completion_window
+        self.run_id = rp.run_dir.name
+        self.batch_dir = rp.run_dir / "batch"
+        self.state_path = rp.run_dir / f"batch_state.{stage}.json"
+        self.state: Dict[str, Any] = {"jobs": []}
+        if self.state_path.exists():
+            self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+
+    def _save(self):
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        return list(self.state["jobs"])
+
+    def submit(self, requests_: List[Dict[str, Any]], manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Parte en archivos dentro de los límites de la API, sube y crea un batch por archivo."""
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        chunks: List[List[str]] = [[]]
+        size = 0
+        lines: Dict[str, str] = {}
+        for req in requests_:
+            line = json.dumps(req, ensure_ascii=False) + "\n"
+            n = len(line.encode("utf-8"))
+            if chunks[-1] and (len(chunks[-1]) >= BATCH_MAX_REQUESTS or size + n > BATCH_MAX_BYTES):
+                chunks.append([])
+                size = 0
+            chunks[-1].append(req["custom_id"])
+            lines[req["custom_id"]] = line
+            size += n
+
+        jobs = []
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+        for k, cids in enumerate(chunks):
+            if not cids:
+                continue
+            input_path = self.batch_dir / f"{self.stage}_{stamp}_{k}.jsonl"
+            with open(input_path, "w", encoding="utf-8") as f:
+                for cid in cids:
+                    f.write(lines[cid])
+            with open(input_path, "rb") as f:
+                up = self.client.files.create(file=f, purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=up.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window,
+                metadata={"run_id": self.run_id, "stage": self.stage},
+            )
+            job = {
+                "batch_id": batch.id,
+                "input_file_id": up.id,
+                "input_path": str(input_path),
+                "submitted_at": now_iso(),
+                "manifest": {cid: manifest[cid] for cid in cids},
+            }
+            self.state["jobs"].append(job)
+            self._save()
+            jobs.append(job)
+            print(f"📤 Batch {self.stage} enviado: {batch.id} ({len(cids)} requests)")
+        return jobs
+
+    def wait(self, job: Dict[str, Any]):
+        last = None
+        while True:
+            batch = self.client.batches.retrieve(job["batch_id"])
+            counts = batch.request_counts
+            progress = (batch.status, counts.completed if counts else None, counts.failed if counts else None)
+            if progress != last:
+                print(f"⏳ Batch {job['batch_id']}: {batch.status} "
+                      f"({progress[1]}/{counts.total if counts else '?'} ok, {progress[2]} failed)")
+                last = progress
+            if batch.status in BATCH_TERMINAL:
+                return batch
+            time.sleep(self.poll_sec)
+
+    def iter_results(self, batch) -> Iterable[Tuple[str, Optional[int], Optional[Dict[str, Any]], Optional[str]]]:
+        """(custom_id, status_code, body, error) desde el output y el error file, en streaming."""
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with self.client.files.with_streaming_response.content(file_id) as resp:
+                for line in resp.iter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    response = rec.get("response") or {}
+                    body = response.get("body") or None
+                    status = response.get("status_code")
+                    error = None
+                    if rec.get("error"):
+                        error = (rec["error"] or {}).get("message") or json.dumps(rec["error"])
+                    elif status != 200:
+                        error = ((body or {}).get("error") or {}).get("message") or f"HTTP {status}"
+                    yield rec.get("custom_id"), status, body, error
+
+    def finish(self, job: Dict[str, Any]):
+        self.state["jobs"] = [j for j in self.state["jobs"] if j["batch_id"] != job["batch_id"]]
+        self._save()
+
+def load_text_payloads(ads: Iterable[Dict[str, Any]], limit: int = 0) -> Dict[str, Dict[str, Any]]:
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for total_in, ad in enumerate(ads, start=1):
+        if limit and total_in > limit:
+            break
+        payload = extract_text_blob(ad)
+        if payload["ad_archive_id"]:
+            payloads.setdefault(payload["ad_archive_id"], payload)
+    return payloads
+
+def run_text_pass_batch(
+    args,
+    rp: RunPaths,
+    processed_ids: Set[str],
+    cache: Optional[LLMCache] = None,
+    sink: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Pass 1 vía Batch API. Mismo esquema, archivos y sink que el modo online.
+    Circuit breaker por rondas: una request fallida de n>1 ads se re-envía partida en dos en la
+    ronda siguiente; las no respondidas (batch expirado/cancelado) se re-envían tal cual.
+    """
+    runner = BatchRunner(OpenAI(), rp, "text", args.batch_poll_sec, args.batch_completion_window)
+    payloads = load_text_payloads(rp.iter_ads(), args.limit)
+    stats = {"written": 0, "batch_jobs": 0, "batch_requests": 0, "splits": 0, "requeued": 0, "left_pending": 0}
+    started = time.perf_counter()
+
+    out_f = open(rp.out_path, "a", encoding="utf-8")
+    err_f = open(rp.err_path, "a", encoding="utf-8")
+
+    def cache_key(aid: str) -> str:
+        return LLMCache.make_key("text", args.model_text, TEXT_PROMPT_VERSION, cache_payload(payloads[aid]))
+
+    def write_result(aid: str, o: Dict[str, Any]):
+        if aid in processed_ids:
+            return  # re-ingesta de un job retomado
+        o["ad_archive_id"] = aid
+        o["_explorer_run_id"] = args.run_id
+        o["_ts"] = now_iso()
+        out_f.write(json.dumps(o, ensure_ascii=False) + "\n")
+        if sink is not None:
+            sink.append(o)
+        processed_ids.add(aid)
+        stats["written"] += 1
+
+    def serve_cached(item: Dict[str, Any]) -> bool:
+        cached = cache.get(cache_key(item["ad_archive_id"]))
+        if cached is None:
+            return False
+        cached["_cache_hit"] = True
+        write_result(item["ad_archive_id"], cached)
+        return True
+
+    def write_error(stage: str, aid: str, error: str):
+        err_f.write(json.dumps({
+            "run_id": args.run_id,
+            "stage": stage,
+            "ad_archive_id": aid,
+            "error": error,
+        }, ensure_ascii=False) + "\n")
+
+    def ingest(job: Dict[str, Any]) -> List[List[str]]:
+        batch = runner.wait(job)
+        retry: List[List[str]] = []
+        answered: Set[str] = set()
+        for cid, status, body, error in runner.iter_results(batch):
+            aids = job["manifest"].get(cid)
+            if not aids:
+                continue
+            answered.add(cid)
+            if error is None and body:
+                content = body["choices"][0]["message"]["content"] or ""
+                out_map = {str(o.get("ad_archive_id") or ""): o for o in extract_json_objects(content) if isinstance(o, dict)}
+                for aid in aids:
+                    o = out_map.get(aid)
+                    if not o:
+                        if len(aids) == 1:
+                            write_error("text_batch_missing", aid, "Model did not return JSON for this ad")
+                        continue
+                    if cache and aid in payloads:
+                        cache.put(cache_key(aid), "text", args.model_text, cacheable(o))
+                    write_result(aid, o)
+            elif len(aids) == 1:
+                write_error("text_batch_exception", aids[0], error or "unknown batch error")
+            else:
+                mid = len(aids) // 2
+                retry += [aids[:mid], aids[mid:]]
+                stats["splits"] += 1
+        unanswered = [aids for cid, aids in job["manifest"].items() if cid not in answered]
+        stats["requeued"] += len(unanswered)
+        retry += unanswered
+        out_f.flush()
+        err_f.flush()
+        if cache:
+            cache.flush()
+        runner.finish(job)
+        return [[a for a in g if a not in processed_ids and a in payloads] for g in retry]
+
+    try:
+        # 1) retomar jobs enviados por un run anterior que no alcanzó a ingerirlos
+        for job in runner.jobs():
+            ingest(job)
+
+        # 2) rondas: pendientes (tras cache) -> batch -> splits / re-encolados -> siguiente ronda
+        groups = [[p["ad_archive_id"] for p in b] for b in iter_pending_batches(
+            rp.iter_ads(), processed_ids, args.batch_size, args.limit,
+            serve_cached=serve_cached if cache else None)]
+        for rnd in range(args.batch_max_rounds):
+            groups = [g for g in groups if g]
+            if not groups:
+                break
+            requests_, manifest = [], {}
+            for i, aids in enumerate(groups):
+                cid = f"text-r{rnd}-{i}-{aids[0]}"
+                manifest[cid] = aids
+                requests_.append(batch_request_line(
+                    cid, args.model_text, text_messages([payloads[a] for a in aids]),
+                    args.temperature, TEXT_MAX_COMPLETION_TOKENS))
+            jobs = runner.submit(requests_, manifest)
+            stats["batch_jobs"] += len(jobs)
+            stats["batch_requests"] += len(requests_)
+            groups = [g for job in jobs for g in ingest(job)]
+        stats["left_pending"] = sum(len(g) for g in groups if g)
+    finally:
+        out_f.close()
+        err_f.close()
+        if cache:
+            cache.flush()
+
+    if cache:
+        stats.update(cache.stats())
+    stats["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    return stats
+
+def run_vision_pass_batch(args, rp: RunPaths, conn, cache: Optional[LLMCache]) -> Dict[str, Any]:
+    """Pass 2 vía Batch API. Retoma: salta ads ya presentes en vision_overrides.jsonl."""
+    runner = BatchRunner(OpenAI(), rp, "vision", args.batch_poll_sec, args.batch_completion_window)
+    vision_out_path, err_path2 = vision_paths(rp)
+    done_ids = load_processed_ids(vision_out_path)
+    skipped: Set[str] = set()  # sin imagen o con error definitivo en este run
+    summary = {"run_id": args.run_id, "stage": "pass2_vision_done", "updated": 0,
+               "vision_overrides_path": str(vision_out_path), "batch_jobs": 0, "batch_requests": 0}
+
+    err_f2 = open(err_path2, "a", encoding="utf-8")
+    vout = open(vision_out_path, "a", encoding="utf-8")
+
+    def write_override(aid: str, v: Dict[str, Any]):
+        if aid in done_ids:
+            return
+        vout.write(json.dumps(v, ensure_ascii=False) + "\n")
+        done_ids.add(aid)
+        summary["updated"] += 1
+
+    def write_error(aid: str, error: str):
+        err_f2.write(json.dumps({
+            "run_id": args.run_id,
+            "stage": "vision_exception",
+            "ad_archive_id": aid,
+            "error": error,
+        }, ensure_ascii=False) + "\n")
+        skipped.add(aid)
+
+    def ingest(job: Dict[str, Any]):
+        batch = runner.wait(job)
+        for cid, status, body, error in runner.iter_results(batch):
+            meta = job["manifest"].get(cid)
+            if not meta:
+                continue
+            aid = meta["aid"]
+            if error is not None or not body:
+                write_error(aid, error or "empty batch response")
+                continue
+            objs = extract_json_objects(body["choices"][0]["message"]["content"] or "")
+            if not objs:
+                write_error(aid, "No JSON returned")
+                continue
+            v = objs[0]
+            if cache and meta.get("vkey"):
+                cache.put(meta["vkey"], "vision", args.model_vision, cacheable(v))
+            write_override(aid, vision_result(args, aid, meta["img_url"], v))
+        vout.flush()
+        err_f2.flush()
+        if cache:
+            cache.flush()
+        runner.finish(job)
+
+    try:
+        for job in runner.jobs():
+            ingest(job)
+
+        # cada ronda recalcula pendientes: lo no respondido (expirado/cancelado) vuelve a entrar
+        for rnd in range(args.batch_max_rounds):
+            requests_, manifest = [], {}
+            for aid, ad in load_vision_candidates(rp, args.vision_threshold):
+                if aid in done_ids or aid in skipped:
+                    continue
+                item = prepare_vision_item(args, conn, cache, aid, ad)
+                if item is None:
+                    skipped.add(aid)
+                    continue
+                if item["cached"] is not None:
+                    write_override(aid, vision_result(args, aid, item["img_url"], item["cached"], cache_hit=True))
+                    continue
+                cid = f"vision-r{rnd}-{aid}"
+                manifest[cid] = {"aid": aid, "img_url": item["img_url"], "vkey": item["vkey"]}
+                requests_.append(batch_request_line(
+                    cid, args.model_vision, vision_messages(item["payload"], item["b64"]),
+                    args.temperature, VISION_MAX_COMPLETION_TOKENS))
+            if not requests_:
+                break
+            jobs = runner.submit(requests_, manifest)
+            summary["batch_jobs"] += len(jobs)
+            summary["batch_requests"] += len(requests_)
+            for job in jobs:
+                ingest(job)
+    finally:
+        vout.close()
+        err_f2.close()
+
+    return summary
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", required=True)
+    parser.add_argument("--limit", type=int, default=0, help="0 = sin límite")
+    parser.add_argument("--batch-size", type=int, default=15)
+    parser.add_argument("--model-text", default=DEFAULT_MODEL_TEXT)
+    parser.add_argument("--model-vision", default=DEFAULT_MODEL_VISION)
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--vision-pass", action="store_true", help="Ejecuta segundo pass con imagen para needs_vision o baja confianza")
+    parser.add_argument("--vision-threshold", type=float, default=0.55, help="Si confidence < threshold, entra a visión (si hay imagen)")
+    parser.add_argument("--mode", choices=["online", "batch"], default="online", help="batch = OpenAI Batch API (50%% costo, sin rate limits, latencia hasta 24h)")
+    parser.add_argument("--batch-poll-sec", type=float, default=30.0, help="Intervalo de polling de la Batch API")
+    parser.add_argument("--batch-max-rounds", type=int, default=5, help="Rondas de re-envío (splits / expirados) en modo batch")
+    parser.add_argument("--batch-completion-window", default="24h")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("OPENAI_CONCURRENCY", "8")), help="Batches en vuelo en Pass 1")
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("OPENAI_RPM", "500")), help="Límite requests/min (Pass 1)")
+    parser.add_argument("--tpm", type=float, default=float(os.getenv("OPENAI_TPM", "200000")), help="Límite tokens/min (Pass 1, estimado con tiktoken)")
+    parser.add_argument("--retries", type=int, default=4, help="Reintentos por batch ante 429/timeout/5xx antes del split")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout por request (segundos)")
+    parser.add_argument("--sleep", type=float, default=0.0, help="Sleep entre llamadas de Pass 2 (segundos) para cuidar rate limits")
+    parser.add_argument("--no-cache", action="store_true", help="No usar el cache de respuestas LLM (llm_cache)")
+    parser.add_argument("--cache-ttl-days", type=float, default=30.0, help="TTL del cache LLM; 0 = sin vencimiento")
+    parser.add_argument("--cache-max-mb", type=float, default=1024.0, help="Tope de tamaño del cache LLM (LRU)")
+    return parser
+
+def run_extraction(args, rp: RunPaths, sink: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Pass 1 (+ Pass 2 si args.vision_pass) sobre rp. Devuelve los stats de ambos passes."""
+    processed_ids = load_processed_ids(rp.out_path)
+
+    conn = None if args.no_cache else connect()
+
+    def make_cache() -> Optional[LLMCache]:
+        return LLMCache(conn, ttl_days=args.cache_ttl_days, max_mb=args.cache_max_mb) if conn else None
+
+    # ---- Pass 1 (texto batch, async | Batch API) ----
+    cache = make_cache()
+    if args.mode == "batch":
+        stats = run_text_pass_batch(args, rp, processed_ids, cache, sink)
+    else:
+        stats = asyncio.run(run_text_pass(args, rp, processed_ids, cache, sink))
+    if cache:
+        stats["cache_evicted"] = cache.evict()
+
+    pass1 = {
+        "run_id": args.run_id,
+        "stage": "pass1_text_done",
+        "processed_total": len(processed_ids),
+        "limit": args.limit,
+        **stats,
+    }
+    print(json.dumps(pass1, ensure_ascii=False, indent=2))
+
+    # ---- Pass 2 (visión opcional) ----
+    if not args.vision_pass:
+        if conn:
+            conn.close()
+        return {"pass1": pass1}
+
+    cache = make_cache()
+    if args.mode == "batch":
+        summary = run_vision_pass_batch(args, rp, conn, cache)
+    else:
+        summary = run_vision_pass(args, rp, conn, cache)
+    if cache:
+        summary.update(cache.stats())
+        summary["cache_evicted"] = cache.evict()
+    if conn:
+        conn.close()
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return {"pass1": pass1, "pass2": summary}
+
+def main():
+    args = build_parser().parse_args()
+
+    rp = get_run_paths(args.run_id)
+    rp.run_dir.mkdir(parents=True, exist_ok=True)
+    if resolve_jsonl(rp.dedup_path) is None:
+        raise FileNotFoundError(f"No existe: {rp.dedup_path}")
 
+    run_extraction(args, rp)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/hash_index.py
+
+Índice de vecinos por distancia Hamming sobre dHash 64-bit (multi-index hashing, 4 bandas de 16 bits).
+
+Principio del palomar: si dist(a, b) <= k, al menos una de las 4 bandas difiere en <= k // 4 bits.
+Se buscan candidatos por banda (valor exacto o variantes a radio k // 4) y se filtran por popcount.
+
+- HammingIndex: índice en memoria (NumPy, CSR por banda). Consultas sub-milisegundo con millones de hashes.
+- hash_index (tabla SQLite, migración v8): misma estructura persistida; sync_index() la alimenta
+  desde image_cache y query_db() consulta sin cargar nada en memoria.
+- group_hashes(): union-find de hashes a distancia <= k (lo usa product_grouper_agent).
+
+Uso:
+  python explorer/hash_index.py --sync
+  python explorer/hash_index.py --query 8f0e1c3c3e1e0f07 --k 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+
+def parse_hash(h: str) -> Optional[int]:
+    if not h or len(h) != 16:
+        return None
+    try:
+        return int(h, 16)
+    except ValueError:
+        return None
+
+def split_bands(v: int) -> Tuple[int, ...]:
+    # banda 0 = 16 bits más significativos (primeras filas del dHash)
+    return tuple((v >> (BAND_BITS * (BANDS - 1 - i))) & BAND_MASK for i in range(BANDS))
+
+_VARIANT_MASKS: Dict[int, List[int]] = {}
+
+def band_variants(value: int, radius: int) -> List[int]:
+    """Todos los valores de 16 bits a distancia <= radius de value."""
+    masks = _VARIANT_MASKS.get(radius)
+    if masks is None:
+        masks = [0]
+        for r in range(1, radius + 1):
+            for bits in combinations(range(BAND_BITS), r):
+                m = 0
+                for b in bits:
+                    m |= 1 << b
+                masks.append(m)
+        _VARIANT_MASKS[radius] = masks
+    return [value ^ m for m in masks]
+
+def _variant_mask_array(radius: int) -> np.ndarray:
+    band_variants(0, radius)  # llena el cache
+    return np.array(_VARIANT_MASKS[radius], dtype=np.int64)
+
+# =============================
+# In-memory
+# =============================
+
+class HammingIndex:
+    """
+    Índice en memoria. Por banda: valores ordenados por el valor de la banda + offsets (CSR),
+    así cada consulta es un gather de rangos + XOR/popcount vectorizado con NumPy.
+    Pensado para carga en bloque: add() acumula y la primera query() reconstruye.
+
+    Uso:
+        idx = HammingIndex(hashes)
+        idx.query("8f0e1c3c3e1e0f07", k=4)  # [(hash, dist), ...]
+    """
+
+    def __init__(self, hashes: Iterable[str] = ()):
+        self._values = np.empty(0, dtype=np.uint64)
+        self._pending: List[int] = []
+        self._bands: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+        for h in hashes:
+            self.add(h)
+
+    def __len__(self) -> int:
+        self._build()
+        return len(self._values)
+
+    def add(self, h: str) -> bool:
+        v = parse_hash(h)
+        if v is None:
+            return False
+        self._pending.append(v)
+        return True
+
+    def _build(self):
+        if not self._pending and self._bands is not None:
+            return
+        if self._pending:
+            self._values = np.unique(np.concatenate([self._values, np.array(self._pending, dtype=np.uint64)]))
+            self._pending = []
+        self._bands = []
+        for i in range(BANDS):
+            keys = ((self._values >> np.uint64(BAND_BITS * (BANDS - 1 - i))) & np.uint64(BAND_MASK)).astype(np.int64)
+            order = np.argsort(keys, kind="stable")
+            offsets = np.searchsorted(keys[order], np.arange(BAND_MASK + 2))
+            self._bands.append((offsets, self._values[order]))
+
+    def query(self, h: str, k: int) -> List[Tuple[str, int]]:
+        q = parse_hash(h)
+        if q is None:
+            return []
+        self._build()
+        masks = _variant_mask_array(k // BANDS)
+        chunks = []
+        for (offsets, values), band in zip(self._bands, split_bands(q)):
+            variants = band ^ masks
+            starts = offsets[variants]
+            lens = offsets[variants + 1] - starts
+            total = int(lens.sum())
+            if not total:
+                continue
+            # gather de rangos [start, start+len) sin loop en Python
+            shift = starts - np.concatenate(([0], np.cumsum(lens)[:-1]))
+            chunks.append(values[np.arange(total) + np.repeat(shift, lens)])
+        if not chunks:
+            return []
+        cand = np.unique(np.concatenate(chunks))
+        dist = np.bitwise_count(cand ^ np.uint64(q))
+        hit = dist <= k
+        return [(f"{int(v):016x}", int(d)) for v, d in zip(cand[hit], dist[hit])]
+
+    @classmethod
+    def load(cls, conn) -> "HammingIndex":
+        idx = cls()
+        for (h,) in conn.execute("SELECT dhash64 FROM hash_index"):
+            idx.add(h)
+        return idx
+
+# =============================
+# SQLite (tabla hash_index)
+# =============================
+
+def sync_index(conn) -> int:
+    """Agrega a hash_index los dHash de image_cache que aún no están. Devuelve filas nuevas."""
+    cur = conn.execute("""
+        SELECT DISTINCT c.dhash64
+        FROM image_cache c
+        LEFT JOIN hash_index h ON h.dhash64 = c.dhash64
+        WHERE c.dhash64 IS NOT NULL AND h.dhash64 IS NULL
+    """)
+    rows = []
+    for (h,) in cur.fetchall():
+        v = parse_hash(h)
+        if v is not None:
+            rows.append((h, *split_bands(v)))
+    if rows:
+        conn.executemany("INSERT OR IGNORE INTO hash_index (dhash64, b0, b1, b2, b3) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    return len(rows)
+
+def query_db(conn, h: str, k: int) -> List[Tuple[str, int]]:
+    """Vecinos a distancia <= k directo sobre la tabla (un SELECT por banda, índices cubrientes)."""
+    q = parse_hash(h)
+    if q is None:
+        return []
+    radius = k // BANDS
+    candidates: Set[str] = set()
+    for i, band in enumerate(split_bands(q)):
+        variants = band_variants(band, radius)
+        marks = ",".join("?" * len(variants))
+        for (c,) in conn.execute(f"SELECT dhash64 FROM hash_index WHERE b{i} IN ({marks})", variants):
+            candidates.add(c)
+    out = []
+    for c in candidates:
+        d = (int(c, 16) ^ q).bit_count()
+        if d <= k:
+            out.append((c, d))
+    return out
+
+# =============================
+# Grouping
+# =============================
+
+def group_hashes(hashes: Iterable[str], k: int, preferred: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Union-find de hashes a distancia <= k. Devuelve hash -> representante del grupo.
+    El representante es un hash de `preferred` si el grupo tiene alguno (p.ej. product_id vhash_* ya
+    existentes, para que el concepto no cambie de id entre runs); si no, el menor hash del grupo.
+    k=0 equivale al agrupamiento exacto anterior (cada hash es su propio representante).
+    """
+    hashes = [h for h in dict.fromkeys(hashes) if parse_hash(h) is not None]
+    preferred = {h for h in preferred if parse_hash(h) is not None}
+    if k <= 0:
+        return {h: h for h in hashes}
+
+    parent: Dict[str, str] = {}
+
+    def find(x: str) -> str:
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def rank(h: str) -> Tuple[int, str]:
+        return (0 if h in preferred else 1, h)
+
+    idx = HammingIndex(hashes + sorted(preferred))
+    for h in hashes + sorted(preferred):
+        parent[h] = h
+
+    for h in hashes:
+        for other, _ in idx.query(h, k):
+            ra, rb = find(h), find(other)
+            if ra != rb:
+                if rank(rb) < rank(ra):
+                    ra, rb = rb, ra
+                parent[rb] = ra
+
+    return {h: find(h) for h in hashes}
+
+def main():
+    from explorer.store import connect
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", action="store_true", help="Indexar los dHash nuevos de image_cache")
+    parser.add_argument("--query", default=None, help="dHash hex de 16 chars")
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        stats = {}
+        if args.sync:
+            t = time.perf_counter()
+            stats["indexed_new"] = sync_index(conn)
+            stats["sync_sec"] = round(time.perf_counter() - t, 3)
+        stats["index_size"] = conn.execute("SELECT COUNT(*) FROM hash_index").fetchone()[0]
+        if args.query:
+            t = time.perf_counter()
+            res = sorted(query_db(conn, args.query, args.k), key=lambda x: x[1])
+            stats["query_ms"] = round((time.perf_counter() - t) * 1000, 3)
+            stats["neighbors"] = [{"dhash64": h, "dist": d} for h, d in res]
+    finally:
+        conn.close()
+
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
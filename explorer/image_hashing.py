@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/image_hashing.py
+
+Hash visual por lotes (dHash 64-bit + pHash 64-bit) para media_hash_agent.
+
+- decode_batch(): decode a grises en tamaño chico (corre en un ProcessPool, fuera del GIL).
+- dhash_batch() / phash_batch(): bits con NumPy sobre arrays apilados (N, h, w).
+
+Compatibilidad:
+- draft=False (default): mismo pipeline que el dhash64 original
+  (convert("L") + resize((9, 8), LANCZOS)) -> strings idénticos a los de image_cache.
+- draft=True: Image.draft decodifica el JPEG directo a escala 1/2..1/8 (mucho más rápido),
+  pero los píxeles de entrada al resize cambian: algunos hashes difieren en 1-2 bits.
+  Ver explorer/bench/bench_hashing.py para la tasa de coincidencia.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+DHASH_SIZE = (9, 8)      # (w, h): 8 comparaciones por fila x 8 filas
+PHASH_SIZE = 32          # pHash: DCT de 32x32, se usa el bloque 8x8 de baja frecuencia
+DRAFT_MIN_SIDE = 96      # draft no reduce por debajo de esto (>= 3x el tamaño de pHash)
+
+def _dct_matrix(n: int, k: int) -> np.ndarray:
+    # DCT-II sin normalizar (igual que scipy.fftpack.dct), primeras k frecuencias
+    rows = np.arange(k)[:, None]
+    cols = np.arange(n)[None, :]
+    return 2.0 * np.cos(np.pi * rows * (2 * cols + 1) / (2 * n))
+
+_DCT_8x32 = _dct_matrix(PHASH_SIZE, 8)
+
+# =============================
+# Decode (process pool)
+# =============================
+
+def decode_gray(content: bytes, draft: bool = False) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """bytes -> (dhash 8x9 uint8, phash 32x32 float32) o None si no se pudo decodificar."""
+    try:
+        img = Image.open(BytesIO(content))
+        if draft:
+            img.draft("L", (DRAFT_MIN_SIDE, DRAFT_MIN_SIDE))
+        gray = img.convert("L")
+        d = np.asarray(gray.resize(DHASH_SIZE, Image.Resampling.LANCZOS), dtype=np.uint8)
+        # pHash no tiene filas legacy: reducing_gap (reduce() entero + LANCZOS) abarata el resize
+        p = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS, reducing_gap=3.0), dtype=np.float32)
+        return d, p
+    except Exception:
+        return None
+
+def decode_batch(contents: Sequence[bytes], draft: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decodifica un lote. Devuelve arrays apilados (N, 8, 9), (N, 32, 32) y máscara ok (N,).
+    Las filas con ok=False quedan en cero.
+    """
+    n = len(contents)
+    d_arr = np.zeros((n, DHASH_SIZE[1], DHASH_SIZE[0]), dtype=np.uint8)
+    p_arr = np.zeros((n, PHASH_SIZE, PHASH_SIZE), dtype=np.float32)
+    ok = np.zeros(n, dtype=bool)
+    for i, content in enumerate(contents):
+        res = decode_gray(content, draft=draft)
+        if res is not None:
+            d_arr[i], p_arr[i] = res
+            ok[i] = True
+    return d_arr, p_arr, ok
+
+# =============================
+# Hash (vectorizado)
+# =============================
+
+def _bits_to_hex(bits: np.ndarray) -> List[str]:
+    # (N, 64) bool, MSB primero (mismo orden que el bit-shifting original)
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return [row.tobytes().hex() for row in packed]
+
+def dhash_batch(pixels: np.ndarray) -> List[str]:
+    """(N, 8, 9) grises -> dHash hex de 16 chars (pixel derecho > izquierdo)."""
+    pixels = pixels.astype(np.int16)
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    return _bits_to_hex(bits.reshape(len(pixels), -1))
+
+def phash_batch(pixels: np.ndarray) -> List[str]:
+    """(N, 32, 32) grises -> pHash hex de 16 chars (DCT 8x8 baja frecuencia > mediana)."""
+    low = np.matmul(np.matmul(_DCT_8x32, pixels.astype(np.float64)), _DCT_8x32.T)  # (N, 8, 8)
+    flat = low.reshape(len(pixels), -1)
+    med = np.median(flat, axis=1, keepdims=True)
+    return _bits_to_hex(flat > med)
+
+def hash_batch(contents: Sequence[bytes], draft: bool = False) -> List[Optional[Tuple[str, str]]]:
+    """Decode + hash de un lote en el proceso actual. [(dhash, phash) | None, ...]"""
+    d_arr, p_arr, ok = decode_batch(contents, draft=draft)
+    return hashes_from_arrays(d_arr, p_arr, ok)
+
+def hashes_from_arrays(d_arr: np.ndarray, p_arr: np.ndarray, ok: np.ndarray) -> List[Optional[Tuple[str, str]]]:
+    out: List[Optional[Tuple[str, str]]] = [None] * len(ok)
+    idx = np.flatnonzero(ok)
+    if len(idx):
+        for i, dh, ph in zip(idx, dhash_batch(d_arr[idx]), phash_batch(p_arr[idx])):
+            out[i] = (dh, ph)
+    return out
+
+# =============================
+# Pool
+# =============================
+
+class HashPool:
+    """
+    ProcessPool para el decode; el hash (NumPy) corre en el proceso principal sobre el lote apilado.
+
+    Uso:
+        with HashPool(workers=4) as pool:
+            hashes = await pool.hash_async(list_of_bytes)
+    """
+
+    def __init__(self, workers: Optional[int] = None, draft: bool = False):
+        self.workers = workers
+        self.draft = draft
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "HashPool":
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def hash_async(self, contents: Sequence[bytes]) -> List[Optional[Tuple[str, str]]]:
+        loop = asyncio.get_running_loop()
+        d_arr, p_arr, ok = await loop.run_in_executor(self._executor, decode_batch, list(contents), self.draft)
+        return hashes_from_arrays(d_arr, p_arr, ok)
+
+    def hash_many(self, contents: Sequence[bytes], batch_size: int = 64) -> List[Optional[Tuple[str, str]]]:
+        batches = [contents[i:i + batch_size] for i in range(0, len(contents), batch_size)]
+        out: List[Optional[Tuple[str, str]]] = []
+        for d_arr, p_arr, ok in self._executor.map(decode_batch, batches, [self.draft] * len(batches)):
+            out.extend(hashes_from_arrays(d_arr, p_arr, ok))
+        return out
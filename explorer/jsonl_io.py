@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/jsonl_io.py
+
+Lectura/escritura de JSONL plano o comprimido con zstd (raw_ads.jsonl.zst / dedup_ads.jsonl.zst).
+
+- resolve_jsonl(path): path si existe; si no, path + ".zst" si existe. Los agentes siguen pidiendo
+  "dedup_ads.jsonl" y funcionan igual con runs escritos por scraper_runner --stream.
+- open_jsonl(path): handle de texto (descomprime si termina en .zst; frames concatenados OK).
+- iter_jsonl(path): dicts de cada línea; salta líneas vacías o con JSON inválido.
+- ZstdFrameAppender: append de un frame zstd completo por página. Tras un crash basta truncar al
+  último tamaño checkpointeado para descartar un frame a medio escribir.
+"""
+
+import io
+import json
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Union
+
+import zstandard
+
+ZSTD_SUFFIX = ".zst"
+
+def resolve_jsonl(path: Union[str, Path]) -> Optional[Path]:
+    path = Path(path)
+    if path.exists():
+        return path
+    zst = path.with_name(path.name + ZSTD_SUFFIX)
+    if zst.exists():
+        return zst
+    return None
+
+def open_jsonl(path: Union[str, Path]) -> IO[str]:
+    resolved = resolve_jsonl(path)
+    if resolved is None:
+        raise FileNotFoundError(f"No existe: {path}")
+    if resolved.name.endswith(ZSTD_SUFFIX):
+        raw = open(resolved, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(resolved, "r", encoding="utf-8")
+
+def iter_jsonl(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    with open_jsonl(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+class ZstdFrameAppender:
+    """
+    Uso:
+        w = ZstdFrameAppender(path, level=6)
+        w.truncate(checkpoint_bytes)   # resume: descarta lo escrito después del checkpoint
+        w.append(lines)                # un frame por llamada
+        checkpoint_bytes = w.sync()    # flush + fsync; tamaño a persistir
+    """
+
+    def __init__(self, path: Union[str, Path], level: int = 6):
+        self.path = Path(path)
+        self._cctx = zstandard.ZstdCompressor(level=level)
+        self._f = open(self.path, "ab")
+
+    def truncate(self, size: int):
+        self._f.flush()
+        self._f.truncate(size)
+        self._f.seek(0, os.SEEK_END)
+
+    def append(self, lines: Iterable[str]):
+        data = "".join(lines).encode("utf-8")
+        if data:
+            self._f.write(self._cctx.compress(data))
+
+    def sync(self) -> int:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
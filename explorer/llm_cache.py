@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/llm_cache.py
+
+Cache persistente de respuestas LLM direccionado por contenido (tabla llm_cache en product_memory.db).
+
+- key = sha256(kind, model, prompt_version, payload normalizado[, extra]) -> un mismo creativo visto en
+  otro run (mismo texto) se sirve sin volver a pagar la llamada.
+- prompt_version(): hash del template; cambiar el prompt invalida solo, sin bump manual.
+- Eviction por TTL (created_at) y por tamaño total (LRU por last_hit_at).
+- Contadores hits/misses/writes para el resumen del run.
+
+Uso:
+  cache = LLMCache(conn, ttl_days=30, max_mb=1024)
+  key = cache.make_key("text", model, version, payload)
+  obj = cache.get(key)            # dict | None
+  cache.put(key, "text", model, obj)
+  cache.flush(); cache.evict()
+"""
+
+import hashlib
+import json
+import sqlite3
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def normalize_text(value: Any) -> Any:
+    """NFC + espacios colapsados en strings (recursivo en listas/dicts); el resto igual."""
+    if isinstance(value, str):
+        return " ".join(unicodedata.normalize("NFC", value).split())
+    if isinstance(value, list):
+        return [normalize_text(v) for v in value]
+    if isinstance(value, dict):
+        return {k: normalize_text(v) for k, v in value.items()}
+    return value
+
+def prompt_version(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+class LLMCache:
+    def __init__(self, conn: sqlite3.Connection, ttl_days: float = 30.0, max_mb: float = 1024.0):
+        self.conn = conn
+        self.ttl_days = ttl_days
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._hit_keys: List[str] = []
+        self._pending: List[Tuple] = []
+
+    @staticmethod
+    def make_key(kind: str, model: str, version: str, payload: Any, extra: Optional[str] = None) -> str:
+        blob = json.dumps([kind, model, version, normalize_text(payload), extra],
+                          ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _cutoff(self) -> Optional[str]:
+        if self.ttl_days <= 0:
+            return None
+        return (datetime.now(timezone.utc) - timedelta(days=self.ttl_days)).isoformat()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT response_json, created_at FROM llm_cache WHERE key=?", (key,)).fetchone()
+        cutoff = self._cutoff()
+        if not row or (cutoff and row[1] < cutoff):
+            self.misses += 1
+            return None
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._hit_keys.append(key)
+        return value
+
+    def put(self, key: str, kind: str, model: str, value: Dict[str, Any]):
+        blob = json.dumps(value, ensure_ascii=False)
+        ts = now_iso()
+        self._pending.append((key, kind, model, blob, len(blob.encode("utf-8")), ts, ts))
+        self.writes += 1
+
+    def flush(self):
+        """Persiste puts y last_hit_at de los hits en una sola transacción."""
+        if not self._pending and not self._hit_keys:
+            return
+        ts = now_iso()
+        with self.conn:
+            if self._pending:
+                self.conn.executemany("""
+                    INSERT INTO llm_cache (key, kind, model, response_json, size_bytes, created_at, last_hit_at, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                    ON CONFLICT(key) DO UPDATE SET
+                        response_json=excluded.response_json,
+                        size_bytes=excluded.size_bytes,
+                        created_at=excluded.created_at,
+                        last_hit_at=excluded.last_hit_at
+                """, self._pending)
+            if self._hit_keys:
+                self.conn.executemany(
+                    "UPDATE llm_cache SET last_hit_at=?, hit_count=hit_count+1 WHERE key=?",
+                    [(ts, k) for k in self._hit_keys])
+        self._pending = []
+        self._hit_keys = []
+
+    def evict(self) -> int:
+        """TTL primero; luego, si el total supera max_bytes, borra los menos usados recientemente."""
+        self.flush()
+        removed = 0
+        with self.conn:
+            cutoff = self._cutoff()
+            if cutoff:
+                removed += self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,)).rowcount
+            total = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_cache").fetchone()[0]
+            if self.max_bytes > 0 and total > self.max_bytes:
+                # ventana acumulada por antigüedad de uso: borra hasta bajar del tope
+                removed += self.conn.execute("""
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, size_bytes, SUM(size_bytes) OVER (ORDER BY last_hit_at, key) AS freed
+                            FROM llm_cache
+                        ) WHERE freed - size_bytes < ?
+                    )
+                """, (total - self.max_bytes,)).rowcount
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {"cache_hits": self.hits, "cache_misses": self.misses, "cache_writes": self.writes}
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/llm_limiter.py
+
+Rate limiting client-side para llamadas a OpenAI desde los agentes del explorer.
+
+- TokenBucket: cubeta que se rellena a `per_minute / 60` por segundo (ráfaga acotada por burst_sec).
+- RateLimiter: dos cubetas, requests/min (RPM) y tokens/min (TPM). acquire() espera hasta que
+  ambas alcancen; settle() devuelve a la cubeta TPM lo estimado de más según response.usage.
+  pause() congela el limiter tras un 429 (Retry-After) para todos los workers a la vez.
+- estimate_tokens(): tokens de prompt con tiktoken (+ max_completion_tokens, que OpenAI
+  descuenta del TPM al recibir la request). Sin encoding disponible: ~4 chars/token.
+"""
+
+import asyncio
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# Overhead aproximado por mensaje del formato chat (rol + separadores)
+TOKENS_PER_MESSAGE = 4
+# Costo aproximado de una imagen en detail=auto (low ~85, high 512px tiles ~170 c/u)
+TOKENS_PER_IMAGE = 800
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None  # sin red para bajar el BPE la primera vez
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+def estimate_tokens(messages: List[Dict[str, Any]], model: str, max_completion_tokens: int = 0) -> int:
+    total = max_completion_tokens
+    for m in messages:
+        total += TOKENS_PER_MESSAGE
+        content = m.get("content")
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += count_tokens(part.get("text") or "", model)
+                elif part.get("type") == "image_url":
+                    total += TOKENS_PER_IMAGE
+    return total
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_sec: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_sec)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """
+    Uso:
+        limiter = RateLimiter(rpm=500, tpm=200_000)
+        est = estimate_tokens(messages, model, max_completion_tokens)
+        await limiter.acquire(est)
+        resp = await client.chat.completions.create(...)
+        limiter.settle(est, resp.usage.total_tokens)
+    """
+
+    def __init__(self, rpm: float, tpm: float, burst_sec: float = 10.0):
+        self.requests = TokenBucket(rpm, burst_sec)
+        self.tokens = TokenBucket(tpm, burst_sec)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waited_sec = 0.0
+
+    async def acquire(self, tokens: int):
+        # una request más grande que la ráfaga nunca pasaría: se acota a la capacidad
+        tokens = min(float(tokens), self.tokens.capacity)
+        async with self._lock:  # FIFO: nadie se salta la fila
+            started = time.monotonic()
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    self.waited_sec += time.monotonic() - started
+                    return
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        if actual is not None and actual < estimated:
+            self.tokens.give_back(estimated - actual)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/media_fetcher.py
+
+Motor asíncrono de descarga de imágenes para media_hash_agent.
+
+- Una sola aiohttp.ClientSession con pool de conexiones keep-alive por host
+  (evita un handshake TLS por imagen contra los hosts de fbcdn).
+- Concurrencia acotada global (workers) y por host (limit_per_host).
+- Lectura en streaming con tope de bytes (max_bytes).
+- Revalidación condicional (If-None-Match / If-Modified-Since): un 304 conserva el hash cacheado.
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+import aiohttp
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+@dataclass
+class FetchRequest:
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+@dataclass
+class FetchResult:
+    url: str
+    status: str                       # "ok" | "not_modified" | "error"
+    content: Optional[bytes] = None
+    http_status: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+
+class ResponseTooLarge(Exception):
+    pass
+
+class AsyncImageFetcher:
+    """
+    Uso:
+        fetcher = AsyncImageFetcher(workers=64, per_host=16)
+        async for res in fetcher.fetch_all(requests):
+            ...
+    """
+
+    def __init__(
+        self,
+        workers: int = 64,
+        per_host: int = 16,
+        timeout: float = 20,
+        retries: int = 2,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.max_bytes = max_bytes
+        self.headers = dict(headers or DEFAULT_HEADERS)
+
+    def _session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.workers,
+            limit_per_host=self.per_host,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout, sock_connect=min(5, self.timeout))
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
+
+    async def _read_capped(self, resp: aiohttp.ClientResponse) -> bytes:
+        if resp.content_length is not None and resp.content_length > self.max_bytes:
+            raise ResponseTooLarge(f"Content-Length {resp.content_length} > {self.max_bytes}")
+        buf = bytearray()
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            buf += chunk
+            if len(buf) > self.max_bytes:
+                raise ResponseTooLarge(f"body > {self.max_bytes} bytes")
+        return bytes(buf)
+
+    async def fetch(self, session: aiohttp.ClientSession, req: FetchRequest) -> FetchResult:
+        headers = {}
+        if req.etag:
+            headers["If-None-Match"] = req.etag
+        if req.last_modified:
+            headers["If-Modified-Since"] = req.last_modified
+
+        last_err = None
+        last_status = None
+        for attempt in range(self.retries):
+            if attempt:
+                await asyncio.sleep(0.25 * (2 ** attempt) + random.random() * 0.1)
+            try:
+                async with session.get(req.url, headers=headers, allow_redirects=True) as resp:
+                    last_status = resp.status
+                    if resp.status == 304:
+                        return FetchResult(req.url, "not_modified", http_status=304,
+                                           etag=resp.headers.get("ETag") or req.etag,
+                                           last_modified=resp.headers.get("Last-Modified") or req.last_modified)
+                    if resp.status != 200:
+                        last_err = f"HTTP {resp.status}"
+                        # 4xx (salvo 429) no mejora reintentando
+                        if 400 <= resp.status < 500 and resp.status != 429:
+                            break
+                        continue
+                    content = await self._read_capped(resp)
+                    if not content:
+                        last_err = "empty body"
+                        continue
+                    return FetchResult(req.url, "ok", content=content, http_status=200,
+                                       etag=resp.headers.get("ETag"),
+                                       last_modified=resp.headers.get("Last-Modified"))
+            except ResponseTooLarge as e:
+                last_err = str(e)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_err = f"{type(e).__name__}: {e}"
+                continue
+        return FetchResult(req.url, "error", http_status=last_status, error=last_err)
+
+    async def fetch_all(self, requests: Iterable[FetchRequest]) -> AsyncIterator[FetchResult]:
+        """Descarga todas las requests con `workers` tareas; entrega resultados a medida que terminan."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+        results: asyncio.Queue = asyncio.Queue()
+        done_marker = object()
+
+        async with self._session() as session:
+            async def producer():
+                for req in requests:
+                    await queue.put(req)
+                for _ in range(self.workers):
+                    await queue.put(done_marker)
+
+            async def worker():
+                while True:
+                    req = await queue.get()
+                    if req is done_marker:
+                        await results.put(done_marker)
+                        return
+                    await results.put(await self.fetch(session, req))
+
+            tasks = [asyncio.create_task(producer())]
+            tasks += [asyncio.create_task(worker()) for _ in range(self.workers)]
+            try:
+                finished = 0
+                while finished < self.workers:
+                    res = await results.get()
+                    if res is done_marker:
+                        finished += 1
+                        continue
+                    yield res
+            finally:
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
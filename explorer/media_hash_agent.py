@@ -5,50 +5,31 @@
 explorer/media_hash_agent.py
 
 Objetivo:
-- Calcular hash visual (dHash 64-bit) de las imágenes de los ads.
-- Usa cache global (image_cache) y multi-threading para performance.
+- Calcular hash visual (dHash 64-bit + pHash 64-bit) de las imágenes de los ads.
+- Usa cache global (image_cache) con revalidación ETag/Last-Modified.
+- Descarga con aiohttp (pool keep-alive por host, ver media_fetcher.py).
+- Decode en process pool + hash vectorizado por lotes (ver image_hashing.py).
 """
 
 import argparse
+import asyncio
 import json
-import sqlite3
-from datetime import datetime
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-import requests
+import numpy as np
 from PIL import Image
 
-DB_NAME = "product_memory.db"
-
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
-
-def ensure_schema(conn: sqlite3.Connection):
-    conn.executescript("""
-    CREATE TABLE IF NOT EXISTS image_cache (
-        image_url TEXT PRIMARY KEY,
-        dhash64 TEXT,
-        fetched_at TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS ad_media (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        run_id TEXT,
-        ad_id TEXT,
-        image_url TEXT,
-        dhash64 TEXT,
-        created_at TEXT,
-        UNIQUE(run_id, ad_id, image_url)
-    );
-
-    CREATE INDEX IF NOT EXISTS idx_image_cache_hash ON image_cache(dhash64);
-    CREATE INDEX IF NOT EXISTS idx_ad_media_ad ON ad_media(ad_id);
-    CREATE INDEX IF NOT EXISTS idx_ad_media_hash ON ad_media(dhash64);
-    """)
-    conn.commit()
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.store import connect
+from explorer.media_fetcher import DEFAULT_MAX_BYTES, AsyncImageFetcher, FetchRequest, FetchResult
+from explorer.image_hashing import DHASH_SIZE, HashPool, dhash_batch
+from explorer.hash_index import sync_index
+from explorer.jsonl_io import iter_jsonl, resolve_jsonl
 
 def extract_image_urls(ad: Dict[str, Any], max_images: int = 1) -> List[str]:
     snap = ad.get("snapshot") or {}
@@ -89,156 +70,231 @@ def extract_image_urls(ad: Dict[str, Any], max_images: int = 1) -> List[str]:
     return urls
 
 def dhash64(img: Image.Image) -> str:
-    # dHash: grayscale, resize 9x8, compare adjacent pixels
-    img = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
-    pixels = list(img.getdata())  # 72 values
-    # reshape into rows
-    rows = [pixels[i*9:(i+1)*9] for i in range(8)]
-    bits = 0
-    for r in rows:
-        for c in range(8):
-            bits = (bits << 1) | (1 if r[c+1] > r[c] else 0)
-    return f"{bits:016x}"
-
-def fetch_and_hash(url: str, timeout: int, retries: int) -> Optional[str]:
-    headers = {"User-Agent": "Mozilla/5.0"}
-    last_err = None
-    for _ in range(max(1, retries)):
-        try:
-            r = requests.get(url, headers=headers, timeout=timeout)
-            if r.status_code != 200 or not r.content:
-                last_err = f"HTTP {r.status_code}"
-                continue
-            img = Image.open(BytesIO(r.content))
-            return dhash64(img)
-        except Exception as e:
-            last_err = str(e)
-            continue
-    return None
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--run-id", required=True)
-    parser.add_argument("--dedup-path", default=None)
-    parser.add_argument("--max-images", type=int, default=1)
-    parser.add_argument("--workers", type=int, default=12)
-    parser.add_argument("--timeout", type=int, default=20)
-    parser.add_argument("--retries", type=int, default=2)
-    args = parser.parse_args()
-
-    root_dir = Path(__file__).resolve().parent
-    dedup_path = Path(args.dedup_path) if args.dedup_path else (root_dir / "data" / "runs" / args.run_id / "dedup_ads.jsonl")
-    if not dedup_path.exists():
-        raise FileNotFoundError(f"No existe: {dedup_path}")
-
-    db_path = get_db_path()
-    conn = sqlite3.connect(str(db_path))
-    ensure_schema(conn)
+    # dHash: grayscale, resize 9x8, compare adjacent pixels (mismos bits que image_hashing.dhash_batch)
+    img = img.convert("L").resize(DHASH_SIZE, Image.Resampling.LANCZOS)
+    return dhash_batch(np.asarray(img, dtype=np.uint8)[None])[0]
+
+def is_stale(validated_at: Optional[str], revalidate_days: float, now: datetime) -> bool:
+    if revalidate_days <= 0 or not validated_at:
+        return False
+    try:
+        ts = datetime.fromisoformat(validated_at.replace("Z", "+00:00"))
+    except ValueError:
+        return True
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return now - ts > timedelta(days=revalidate_days)
+
+async def fetch_and_hash_all(
+    fetcher: AsyncImageFetcher,
+    requests: List[FetchRequest],
+    hash_workers: int,
+    batch_size: int = 32,
+    draft: bool = False,
+):
+    """
+    Descarga async + decode en process pool (lotes de batch_size) + hash NumPy por lote.
+    Entrega (FetchResult, dhash | None, phash | None) a medida que terminan.
+    """
+    with HashPool(workers=max(1, hash_workers), draft=draft) as pool:
+        pending = set()
+        batch: List[FetchResult] = []
+        max_pending = max(2, hash_workers * 2)  # acota bytes en memoria si el hash va más lento que el fetch
+
+        async for res in fetcher.fetch_all(requests):
+            if res.status == "ok":
+                batch.append(res)
+                if len(batch) >= batch_size:
+                    pending.add(asyncio.ensure_future(_hash_batch(pool, batch)))
+                    batch = []
+            else:
+                yield res, None, None
+            if len(pending) >= max_pending:
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # drenar los lotes ya listos sin bloquear el fetch
+            done = {t for t in pending if t.done()}
+            for t in done:
+                pending.discard(t)
+                for item in t.result():
+                    yield item
+        if batch:
+            pending.add(asyncio.ensure_future(_hash_batch(pool, batch)))
+        for t in asyncio.as_completed(pending):
+            for item in await t:
+                yield item
+
+async def _hash_batch(pool: HashPool, batch: List[FetchResult]) -> List[Tuple[FetchResult, Optional[str], Optional[str]]]:
+    hashes = await pool.hash_async([res.content for res in batch])
+    out = []
+    for res, hp in zip(batch, hashes):
+        res.content = None  # liberar bytes
+        out.append((res, hp[0], hp[1]) if hp else (res, None, None))
+    return out
+
+async def run_async(args, conn, ads: Optional[Iterable[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    started = time.perf_counter()
     cur = conn.cursor()
 
-    # Use timezone-aware now
-    from datetime import timezone
-    created_at = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
+    created_at = now.isoformat()
 
     # Pre-carga cache de URLs ya conocidas para evitar hits a DB por cada fila
-    cur.execute("SELECT image_url, dhash64 FROM image_cache")
-    cache_map = {u: h for (u, h) in cur.fetchall()}
+    cur.execute("SELECT image_url, dhash64, etag, last_modified, COALESCE(validated_at, fetched_at) FROM image_cache")
+    cache_map = {u: (h, et, lm, va) for (u, h, et, lm, va) in cur.fetchall()}
 
-    tasks: List[Tuple[str, str]] = []  # (ad_id, image_url)
+    cur.execute("SELECT ad_id, image_url FROM ad_media WHERE run_id=?", (args.run_id,))
+    done_pairs = set(cur.fetchall())
+
+    url_to_ads: Dict[str, List[str]] = {}
+    tasks_total = 0
     skipped_no_img = 0
     skipped_no_adid = 0
     already_run = 0
 
-    # Build task list
-    with open(dedup_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                ad = json.loads(line)
-            except:
-                continue
+    # Build task list (ads ya parseados en memoria si vienen de pipeline.py)
+    for ad in (ads if ads is not None else iter_jsonl(args.dedup_path)):
+        ad_id = str(ad.get("ad_archive_id") or ad.get("adArchiveId") or ad.get("adArchiveID") or "")
+        if not ad_id:
+            skipped_no_adid += 1
+            continue
 
-            ad_id = str(ad.get("ad_archive_id") or ad.get("adArchiveId") or ad.get("adArchiveID") or "")
-            if not ad_id:
-                skipped_no_adid += 1
-                continue
+        urls = extract_image_urls(ad, max_images=args.max_images)
+        if not urls:
+            skipped_no_img += 1
+            continue
 
-            urls = extract_image_urls(ad, max_images=args.max_images)
-            if not urls:
-                skipped_no_img += 1
+        for url in urls:
+            # ya existe para este run?
+            if (ad_id, url) in done_pairs:
+                already_run += 1
                 continue
+            done_pairs.add((ad_id, url))
+            url_to_ads.setdefault(url, []).append(ad_id)
+            tasks_total += 1
+
+    stats = {
+        "run_id": args.run_id,
+        "tasks_total": tasks_total,
+        "unique_urls": len(url_to_ads),
+        "inserted": 0,
+        "cache_hits": 0,
+        "downloaded": 0,
+        "revalidated_not_modified": 0,
+        "revalidated_changed": 0,
+        "failed": 0,
+        "skipped_no_img": skipped_no_img,
+        "skipped_no_adid": skipped_no_adid,
+        "already_run": already_run,
+    }
 
-            for url in urls:
-                # ya existe para este run?
-                cur.execute("SELECT 1 FROM ad_media WHERE run_id=? AND ad_id=? AND image_url=?", (args.run_id, ad_id, url))
-                if cur.fetchone():
-                    already_run += 1
-                    continue
-                tasks.append((ad_id, url))
-
-    # Worker execution (I/O bound)
-    inserted = 0
-    cached_used = 0
-    downloaded = 0
-    failed = 0
-
-    def worker(ad_id: str, url: str) -> Tuple[str, str, Optional[str]]:
-        # retorna hash si pudo, None si falló
-        if url in cache_map and cache_map[url]:
-            return (ad_id, url, cache_map[url])
-        h = fetch_and_hash(url, timeout=args.timeout, retries=args.retries)
-        return (ad_id, url, h)
-    
     # Batch commit param
-    BATCH_SIZE = 100
+    BATCH_SIZE = 500
     pending_commits = 0
 
-    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
-        futures = [ex.submit(worker, ad_id, url) for (ad_id, url) in tasks]
-        for fut in as_completed(futures):
-            ad_id, url, h = fut.result()
-            if not h:
-                failed += 1
-                continue
-
-            # actualizar cache si era nuevo
-            if url in cache_map:
-                cached_used += 1
+    def record(url: str, h: str):
+        nonlocal pending_commits
+        # insertar trazabilidad run/ad (una fila por ad que usa esta URL)
+        rows = [(args.run_id, ad_id, url, h, created_at) for ad_id in url_to_ads[url]]
+        cur.executemany("""
+            INSERT OR IGNORE INTO ad_media (run_id, ad_id, image_url, dhash64, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+        stats["inserted"] += len(rows)
+        pending_commits += len(rows)
+        if pending_commits >= BATCH_SIZE:
+            conn.commit()
+            pending_commits = 0
+
+    # Cache hits frescos: sin red. Stale: revalidación condicional.
+    to_fetch: List[FetchRequest] = []
+    for url in url_to_ads:
+        cached = cache_map.get(url)
+        if cached and cached[0]:
+            h, etag, last_modified, validated_at = cached
+            if (etag or last_modified) and is_stale(validated_at, args.revalidate_days, now):
+                to_fetch.append(FetchRequest(url, etag=etag, last_modified=last_modified))
             else:
-                downloaded += 1
-                cache_map[url] = h
-                cur.execute("""
-                    INSERT OR REPLACE INTO image_cache (image_url, dhash64, fetched_at)
-                    VALUES (?, ?, ?)
-                """, (url, h, created_at))
-
-            # insertar trazabilidad run/ad
+                stats["cache_hits"] += len(url_to_ads[url])
+                record(url, h)
+        else:
+            to_fetch.append(FetchRequest(url))
+
+    fetcher = AsyncImageFetcher(
+        workers=args.workers,
+        per_host=args.per_host,
+        timeout=args.timeout,
+        retries=args.retries,
+        max_bytes=args.max_bytes,
+    )
+
+    async for res, h, ph in fetch_and_hash_all(fetcher, to_fetch, args.hash_workers, args.hash_batch, args.draft):
+        url = res.url
+        cached = cache_map.get(url)
+
+        if res.status == "not_modified" and cached:
+            h = cached[0]
+            stats["revalidated_not_modified"] += 1
             cur.execute("""
-                INSERT OR IGNORE INTO ad_media (run_id, ad_id, image_url, dhash64, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            """, (args.run_id, ad_id, url, h, created_at))
-            inserted += 1
-            
-            pending_commits += 1
-            if pending_commits >= BATCH_SIZE:
-                conn.commit()
-                pending_commits = 0
+                UPDATE image_cache SET etag=?, last_modified=?, validated_at=? WHERE image_url=?
+            """, (res.etag, res.last_modified, created_at, url))
+        elif h:
+            if cached and cached[0]:
+                stats["revalidated_changed"] += 1
+            else:
+                stats["downloaded"] += 1
+            cur.execute("""
+                INSERT OR REPLACE INTO image_cache (image_url, dhash64, phash64, fetched_at, etag, last_modified, validated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (url, h, ph, created_at, res.etag, res.last_modified, created_at))
+        elif cached and cached[0]:
+            # revalidación fallida (p.ej. URL firmada expirada): se conserva el hash conocido
+            h = cached[0]
+            stats["cache_hits"] += len(url_to_ads[url])
+        else:
+            stats["failed"] += len(url_to_ads[url])
+            continue
+
+        record(url, h)
 
     conn.commit()
-    conn.close()
+    stats["hash_index_new"] = sync_index(conn)
 
-    print(json.dumps({
-        "run_id": args.run_id,
-        "tasks_total": len(tasks),
-        "inserted": inserted,
-        "cache_hits": cached_used,
-        "downloaded": downloaded,
-        "failed": failed,
-        "skipped_no_img": skipped_no_img,
-        "skipped_no_adid": skipped_no_adid,
-        "already_run": already_run
-    }, indent=2))
+    elapsed = time.perf_counter() - started
+    stats["elapsed_sec"] = round(elapsed, 2)
+    stats["urls_per_min"] = round(len(to_fetch) / elapsed * 60, 1) if elapsed > 0 else None
+    return stats
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", required=True)
+    parser.add_argument("--dedup-path", default=None)
+    parser.add_argument("--max-images", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=64, help="Descargas concurrentes en total")
+    parser.add_argument("--per-host", type=int, default=16, help="Conexiones concurrentes por host")
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count() or 4, help="Procesos de decode")
+    parser.add_argument("--hash-batch", type=int, default=32, help="Imágenes por lote de decode/hash")
+    parser.add_argument("--draft", action="store_true", help="Decode JPEG en modo draft (más rápido; el dHash puede diferir 1-2 bits del cacheado)")
+    parser.add_argument("--timeout", type=int, default=20)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="Tope de bytes por imagen")
+    parser.add_argument("--revalidate-days", type=float, default=30, help="Revalida (ETag/Last-Modified) entradas de image_cache más viejas que esto; 0 = nunca")
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+
+    root_dir = Path(__file__).resolve().parent
+    args.dedup_path = Path(args.dedup_path) if args.dedup_path else (root_dir / "data" / "runs" / args.run_id / "dedup_ads.jsonl")
+    if resolve_jsonl(args.dedup_path) is None:
+        raise FileNotFoundError(f"No existe: {args.dedup_path}")
+
+    conn = connect()
+    try:
+        stats = asyncio.run(run_async(args, conn))
+    finally:
+        conn.close()
+
+    print(json.dumps(stats, indent=2))
 
 if __name__ == "__main__":
     main()
@@ -10,8 +10,14 @@ Objetivo:
 - Generar snapshots para detectar cambios.
 
 Uso:
-  python explorer/memory_agent.py --run-id <TIMESTAMP_RUN_ID>
+  python explorer/memory_agent.py --run-id <TIMESTAMP_RUN_ID> [--mode bulk|row]
   Si no se pasa run-id, intenta tomar el último de explorer/data/runs/
+
+Modos:
+- bulk (default): carga el jsonl en una tabla staging con executemany y reconcilia
+  advertisers / advertiser_profile_history / ads / ad_snapshots con SQL set-based
+  en una sola transacción.
+- row: ingesta fila a fila (legacy).
 """
 
 import argparse
@@ -20,159 +26,31 @@ import json
 import os
 import sqlite3
 import sys
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.logger import setup_logger
+from explorer.store import connect
+from explorer.jsonl_io import open_jsonl, resolve_jsonl
 
 logger = setup_logger("Explorer_Memory")
 
-# =============================
-# CONFIG
-# =============================
-
-DB_NAME = "product_memory.db"
-
-# =============================
-# Schema Definition
-# =============================
-
-SCHEMA_SQL = """
--- 1) runs
-CREATE TABLE IF NOT EXISTS runs (
-    run_id TEXT PRIMARY KEY,
-    timestamp TEXT,
-    queries_loaded INTEGER,
-    raw_count INTEGER,
-    dedup_count INTEGER,
-    unique_advertisers INTEGER,
-    apify_run TEXT,
-    config_json TEXT
-);
-
--- 2) advertisers (Current State)
-CREATE TABLE IF NOT EXISTS advertisers (
-    advertiser_id TEXT PRIMARY KEY, -- page_id
-    current_page_name TEXT,
-    current_profile_uri TEXT,
-    current_like_count INTEGER,
-    current_categories_json TEXT,
-    first_seen_at TEXT,
-    last_seen_at TEXT,
-    status TEXT -- 'active', 'dormant'
-);
-
--- 3) advertiser_profile_history (SCD)
-CREATE TABLE IF NOT EXISTS advertiser_profile_history (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    advertiser_id TEXT,
-    observed_at TEXT,
-    page_name TEXT,
-    profile_uri TEXT,
-    like_count INTEGER,
-    categories_json TEXT,
-    FOREIGN KEY(advertiser_id) REFERENCES advertisers(advertiser_id)
-);
-
--- 4) ads (Current State)
-CREATE TABLE IF NOT EXISTS ads (
-    ad_id TEXT PRIMARY KEY, -- ad_archive_id
-    advertiser_id TEXT,
-    first_seen_at TEXT,
-    last_seen_at TEXT,
-    current_is_active BOOLEAN,
-    current_link_url TEXT,
-    current_domain TEXT,
-    current_body_hash TEXT,
-    current_media_hash TEXT,
-    FOREIGN KEY(advertiser_id) REFERENCES advertisers(advertiser_id)
-);
-
--- 5) ad_snapshots (One per run per ad)
-CREATE TABLE IF NOT EXISTS ad_snapshots (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    run_id TEXT,
-    ad_id TEXT,
-    observed_at TEXT,
-    is_active BOOLEAN,
-    start_date TEXT,
-    end_date TEXT,
-    link_url TEXT,
-    domain TEXT,
-    title TEXT,
-    body_text TEXT,
-    cta_type TEXT,
-    publisher_platform_json TEXT,
-    _query_matched TEXT,
-    _intent_guess TEXT,
-    snapshot_hash TEXT,
-    FOREIGN KEY(run_id) REFERENCES runs(run_id),
-    FOREIGN KEY(ad_id) REFERENCES ads(ad_id),
-    UNIQUE(run_id, ad_id)
-);
-
--- 6) ad_extractions (Placeholder for Agent 2 output)
-CREATE TABLE IF NOT EXISTS ad_extractions (
-    run_id TEXT,
-    ad_id TEXT,
-    product_name_guess TEXT,
-    category TEXT,
-    subcategory TEXT,
-    signals_json TEXT,
-    evidence_json TEXT,
-    confidence REAL,
-    UNIQUE(run_id, ad_id)
-);
-
--- Indices
-CREATE INDEX IF NOT EXISTS idx_adv_last_seen ON advertisers(last_seen_at);
-CREATE INDEX IF NOT EXISTS idx_ads_adv_last_seen ON ads(advertiser_id, last_seen_at);
-CREATE INDEX IF NOT EXISTS idx_snapshots_domain ON ad_snapshots(domain);
-
--- 7) image_cache (global cache by URL)
-CREATE TABLE IF NOT EXISTS image_cache (
-    image_url TEXT PRIMARY KEY,
-    dhash64 TEXT,
-    fetched_at TEXT
-);
-
--- 8) ad_media (traceability per run/ad)
-CREATE TABLE IF NOT EXISTS ad_media (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    run_id TEXT,
-    ad_id TEXT,
-    image_url TEXT,
-    dhash64 TEXT,
-    created_at TEXT,
-    UNIQUE(run_id, ad_id, image_url)
-);
-
-CREATE INDEX IF NOT EXISTS idx_image_cache_hash ON image_cache(dhash64);
-CREATE INDEX IF NOT EXISTS idx_ad_media_ad ON ad_media(ad_id);
-CREATE INDEX IF NOT EXISTS idx_ad_media_hash ON ad_media(dhash64);
-"""
-
 # =============================
 # Helpers
 # =============================
 
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
-
-def init_db():
-    db_path = get_db_path()
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(db_path))
-    conn.executescript(SCHEMA_SQL)
-    conn.close()
-    return db_path
+@lru_cache(maxsize=None)
+def _path_parts(path: str) -> Tuple[str, ...]:
+    return tuple(path.split("."))
 
 def first_present(item: Dict[str, Any], paths: List[str]) -> Any:
     for p in paths:
         val = item
-        for part in p.split("."):
+        for part in _path_parts(p):
             if isinstance(val, dict) and part in val:
                 val = val[part]
             elif isinstance(val, list) and part.isdigit() and int(part) < len(val):
@@ -240,9 +118,67 @@ def ingest_run(run_id: str, summary_path: Path, conn: sqlite3.Connection) -> Dic
     logger.info(f"Run {run_id} registrado.")
     return data
 
-def ingest_ads(run_id: str, jsonl_path: Path, conn: sqlite3.Connection):
+def parse_ad_record(ad_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extrae de un item del dataset los campos que persisten advertisers/ads/snapshots.
+    Compartido por la ingesta fila a fila y la ingesta bulk.
+    """
+    page_id = first_present(ad_data, ["pageId", "pageID", "page_id"])
+    if not page_id:
+        # Fallback weird cases
+        page_id = "unknown_" + str(first_present(ad_data, ["pageName", "page_name", "advertiser.name"]) or "")
+
+    cats = first_present(ad_data, ["snapshot.page_categories", "pageCategories", "page_categories"])
+    link_url = first_present(ad_data, ["snapshot.link_url"])
+
+    return {
+        "page_id": page_id,
+        "page_name": first_present(ad_data, ["snapshot.page_name", "page_name", "pageName", "advertiser.name"]),
+        "profile_uri": first_present(ad_data, ["snapshot.page_profile_uri", "page_profile_uri"]),
+        "like_count": first_present(ad_data, ["snapshot.page_like_count", "pageLikeCount", "page_like_count"]),
+        "cats_json": json.dumps(cats) if cats else None,
+        "ad_id": str(first_present(ad_data, ["adArchiveId", "adArchiveID", "ad_archive_id"])),
+        "is_active": first_present(ad_data, ["isActive", "is_active"]),
+        "start_date": first_present(ad_data, ["startDate", "start_date"]),
+        "end_date": first_present(ad_data, ["endDate", "end_date"]),
+        "link_url": link_url,
+        "domain": extract_domain(link_url),
+        "title": first_present(ad_data, ["snapshot.title"]),
+        "body_text": first_present(ad_data, ["snapshot.body.text"]),
+        "cta_type": first_present(ad_data, ["snapshot.cta_type"]),
+        "query_matched": ad_data.get("_query_matched"),
+        "intent_guess": ad_data.get("_intent_guess"),
+        "snapshot_hash": compute_snapshot_hash(ad_data),  # Hash for visual/content changes
+    }
+
+def iter_ad_records(jsonl_path: Path, ads: Optional[Iterable[Dict[str, Any]]] = None):
+    """ads: items ya parseados en memoria (pipeline.py); si es None se lee jsonl_path."""
+    if ads is not None:
+        for ad_data in ads:
+            yield parse_ad_record(ad_data)
+        return
+    with open_jsonl(jsonl_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                ad_data = json.loads(line)
+            except:
+                continue
+            yield parse_ad_record(ad_data)
+
+def add_timing(stats: Dict, rows: int, started: float) -> Dict:
+    elapsed = time.perf_counter() - started
+    stats["rows"] = rows
+    stats["elapsed_sec"] = round(elapsed, 3)
+    stats["rows_per_sec"] = round(rows / elapsed, 1) if elapsed > 0 else None
+    return stats
+
+def ingest_ads(run_id: str, jsonl_path: Path, conn: sqlite3.Connection, ads: Optional[Iterable[Dict[str, Any]]] = None):
     cur = conn.cursor()
-    
+    started = time.perf_counter()
+    rows = 0
+
     stats = {
         "new_advertisers": 0,
         "updated_advertisers": 0,
@@ -250,122 +186,269 @@ def ingest_ads(run_id: str, jsonl_path: Path, conn: sqlite3.Connection):
         "updated_ads": 0,
         "snapshots": 0
     }
-    
+
     timestamp_now = datetime.utcnow().isoformat() + "Z"
-    
-    with open(jsonl_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            
-            try:
-                ad_data = json.loads(line)
-            except:
-                continue
-                
-            # --- 1. Advertiser ---
-            page_id = first_present(ad_data, ["pageId", "pageID", "page_id"])
-            if not page_id:
-                # Fallback weird cases
-                page_id = "unknown_" + first_present(ad_data, ["pageName", "page_name", "advertiser.name"], "")
-            
-            page_name = first_present(ad_data, ["snapshot.page_name", "page_name", "pageName", "advertiser.name"])
-            profile_uri = first_present(ad_data, ["snapshot.page_profile_uri", "page_profile_uri"])
-            like_count = first_present(ad_data, ["snapshot.page_like_count", "pageLikeCount", "page_like_count"])
-            cats = first_present(ad_data, ["snapshot.page_categories", "pageCategories", "page_categories"])
-            cats_json = json.dumps(cats) if cats else None
-            
-            # Check exist
-            cur.execute("SELECT current_page_name, current_profile_uri FROM advertisers WHERE advertiser_id=?", (page_id,))
-            row = cur.fetchone()
-            
-            if not row:
-                # Insert New
+
+    for rec in iter_ad_records(jsonl_path, ads):
+        rows += 1
+
+        # --- 1. Advertiser ---
+        page_id = rec["page_id"]
+        page_name = rec["page_name"]
+        profile_uri = rec["profile_uri"]
+        like_count = rec["like_count"]
+        cats_json = rec["cats_json"]
+
+        # Check exist
+        cur.execute("SELECT current_page_name, current_profile_uri FROM advertisers WHERE advertiser_id=?", (page_id,))
+        row = cur.fetchone()
+
+        if not row:
+            # Insert New
+            cur.execute("""
+                INSERT INTO advertisers (advertiser_id, current_page_name, current_profile_uri, current_like_count, current_categories_json, first_seen_at, last_seen_at, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'active')
+            """, (page_id, page_name, profile_uri, like_count, cats_json, timestamp_now, timestamp_now))
+            stats["new_advertisers"] += 1
+
+            # History init
+            cur.execute("""
+                INSERT INTO advertiser_profile_history (advertiser_id, observed_at, page_name, profile_uri, like_count, categories_json)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (page_id, timestamp_now, page_name, profile_uri, like_count, cats_json))
+
+        else:
+            # Update existing
+            current_name, current_uri = row
+            stats["updated_advertisers"] += 1
+            cur.execute("UPDATE advertisers SET last_seen_at=?, status='active' WHERE advertiser_id=?", (timestamp_now, page_id))
+
+            # Check changes for history
+            if (page_name and page_name != current_name) or (profile_uri and profile_uri != current_uri):
                 cur.execute("""
-                    INSERT INTO advertisers (advertiser_id, current_page_name, current_profile_uri, current_like_count, current_categories_json, first_seen_at, last_seen_at, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, 'active')
-                """, (page_id, page_name, profile_uri, like_count, cats_json, timestamp_now, timestamp_now))
-                stats["new_advertisers"] += 1
-                
-                # History init
+                    UPDATE advertisers SET current_page_name=?, current_profile_uri=?, current_like_count=?, current_categories_json=?
+                    WHERE advertiser_id=?
+                """, (page_name, profile_uri, like_count, cats_json, page_id))
+
                 cur.execute("""
                     INSERT INTO advertiser_profile_history (advertiser_id, observed_at, page_name, profile_uri, like_count, categories_json)
                     VALUES (?, ?, ?, ?, ?, ?)
                 """, (page_id, timestamp_now, page_name, profile_uri, like_count, cats_json))
-                
-            else:
-                # Update existing
-                current_name, current_uri = row
-                stats["updated_advertisers"] += 1
-                cur.execute("UPDATE advertisers SET last_seen_at=?, status='active' WHERE advertiser_id=?", (timestamp_now, page_id))
-                
-                # Check changes for history
-                if (page_name and page_name != current_name) or (profile_uri and profile_uri != current_uri):
-                    cur.execute("""
-                        UPDATE advertisers SET current_page_name=?, current_profile_uri=?, current_like_count=?, current_categories_json=?
-                        WHERE advertiser_id=?
-                    """, (page_name, profile_uri, like_count, cats_json, page_id))
-                    
-                    cur.execute("""
-                        INSERT INTO advertiser_profile_history (advertiser_id, observed_at, page_name, profile_uri, like_count, categories_json)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (page_id, timestamp_now, page_name, profile_uri, like_count, cats_json))
-
-            # --- 2. Ads ---
-            ad_archive_id = str(first_present(ad_data, ["adArchiveId", "adArchiveID", "ad_archive_id"]))
-            # Basic fields
-            is_active = first_present(ad_data, ["isActive", "is_active"])
-            start_date = first_present(ad_data, ["startDate", "start_date"])
-            end_date = first_present(ad_data, ["endDate", "end_date"])
-            link_url = first_present(ad_data, ["snapshot.link_url"])
-            domain = extract_domain(link_url)
-            body_text = first_present(ad_data, ["snapshot.body.text"])
-            
-            snapshot_hash = compute_snapshot_hash(ad_data) # Hash for visual/content changes
-            
-            cur.execute("SELECT current_body_hash FROM ads WHERE ad_id=?", (ad_archive_id,))
-            ad_row = cur.fetchone()
-            
-            if not ad_row:
-                cur.execute("""
-                    INSERT INTO ads (ad_id, advertiser_id, first_seen_at, last_seen_at, current_is_active, current_link_url, current_domain, current_body_hash)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (ad_archive_id, page_id, timestamp_now, timestamp_now, is_active, link_url, domain, snapshot_hash))
-                stats["new_ads"] += 1
-            else:
-                cur.execute("""
-                    UPDATE ads SET last_seen_at=?, current_is_active=?, current_link_url=?, current_domain=?, current_body_hash=?
-                    WHERE ad_id=?
-                """, (timestamp_now, is_active, link_url, domain, snapshot_hash, ad_archive_id))
-                stats["updated_ads"] += 1
 
-            # --- 3. Snapshot ---
-            # Try/Except for UNIQUE constraint (run_id, ad_id) just in case dedup failed or rerun
-            try:
-                cur.execute("""
-                    INSERT INTO ad_snapshots (
-                        run_id, ad_id, observed_at, is_active, start_date, end_date, 
-                        link_url, domain, title, body_text, cta_type, 
-                        _query_matched, _intent_guess, snapshot_hash
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    run_id, ad_archive_id, timestamp_now, is_active, start_date, end_date,
-                    link_url, domain, 
-                    first_present(ad_data, ["snapshot.title"]),
-                    body_text,
-                    first_present(ad_data, ["snapshot.cta_type"]),
-                    ad_data.get("_query_matched"),
-                    ad_data.get("_intent_guess"),
-                    snapshot_hash
-                ))
-                stats["snapshots"] += 1
-            except sqlite3.IntegrityError:
-                pass # Already ingested for this run
-
-            # Commit batching could be optimized, but row-by-row for safety is fine for <5k rows
-            
+        # --- 2. Ads ---
+        ad_archive_id = rec["ad_id"]
+
+        cur.execute("SELECT current_body_hash FROM ads WHERE ad_id=?", (ad_archive_id,))
+        ad_row = cur.fetchone()
+
+        if not ad_row:
+            cur.execute("""
+                INSERT INTO ads (ad_id, advertiser_id, first_seen_at, last_seen_at, current_is_active, current_link_url, current_domain, current_body_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (ad_archive_id, page_id, timestamp_now, timestamp_now, rec["is_active"], rec["link_url"], rec["domain"], rec["snapshot_hash"]))
+            stats["new_ads"] += 1
+        else:
+            cur.execute("""
+                UPDATE ads SET last_seen_at=?, current_is_active=?, current_link_url=?, current_domain=?, current_body_hash=?
+                WHERE ad_id=?
+            """, (timestamp_now, rec["is_active"], rec["link_url"], rec["domain"], rec["snapshot_hash"], ad_archive_id))
+            stats["updated_ads"] += 1
+
+        # --- 3. Snapshot ---
+        # Try/Except for UNIQUE constraint (run_id, ad_id) just in case dedup failed or rerun
+        try:
+            cur.execute("""
+                INSERT INTO ad_snapshots (
+                    run_id, ad_id, observed_at, is_active, start_date, end_date,
+                    link_url, domain, title, body_text, cta_type,
+                    _query_matched, _intent_guess, snapshot_hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                run_id, ad_archive_id, timestamp_now, rec["is_active"], rec["start_date"], rec["end_date"],
+                rec["link_url"], rec["domain"],
+                rec["title"],
+                rec["body_text"],
+                rec["cta_type"],
+                rec["query_matched"],
+                rec["intent_guess"],
+                rec["snapshot_hash"]
+            ))
+            stats["snapshots"] += 1
+        except sqlite3.IntegrityError:
+            pass # Already ingested for this run
+
+        # Row-by-row is kept as the legacy path; large runs should use ingest_ads_bulk
+
     conn.commit()
-    return stats
+    return add_timing(stats, rows, started)
+
+# =============================
+# Bulk (set-based) Ingestion
+# =============================
+
+STAGING_COLUMNS = [
+    "page_id", "page_name", "profile_uri", "like_count", "cats_json",
+    "ad_id", "is_active", "start_date", "end_date", "link_url", "domain",
+    "title", "body_text", "cta_type", "query_matched", "intent_guess", "snapshot_hash",
+]
+
+STAGING_SQL = """
+DROP TABLE IF EXISTS temp.staging_advertisers;
+DROP TABLE IF EXISTS temp.staging_ads;
+CREATE TEMP TABLE staging_ads (
+    seq INTEGER PRIMARY KEY, -- orden de aparición en el jsonl
+    page_id TEXT,
+    page_name TEXT,
+    profile_uri TEXT,
+    like_count INTEGER,
+    cats_json TEXT,
+    ad_id TEXT,
+    is_active BOOLEAN,
+    start_date TEXT,
+    end_date TEXT,
+    link_url TEXT,
+    domain TEXT,
+    title TEXT,
+    body_text TEXT,
+    cta_type TEXT,
+    query_matched TEXT,
+    intent_guess TEXT,
+    snapshot_hash TEXT
+);
+CREATE INDEX temp.idx_staging_page ON staging_ads(page_id, seq);
+CREATE INDEX temp.idx_staging_ad ON staging_ads(ad_id, seq);
+"""
+
+# Replica el check fila a fila:
+# (page_name and page_name != current_name) or (profile_uri and profile_uri != current_uri)
+PROFILE_CHANGED_SQL = """(
+    ({new}.{name} IS NOT NULL AND {new}.{name} <> '' AND {new}.{name} IS NOT {old}.current_page_name)
+    OR ({new}.{uri} IS NOT NULL AND {new}.{uri} <> '' AND {new}.{uri} IS NOT {old}.current_profile_uri)
+)"""
+
+def ingest_ads_bulk(run_id: str, jsonl_path: Path, conn: sqlite3.Connection, ads: Optional[Iterable[Dict[str, Any]]] = None) -> Dict:
+    """
+    Ingesta set-based de dedup_ads.jsonl:
+    1) executemany del jsonl completo a la tabla TEMP staging_ads.
+    2) Reconciliación con INSERT ... SELECT / ON CONFLICT DO UPDATE en una sola transacción.
+
+    Devuelve el mismo dict de stats que ingest_ads (+ rows / elapsed_sec / rows_per_sec).
+    Diferencia con el modo fila a fila: si un anunciante cambia de perfil varias veces
+    dentro del mismo jsonl, se registra un único evento de historia (su primera fila del run).
+    """
+    started = time.perf_counter()
+    timestamp_now = datetime.utcnow().isoformat() + "Z"
+    params = {"ts": timestamp_now, "run_id": run_id}
+
+    conn.executescript(STAGING_SQL)
+    cur = conn.cursor()
+
+    try:
+        # IMMEDIATE: la transacción lee las tablas principales antes de escribirlas; con BEGIN diferido,
+        # un commit de otra conexión en el medio (media_hash en pipeline.py) la hace fallar al escribir
+        # sin esperar el busy_timeout
+        cur.execute("BEGIN IMMEDIATE")
+
+        # --- 0. Staging ---
+        cur.executemany(
+            f"INSERT INTO staging_ads ({', '.join(STAGING_COLUMNS)}) VALUES ({', '.join('?' * len(STAGING_COLUMNS))})",
+            (tuple(rec[c] for c in STAGING_COLUMNS) for rec in iter_ad_records(jsonl_path, ads)),
+        )
+        rows = cur.execute("SELECT COUNT(*) FROM staging_ads").fetchone()[0]
+
+        # Fila representativa por anunciante (primera aparición) + si ya existía antes del run
+        cur.execute("""
+            CREATE TEMP TABLE staging_advertisers AS
+            SELECT s.*, (a.advertiser_id IS NULL) AS is_new
+            FROM staging_ads s
+            JOIN (SELECT page_id, MIN(seq) AS seq FROM staging_ads GROUP BY page_id) f ON f.seq = s.seq
+            LEFT JOIN advertisers a ON a.advertiser_id = s.page_id
+        """)
+
+        new_advertisers = cur.execute("SELECT COUNT(*) FROM staging_advertisers WHERE is_new").fetchone()[0]
+        new_ads = cur.execute("""
+            SELECT COUNT(DISTINCT s.ad_id)
+            FROM staging_ads s
+            LEFT JOIN ads a ON a.ad_id = s.ad_id
+            WHERE a.ad_id IS NULL
+        """).fetchone()[0]
+
+        # --- 1. Advertisers ---
+        # History antes del upsert: compara contra el estado previo
+        changed = PROFILE_CHANGED_SQL.format(new="r", name="page_name", uri="profile_uri", old="a")
+        cur.execute(f"""
+            INSERT INTO advertiser_profile_history (advertiser_id, observed_at, page_name, profile_uri, like_count, categories_json)
+            SELECT r.page_id, :ts, r.page_name, r.profile_uri, r.like_count, r.cats_json
+            FROM staging_advertisers r
+            LEFT JOIN advertisers a ON a.advertiser_id = r.page_id
+            WHERE r.is_new OR {changed}
+            ORDER BY r.seq
+        """, params)
+
+        changed = PROFILE_CHANGED_SQL.format(new="excluded", name="current_page_name", uri="current_profile_uri", old="advertisers")
+        cur.execute(f"""
+            INSERT INTO advertisers (advertiser_id, current_page_name, current_profile_uri, current_like_count, current_categories_json, first_seen_at, last_seen_at, status)
+            SELECT page_id, page_name, profile_uri, like_count, cats_json, :ts, :ts, 'active'
+            FROM staging_advertisers
+            WHERE true
+            ON CONFLICT(advertiser_id) DO UPDATE SET
+                last_seen_at = excluded.last_seen_at,
+                status = 'active',
+                current_page_name = CASE WHEN {changed} THEN excluded.current_page_name ELSE advertisers.current_page_name END,
+                current_profile_uri = CASE WHEN {changed} THEN excluded.current_profile_uri ELSE advertisers.current_profile_uri END,
+                current_like_count = CASE WHEN {changed} THEN excluded.current_like_count ELSE advertisers.current_like_count END,
+                current_categories_json = CASE WHEN {changed} THEN excluded.current_categories_json ELSE advertisers.current_categories_json END
+        """, params)
+
+        # --- 2. Ads ---
+        # advertiser_id de la primera fila (solo se fija al insertar), estado actual de la última
+        cur.execute("""
+            INSERT INTO ads (ad_id, advertiser_id, first_seen_at, last_seen_at, current_is_active, current_link_url, current_domain, current_body_hash)
+            SELECT l.ad_id, f.page_id, :ts, :ts, l.is_active, l.link_url, l.domain, l.snapshot_hash
+            FROM (SELECT ad_id, MIN(seq) AS first_seq, MAX(seq) AS last_seq FROM staging_ads GROUP BY ad_id) g
+            JOIN staging_ads f ON f.seq = g.first_seq
+            JOIN staging_ads l ON l.seq = g.last_seq
+            WHERE true
+            ON CONFLICT(ad_id) DO UPDATE SET
+                last_seen_at = excluded.last_seen_at,
+                current_is_active = excluded.current_is_active,
+                current_link_url = excluded.current_link_url,
+                current_domain = excluded.current_domain,
+                current_body_hash = excluded.current_body_hash
+        """, params)
+
+        # --- 3. Snapshots ---
+        # UNIQUE(run_id, ad_id): gana la primera fila por ad; en un rerun se ignoran
+        cur.execute("""
+            INSERT OR IGNORE INTO ad_snapshots (
+                run_id, ad_id, observed_at, is_active, start_date, end_date,
+                link_url, domain, title, body_text, cta_type,
+                _query_matched, _intent_guess, snapshot_hash
+            )
+            SELECT :run_id, ad_id, :ts, is_active, start_date, end_date,
+                   link_url, domain, title, body_text, cta_type,
+                   query_matched, intent_guess, snapshot_hash
+            FROM staging_ads
+            ORDER BY seq
+        """, params)
+        snapshots = cur.rowcount
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.staging_advertisers")
+        conn.execute("DROP TABLE IF EXISTS temp.staging_ads")
+
+    stats = {
+        "new_advertisers": new_advertisers,
+        "updated_advertisers": rows - new_advertisers,
+        "new_ads": new_ads,
+        "updated_ads": rows - new_ads,
+        "snapshots": snapshots,
+    }
+    return add_timing(stats, rows, started)
 
 def update_advertiser_status(conn: sqlite3.Connection):
     """
@@ -386,6 +469,7 @@ def update_advertiser_status(conn: sqlite3.Connection):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--run-id", help="ID del run a ingestar (nombre de carpeta timestamp)", default=None)
+    parser.add_argument("--mode", choices=["bulk", "row"], default="bulk", help="bulk = staging + SQL set-based; row = fila a fila (legacy)")
     args = parser.parse_args()
     
     root_dir = Path(__file__).resolve().parent
@@ -408,19 +492,21 @@ def main():
     summary_path = run_dir / "summary.json"
     dedup_path = run_dir / "dedup_ads.jsonl"
     
-    if not summary_path.exists() or not dedup_path.exists():
+    if not summary_path.exists() or resolve_jsonl(dedup_path) is None:
         logger.error("Faltan archivos summary.json o dedup_ads.jsonl en el run dir")
         return
 
-    logger.info(f"Iniciando ingesta para Run ID: {run_id}")
+    logger.info(f"Iniciando ingesta para Run ID: {run_id} (modo: {args.mode})")
     
-    db_path = init_db()
-    conn = sqlite3.connect(str(db_path))
+    conn = connect()
     
     try:
         # Ingest
         ingest_run(run_id, summary_path, conn)
-        stats = ingest_ads(run_id, dedup_path, conn)
+        if args.mode == "bulk":
+            stats = ingest_ads_bulk(run_id, dedup_path, conn)
+        else:
+            stats = ingest_ads(run_id, dedup_path, conn)
         update_advertiser_status(conn)
         
         logger.info("Ingesta completada exitosamente.")
@@ -430,6 +516,7 @@ def main():
         report = {
             "ingested_at": datetime.utcnow().isoformat() + "Z",
             "run_id": run_id,
+            "mode": args.mode,
             "stats": stats
         }
         with open(run_dir / "ingest_report.json", "w") as f:
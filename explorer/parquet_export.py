@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/parquet_export.py
+
+Export columnar (Parquet) de los runs del explorer para análisis en pandas/pyarrow.
+
+- Un dataset por tabla (ad_snapshots, ad_extractions, product_observations), particionado estilo hive:
+    explorer/data/parquet/<tabla>/run_id=<run>/part-0.parquet
+  El directorio de la tabla ES el dataset de todos los runs: cada run exportado agrega (o reemplaza)
+  sólo su partición; --all exporta los runs que todavía no tienen partición (parquet_exports, v14).
+- Columnas de baja cardinalidad (category, domain, cta_type, _query_matched, ...) como dictionary.
+- Filas ordenadas por la columna de filtro principal (category / domain): en runs de más de
+  ROW_GROUP_SIZE filas las estadísticas min/max permiten saltar row groups al filtrar por category.
+  En runs chicos el filtro se evalúa por fila, pero sólo sobre las columnas pedidas.
+- product_observations se exporta desnormalizado con canonical_name/category/subcategory/score de
+  product_concepts (snapshot al momento del export).
+- Escritura atómica: la partición se arma en un directorio "_tmp_*" (ignorado por pyarrow.dataset)
+  y se renombra al final.
+
+Lectura (lazy, con pushdown de run_id/category):
+  from explorer.parquet_export import read_table
+  df = read_table("ad_extractions", columns=["ad_id", "category"],
+                  run_ids=["20260117_180851"], categories=["Hogar"]).to_pandas()
+
+Uso:
+  python explorer/parquet_export.py --run-id 20260117_180851
+  python explorer/parquet_export.py --all
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.llm_cache import now_iso
+
+# =============================
+# CONFIG
+# =============================
+
+PARQUET_ROOT = Path(__file__).resolve().parent / "data" / "parquet"
+ROW_GROUP_SIZE = 16_384
+COMPRESSION = "zstd"
+
+DICT = pa.dictionary(pa.int32(), pa.string())
+# run_id como dictionary también al leer: materializarlo como string por fila domina el scan
+PARTITIONING = ds.partitioning(pa.schema([("run_id", DICT)]), flavor="hive", dictionaries="infer")
+
+@dataclass
+class TableExport:
+    name: str
+    sql: str                 # un parámetro: run_id; columnas en el orden de schema
+    schema: pa.Schema        # sin run_id (va en la partición)
+    sort_by: List[str]
+
+EXPORTS: Dict[str, TableExport] = {t.name: t for t in [
+    TableExport(
+        "ad_snapshots",
+        """
+        SELECT id, ad_id, observed_at, is_active, start_date, end_date, link_url, domain, title, body_text,
+               cta_type, publisher_platform_json, _query_matched, _intent_guess, snapshot_hash
+        FROM ad_snapshots WHERE run_id = ?
+        """,
+        pa.schema([
+            ("id", pa.int64()), ("ad_id", pa.string()), ("observed_at", pa.string()), ("is_active", pa.bool_()),
+            ("start_date", pa.string()), ("end_date", pa.string()), ("link_url", pa.string()), ("domain", DICT),
+            ("title", pa.string()), ("body_text", pa.string()), ("cta_type", DICT),
+            ("publisher_platform_json", pa.string()), ("_query_matched", DICT), ("_intent_guess", DICT),
+            ("snapshot_hash", pa.string()),
+        ]),
+        ["domain", "ad_id"],
+    ),
+    TableExport(
+        "ad_extractions",
+        """
+        SELECT ad_id, product_name_guess, category, subcategory, signals_json, evidence_json, confidence
+        FROM ad_extractions WHERE run_id = ?
+        """,
+        pa.schema([
+            ("ad_id", pa.string()), ("product_name_guess", pa.string()), ("category", DICT), ("subcategory", DICT),
+            ("signals_json", pa.string()), ("evidence_json", pa.string()), ("confidence", pa.float64()),
+        ]),
+        ["category", "ad_id"],
+    ),
+    TableExport(
+        "product_observations",
+        """
+        SELECT o.product_id, p.canonical_name, p.category, p.subcategory, p.candidate_score,
+               o.ads_count, o.advertisers_count, o.avg_confidence, o.created_at
+        FROM product_observations o
+        LEFT JOIN product_concepts p ON p.product_id = o.product_id
+        WHERE o.run_id = ?
+        """,
+        pa.schema([
+            ("product_id", pa.string()), ("canonical_name", pa.string()), ("category", DICT), ("subcategory", DICT),
+            ("candidate_score", pa.float64()), ("ads_count", pa.int64()), ("advertisers_count", pa.int64()),
+            ("avg_confidence", pa.float64()), ("created_at", pa.string()),
+        ]),
+        ["category", "product_id"],
+    ),
+]}
+
+# =============================
+# Export
+# =============================
+
+def partition_dir(root: Path, table: str, run_id: str) -> Path:
+    # segment_encoding="uri" (default de pyarrow) decodifica el nombre al leer
+    return root / table / f"run_id={quote(run_id, safe='')}"
+
+def fetch_table(conn, spec: TableExport, run_id: str) -> pa.Table:
+    """SQLite -> Arrow columna a columna (sin pasar por un DataFrame)."""
+    rows = conn.execute(spec.sql, (run_id,)).fetchall()
+    cols = list(zip(*rows)) if rows else [()] * len(spec.schema)
+    plain = pa.schema([
+        pa.field(f.name, pa.string()) if pa.types.is_dictionary(f.type) else f for f in spec.schema
+    ])
+    # SQLite guarda los booleanos como 0/1 y Arrow no convierte int -> bool_
+    cols = [[None if x is None else bool(x) for x in v] if pa.types.is_boolean(f.type) else v
+            for f, v in zip(plain, cols)]
+    table = pa.Table.from_arrays([pa.array(v, type=f.type) for f, v in zip(plain, cols)], schema=plain)
+    if len(table):
+        # se ordena antes del dictionary encoding (Arrow no ordena columnas dictionary)
+        table = table.sort_by([(c, "ascending") for c in spec.sort_by])
+    return table.cast(spec.schema)
+
+def write_partition(table: pa.Table, root: Path, name: str, run_id: str) -> int:
+    final = partition_dir(root, name, run_id)
+    tmp = final.parent / f"_tmp_{final.name}_{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    pq.write_table(table, tmp / "part-0.parquet", row_group_size=ROW_GROUP_SIZE,
+                   compression=COMPRESSION, use_dictionary=True, write_statistics=True)
+    size = (tmp / "part-0.parquet").stat().st_size
+    if final.exists():
+        shutil.rmtree(final)
+    os.replace(tmp, final)
+    return size
+
+def export_run(conn, run_id: str, root: Optional[Path] = None, tables: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """Escribe (o reemplaza) la partición run_id de cada tabla. Devuelve filas por tabla."""
+    root = Path(root or PARQUET_ROOT)
+    stats = {}
+    for name in tables or EXPORTS:
+        table = fetch_table(conn, EXPORTS[name], run_id)
+        size = write_partition(table, root, name, run_id)
+        with conn:
+            conn.execute("""
+                INSERT INTO parquet_exports (table_name, run_id, rows, bytes, exported_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(table_name, run_id) DO UPDATE SET
+                    rows=excluded.rows, bytes=excluded.bytes, exported_at=excluded.exported_at
+            """, (name, run_id, len(table), size, now_iso()))
+        stats[name] = len(table)
+    return stats
+
+def pending_runs(conn, tables: Optional[Sequence[str]] = None) -> List[str]:
+    """Runs sin partición en alguna de las tablas (en orden cronológico)."""
+    names = list(tables or EXPORTS)
+    marks = ",".join("?" * len(names))
+    return [r[0] for r in conn.execute(f"""
+        SELECT r.run_id FROM runs r
+        LEFT JOIN parquet_exports e ON e.run_id = r.run_id AND e.table_name IN ({marks})
+        GROUP BY r.run_id
+        HAVING COUNT(e.table_name) < ?
+        ORDER BY MIN(r.timestamp), r.run_id
+    """, (*names, len(names)))]
+
+# =============================
+# Lectura
+# =============================
+
+def open_dataset(table: str, root: Optional[Path] = None) -> ds.Dataset:
+    """Dataset de todos los runs exportados de la tabla (lazy: no lee datos hasta el scan)."""
+    return ds.dataset(Path(root or PARQUET_ROOT) / table, format="parquet", partitioning=PARTITIONING)
+
+def read_table(
+    table: str,
+    columns: Optional[Sequence[str]] = None,
+    run_ids: Optional[Sequence[str]] = None,
+    categories: Optional[Sequence[str]] = None,
+    root: Optional[Path] = None,
+) -> pa.Table:
+    """
+    Lee sólo las columnas pedidas. run_ids poda particiones (directorios); categories filtra con
+    pushdown sobre las estadísticas de los row groups (tablas con columna category).
+    """
+    filt = None
+    if run_ids is not None:
+        filt = ds.field("run_id").isin(list(run_ids))
+    if categories is not None:
+        cond = ds.field("category").isin(list(categories))
+        filt = cond if filt is None else filt & cond
+    return open_dataset(table, root).to_table(columns=list(columns) if columns else None, filter=filt)
+
+def main():
+    from explorer.store import connect
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", default=None, help="Exporta (o re-exporta) un run")
+    parser.add_argument("--all", action="store_true", help="Exporta todos los runs sin partición")
+    parser.add_argument("--tables", default=None, help="Lista separada por comas (default: todas)")
+    parser.add_argument("--out", default=None, help=f"Directorio raíz (default: {PARQUET_ROOT})")
+    args = parser.parse_args()
+
+    tables = [t.strip() for t in args.tables.split(",")] if args.tables else list(EXPORTS)
+    unknown = set(tables) - set(EXPORTS)
+    if unknown:
+        parser.error(f"tablas desconocidas: {sorted(unknown)}")
+
+    conn = connect()
+    try:
+        if args.run_id:
+            run_ids = [args.run_id]
+        elif args.all:
+            run_ids = pending_runs(conn, tables)
+        else:
+            parser.error("--run-id o --all")
+
+        t = time.perf_counter()
+        stats = {"runs": len(run_ids), **{name: 0 for name in tables}}
+        for run_id in run_ids:
+            for name, n in export_run(conn, run_id, args.out, tables).items():
+                stats[name] += n
+        stats["elapsed_sec"] = round(time.perf_counter() - t, 3)
+        stats["root"] = str(args.out or PARQUET_ROOT)
+    finally:
+        conn.close()
+
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/pipeline.py
+
+Runner del explorer en un solo proceso. Ejecuta los agentes como un DAG con handoff en memoria,
+en lugar de encadenar los CLIs (cada uno re-leyendo el JSONL y reabriendo la DB):
+
+  [scrape] -> load -+-> memory ---------------------------------+-> product_grouper -> export_winners
+                    +-> media_hash -----------------------------+
+                    +-> extract -> extractions_ingest -> semantic_grouper
+                                                  \\-> advertiser_state (+ memory)
+
+- load: dedup_ads.jsonl(.zst) se parsea una sola vez; memory, media_hash y extract (incluido el
+  Pass 2 de visión) reciben la misma lista de dicts.
+- extract -> extractions_ingest: los resultados del Pass 1 pasan por un sink en memoria; en un resume
+  se les suma lo que ya estaba en ads_enriched.jsonl (el archivo sigue siendo el checkpoint).
+- Etapas sin dependencias pendientes corren a la vez en threads (media_hash y extract, las dos
+  limitadas por red). Cada etapa abre su propia conexión. WAL deja leer mientras otro escribe, pero
+  no serializa a dos writers: una transacción que leyó y después quiere escribir falla en el acto
+  (SQLITE_BUSY_SNAPSHOT, el busy_timeout no aplica) si otro commiteó en el medio. Las etapas que
+  reescriben tablas en bloque (product_grouper, advertiser_state) comparten lock="db" y run_dag
+  nunca las corre a la vez; además abren su fase de escritura con BEGIN IMMEDIATE. memory corre
+  junto a media_hash y extractions_ingest: su transacción bulk también arranca con BEGIN IMMEDIATE.
+- Cada etapa sigue siendo un CLI independiente; las opciones propias de una etapa se pasan con
+  --<etapa>-args "...", con la misma sintaxis que su CLI.
+- Reporte por etapa (status, wall time, filas) en <run_dir>/pipeline_report.json.
+
+Uso:
+  python explorer/pipeline.py --run-id 20260117_180851
+  python explorer/pipeline.py --scrape --scrape-args "--stream --shards 4"
+  python explorer/pipeline.py --run-id 20260117_180851 --skip media_hash --extract-args "--vision-pass"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logger import setup_logger
+from explorer import (
+    advertiser_state_agent,
+    export_winners,
+    extractions_ingest_agent,
+    extractor_agent,
+    media_hash_agent,
+    memory_agent,
+    product_grouper_agent,
+    scraper_runner,
+    semantic_grouper_agent,
+)
+from explorer.jsonl_io import iter_jsonl, resolve_jsonl
+from explorer.store import connect
+
+logger = setup_logger("Explorer_Pipeline")
+
+RUNS_DIR = Path(__file__).resolve().parent / "data" / "runs"
+
+# =============================
+# Contexto y etapas
+# =============================
+
+@dataclass
+class PipelineContext:
+    run_id: str
+    run_dir: Path
+    stage_args: Dict[str, List[str]]
+    ads: List[Dict[str, Any]] = field(default_factory=list)
+    # resultados del Extractor (None = la etapa extract no corrió; se lee ads_enriched.jsonl)
+    extractions: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def dedup_path(self) -> Path:
+        return self.run_dir / "dedup_ads.jsonl"
+
+    def argv(self, stage: str) -> List[str]:
+        return ["--run-id", self.run_id, *self.stage_args.get(stage, [])]
+
+# Una etapa devuelve (filas procesadas, stats del agente)
+StageFn = Callable[[PipelineContext], Tuple[int, Dict[str, Any]]]
+
+@dataclass
+class Stage:
+    name: str
+    fn: StageFn
+    deps: Tuple[str, ...] = ()
+    # etapas con el mismo lock no corren a la vez (writers en bloque sobre la misma DB)
+    lock: Optional[str] = None
+
+def stage_memory(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    conn = connect()
+    try:
+        memory_agent.ingest_run(ctx.run_id, ctx.run_dir / "summary.json", conn)
+        stats = memory_agent.ingest_ads_bulk(ctx.run_id, ctx.dedup_path, conn, ads=ctx.ads)
+        memory_agent.update_advertiser_status(conn)
+    finally:
+        conn.close()
+    return stats["rows"], stats
+
+def stage_media_hash(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    args = media_hash_agent.build_parser().parse_args(ctx.argv("media_hash"))
+    args.dedup_path = ctx.dedup_path
+    conn = connect()
+    try:
+        stats = asyncio.run(media_hash_agent.run_async(args, conn, ads=ctx.ads))
+    finally:
+        conn.close()
+    return stats["tasks_total"], stats
+
+def stage_extract(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    args = extractor_agent.build_parser().parse_args(ctx.argv("extract"))
+    rp = extractor_agent.get_run_paths(ctx.run_id)
+    rp.ads = ctx.ads
+    prior = list(iter_jsonl(rp.out_path)) if rp.out_path.exists() else []  # resume: ya escritos
+    sink: List[Dict[str, Any]] = []
+    stats = extractor_agent.run_extraction(args, rp, sink)
+    ctx.extractions = prior + sink
+    return len(sink), stats
+
+def stage_extractions_ingest(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    rows = ctx.extractions
+    if rows is None:
+        out_path = extractor_agent.get_run_paths(ctx.run_id).out_path
+        if not out_path.exists():
+            raise FileNotFoundError(f"No existe: {out_path}")
+        rows = iter_jsonl(out_path)
+    conn = connect()
+    try:
+        stats = extractions_ingest_agent.ingest_extractions(conn, ctx.run_id, rows)
+    finally:
+        conn.close()
+    return stats["updated"], stats
+
+def stage_semantic_grouper(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    stats = semantic_grouper_agent.main(ctx.argv("semantic_grouper"))
+    return stats["names"], stats
+
+def stage_product_grouper(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    stats = product_grouper_agent.main(ctx.argv("product_grouper"))
+    return stats["products_total"], stats
+
+def stage_advertiser_state(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    stats = advertiser_state_agent.main(ctx.argv("advertiser_state"))
+    return stats["advertisers"], stats
+
+def stage_export_winners(ctx: PipelineContext) -> Tuple[int, Dict[str, Any]]:
+    stats = export_winners.main(ctx.argv("export_winners"))
+    return stats["exported"], stats
+
+STAGES: List[Stage] = [
+    Stage("memory", stage_memory),
+    Stage("media_hash", stage_media_hash),
+    Stage("extract", stage_extract),
+    Stage("extractions_ingest", stage_extractions_ingest, ("extract",)),
+    Stage("semantic_grouper", stage_semantic_grouper, ("extractions_ingest",)),
+    Stage("product_grouper", stage_product_grouper, ("memory", "media_hash", "extractions_ingest", "semantic_grouper"),
+          lock="db"),
+    Stage("advertiser_state", stage_advertiser_state, ("memory", "extractions_ingest"), lock="db"),
+    Stage("export_winners", stage_export_winners, ("product_grouper",)),
+]
+
+# =============================
+# Ejecución
+# =============================
+
+def run_stage(stage: Stage, ctx: PipelineContext) -> Dict[str, Any]:
+    logger.info(f"[{stage.name}] inicio")
+    t = time.perf_counter()
+    rows, stats = stage.fn(ctx)
+    sec = round(time.perf_counter() - t, 3)
+    logger.info(f"[{stage.name}] ok en {sec}s ({rows} filas)")
+    return {"status": "ok", "sec": sec, "rows": rows, "stats": stats}
+
+def run_dag(stages: List[Stage], ctx: PipelineContext, skip: List[str], workers: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Lanza cada etapa en cuanto sus dependencias terminaron bien. Una etapa en --skip cuenta como
+    terminada (sus dependientes corren con lo que ya hay en la DB); si una etapa falla, sus
+    dependientes se marcan 'blocked' y el resto del DAG sigue. Una etapa lista espera si otra
+    con su mismo lock está corriendo.
+    """
+    report: Dict[str, Dict[str, Any]] = {s.name: {"status": "skipped"} for s in stages if s.name in skip}
+    ok = set(report)
+    running: Dict[Any, Stage] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="stage") as ex:
+        while True:
+            for stage in stages:
+                if stage.name in report or stage in running.values():
+                    continue
+                blocked = [d for d in stage.deps if d in report and d not in ok]
+                if blocked:
+                    report[stage.name] = {"status": "blocked", "blocked_by": blocked}
+                elif all(d in ok for d in stage.deps):
+                    if stage.lock and any(r.lock == stage.lock for r in running.values()):
+                        continue
+                    running[ex.submit(run_stage, stage, ctx)] = stage
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                stage = running.pop(fut)
+                try:
+                    report[stage.name] = fut.result()
+                    ok.add(stage.name)
+                except Exception as e:
+                    logger.error(f"[{stage.name}] falló: {e}")
+                    traceback.print_exc()
+                    report[stage.name] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    return {s.name: report[s.name] for s in stages}
+
+def latest_run_id() -> Optional[str]:
+    runs = sorted(d.name for d in RUNS_DIR.iterdir() if d.is_dir()) if RUNS_DIR.exists() else []
+    return runs[-1] if runs else None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", default=None, help="Run existente en data/runs (default: el último)")
+    parser.add_argument("--scrape", action="store_true", help="Correr scraper_runner primero y procesar el run nuevo")
+    parser.add_argument("--skip", nargs="*", default=[], choices=[s.name for s in STAGES])
+    parser.add_argument("--workers", type=int, default=3, help="Etapas concurrentes como máximo")
+    parser.add_argument("--scrape-args", default="", help="Opciones de scraper_runner.py")
+    for s in STAGES:
+        parser.add_argument(f"--{s.name.replace('_', '-')}-args", dest=f"{s.name}_args", default="",
+                            help=f"Opciones de la etapa {s.name} (sintaxis de su CLI, sin --run-id)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    prelude: Dict[str, Dict[str, Any]] = {}
+
+    run_id = args.run_id
+    if args.scrape:
+        t = time.perf_counter()
+        summary = scraper_runner.main(shlex.split(args.scrape_args))
+        run_id = summary["run_id"]
+        prelude["scrape"] = {"status": "ok", "sec": round(time.perf_counter() - t, 3),
+                             "rows": summary.get("dedup_count"), "stats": summary}
+    run_id = run_id or latest_run_id()
+    if not run_id:
+        parser.error("No hay runs en data/runs; usar --scrape o --run-id")
+
+    ctx = PipelineContext(
+        run_id=run_id,
+        run_dir=RUNS_DIR / run_id,
+        stage_args={s.name: shlex.split(getattr(args, f"{s.name}_args")) for s in STAGES},
+    )
+    if resolve_jsonl(ctx.dedup_path) is None:
+        raise FileNotFoundError(f"No existe: {ctx.dedup_path}")
+
+    # dedup parseado una sola vez para memory / media_hash / extract
+    t = time.perf_counter()
+    ctx.ads = list(iter_jsonl(ctx.dedup_path))
+    prelude["load"] = {"status": "ok", "sec": round(time.perf_counter() - t, 3), "rows": len(ctx.ads)}
+    logger.info(f"Pipeline run {run_id}: {len(ctx.ads)} ads en memoria")
+
+    stages = run_dag(STAGES, ctx, args.skip, args.workers)
+    report = {
+        "run_id": run_id,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+        # suma de wall times: la diferencia con elapsed_sec es lo que ganó la concurrencia
+        "stages_sum_sec": round(sum(s.get("sec", 0) for s in [*prelude.values(), *stages.values()]), 3),
+        "stages": {**prelude, **stages},
+    }
+    (ctx.run_dir / "pipeline_report.json").write_text(
+        json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+
+    summary = {k: v for k, v in report.items() if k != "stages"}
+    summary["stages"] = {name: {k: v for k, v in s.items() if k != "stats"} for name, s in report["stages"].items()}
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+    if any(s["status"] in ("failed", "blocked") for s in stages.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,19 @@
 import argparse
 import hashlib
 import json
+import os
 import sqlite3
+import sys
 import unicodedata
-from collections import Counter, defaultdict
+from collections import defaultdict
 from datetime import datetime
-from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-DB_NAME = "product_memory.db"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.store import connect
+from explorer.hash_index import group_hashes
+from explorer.rollups import refresh_rollups
+from explorer.trends import update_product_trends
 
 WEIGHTS = {
     "cod": 0.12,
@@ -28,60 +33,6 @@ def now_iso() -> str:
     from datetime import timezone
     return datetime.now(timezone.utc).isoformat()
 
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
-
-def ensure_schema(conn: sqlite3.Connection):
-    conn.executescript("""
-    CREATE TABLE IF NOT EXISTS product_concepts (
-      product_id TEXT PRIMARY KEY,
-      canonical_name TEXT,
-      category TEXT,
-      subcategory TEXT,
-      signals_json TEXT,
-      rationale_json TEXT,
-      candidate_score REAL,
-      first_seen_at TEXT,
-      last_seen_at TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS product_observations (
-      run_id TEXT,
-      product_id TEXT,
-      ads_count INTEGER,
-      advertisers_count INTEGER,
-      avg_confidence REAL,
-      created_at TEXT,
-      PRIMARY KEY (run_id, product_id)
-    );
-
-    CREATE TABLE IF NOT EXISTS ad_to_product (
-      run_id TEXT,
-      ad_id TEXT,
-      product_id TEXT,
-      advertiser_id TEXT,
-      match_basis TEXT,
-      confidence REAL,
-      created_at TEXT,
-      PRIMARY KEY (run_id, ad_id)
-    );
-
-    CREATE TABLE IF NOT EXISTS advertiser_product_state (
-      advertiser_id TEXT,
-      product_id TEXT,
-      first_seen_at TEXT,
-      last_seen_at TEXT,
-      last_run_id TEXT,
-      status TEXT,
-      PRIMARY KEY (advertiser_id, product_id)
-    );
-
-    CREATE INDEX IF NOT EXISTS idx_prod_obs_run ON product_observations(run_id);
-    CREATE INDEX IF NOT EXISTS idx_ad_to_product_prod ON ad_to_product(product_id);
-    CREATE INDEX IF NOT EXISTS idx_adv_prod_last ON advertiser_product_state(last_seen_at);
-    """)
-    conn.commit()
-
 def strip_accents(s: str) -> str:
     return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
 
@@ -112,166 +63,189 @@ def compute_candidate_score(avg_conf: float, signals: Dict[str, bool]) -> Tuple[
         score = 1.0
     return score, reasons
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--run-id", required=True)
-    args = ap.parse_args()
-
-    conn = sqlite3.connect(str(get_db_path()))
-    ensure_schema(conn)
-    cur = conn.cursor()
-
-    run_id = args.run_id
-    created_at = now_iso()
-
-    # 1) Cargar extracciones
-    cur.execute("""
-      SELECT ad_id, product_name_guess, category, subcategory, signals_json, evidence_json, confidence
-      FROM ad_extractions
-      WHERE run_id=?
-    """, (run_id,))
-    
-    rows = cur.fetchall()
-    if not rows:
-        print(f"No hay ad_extractions para run_id={run_id}. Primero ingesta Agent 2.")
-        return
-
-    extr = {row[0]: {
-        "product_name_guess": row[1] or "desconocido",
-        "category": row[2] or "Otros",
-        "subcategory": row[3] or "Otros",
-        "signals": json.loads(row[4]) if row[4] else {},
-        "evidence": json.loads(row[5]) if row[5] else {},
-        "confidence": float(row[6] or 0.0),
-    } for row in rows}
-
-    # 2) advertiser_id por ad_id (desde snapshots del run)
-    cur.execute("""
-      SELECT s.ad_id, a.advertiser_id, s.observed_at
-      FROM ad_snapshots s
+# =============================
+# Agregación set-based (tablas TEMP + GROUP BY en SQLite)
+# =============================
+#
+# pg_vhash   : ad_id -> dHash representante (group_hashes)
+# pg_names   : nombre crudo -> product_id por nombre (semántico -> ANN -> texto -> unknown) y nombre para el conteo
+# pg_map     : un registro por anuncio del run con snapshot: product_id final (vhash primero), match_basis,
+#              advertiser/observed_at y defaults ya aplicados (sin los JSON, que se leen en un solo pase)
+# pg_counts  : conteos por (producto, nombre, categoría, subcategoría) para los "más frecuentes"
+# pg_products: agregados por producto
+#
+# Orden de recorrido = ad_id (índice UNIQUE(run_id, ad_id) de ad_extractions), igual que la versión con
+# Counters: desempates de "más frecuente" y orden de señales/evidencias = primera aparición por ad_id.
+
+NAME_SQL = "COALESCE(NULLIF(e.product_name_guess, ''), 'desconocido')"
+
+def stage_vhash(conn, ad_hash: Dict[str, str]):
+    conn.execute("DROP TABLE IF EXISTS temp.pg_vhash")
+    conn.execute("CREATE TEMP TABLE pg_vhash (ad_id TEXT PRIMARY KEY, vhash TEXT) WITHOUT ROWID")
+    conn.executemany("INSERT INTO pg_vhash (ad_id, vhash) VALUES (?, ?)", ad_hash.items())
+
+def names_without_vhash(conn, run_id: str) -> List[str]:
+    """Nombres de anuncios (con snapshot) que no se resuelven por vhash."""
+    return [r[0] for r in conn.execute(f"""
+      SELECT DISTINCT {NAME_SQL}
+      FROM ad_extractions e
+      JOIN ad_snapshots s ON s.run_id = e.run_id AND s.ad_id = e.ad_id
+      LEFT JOIN pg_vhash v ON v.ad_id = e.ad_id
+      WHERE e.run_id = ? AND v.ad_id IS NULL
+    """, (run_id,))]
+
+def stage_names(conn, run_id: str, sem_map: Dict[str, Tuple[str, str]], ann_map: Dict[str, str]):
+    """Resuelve cada nombre único una sola vez (normalize_product_name/sha1 en Python, no por anuncio)."""
+    rows = []
+    for (name,) in conn.execute(f"SELECT DISTINCT {NAME_SQL} FROM ad_extractions e WHERE e.run_id = ?", (run_id,)).fetchall():
+        if name in sem_map:
+            product_id, canon = sem_map[name]
+            rows.append((name, product_id, "semantic", canon))
+        elif name in ann_map:
+            rows.append((name, ann_map[name], "ann_name", name))
+        else:
+            norm_name = normalize_product_name(name)
+            if norm_name != "desconocido":
+                rows.append((name, f"text_{stable_product_id(norm_name)}", "text_name", name))
+            else:
+                rows.append((name, "unknown_cluster", "unknown", name))
+    conn.execute("DROP TABLE IF EXISTS temp.pg_names")
+    conn.execute("CREATE TEMP TABLE pg_names (raw_name TEXT PRIMARY KEY, product_id TEXT, basis TEXT, counter_name TEXT) WITHOUT ROWID")
+    conn.executemany("INSERT INTO pg_names VALUES (?, ?, ?, ?)", rows)
+
+def stage_map(conn, run_id: str, created_at: str) -> int:
+    conn.execute("DROP TABLE IF EXISTS temp.pg_map")
+    conn.execute(f"""
+      CREATE TEMP TABLE pg_map AS
+      SELECT
+        e.ad_id,
+        CASE WHEN v.vhash IS NOT NULL THEN 'vhash_' || v.vhash ELSE n.product_id END AS product_id,
+        CASE WHEN v.vhash IS NOT NULL THEN 'video_hash' ELSE n.basis END AS basis,
+        CASE WHEN v.vhash IS NOT NULL THEN n.raw_name ELSE n.counter_name END AS counter_name,
+        COALESCE(NULLIF(e.category, ''), 'Otros') AS category,
+        COALESCE(NULLIF(e.subcategory, ''), 'Otros') AS subcategory,
+        COALESCE(e.confidence, 0.0) AS confidence,
+        a.advertiser_id,
+        COALESCE(NULLIF(s.observed_at, ''), ?) AS observed_at
+      FROM ad_extractions e
+      JOIN ad_snapshots s ON s.run_id = e.run_id AND s.ad_id = e.ad_id
       JOIN ads a ON a.ad_id = s.ad_id
-      WHERE s.run_id=?
-    """, (run_id,))
-    ad_meta = {row[0]: {"advertiser_id": row[1], "observed_at": row[2]} for row in cur.fetchall()}
-
-    # 3) dhash por ad_id (si existe)
-    cur.execute("SELECT ad_id, dhash64 FROM ad_media WHERE run_id=?", (run_id,))
-    ad_hash = {}
-    for ad_id, dh in cur.fetchall():
-        # si hay varios, nos quedamos con el primero que llegue
-        if ad_id not in ad_hash and dh:
-            ad_hash[ad_id] = dh
-
-    # 3.5) Load Semantic Map (if exists)
-    sem_map = {} # name -> (cluster_id, canonical_name)
-    try:
-        cur.execute("SELECT original_name, cluster_id, canonical_name FROM semantic_map WHERE run_id=?", (run_id,))
-        for row in cur.fetchall():
-            sem_map[row[0]] = (row[1], row[2])
-    except sqlite3.OperationalError:
-        # Table might not exist if semantic_grouper wasn't run
-        pass
-
-    # 4) Agregación
-    agg = {}
-    for ad_id, e in extr.items():
-        meta = ad_meta.get(ad_id)
-        if not meta:
+      JOIN pg_names n ON n.raw_name = {NAME_SQL}
+      LEFT JOIN pg_vhash v ON v.ad_id = e.ad_id
+      WHERE e.run_id = ?
+    """, (created_at, run_id))
+    conn.execute("CREATE UNIQUE INDEX temp.idx_pg_map_ad ON pg_map(ad_id)")
+    return conn.execute("SELECT COUNT(*) FROM pg_map").fetchone()[0]
+
+def mode_by_product(conn, column: str) -> Dict[str, str]:
+    """Valor más frecuente de column por producto (desempate: primer ad_id), sobre pg_counts."""
+    return dict(conn.execute(f"""
+      SELECT product_id, v FROM (
+        SELECT product_id, v, ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY n DESC, first_ad) AS rk
+        FROM (SELECT product_id, {column} AS v, SUM(n) AS n, MIN(first_ad) AS first_ad
+              FROM pg_counts GROUP BY product_id, {column})
+      ) WHERE rk = 1
+    """).fetchall())
+
+def fold_signals(conn, run_id: str) -> Tuple[Dict[str, Dict[str, bool]], Dict[str, Dict[str, list]]]:
+    """
+    OR de señales en True y hasta 2 evidencias por anuncio/señal (sin repetidos), por producto.
+    Un solo pase por los JSON en orden de ad_id (json.loads en C; json_each de SQLite re-parsea por señal).
+    signals_json son pocas combinaciones de booleanos: las keys en True se parsean una vez por string.
+    """
+    signals: Dict[str, Dict[str, bool]] = defaultdict(dict)
+    evidence: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+    true_keys: Dict[str, Tuple[str, ...]] = {}
+    for product_id, signals_json, evidence_json in conn.execute("""
+      SELECT m.product_id, e.signals_json, e.evidence_json
+      FROM ad_extractions e
+      JOIN pg_map m ON m.ad_id = e.ad_id
+      WHERE e.run_id = ? AND e.signals_json IS NOT NULL AND e.signals_json <> ''
+      ORDER BY e.ad_id
+    """, (run_id,)):
+        keys = true_keys.get(signals_json)
+        if keys is None:
+            keys = true_keys[signals_json] = tuple(k for k, v in (json.loads(signals_json) or {}).items() if v is True)
+        if not keys:
             continue
-
-        norm_name = normalize_product_name(e["product_name_guess"])
-        raw_name = e["product_name_guess"]
-        
-        # Lógica de agrupación HÍBRIDA v2.0
-        # 1. Visual Hash (strongest)
-        if ad_id in ad_hash:
-            product_id = f"vhash_{ad_hash[ad_id]}"
-        # 2. Semantic Cluster (new)
-        elif raw_name in sem_map:
-            cid, canon = sem_map[raw_name]
-            product_id = f"sem_{cid}"
-            # Upgrade the name for the counter to align with semantic canonical
-            e["product_name_guess"] = canon 
-        # 3. Fallback: Text Normalization
-        elif norm_name != "desconocido":
-            product_id = f"text_{stable_product_id(norm_name)}"
-        # 4. Unknown
-        else:
-            product_id = "unknown_cluster"
-
-        if product_id not in agg:
-            agg[product_id] = {
-                "name_counter": Counter(),
-                "cat_counter": Counter(),
-                "sub_counter": Counter(),
-                "signals_or": defaultdict(bool),
-                "conf_sum": 0.0,
-                "conf_n": 0,
-                "ads_count": 0,
-                "advertisers": set(),
-                "first_seen": meta["observed_at"],
-                "last_seen": meta["observed_at"],
-                "evidence_samples": defaultdict(list),
-            }
-
-        g = agg[product_id]
-        g["name_counter"][e["product_name_guess"]] += 1
-        g["cat_counter"][e["category"]] += 1
-        g["sub_counter"][e["subcategory"]] += 1
-        for k, v in (e["signals"] or {}).items():
-            if v is True:
-                g["signals_or"][k] = True
-                # guardar 1-2 evidencias por señal
-                spans = (e["evidence"] or {}).get(k) or []
-                for sp in spans[:2]:
-                    if sp and sp not in g["evidence_samples"][k]:
-                        g["evidence_samples"][k].append(sp)
-
-        g["conf_sum"] += float(e["confidence"] or 0.0)
-        g["conf_n"] += 1
-        g["ads_count"] += 1
-        g["advertisers"].add(meta["advertiser_id"])
-        
-        # Guard against None dates
-        obs_at = meta["observed_at"] or created_at
-        if g["first_seen"] is None: g["first_seen"] = obs_at
-        if g["last_seen"] is None: g["last_seen"] = obs_at
-        
-        if obs_at < g["first_seen"]:
-            g["first_seen"] = obs_at
-        if obs_at > g["last_seen"]:
-            g["last_seen"] = obs_at
-
-    # 5) Persistir: product_concepts + observations + mappings + advertiser_product_state
-    concepts_upserted = 0
-    obs_upserted = 0
-    mappings_upserted = 0
-    adv_states_upserted = 0
-
-    for product_id, g in agg.items():
-        canonical_name = g["name_counter"].most_common(1)[0][0]
-        category = g["cat_counter"].most_common(1)[0][0]
-        subcategory = g["sub_counter"].most_common(1)[0][0]
-        signals = {k: bool(v) for k, v in g["signals_or"].items()}
-        avg_conf = (g["conf_sum"] / g["conf_n"]) if g["conf_n"] else 0.0
-        candidate_score, reasons = compute_candidate_score(avg_conf, signals)
-
-        rationale = {
-            "reasons": reasons,
-            "evidence": {k: v for k, v in g["evidence_samples"].items()},
-            "avg_confidence": avg_conf,
-            "ads_count": g["ads_count"],
-            "advertisers_count": len(g["advertisers"]),
-        }
-
-        # upsert product_concepts
-        cur.execute("SELECT first_seen_at FROM product_concepts WHERE product_id=?", (product_id,))
-        row = cur.fetchone()
-        first_seen = g["first_seen"]
-        if row and row[0]:
-            first_seen = min(row[0], first_seen)
-
-        cur.execute("""
+        ev = (json.loads(evidence_json) if evidence_json else {}) or {}
+        g_sig, g_ev = signals[product_id], evidence[product_id]
+        for k in keys:
+            g_sig[k] = True
+            # guardar 1-2 evidencias por señal
+            for sp in (ev.get(k) or [])[:2]:
+                if sp and sp not in g_ev[k]:
+                    g_ev[k].append(sp)
+    return signals, evidence
+
+def aggregate_products(conn, run_id: str) -> List[Dict[str, Any]]:
+    conn.execute("DROP TABLE IF EXISTS temp.pg_products")
+    conn.execute("""
+      CREATE TEMP TABLE pg_products AS
+      SELECT
+        product_id,
+        COUNT(*) AS ads_count,
+        COUNT(DISTINCT advertiser_id) + MAX(advertiser_id IS NULL) AS advertisers_count,
+        SUM(confidence) AS conf_sum,
+        MIN(observed_at) AS first_seen,
+        MAX(observed_at) AS last_seen
+      FROM pg_map
+      GROUP BY product_id
+    """)
+    conn.execute("DROP TABLE IF EXISTS temp.pg_counts")
+    conn.execute("""
+      CREATE TEMP TABLE pg_counts AS
+      SELECT product_id, counter_name, category, subcategory, COUNT(*) AS n, MIN(ad_id) AS first_ad
+      FROM pg_map
+      GROUP BY product_id, counter_name, category, subcategory
+    """)
+    names = mode_by_product(conn, "counter_name")
+    cats = mode_by_product(conn, "category")
+    subs = mode_by_product(conn, "subcategory")
+    signals, evidence = fold_signals(conn, run_id)
+
+    products = []
+    for product_id, ads_count, advertisers_count, conf_sum, first_seen, last_seen in conn.execute(
+        "SELECT product_id, ads_count, advertisers_count, conf_sum, first_seen, last_seen FROM pg_products"
+    ):
+        avg_conf = (conf_sum / ads_count) if ads_count else 0.0
+        sigs = signals.get(product_id, {})
+        candidate_score, reasons = compute_candidate_score(avg_conf, sigs)
+        products.append({
+            "product_id": product_id,
+            "canonical_name": names[product_id],
+            "category": cats[product_id],
+            "subcategory": subs[product_id],
+            "signals": sigs,
+            "candidate_score": candidate_score,
+            "rationale": {
+                "reasons": reasons,
+                "evidence": {k: v for k, v in evidence.get(product_id, {}).items()},
+                "avg_confidence": avg_conf,
+                "ads_count": ads_count,
+                "advertisers_count": advertisers_count,
+            },
+            "avg_conf": avg_conf,
+            "ads_count": ads_count,
+            "advertisers_count": advertisers_count,
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+        })
+    return products
+
+def persist(conn, run_id: str, created_at: str, products: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    product_concepts + observations (executemany) y mappings/advertiser_product_state (INSERT ... SELECT), una transacción.
+    Se cierra antes la transacción implícita de las tablas temp (su snapshot de lectura haría fallar
+    el primer INSERT si otro writer commiteó) y la escritura arranca con BEGIN IMMEDIATE, que sí
+    espera el busy_timeout.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # first_seen_at sólo se escribe al insertar (el upsert no lo toca)
+        conn.executemany("""
           INSERT INTO product_concepts (
             product_id, canonical_name, category, subcategory,
             signals_json, rationale_json, candidate_score,
@@ -285,17 +259,15 @@ def main():
             rationale_json=excluded.rationale_json,
             candidate_score=excluded.candidate_score,
             last_seen_at=excluded.last_seen_at
-        """, (
-            product_id, canonical_name, category, subcategory,
-            json.dumps(signals, ensure_ascii=False),
-            json.dumps(rationale, ensure_ascii=False),
-            float(candidate_score),
-            first_seen, g["last_seen"]
-        ))
-        concepts_upserted += 1
-
-        # observation por run
-        cur.execute("""
+        """, [(
+            p["product_id"], p["canonical_name"], p["category"], p["subcategory"],
+            json.dumps(p["signals"], ensure_ascii=False),
+            json.dumps(p["rationale"], ensure_ascii=False),
+            float(p["candidate_score"]),
+            p["first_seen"], p["last_seen"],
+        ) for p in products])
+
+        conn.executemany("""
           INSERT INTO product_observations (
             run_id, product_id, ads_count, advertisers_count, avg_confidence, created_at
           ) VALUES (?, ?, ?, ?, ?, ?)
@@ -303,70 +275,149 @@ def main():
             ads_count=excluded.ads_count,
             advertisers_count=excluded.advertisers_count,
             avg_confidence=excluded.avg_confidence
-        """, (
-            run_id, product_id, g["ads_count"], len(g["advertisers"]), float(avg_conf), created_at
-        ))
-        obs_upserted += 1
-
-        # advertiser_product_state
-        for adv_id in g["advertisers"]:
-            cur.execute("SELECT first_seen_at FROM advertiser_product_state WHERE advertiser_id=? AND product_id=?", (adv_id, product_id))
-            r = cur.fetchone()
-            adv_first = g["first_seen"]
-            if r and r[0]:
-                adv_first = min(r[0], adv_first)
-
-            cur.execute("""
-              INSERT INTO advertiser_product_state (
-                advertiser_id, product_id, first_seen_at, last_seen_at, last_run_id, status
-              ) VALUES (?, ?, ?, ?, ?, ?)
-              ON CONFLICT(advertiser_id, product_id) DO UPDATE SET
-                last_seen_at=excluded.last_seen_at,
-                last_run_id=excluded.last_run_id,
-                status=excluded.status
-            """, (adv_id, product_id, adv_first, g["last_seen"], run_id, "active"))
-            adv_states_upserted += 1
-
-    # ad_to_product mapping (por ad)
-    for ad_id, e in extr.items():
-        meta = ad_meta.get(ad_id)
-        if not meta:
-            continue
-        norm_name = normalize_product_name(e["product_name_guess"])
-        
-        # Misma logica hibrida
-        if ad_id in ad_hash:
-            product_id = f"vhash_{ad_hash[ad_id]}"
-            basis = "video_hash"
-        elif norm_name != "desconocido":
-            product_id = f"text_{stable_product_id(norm_name)}"
-            basis = "text_name"
-        else:
-            product_id = "unknown_cluster"
-            basis = "unknown"
-
-        cur.execute("""
+        """, [(run_id, p["product_id"], p["ads_count"], p["advertisers_count"], float(p["avg_conf"]), created_at)
+              for p in products])
+
+        adv_states = conn.execute("""
+          INSERT INTO advertiser_product_state (
+            advertiser_id, product_id, first_seen_at, last_seen_at, last_run_id, status
+          )
+          SELECT DISTINCT m.advertiser_id, m.product_id, g.first_seen, g.last_seen, ?, 'active'
+          FROM pg_map m JOIN pg_products g ON g.product_id = m.product_id
+          WHERE true
+          ORDER BY m.advertiser_id, m.product_id
+          ON CONFLICT(advertiser_id, product_id) DO UPDATE SET
+            last_seen_at=excluded.last_seen_at,
+            last_run_id=excluded.last_run_id,
+            status=excluded.status
+        """, (run_id,)).rowcount
+
+        mappings = conn.execute("""
           INSERT INTO ad_to_product (run_id, ad_id, product_id, advertiser_id, match_basis, confidence, created_at)
-          VALUES (?, ?, ?, ?, ?, ?, ?)
+          SELECT ?, ad_id, product_id, advertiser_id, basis, confidence, ?
+          FROM pg_map
+          WHERE true
+          ORDER BY ad_id
           ON CONFLICT(run_id, ad_id) DO UPDATE SET
             product_id=excluded.product_id,
             advertiser_id=excluded.advertiser_id,
             match_basis=excluded.match_basis,
             confidence=excluded.confidence
-        """, (run_id, ad_id, product_id, meta["advertiser_id"], basis, float(e["confidence"] or 0.0), created_at))
-        mappings_upserted += 1
+        """, (run_id, created_at)).rowcount
+
+    return {
+        "concepts_upserted": len(products),
+        "observations_upserted": len(products),
+        "mappings_upserted": mappings,
+        "adv_states_upserted": adv_states,
+    }
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--run-id", required=True)
+    ap.add_argument("--vhash-k", type=int, default=4, help="Distancia Hamming máx. para unir dHash en un mismo producto (0 = solo idénticos)")
+    ap.add_argument("--ann-min-score", type=float, default=None, help="Nombres sin vhash ni cluster semántico -> producto histórico más parecido (índice ANN) si coseno >= score")
+    ap.add_argument("--ann-sync", action="store_true", help="Al terminar, sincronizar el índice ANN de productos (product_index.py)")
+    args = ap.parse_args(argv)
+
+    conn = connect()
+    cur = conn.cursor()
+
+    run_id = args.run_id
+    created_at = now_iso()
+
+    # 1) Extracciones del run
+    if not cur.execute("SELECT 1 FROM ad_extractions WHERE run_id=? LIMIT 1", (run_id,)).fetchone():
+        print(f"No hay ad_extractions para run_id={run_id}. Primero ingesta Agent 2.")
+        conn.close()
+        return {"run_id": run_id, "products_total": 0}
 
-    conn.commit()
+    # 2) dhash por ad_id (si existe)
+    cur.execute("SELECT ad_id, dhash64 FROM ad_media WHERE run_id=?", (run_id,))
+    ad_hash = {}
+    for ad_id, dh in cur.fetchall():
+        # si hay varios, nos quedamos con el primero que llegue
+        if ad_id not in ad_hash and dh:
+            ad_hash[ad_id] = dh
+
+    # 2.1) Unir dHash cercanos (re-encodes / recortes del mismo creativo) en un representante.
+    # Se prefieren hashes que ya son product_id (vhash_*) para mantener el id entre runs.
+    if ad_hash and args.vhash_k > 0:
+        cur.execute("SELECT substr(product_id, 7) FROM product_concepts WHERE product_id LIKE 'vhash\\_%' ESCAPE '\\'")
+        known = [row[0] for row in cur.fetchall()]
+        rep = group_hashes(ad_hash.values(), args.vhash_k, preferred=known)
+        ad_hash = {ad_id: rep.get(dh, dh) for ad_id, dh in ad_hash.items()}
+    vhash_groups = len(set(ad_hash.values()))
+    stage_vhash(conn, ad_hash)
+
+    # 3) Load Semantic Map (if exists)
+    # name -> (product_id, canonical_name). Los labels de --mode full son locales al run (sem_*) y los
+    # cluster_id de --mode incremental son de semantic_clusters (semc_*): mismo número, distinto cluster.
+    sem_map = {}
+    try:
+        cur.execute("SELECT original_name, cluster_id, canonical_name, persistent FROM semantic_map WHERE run_id=?", (run_id,))
+        for row in cur.fetchall():
+            sem_map[row[0]] = (f"{'semc' if row[3] else 'sem'}_{row[1]}", row[2])
+    except sqlite3.OperationalError:
+        # Table might not exist if semantic_grouper wasn't run
+        pass
+
+    # 3.1) Nombres que caerían en text_* -> producto histórico más parecido (índice ANN, opt-in)
+    ann_map = {}  # name -> product_id
+    if args.ann_min_score is not None:
+        from explorer.embedding_store import EmbeddingStore
+        from explorer.product_index import open_index, openai_embed_fn
+        pending = sorted(
+            name for name in names_without_vhash(conn, run_id)
+            if name not in sem_map and normalize_product_name(name) != "desconocido"
+        )
+        index = open_index(conn)
+        if pending and index is not None and index.exists():
+            X = EmbeddingStore(conn, index.model).get_or_embed(pending, openai_embed_fn(), run_id)
+            for name, hits in zip(pending, index.search(X, 1, args.ann_min_score)):
+                if hits:
+                    ann_map[name] = hits[0]["product_id"]
+
+    # 4) Resolución HÍBRIDA v2.0 por anuncio (advertiser_id / observed_at desde snapshots del run):
+    #    vhash -> semántico -> ANN -> texto -> unknown
+    stage_names(conn, run_id, sem_map, ann_map)
+    stage_map(conn, run_id, created_at)
+
+    # 5) Agregación (GROUP BY sobre pg_map)
+    products = aggregate_products(conn, run_id)
+
+    # 6) Persistir: product_concepts + observations + mappings + advertiser_product_state
+    written = persist(conn, run_id, created_at, products)
+
+    # 7) Rollups del run para los dashboards (search tags, primera imagen, anunciantes)
+    rollup_stats = {f"rollup_{k}": v for k, v in refresh_rollups(conn, run_id).items()}
+
+    # 8) Tendencias: ventana de runs anteriores -> product_trends del run
+    trend_stats = update_product_trends(conn, run_id)
+
+    ann_stats = {"ann_matched_names": len(ann_map)} if args.ann_min_score is not None else {}
+    if args.ann_sync:
+        from explorer.embedding_store import EmbeddingStore
+        from explorer.product_index import open_index, openai_embed_fn, sync_index
+        index = open_index(conn)
+        if index is not None:
+            ann_stats.update(sync_index(conn, index, EmbeddingStore(conn, index.model), openai_embed_fn(), run_id))
+        else:
+            ann_stats["ann_sync_skipped"] = True
     conn.close()
 
-    print(json.dumps({
+    stats = {
         "run_id": run_id,
-        "products_total": len(agg),
-        "concepts_upserted": concepts_upserted,
-        "observations_upserted": obs_upserted,
-        "mappings_upserted": mappings_upserted,
-        "adv_states_upserted": adv_states_upserted,
-    }, ensure_ascii=False, indent=2))
+        "products_total": len(products),
+        "vhash_k": args.vhash_k,
+        "vhash_groups": vhash_groups,
+        **written,
+        **rollup_stats,
+        **trend_stats,
+        **ann_stats,
+    }
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return stats
 
 if __name__ == "__main__":
     main()
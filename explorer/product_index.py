@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/product_index.py
+
+Índice ANN (kNN por coseno) sobre los embeddings de canonical_name de todos los product_concepts.
+
+- Colección qdrant por modelo de embeddings. Modo local en disco (store/qdrant/ junto a la DB, sin
+  servidor) o, si QDRANT_URL está definido, un servidor qdrant (HNSW; permite varios procesos a la vez:
+  el modo local toma un lock exclusivo sobre el directorio).
+- Los vectores salen del EmbeddingStore (embedding_store.py): re-sincronizar o consultar un nombre ya
+  visto no llama a la API.
+- product_ann (migración v12) registra nombre/categoría indexados; sync_index() sólo sube productos
+  nuevos o renombrados y borra los que ya no están en product_concepts.
+- similar_products(name, k): API para el grouper y los dashboards (sólo lectura sobre el EmbeddingStore).
+- open_index(): si otro proceso tiene tomado el modo local, el grouper sigue sin ANN (los productos
+  quedan pendientes en product_ann para el próximo sync) en vez de fallar.
+
+Uso:
+  from explorer.product_index import similar_products
+  similar_products("faja colombiana reductora", k=10)
+
+  python explorer/product_index.py --sync
+  python explorer/product_index.py --query "faja reductora" --k 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.embedding_store import EmbeddingStore, db_dir, model_slug
+from explorer.llm_cache import now_iso
+
+EMBEDDING_MODEL = "text-embedding-3-small"  # mismo modelo que semantic_grouper_agent
+UPSERT_BATCH = 1000
+QUERY_BATCH = 256
+
+def point_id(product_id: str) -> str:
+    # qdrant sólo acepta int/UUID como id: UUID determinista por product_id
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, product_id))
+
+def openai_embed_fn() -> Callable[[List[str]], np.ndarray]:
+    """embed_fn perezoso: el cliente OpenAI se crea sólo si hay un miss en el EmbeddingStore."""
+    client = None
+
+    def embed(texts: List[str]) -> np.ndarray:
+        nonlocal client
+        from explorer.semantic_grouper_agent import get_embeddings
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        return get_embeddings(client, texts)
+
+    return embed
+
+# =============================
+# Index
+# =============================
+
+class ProductIndex:
+    """
+    Uso:
+        idx = ProductIndex.open(conn)
+        idx.upsert(product_ids, X, payloads)
+        hits = idx.search(X, k)        # por fila: [{"product_id", "canonical_name", "category", "score"}]
+    """
+
+    def __init__(self, client, model: str = EMBEDDING_MODEL):
+        self.client = client
+        self.model = model
+        self.collection = f"products_{model_slug(model)}"
+
+    @classmethod
+    def open(cls, conn, model: str = EMBEDDING_MODEL, path: Optional[str] = None) -> "ProductIndex":
+        from qdrant_client import QdrantClient
+
+        url = os.getenv("QDRANT_URL")
+        if url:
+            client = QdrantClient(url=url, api_key=os.getenv("QDRANT_API_KEY"))
+        else:
+            client = QdrantClient(path=str(path or db_dir(conn) / "qdrant"))
+        return cls(client, model)
+
+    def close(self):
+        self.client.close()
+
+    def exists(self) -> bool:
+        return self.client.collection_exists(self.collection)
+
+    def ensure_collection(self, dim: int):
+        from qdrant_client import models
+
+        if not self.exists():
+            self.client.create_collection(
+                self.collection,
+                vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+            )
+
+    def count(self) -> int:
+        return self.client.count(self.collection).count if self.exists() else 0
+
+    def upsert(self, product_ids: Sequence[str], X: np.ndarray, payloads: Sequence[Dict]):
+        from qdrant_client import models
+
+        if not len(product_ids):
+            return
+        self.ensure_collection(X.shape[1])
+        for i in range(0, len(product_ids), UPSERT_BATCH):
+            self.client.upsert(self.collection, points=models.Batch(
+                ids=[point_id(p) for p in product_ids[i:i + UPSERT_BATCH]],
+                vectors=X[i:i + UPSERT_BATCH].tolist(),
+                payloads=list(payloads[i:i + UPSERT_BATCH]),
+            ))
+
+    def delete(self, product_ids: Sequence[str]):
+        from qdrant_client import models
+
+        if product_ids and self.exists():
+            self.client.delete(self.collection, points_selector=models.PointIdsList(points=[point_id(p) for p in product_ids]))
+
+    def search(self, X: np.ndarray, k: int, min_score: Optional[float] = None) -> List[List[Dict]]:
+        """kNN por fila de X (query_batch_points, en bloques)."""
+        from qdrant_client import models
+
+        if not len(X) or not self.exists():
+            return [[] for _ in range(len(X))]
+        out: List[List[Dict]] = []
+        for i in range(0, len(X), QUERY_BATCH):
+            requests = [
+                models.QueryRequest(query=v.tolist(), limit=k, with_payload=True, score_threshold=min_score)
+                for v in X[i:i + QUERY_BATCH]
+            ]
+            for resp in self.client.query_batch_points(self.collection, requests=requests):
+                out.append([{**(p.payload or {}), "score": round(float(p.score), 4)} for p in resp.points])
+        return out
+
+# =============================
+# Sync
+# =============================
+
+def sync_index(
+    conn,
+    index: ProductIndex,
+    store: EmbeddingStore,
+    embed_fn: Callable[[List[str]], np.ndarray],
+    run_id: Optional[str] = None,
+) -> Dict[str, int]:
+    """Sube productos nuevos/renombrados de product_concepts y borra los que ya no existen."""
+    changed = conn.execute("""
+        SELECT p.product_id, p.canonical_name, p.category
+        FROM product_concepts p
+        LEFT JOIN product_ann a ON a.product_id = p.product_id AND a.model = ?
+        WHERE p.product_id <> 'unknown_cluster'
+          AND p.canonical_name IS NOT NULL AND p.canonical_name <> ''
+          AND (a.product_id IS NULL OR a.canonical_name IS NOT p.canonical_name OR a.category IS NOT p.category)
+    """, (index.model,)).fetchall()
+    stale = [r[0] for r in conn.execute("""
+        SELECT a.product_id FROM product_ann a
+        LEFT JOIN product_concepts p ON p.product_id = a.product_id
+        WHERE a.model = ? AND p.product_id IS NULL
+    """, (index.model,)).fetchall()]
+
+    if changed:
+        X = store.get_or_embed([r[1] for r in changed], embed_fn, run_id)
+        index.upsert(
+            [r[0] for r in changed], X,
+            [{"product_id": r[0], "canonical_name": r[1], "category": r[2]} for r in changed],
+        )
+    index.delete(stale)
+
+    ts = now_iso()
+    with conn:
+        conn.executemany("""
+            INSERT INTO product_ann (product_id, model, canonical_name, category, indexed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(product_id) DO UPDATE SET
+                model=excluded.model, canonical_name=excluded.canonical_name,
+                category=excluded.category, indexed_at=excluded.indexed_at
+        """, [(r[0], index.model, r[1], r[2], ts) for r in changed])
+        conn.executemany("DELETE FROM product_ann WHERE product_id=?", [(p,) for p in stale])
+    return {"ann_upserted": len(changed), "ann_deleted": len(stale)}
+
+# =============================
+# API
+# =============================
+
+_INDEXES: Dict[str, ProductIndex] = {}
+
+def get_index(conn, model: str = EMBEDDING_MODEL) -> ProductIndex:
+    """ProductIndex compartido por proceso (el modo local de qdrant no admite dos clientes sobre el mismo path)."""
+    if model not in _INDEXES:
+        _INDEXES[model] = ProductIndex.open(conn, model)
+    return _INDEXES[model]
+
+def open_index(conn, model: str = EMBEDDING_MODEL) -> Optional[ProductIndex]:
+    """
+    get_index(), o None si el modo local está tomado por otro proceso (el lock de qdrant es por
+    directorio: dashboard abierto, otro grouper). Se loguea y el llamador sigue sin ANN.
+    """
+    try:
+        return get_index(conn, model)
+    except RuntimeError as e:
+        if "already accessed" not in str(e):
+            raise
+        print(f"[product_index] índice ANN ocupado por otro proceso, se omite: {e}")
+        return None
+
+def similar_products(
+    name: str,
+    k: int = 10,
+    conn=None,
+    model: str = EMBEDDING_MODEL,
+    exclude_product_id: Optional[str] = None,
+    min_score: Optional[float] = None,
+    embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+) -> List[Dict]:
+    """
+    Los k product_concepts más parecidos a name (coseno sobre embeddings de canonical_name).
+    Devuelve [{"product_id", "canonical_name", "category", "score"}], score desc ([] si el índice
+    local está tomado por otro proceso). Sólo lee: no marca el embedding como usado (evict).
+    """
+    if conn is None:
+        from explorer.store import connect
+        conn = connect()
+    index = open_index(conn, model)
+    if index is None:
+        return []
+    store = EmbeddingStore(conn, model)
+    X = store.get_or_embed([name], embed_fn or openai_embed_fn(), read_only=True)
+    hits = index.search(X, k + (1 if exclude_product_id else 0), min_score)[0]
+    return [h for h in hits if h.get("product_id") != exclude_product_id][:k]
+
+def main():
+    from explorer.store import connect
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", action="store_true", help="Indexar product_concepts nuevos/renombrados")
+    parser.add_argument("--query", default=None, help="Nombre de producto a buscar")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        index = get_index(conn, args.model)
+        stats = {}
+        if args.sync:
+            t = time.perf_counter()
+            stats.update(sync_index(conn, index, EmbeddingStore(conn, args.model), openai_embed_fn()))
+            stats["sync_sec"] = round(time.perf_counter() - t, 3)
+        stats["index_size"] = index.count()
+        if args.query:
+            t = time.perf_counter()
+            stats["neighbors"] = similar_products(args.query, args.k, conn=conn, model=args.model)
+            stats["query_ms"] = round((time.perf_counter() - t) * 1000, 3)
+    finally:
+        conn.close()
+
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/rollups.py
+
+Rollups por run para los dashboards (migración v13). Reemplazan las subconsultas correlacionadas
+que se ejecutaban en cada render:
+
+- rollup_product_run   : search_tags (GROUP_CONCAT DISTINCT _query_matched) por producto y run
+                         (antes: subconsulta sobre ad_to_product + ad_snapshots por fila de load_winners).
+- rollup_ad_image      : primera imagen por anuncio (menor ad_media.id)
+                         (antes: (SELECT image_url FROM ad_media ... LIMIT 1) por fila del drilldown).
+- rollup_advertiser_run: anuncios, categorías y search tags por anunciante y run (directorio).
+- rollup_runs          : runs con rollups calculados + source_mark (v18) de los datos fuente.
+
+refresh_rollups() recalcula sólo el run indicado (DELETE + INSERT ... SELECT en una transacción) y
+rollup_ad_image sólo sube filas nuevas: el costo es el de un run, no el del historial.
+product_grouper_agent lo llama al terminar; ensure_rollups() lo hace perezosamente para runs viejos
+o cuyos datos cambiaron desde el último refresh (p.ej. el dashboard abrió el run con el pipeline a
+medias): compara source_mark con source_mark() actual.
+
+Uso:
+  python explorer/rollups.py --run-id 20260101_120000
+  python explorer/rollups.py --all            # backfill de runs sin rollups o desactualizados
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.llm_cache import now_iso
+
+# conteos por run sobre índices (run_id, ...): barato de calcular en cada lectura del dashboard
+SOURCE_MARK_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM ad_snapshots WHERE run_id = :run_id),
+        (SELECT COUNT(*) FROM ad_media WHERE run_id = :run_id),
+        (SELECT COUNT(*) FROM ad_extractions WHERE run_id = :run_id),
+        (SELECT COUNT(*) FROM ad_to_product WHERE run_id = :run_id)
+"""
+
+def source_mark(conn, run_id: str) -> str:
+    """Marca de los datos fuente del run: cambia cuando una etapa del pipeline agrega filas."""
+    return "|".join(str(n) for n in conn.execute(SOURCE_MARK_SQL, {"run_id": run_id}).fetchone())
+
+def refresh_rollups(conn, run_id: str) -> Dict[str, int]:
+    stats = {}
+    with conn:
+        mark = source_mark(conn, run_id)
+        conn.execute("DELETE FROM rollup_product_run WHERE run_id=?", (run_id,))
+        stats["product_rows"] = conn.execute("""
+            INSERT INTO rollup_product_run (run_id, product_id, search_tags)
+            SELECT map.run_id, map.product_id, GROUP_CONCAT(DISTINCT s._query_matched)
+            FROM ad_to_product map
+            LEFT JOIN ad_snapshots s ON s.run_id = map.run_id AND s.ad_id = map.ad_id
+            WHERE map.run_id = ?
+            GROUP BY map.product_id
+        """, (run_id,)).rowcount
+
+        # MIN(id) + columna "bare" -> image_url de la fila con menor id (semántica de SQLite)
+        stats["ad_image_rows"] = conn.execute("""
+            INSERT INTO rollup_ad_image (ad_id, media_id, image_url)
+            SELECT ad_id, MIN(id), image_url
+            FROM ad_media
+            WHERE run_id = ?
+            GROUP BY ad_id
+            ON CONFLICT(ad_id) DO UPDATE SET
+                media_id=excluded.media_id,
+                image_url=excluded.image_url
+            WHERE excluded.media_id < rollup_ad_image.media_id
+        """, (run_id,)).rowcount
+
+        conn.execute("DELETE FROM rollup_advertiser_run WHERE run_id=?", (run_id,))
+        stats["advertiser_rows"] = conn.execute("""
+            INSERT INTO rollup_advertiser_run (run_id, advertiser_id, ads_in_run, categories_seen, search_tags)
+            SELECT
+                s.run_id,
+                a.advertiser_id,
+                COUNT(DISTINCT s.ad_id),
+                GROUP_CONCAT(DISTINCT e.category),
+                GROUP_CONCAT(DISTINCT s._query_matched)
+            FROM ad_snapshots s
+            JOIN ads ad ON ad.ad_id = s.ad_id
+            JOIN advertisers a ON a.advertiser_id = ad.advertiser_id
+            LEFT JOIN ad_extractions e ON e.run_id = s.run_id AND e.ad_id = s.ad_id
+            WHERE s.run_id = ?
+            GROUP BY a.advertiser_id
+        """, (run_id,)).rowcount
+
+        conn.execute("""
+            INSERT INTO rollup_runs (run_id, refreshed_at, source_mark) VALUES (?, ?, ?)
+            ON CONFLICT(run_id) DO UPDATE SET
+                refreshed_at=excluded.refreshed_at,
+                source_mark=excluded.source_mark
+        """, (run_id, now_iso(), mark))
+    return stats
+
+def ensure_rollups(conn, run_id: str) -> bool:
+    """
+    Calcula los rollups del run si nunca se calcularon (runs previos a v13) o si los datos fuente
+    cambiaron desde el último refresh (source_mark distinto; NULL en filas previas a v18). True si refrescó.
+    """
+    row = conn.execute("SELECT source_mark FROM rollup_runs WHERE run_id=?", (run_id,)).fetchone()
+    if row and row[0] == source_mark(conn, run_id):
+        return False
+    refresh_rollups(conn, run_id)
+    return True
+
+def main():
+    from explorer.store import connect
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", default=None)
+    parser.add_argument("--all", action="store_true", help="Backfill de todos los runs sin rollups o con rollups desactualizados")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.run_id:
+            run_ids = [args.run_id]
+        elif args.all:
+            run_ids = [r[0] for r in conn.execute("""
+                SELECT r.run_id, u.source_mark FROM runs r
+                LEFT JOIN rollup_runs u ON u.run_id = r.run_id
+                ORDER BY r.timestamp
+            """) if r[1] is None or r[1] != source_mark(conn, r[0])]
+        else:
+            parser.error("--run-id o --all")
+
+        t = time.perf_counter()
+        stats = {"runs": len(run_ids), "product_rows": 0, "ad_image_rows": 0, "advertiser_rows": 0}
+        for run_id in run_ids:
+            for k, v in refresh_rollups(conn, run_id).items():
+                stats[k] += v
+        stats["elapsed_sec"] = round(time.perf_counter() - t, 3)
+    finally:
+        conn.close()
+
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/scrape_cache.py
+
+Cache de scrapes de Facebook Ads Library compartido entre spy_agent (output/<producto>/apify_results) y el
+explorer (explorer/data/runs), en product_memory.db (tablas scrape_cache_*).
+
+- Clave de una búsqueda = sha256(URL normalizada, país, ventana de fechas). La URL se normaliza
+  (host sin www, params ordenados, q en minúsculas/NFC/espacios colapsados), así la misma query
+  armada por apify_actor.py o por scraper_runner.py cae en la misma entrada.
+- Cada ad se guarda una sola vez (scrape_cache_ads, zlib); las búsquedas guardan la lista ordenada de
+  ad_keys. Los campos con la URL de origen se quitan al guardar y se reponen al servir, para que el
+  demux por query (_source_query_guess / _query_matched) funcione igual que con un scrape nuevo.
+- Frescura: una entrada sirve si tiene menos de max_age_hours, cubre el limitPerSource pedido (o la
+  búsqueda se agotó antes del límite) y trae ad details si se piden.
+- Solo se graban búsquedas de runs SUCCEEDED (un run caído puede haber cortado una query a la mitad).
+
+Uso:
+  cache = ScrapeCache(connect(), max_age_hours=72)
+  hits, missing = cache.lookup(urls, period, limit_per_source, scrape_ad_details)
+  rec = cache.recorder(missing, period, limit_per_source, scrape_ad_details)
+  for item in dataset: rec.add(item)
+  rec.commit(apify_run_id)                       # si el run terminó SUCCEEDED
+  for item in cache.iter_items(hits, limit_per_source): ...
+
+  python explorer/scrape_cache.py --stats
+  python explorer/scrape_cache.py --prune-days 30
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import unicodedata
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# =============================
+# CONFIG
+# =============================
+
+MAX_AGE_HOURS = 72.0      # una query scrapeada hace menos de esto no se vuelve a pagar
+ZLIB_LEVEL = 6
+WRITE_BATCH = 500
+# campos del item del actor que traen la URL de búsqueda de origen (mismos que usan apify_actor/scraper_runner)
+SOURCE_FIELDS = ("sourceUrl", "source_url", "inputUrl", "input_url", "url", "adLibraryUrl")
+AD_ID_FIELDS = ("adArchiveID", "adArchiveId", "ad_archive_id", "ad_archiveId")
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def normalize_query(q: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", q).lower().split())
+
+def normalize_search_url(url: str) -> Tuple[str, str]:
+    """(URL normalizada sin country, country). Mismo resultado para quote_plus/quote, orden de params o www."""
+    p = urlparse((url or "").strip())
+    params = {}
+    for k, v in parse_qsl(p.query, keep_blank_values=True):
+        params.setdefault(k.lower(), v)
+    country = (params.pop("country", "") or "ALL").strip().upper()
+    norm = {k: normalize_query(v) if k == "q" else v.strip().lower() for k, v in params.items()}
+    host = p.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}{p.path.rstrip('/')}?{urlencode(sorted(norm.items()))}", country
+
+def normalize_window(date_window: Optional[str]) -> str:
+    return (date_window or "").strip().lower() or "all"
+
+def cache_key(url: str, date_window: Optional[str] = "") -> str:
+    norm, country = normalize_search_url(url)
+    blob = json.dumps([norm, country, normalize_window(date_window)], separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def ad_cache_key(item: Dict[str, Any]) -> str:
+    for f in AD_ID_FIELDS:
+        v = item.get(f)
+        if v not in (None, ""):
+            return f"id:{v}"
+    body = {k: v for k, v in item.items() if k not in SOURCE_FIELDS}
+    blob = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return "sha1:" + hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def item_source_url(item: Dict[str, Any]) -> Optional[str]:
+    for f in SOURCE_FIELDS:
+        v = item.get(f)
+        if isinstance(v, str) and v:
+            return v
+    return None
+
+class ScrapeRecorder:
+    """
+    Acumula los items de un run del actor por búsqueda de origen. Los ads se escriben por lotes
+    (upsert: la versión más reciente del ad gana); las búsquedas solo al commit().
+    """
+
+    def __init__(self, cache: "ScrapeCache", urls: List[str], date_window: str,
+                 limit_per_source: Optional[int], ad_details: bool):
+        self.cache = cache
+        self.date_window = normalize_window(date_window)
+        self.limit_per_source = int(limit_per_source) if limit_per_source else None
+        self.ad_details = bool(ad_details)
+        self.targets: Dict[str, Tuple[str, str]] = {}   # norm url|country -> (cache_key, url)
+        self.positions: Dict[str, List[Tuple[str, str]]] = {}
+        for u in urls:
+            norm, country = normalize_search_url(u)
+            key = cache_key(u, date_window)
+            self.targets[f"{norm}|{country}"] = (key, u)
+            self.positions.setdefault(key, [])
+        self._ads: Dict[str, Tuple[bytes, int]] = {}
+        self.recorded = 0
+        self.unattributed = 0
+
+    def add(self, item: Dict[str, Any]) -> bool:
+        src = item_source_url(item)
+        target = None
+        if src:
+            norm, country = normalize_search_url(src)
+            target = self.targets.get(f"{norm}|{country}")
+        if target is None:
+            self.unattributed += 1
+            return False
+        key, _ = target
+        fields = [f for f in SOURCE_FIELDS if isinstance(item.get(f), str) and item.get(f) == src]
+        stored = {k: v for k, v in item.items() if k not in fields}
+        ad_key = ad_cache_key(item)
+        blob = zlib.compress(json.dumps(stored, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), ZLIB_LEVEL)
+        self._ads[ad_key] = (blob, len(blob))
+        self.positions[key].append((ad_key, ",".join(fields)))
+        self.recorded += 1
+        if len(self._ads) >= WRITE_BATCH:
+            self._flush_ads()
+        return True
+
+    def _flush_ads(self):
+        if not self._ads:
+            return
+        ts = now_iso()
+        with self.cache.conn:
+            self.cache.conn.executemany("""
+                INSERT INTO scrape_cache_ads (ad_key, item_z, size_bytes, first_seen_at, last_seen_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(ad_key) DO UPDATE SET
+                    item_z=excluded.item_z,
+                    size_bytes=excluded.size_bytes,
+                    last_seen_at=excluded.last_seen_at
+            """, [(k, blob, size, ts, ts) for k, (blob, size) in self._ads.items()])
+        self._ads = {}
+
+    def commit(self, apify_run_id: Optional[str] = None) -> int:
+        """Graba todas las búsquedas del run (también las que no trajeron ads). Retorna cuántas."""
+        self._flush_ads()
+        ts = now_iso()
+        with self.cache.conn:
+            for norm_country, (key, url) in self.targets.items():
+                rows = self.positions[key]
+                norm, country = norm_country.rsplit("|", 1)
+                self.cache.conn.execute("DELETE FROM scrape_cache_query_ads WHERE cache_key=?", (key,))
+                self.cache.conn.executemany(
+                    "INSERT INTO scrape_cache_query_ads (cache_key, pos, ad_key, source_fields) VALUES (?, ?, ?, ?)",
+                    [(key, pos, ad_key, fields) for pos, (ad_key, fields) in enumerate(rows)])
+                self.cache.conn.execute("""
+                    INSERT OR REPLACE INTO scrape_cache_queries
+                        (cache_key, search_url, country, date_window, limit_per_source, ad_details,
+                         item_count, scraped_at, apify_run_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (key, norm, country, self.date_window, self.limit_per_source, int(self.ad_details),
+                      len(rows), ts, apify_run_id))
+        self.cache.writes += len(self.targets)
+        return len(self.targets)
+
+    def stats(self) -> Dict[str, int]:
+        return {"recorded_items": self.recorded, "unattributed_items": self.unattributed}
+
+class ScrapeCache:
+    def __init__(self, conn: sqlite3.Connection, max_age_hours: float = MAX_AGE_HOURS):
+        self.conn = conn
+        self.max_age_hours = max_age_hours
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _cutoff(self) -> str:
+        return (datetime.now(timezone.utc) - timedelta(hours=self.max_age_hours)).isoformat()
+
+    def lookup(
+        self,
+        urls: List[str],
+        date_window: Optional[str] = "",
+        limit_per_source: Optional[int] = None,
+        ad_details: bool = False,
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """({url: cache_key} servibles desde cache, [urls a scrapear]) preservando el orden de urls."""
+        keys = {u: cache_key(u, date_window) for u in urls}
+        rows: Dict[str, Tuple] = {}
+        uniq = list(dict.fromkeys(keys.values()))
+        for i in range(0, len(uniq), 500):
+            chunk = uniq[i:i + 500]
+            rows.update((r[0], r[1:]) for r in self.conn.execute(f"""
+                SELECT cache_key, limit_per_source, ad_details, item_count, scraped_at
+                FROM scrape_cache_queries WHERE cache_key IN ({",".join("?" * len(chunk))})
+            """, chunk))
+
+        cutoff = self._cutoff()
+        want = int(limit_per_source) if limit_per_source else None
+        hits, missing = {}, []
+        for u in urls:
+            row = rows.get(keys[u])
+            ok = False
+            if row:
+                limit, details, count, scraped_at = row
+                ok = (
+                    scraped_at >= cutoff
+                    and (bool(details) or not ad_details)
+                    and (limit is None or (want is not None and limit >= want) or count < limit)
+                )
+            if ok:
+                hits[u] = keys[u]
+            else:
+                missing.append(u)
+        self.hits += len(hits)
+        self.misses += len(missing)
+        return hits, missing
+
+    def iter_items(self, hits: Dict[str, str], limit_per_source: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Items cacheados de cada búsqueda, en orden de dataset, con la URL de origen repuesta."""
+        want = int(limit_per_source) if limit_per_source else None
+        for url, key in hits.items():
+            for fields, blob in self.conn.execute("""
+                SELECT qa.source_fields, a.item_z
+                FROM scrape_cache_query_ads qa JOIN scrape_cache_ads a ON a.ad_key = qa.ad_key
+                WHERE qa.cache_key = ? AND (? IS NULL OR qa.pos < ?)
+                ORDER BY qa.pos
+            """, (key, want, want)):
+                item = json.loads(zlib.decompress(blob))
+                for f in (fields.split(",") if fields else ()):
+                    item[f] = url
+                yield item
+
+    def recorder(
+        self,
+        urls: List[str],
+        date_window: Optional[str] = "",
+        limit_per_source: Optional[int] = None,
+        ad_details: bool = False,
+    ) -> ScrapeRecorder:
+        return ScrapeRecorder(self, urls, date_window, limit_per_source, ad_details)
+
+    def prune(self, max_age_days: float) -> Dict[str, int]:
+        """Borra búsquedas más viejas que max_age_days y los ads que ya no usa ninguna búsqueda."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).isoformat()
+        with self.conn:
+            queries = self.conn.execute("DELETE FROM scrape_cache_queries WHERE scraped_at < ?", (cutoff,)).rowcount
+            links = self.conn.execute("""
+                DELETE FROM scrape_cache_query_ads
+                WHERE cache_key NOT IN (SELECT cache_key FROM scrape_cache_queries)
+            """).rowcount
+            ads = self.conn.execute("""
+                DELETE FROM scrape_cache_ads
+                WHERE ad_key NOT IN (SELECT ad_key FROM scrape_cache_query_ads)
+            """).rowcount
+        return {"queries": queries, "query_ads": links, "ads": ads}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache_hits": self.hits, "cache_misses": self.misses, "cache_writes": self.writes}
+
+    def summary(self) -> Dict[str, Any]:
+        q, fresh = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(scraped_at >= ?), 0) FROM scrape_cache_queries",
+                                     (self._cutoff(),)).fetchone()
+        ads, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM scrape_cache_ads").fetchone()
+        links = self.conn.execute("SELECT COUNT(*) FROM scrape_cache_query_ads").fetchone()[0]
+        return {"queries": q, "fresh_queries": fresh, "max_age_hours": self.max_age_hours,
+                "query_items": links, "unique_ads": ads, "ads_mb": round(size / 1024 / 1024, 1)}
+
+def open_cache(max_age_hours: Optional[float] = MAX_AGE_HOURS, db_path=None) -> Optional[ScrapeCache]:
+    """ScrapeCache sobre product_memory.db; None si max_age_hours es 0/None (cache desactivado)."""
+    if not max_age_hours or max_age_hours <= 0:
+        return None
+    from explorer.store import connect
+    return ScrapeCache(connect(db_path), max_age_hours)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stats", action="store_true")
+    parser.add_argument("--prune-days", type=float, default=None, help="Borra búsquedas más viejas que N días")
+    parser.add_argument("--max-age-hours", type=float, default=MAX_AGE_HOURS)
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    cache = open_cache(args.max_age_hours or MAX_AGE_HOURS, args.db)
+    out: Dict[str, Any] = {}
+    if args.prune_days is not None:
+        out["pruned"] = cache.prune(args.prune_days)
+    out["cache"] = cache.summary()
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -10,16 +10,40 @@ Objetivo:
 - Ejecutar Apify Actor (curious_coder/facebook-ads-library-scraper)
 - Guardar resultados RAW y DEDUP en explorer/data/runs/<timestamp>/
 
+Modo --stream: arranca el actor y pagina el dataset mientras corre.
+- raw_ads.jsonl.zst / dedup_ads.jsonl.zst (un frame zstd por página).
+- stream_state.json: offset del dataset + tamaños de archivo tras cada página (checkpoint).
+- Dedup en la misma pasada con digests de 64 bits (dedup_keys.bin), no f-strings en memoria.
+- --resume <run_id>: retoma el mismo run de Apify desde el último offset, sin volver a pagar el actor.
+
+Modo --shards N: reparte las URLs en N runs concurrentes del actor, asignados a los tokens configurados
+(APIFY_API_TOKEN, APIFY_APY_KEY, APIFY_APY_KEY_2, ...) según cuota restante (explorer/apify_pool.py).
+Cada shard hace streaming en shards/shard_<k>/; al final se mergean en un único run dir deduplicado.
+
+Cache de scrapes (explorer/scrape_cache.py, compartido con spy_agent): las querys scrapeadas hace menos de
+--cache-max-age-hours no van al actor; sus ads se agregan a raw/dedup al final del run (cache_state.json
+guarda qué URLs salieron del cache para que --resume lance/retome lo mismo). Desactivado por defecto
+en el explorer (ver SCRAPE_CACHE_MAX_AGE_HOURS).
+
 Uso:
   python explorer/scraper_runner.py
+  python explorer/scraper_runner.py --stream
+  python explorer/scraper_runner.py --shards 6
+  python explorer/scraper_runner.py --resume 20260117_180851
+  python explorer/scraper_runner.py --cache-max-age-hours 6      # reusar scrapes de < 6 h (runs más espaciados)
 """
 
+import argparse
 import hashlib
 import json
 import os
 import re
 import sys
+import threading
+import time
 import unicodedata
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -31,6 +55,9 @@ from apify_client import ApifyClient
 # Fix import path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.logger import setup_logger
+from explorer.jsonl_io import ZstdFrameAppender, open_jsonl
+from explorer.apify_pool import USD_PER_AD, TokenScheduler, load_apify_tokens, plan_shards, probe_tokens
+from explorer.scrape_cache import ScrapeCache, open_cache
 
 logger = setup_logger("Explorer_Scraper")
 load_dotenv()
@@ -43,6 +70,18 @@ APIFY_ACTOR = "curious_coder/facebook-ads-library-scraper"
 LIMIT_PER_SOURCE = 60  # Ajustable
 SCRAPE_DETAILS = False
 
+# Streaming
+STREAM_PAGE_SIZE = 1000
+STREAM_POLL_SEC = 15.0
+ZSTD_LEVEL = 6
+APIFY_TERMINAL = {"SUCCEEDED", "FAILED", "TIMED-OUT", "ABORTED"}
+
+# Cache de scrapes: horas de frescura (0 = siempre scrapear). Desactivado por defecto: los ads
+# servidos del cache entran a ad_snapshots con el observed_at del run nuevo y repiten en las
+# tendencias la foto de un run anterior. Activarlo sólo con una ventana más corta que la cadencia
+# de runs (spy_agent usa 72 h: no arma series temporales).
+SCRAPE_CACHE_MAX_AGE_HOURS = 0
+
 # =============================
 # Helpers
 # =============================
@@ -106,6 +145,10 @@ def compute_ad_dedupe_key(item: Dict[str, Any]) -> Tuple[str, str]:
 
     return advertiser_key, ad_key
 
+def key_digest(key: str) -> int:
+    """Digest de 64 bits de una clave de dedup (colisión ~n²/2^65: despreciable a escala de runs)."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
 def build_ads_library_search_url(query: str, country: str = "CO") -> str:
     # Defaults fijos para exploración amplia
     active_status = "all"
@@ -159,14 +202,470 @@ def load_seed_queries(path: Path) -> List[Dict]:
     
     return flat_queries
 
-def run_scraper():
+def enrich_item(item: Dict[str, Any], run_id: str, ukey: str, unique_queries_map: Dict[str, str]) -> Dict[str, Any]:
+    enriched = dict(item)
+    enriched["_explorer_run_id"] = run_id
+    enriched["_dedup_key"] = ukey
+
+    # Try to map back intent
+    poss_url = first_present(enriched, ["sourceUrl", "url", "adLibraryUrl"])
+    if poss_url:
+        q_str = extract_query_from_url(poss_url)
+        if q_str:
+            enriched["_query_matched"] = q_str
+            # Recuperar intent si match exacto (puede variar si URL tiene encoding raro)
+            # Normalizamos un poco para buscar en map
+            enriched["_intent_guess"] = unique_queries_map.get(q_str, "Unknown")
+    return enriched
+
+# =============================
+# Streaming (--stream / --resume)
+# =============================
+
+class DigestSet:
+    """Set de digests int64 con log append-only en disco (8 bytes por clave) para el resume."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.keys = set()
+        self._buf = array("q")
+
+    def load(self, count: int):
+        # descarta lo escrito después del último checkpoint
+        data = self.path.read_bytes()[: count * 8] if self.path.exists() else b""
+        with self.path.open("wb") as f:
+            f.write(data)
+        arr = array("q")
+        arr.frombytes(data)
+        self.keys = set(arr)
+
+    def add(self, digest: int) -> bool:
+        if digest in self.keys:
+            return False
+        self.keys.add(digest)
+        self._buf.append(digest)
+        return True
+
+    def sync(self) -> int:
+        if self._buf:
+            with self.path.open("ab") as f:
+                self._buf.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            self._buf = array("q")
+        return len(self.keys)
+
+def save_stream_state(path: Path, state: Dict[str, Any]):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+def stream_dataset(
+    client,
+    data_dir: Path,
+    run_id: str,
+    unique_queries_map: Dict[str, str],
+    run_input: Optional[Dict[str, Any]] = None,
+    page_size: int = STREAM_PAGE_SIZE,
+    poll_sec: float = STREAM_POLL_SEC,
+    zstd_level: int = ZSTD_LEVEL,
+) -> Dict[str, Any]:
+    """
+    Pagina el dataset del run de Apify mientras corre. Orden del checkpoint por página:
+    frames zstd + digests (fsync) -> stream_state.json (replace atómico). Un crash en el medio
+    deja bytes de más que el resume trunca; nunca un offset adelantado a los datos.
+    """
+    state_path = data_dir / "stream_state.json"
+    if state_path.exists():
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        logger.info(f"Retomando run Apify {state['apify_run_id']} desde offset {state['offset']}")
+    else:
+        run = client.actor(APIFY_ACTOR).start(run_input=run_input)
+        state = {
+            "apify_run_id": run.get("id"),
+            "dataset_id": run.get("defaultDatasetId"),
+            "offset": 0,
+            "raw_bytes": 0,
+            "dedup_bytes": 0,
+            "raw_count": 0,
+            "dedup_count": 0,
+            "dedup_keys": 0,
+            "advertiser_keys": 0,
+            "apify_status": run.get("status"),
+            "done": False,
+        }
+        save_stream_state(state_path, state)
+        logger.info(f"Actor iniciado. Run: {state['apify_run_id']} Dataset: {state['dataset_id']}")
+
+    raw_path = data_dir / "raw_ads.jsonl.zst"
+    dedup_path = data_dir / "dedup_ads.jsonl.zst"
+    f_raw = ZstdFrameAppender(raw_path, zstd_level)
+    f_dedup = ZstdFrameAppender(dedup_path, zstd_level)
+    f_raw.truncate(state["raw_bytes"])
+    f_dedup.truncate(state["dedup_bytes"])
+    seen = DigestSet(data_dir / "dedup_keys.bin")
+    seen.load(state["dedup_keys"])
+    advertisers = DigestSet(data_dir / "advertiser_keys.bin")
+    advertisers.load(state["advertiser_keys"])
+
+    run_client = client.run(state["apify_run_id"])
+    dataset = client.dataset(state["dataset_id"])
+
+    try:
+        while not state["done"]:
+            # status ANTES de paginar: si ya era terminal y la página vino vacía, el dataset está completo
+            status = (run_client.get() or {}).get("status")
+            page = dataset.list_items(offset=state["offset"], limit=page_size)
+            items = page.items or []
+
+            if not items:
+                if status in APIFY_TERMINAL:
+                    state["done"] = True
+                    state["apify_status"] = status
+                    save_stream_state(state_path, state)
+                    break
+                time.sleep(poll_sec)
+                continue
+
+            raw_lines, dedup_lines = [], []
+            for item in items:
+                raw_lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+
+                adv_key, ad_key = compute_ad_dedupe_key(item)
+                advertisers.add(key_digest(adv_key))
+                ukey = f"{adv_key}::{ad_key}"
+                if not seen.add(key_digest(ukey)):
+                    continue
+                dedup_lines.append(json.dumps(enrich_item(item, run_id, ukey, unique_queries_map), ensure_ascii=False) + "\n")
+
+            f_raw.append(raw_lines)
+            f_dedup.append(dedup_lines)
+            state["raw_bytes"] = f_raw.sync()
+            state["dedup_bytes"] = f_dedup.sync()
+            state["dedup_keys"] = seen.sync()
+            state["advertiser_keys"] = advertisers.sync()
+            state["offset"] += len(items)
+            state["raw_count"] += len(items)
+            state["dedup_count"] += len(dedup_lines)
+            state["apify_status"] = status
+            save_stream_state(state_path, state)
+            logger.info(f"Página offset={state['offset']} (+{len(items)} raw, +{len(dedup_lines)} dedup) status={status}")
+            if len(items) < page_size and status not in APIFY_TERMINAL:
+                time.sleep(poll_sec)  # página corta: alcanzamos al actor, esperar a que produzca más
+    finally:
+        f_raw.close()
+        f_dedup.close()
+
+    if state["apify_status"] != "SUCCEEDED":
+        logger.warning(f"Run Apify terminó con status {state['apify_status']}; se guardan los items obtenidos")
+
+    return {
+        "raw_count": state["raw_count"],
+        "dedup_count": state["dedup_count"],
+        "unique_advertisers": len(advertisers.keys),
+        "paths": {"raw": str(raw_path), "dedup": str(dedup_path)},
+        "apify_run": state["apify_run_id"],
+        "apify_status": state["apify_status"],
+    }
+
+# =============================
+# Shards (--shards N)
+# =============================
+
+def _copy_prefix(src: Path, dst, size: int):
+    with src.open("rb") as f:
+        while size > 0:
+            chunk = f.read(min(size, 1 << 20))
+            if not chunk:
+                break
+            dst.write(chunk)
+            size -= len(chunk)
+
+def merge_shards(data_dir: Path, shard_dirs: List[Path], zstd_level: int = ZSTD_LEVEL) -> Dict[str, Any]:
+    """
+    raw: concatenación byte a byte de los frames zstd de cada shard (hasta su checkpoint).
+    dedup: stream de los dedup de cada shard filtrado por digest de _dedup_key (duplicados entre shards).
+    """
+    raw_path = data_dir / "raw_ads.jsonl.zst"
+    dedup_path = data_dir / "dedup_ads.jsonl.zst"
+    raw_count = 0
+    seen = set()
+    advertisers = set()
+
+    with raw_path.open("wb") as f_raw:
+        for d in shard_dirs:
+            state = json.loads((d / "stream_state.json").read_text(encoding="utf-8"))
+            _copy_prefix(d / "raw_ads.jsonl.zst", f_raw, state["raw_bytes"])
+            raw_count += state["raw_count"]
+            arr = array("q")
+            arr.frombytes((d / "advertiser_keys.bin").read_bytes()[: state["advertiser_keys"] * 8])
+            advertisers.update(arr)
+
+    dedup_path.unlink(missing_ok=True)
+    f_dedup = ZstdFrameAppender(dedup_path, zstd_level)
+    dedup_count = 0
+    try:
+        for d in shard_dirs:
+            buf: List[str] = []
+            with open_jsonl(d / "dedup_ads.jsonl.zst") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    digest = key_digest(json.loads(line)["_dedup_key"])
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    buf.append(line)
+                    if len(buf) >= STREAM_PAGE_SIZE:
+                        f_dedup.append(buf)
+                        buf = []
+            f_dedup.append(buf)
+            dedup_count = len(seen)
+        f_dedup.sync()
+    finally:
+        f_dedup.close()
+
+    return {
+        "raw_count": raw_count,
+        "dedup_count": dedup_count,
+        "unique_advertisers": len(advertisers),
+        "paths": {"raw": str(raw_path), "dedup": str(dedup_path)},
+    }
+
+def run_sharded(
+    token_clients: List[Tuple[str, Any]],
+    data_dir: Path,
+    run_id: str,
+    urls: List[str],
+    run_input: Dict[str, Any],
+    unique_queries_map: Dict[str, str],
+    n_shards: int,
+    page_size: int = STREAM_PAGE_SIZE,
+    poll_sec: float = STREAM_POLL_SEC,
+    zstd_level: int = ZSTD_LEVEL,
+) -> Dict[str, Any]:
+    """
+    Plan en shards.json (URLs + nombre de token por shard) para que --resume retome cada shard en su
+    token. Si el actor no arranca en un token (cuota agotada, token inválido) el shard pasa al siguiente
+    token con más presupuesto; si un shard falla ya iniciado, se deja para --resume.
+    """
+    plan_path = data_dir / "shards.json"
+    plan_lock = threading.Lock()
+
+    def save_plan():
+        tmp = plan_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(plan, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, plan_path)
+
+    sched = TokenScheduler(probe_tokens(token_clients))
+    if plan_path.exists():
+        plan = json.loads(plan_path.read_text(encoding="utf-8"))
+    else:
+        plan = {"shards": [{"shard": k, "urls": shard_urls, "token": None}
+                           for k, shard_urls in enumerate(plan_shards(urls, n_shards))]}
+    costs = [len(sh["urls"]) * run_input["limitPerSource"] * USD_PER_AD for sh in plan["shards"]]
+
+    slots: List[Any] = [None] * len(plan["shards"])
+    fresh = []
+    for k, sh in enumerate(plan["shards"]):
+        slot = sched.by_name(sh["token"]) if sh["token"] else None
+        if slot is not None:
+            sched.claim(slot, costs[k])
+            slots[k] = slot
+        else:
+            fresh.append(k)
+    for k, slot in zip(fresh, sched.assign([costs[k] for k in fresh])):
+        slots[k] = slot
+        plan["shards"][k]["token"] = slot.name
+    save_plan()
+    logger.info(f"{len(plan['shards'])} shards sobre {len(sched.slots)} tokens: "
+                + ", ".join(f"{sh['shard']}->{sh['token']}" for sh in plan["shards"]))
+
+    def run_shard(k: int) -> Dict[str, Any]:
+        sh = plan["shards"][k]
+        shard_dir = data_dir / "shards" / f"shard_{k:03d}"
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        shard_input = dict(run_input, urls=[{"url": u} for u in sh["urls"]])
+        slot, tried = slots[k], ()
+        while True:
+            if slot.failed:
+                error = slot.error or "token caído"  # otro shard ya lo descartó: no reintentar
+            else:
+                try:
+                    res = stream_dataset(slot.client, shard_dir, run_id, unique_queries_map, shard_input,
+                                         page_size=page_size, poll_sec=poll_sec, zstd_level=zstd_level)
+                    sched.release(slot, costs[k])
+                    return {"shard": k, "token": slot.name, "urls": len(sh["urls"]), "apify_run": res["apify_run"],
+                            "apify_status": res["apify_status"], "raw_count": res["raw_count"]}
+                except Exception as e:
+                    if (shard_dir / "stream_state.json").exists():
+                        raise  # el run ya existe en ese token: se retoma con --resume
+                    error = str(e)
+            tried += (slot.name,)
+            new = sched.next_token(slot, costs[k], error, tried)
+            if new is None:
+                raise RuntimeError(f"Shard {k}: ningún token Apify disponible ({error})")
+            logger.warning(f"Shard {k}: token {slot.name} falló al iniciar ({error}); reintentando con {new.name}")
+            slot = new
+            with plan_lock:
+                sh["token"] = slot.name
+                save_plan()
+
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=len(plan["shards"])) as ex:
+        futures = {ex.submit(run_shard, k): k for k in range(len(plan["shards"]))}
+        for fut, k in futures.items():
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                errors.append({"shard": k, "error": str(e)[:300]})
+    if errors:
+        raise RuntimeError(f"{len(errors)} shards fallaron (retomar con --resume {run_id}): {errors}")
+
+    merged = merge_shards(data_dir, [data_dir / "shards" / f"shard_{k:03d}" for k in range(len(plan["shards"]))], zstd_level)
+    # string como en los demás modos (memory_agent lo guarda en runs.apify_run); los ids por shard van en "shards"
+    merged["apify_run"] = ",".join(r["apify_run"] or "" for r in results)
+    merged["shards"] = results
+    merged["tokens"] = sched.report()
+    return merged
+
+# =============================
+# Cache de scrapes
+# =============================
+
+def load_cache_state(data_dir: Path, cache: Optional[ScrapeCache], urls: List[str], resume: bool) -> Dict[str, Any]:
+    """
+    {"hits": {url: cache_key}, "missing": [urls al actor], "recorded": bool}. Run nuevo: lookup en el
+    cache y se persiste en cache_state.json; --resume: se relee (un run anterior a este archivo
+    retoma sin cache).
+    """
+    path = data_dir / "cache_state.json"
+    if resume:
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        return {"hits": {}, "missing": urls, "recorded": True}
+    if cache is None:
+        hits, missing = {}, urls
+    else:
+        hits, missing = cache.lookup(urls, "", LIMIT_PER_SOURCE, SCRAPE_DETAILS)
+    state = {"hits": hits, "missing": missing, "recorded": False}
+    save_stream_state(path, state)
+    return state
+
+def merge_scrape_cache(
+    data_dir: Path,
+    result: Dict[str, Any],
+    cache: Optional[ScrapeCache],
+    cache_state: Dict[str, Any],
+    apify_ok: bool,
+    run_id: str,
+    unique_queries_map: Dict[str, str],
+    zstd_level: int = ZSTD_LEVEL,
+) -> Dict[str, Any]:
+    """
+    Post-paso del run (raw/dedup ya cerrados, en su tamaño de checkpoint):
+    1. Graba en el cache los items del actor (una vez por run y solo si terminó SUCCEEDED).
+    2. Agrega a raw/dedup los items de las URLs servidas por el cache, deduplicando contra lo scrapeado.
+    Stream/shards reescriben o truncan raw/dedup al retomar, así que repetir el paso tras un --resume
+    no duplica items. Retorna el bloque "cache" del summary y actualiza los conteos de result.
+    """
+    raw_path, dedup_path = Path(result["paths"]["raw"]), Path(result["paths"]["dedup"])
+    hits = cache_state["hits"] if cache is not None else {}
+    recorder = None
+    if cache is not None and apify_ok and cache_state["missing"] and not cache_state["recorded"]:
+        recorder = cache.recorder(cache_state["missing"], "", LIMIT_PER_SOURCE, SCRAPE_DETAILS)
+    info = {
+        "enabled": cache is not None,
+        "max_age_hours": cache.max_age_hours if cache is not None else None,
+        "cached_urls": len(hits),
+        "scraped_urls": len(cache_state["missing"]),
+        "cached_items": 0,
+    }
+    if recorder is None and not hits:
+        return info
+
+    advertisers, seen = set(), set()
+    with open_jsonl(raw_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if recorder is not None:
+                recorder.add(item)
+            if hits:
+                advertisers.add(key_digest(compute_ad_dedupe_key(item)[0]))
+    if recorder is not None:
+        recorder.commit(result.get("apify_run"))
+        cache_state["recorded"] = True
+        save_stream_state(data_dir / "cache_state.json", cache_state)
+        info.update(recorder.stats())
+    if not hits:
+        return info
+
+    with open_jsonl(dedup_path) as f:
+        for line in f:
+            if line.strip():
+                seen.add(key_digest(json.loads(line)["_dedup_key"]))
+
+    zst = raw_path.suffix == ".zst"
+    f_raw = ZstdFrameAppender(raw_path, zstd_level) if zst else raw_path.open("a", encoding="utf-8")
+    f_dedup = ZstdFrameAppender(dedup_path, zstd_level) if zst else dedup_path.open("a", encoding="utf-8")
+    write = (lambda f, lines: f.append(lines)) if zst else (lambda f, lines: f.writelines(lines))
+    raw_lines, dedup_lines = [], []
+    cached = 0
+    try:
+        for item in cache.iter_items(hits, LIMIT_PER_SOURCE):
+            cached += 1
+            raw_lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+            adv_key, ad_key = compute_ad_dedupe_key(item)
+            advertisers.add(key_digest(adv_key))
+            ukey = f"{adv_key}::{ad_key}"
+            digest = key_digest(ukey)
+            if digest not in seen:
+                seen.add(digest)
+                dedup_lines.append(json.dumps(enrich_item(item, run_id, ukey, unique_queries_map), ensure_ascii=False) + "\n")
+            if len(raw_lines) >= STREAM_PAGE_SIZE:
+                write(f_raw, raw_lines)
+                write(f_dedup, dedup_lines)
+                raw_lines, dedup_lines = [], []
+        write(f_raw, raw_lines)
+        write(f_dedup, dedup_lines)
+    finally:
+        f_raw.close()
+        f_dedup.close()
+
+    info["cached_items"] = cached
+    result["raw_count"] += cached
+    result["dedup_count"] = len(seen)
+    result["unique_advertisers"] = len(advertisers)
+    return info
+
+def run_scraper(
+    stream: bool = False,
+    resume_run_id: Optional[str] = None,
+    page_size: int = STREAM_PAGE_SIZE,
+    poll_sec: float = STREAM_POLL_SEC,
+    zstd_level: int = ZSTD_LEVEL,
+    client=None,
+    runs_dir: Optional[Path] = None,
+    shards: int = 1,
+    token_clients: Optional[List[Tuple[str, Any]]] = None,
+    seed_path: Optional[Path] = None,
+    cache_max_age_hours: Optional[float] = SCRAPE_CACHE_MAX_AGE_HOURS,
+    cache_db_path: Optional[Path] = None,
+):
     # Setup Paths
     root_dir = Path(__file__).resolve().parent
-    seed_path = root_dir / "seed_queries.json"
+    seed_path = seed_path or (root_dir / "seed_queries.json")
+    runs_dir = runs_dir or (root_dir / "data" / "runs")
     
     # Run folder
-    run_id = _timestamp_folder()
-    data_dir = root_dir / "data" / "runs" / run_id
+    run_id = resume_run_id or _timestamp_folder()
+    data_dir = runs_dir / run_id
+    if resume_run_id and (data_dir / "shards.json").exists():
+        shards = max(shards, 2)
+    elif resume_run_id and not (data_dir / "stream_state.json").exists():
+        raise FileNotFoundError(f"No hay stream_state.json para retomar en {data_dir}")
     data_dir.mkdir(parents=True, exist_ok=True)
     
     logger.info(f"Iniciando Scraper Explorer. RunID: {run_id}")
@@ -180,15 +679,26 @@ def run_scraper():
     logger.info(f"Cargadas {len(queries)} queries únicas de {len(queries_data)} entradas.")
     
     # Apify Client
-    token = os.getenv("APIFY_API_TOKEN") or os.getenv("APIFY_APY_KEY")
-    if not token:
-        raise ValueError("Missing APIFY_API_TOKEN")
-        
-    client = ApifyClient(token)
+    if shards > 1:
+        if token_clients is None:
+            token_clients = [(name, ApifyClient(tok)) for name, tok in load_apify_tokens()]
+    elif client is None:
+        token = os.getenv("APIFY_API_TOKEN") or os.getenv("APIFY_APY_KEY")
+        if not token:
+            raise ValueError("Missing APIFY_API_TOKEN")
+        client = ApifyClient(token)
     
     # Build Input
     urls = [build_ads_library_search_url(q) for q in queries]
-    
+
+    # Cache de scrapes: al actor solo van las URLs faltantes o vencidas
+    cache = open_cache(cache_max_age_hours, cache_db_path)
+    cache_state = load_cache_state(data_dir, cache, urls, bool(resume_run_id))
+    cached_urls = cache_state["hits"]
+    urls = cache_state["missing"]
+    if cache is not None:
+        logger.info(f"Scrape cache: {len(cached_urls)} URLs en cache | {len(urls)} al actor")
+
     run_input = {
         "urls": [{"url": u} for u in urls],
         "scrapeAdDetails": SCRAPE_DETAILS,
@@ -196,14 +706,56 @@ def run_scraper():
         "scrapePageAds.activeStatus": "all",
         "scrapePageAds.countryCode": "CO",
     }
+
+    if shards > 1 or stream or resume_run_id:
+        if not urls:
+            logger.info("Todas las URLs están en cache; no se lanza el actor.")
+            result = {"raw_count": 0, "dedup_count": 0, "unique_advertisers": 0,
+                      "paths": {"raw": str(data_dir / "raw_ads.jsonl.zst"), "dedup": str(data_dir / "dedup_ads.jsonl.zst")},
+                      "apify_run": None}
+            # misma forma de summary que el modo que se pidió, sin runs del actor
+            if shards > 1:
+                result.update({"shards": [], "tokens": []})
+            else:
+                result["apify_status"] = None
+            for path in result["paths"].values():
+                Path(path).write_bytes(b"")
+            apify_ok = False
+        elif shards > 1:
+            logger.info(f"Ejecutando Apify Actor en {shards} shards ({len(urls)} URLs)...")
+            result = run_sharded(token_clients, data_dir, run_id, urls, run_input, unique_queries_map, shards,
+                                 page_size=page_size, poll_sec=poll_sec, zstd_level=zstd_level)
+            apify_ok = all(r["apify_status"] == "SUCCEEDED" for r in result["shards"])
+        else:
+            logger.info(f"Ejecutando Apify Actor en modo streaming ({len(urls)} URLs)...")
+            result = stream_dataset(client, data_dir, run_id, unique_queries_map, run_input,
+                                    page_size=page_size, poll_sec=poll_sec, zstd_level=zstd_level)
+            apify_ok = result["apify_status"] == "SUCCEEDED"
+        cache_info = merge_scrape_cache(data_dir, result, cache, cache_state, apify_ok, run_id,
+                                        unique_queries_map, zstd_level)
+        summary = {
+            "run_id": run_id,
+            "timestamp": _now_iso(),
+            "queries_loaded": len(queries),
+            **result,
+            "cache": cache_info,
+        }
+        summary_path = data_dir / "summary.json"
+        summary_path.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+        logger.info(f"Scraping completado. Resumen: {summary}")
+        return summary
     
     logger.info(f"Ejecutando Apify Actor ({len(urls)} URLs)...")
     
     try:
-        run = client.actor(APIFY_ACTOR).call(run_input=run_input)
-        dataset_id = run.get("defaultDatasetId")
-        
-        logger.info(f"Actor finalizado. Dataset: {dataset_id}")
+        run, items = {}, []
+        if urls:
+            run = client.actor(APIFY_ACTOR).call(run_input=run_input)
+            dataset_id = run.get("defaultDatasetId")
+            items = client.dataset(dataset_id).iterate_items()
+            logger.info(f"Actor finalizado. Dataset: {dataset_id}")
+        else:
+            logger.info("Todas las URLs están en cache; no se lanza el actor.")
         
         # Process Results
         raw_path = data_dir / "raw_ads.jsonl"
@@ -215,7 +767,7 @@ def run_scraper():
         advertisers = set()
         
         with raw_path.open("w", encoding="utf-8") as f_raw, dedup_path.open("w", encoding="utf-8") as f_dedup:
-            for item in client.dataset(dataset_id).iterate_items():
+            for item in items:
                 raw_count += 1
                 f_raw.write(json.dumps(item, ensure_ascii=False) + "\n")
                 
@@ -230,19 +782,7 @@ def run_scraper():
                 seen_keys.add(ukey)
                 
                 # Enrich
-                enriched = dict(item)
-                enriched["_explorer_run_id"] = run_id
-                enriched["_dedup_key"] = ukey
-                
-                # Try to map back intent
-                poss_url = first_present(enriched, ["sourceUrl", "url", "adLibraryUrl"])
-                if poss_url:
-                    q_str = extract_query_from_url(poss_url)
-                    if q_str:
-                        enriched["_query_matched"] = q_str
-                        # Recuperar intent si match exacto (puede variar si URL tiene encoding raro)
-                        # Normalizamos un poco para buscar en map
-                        enriched["_intent_guess"] = unique_queries_map.get(q_str, "Unknown")
+                enriched = enrich_item(item, run_id, ukey, unique_queries_map)
                 
                 dedup_count += 1
                 f_dedup.write(json.dumps(enriched, ensure_ascii=False) + "\n")
@@ -261,15 +801,41 @@ def run_scraper():
             },
             "apify_run": run.get("id")
         }
+        summary["cache"] = merge_scrape_cache(data_dir, summary, cache, cache_state, run.get("status") == "SUCCEEDED",
+                                              run_id, unique_queries_map)
         
         summary_path = data_dir / "summary.json"
         summary_path.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
         
         logger.info(f"Scraping completado. Resumen: {summary}")
+        return summary
         
     except Exception as e:
         logger.error(f"Error en scraping: {e}")
         raise e
 
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream", action="store_true", help="Paginar el dataset mientras el actor corre (zstd + checkpoints)")
+    parser.add_argument("--resume", default=None, help="run_id de un run --stream interrumpido")
+    parser.add_argument("--page-size", type=int, default=STREAM_PAGE_SIZE)
+    parser.add_argument("--poll-sec", type=float, default=STREAM_POLL_SEC)
+    parser.add_argument("--zstd-level", type=int, default=ZSTD_LEVEL)
+    parser.add_argument("--shards", type=int, default=1, help="Runs concurrentes del actor, repartidos entre tokens por cuota")
+    parser.add_argument("--seeds", default=None, help="Ruta a seed_queries.json (default: explorer/seed_queries.json)")
+    parser.add_argument("--cache-max-age-hours", type=float, default=SCRAPE_CACHE_MAX_AGE_HOURS,
+                        help="Frescura del cache de scrapes compartido (default 0 = scrapear todo; "
+                             "usar una ventana menor que la cadencia de runs)")
+    parser.add_argument("--cache-db", default=None, help="DB del cache de scrapes (default: product_memory.db)")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = build_parser().parse_args(argv)
+    return run_scraper(stream=args.stream, resume_run_id=args.resume, page_size=args.page_size,
+                       poll_sec=args.poll_sec, zstd_level=args.zstd_level, shards=args.shards,
+                       seed_path=Path(args.seeds) if args.seeds else None,
+                       cache_max_age_hours=args.cache_max_age_hours,
+                       cache_db_path=Path(args.cache_db) if args.cache_db else None)
+
 if __name__ == "__main__":
-    run_scraper()
+    main()
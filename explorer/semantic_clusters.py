@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/semantic_clusters.py
+
+Clustering semántico incremental entre runs (semantic_grouper_agent --mode incremental).
+
+- semantic_members (migración v10): nombre ya visto -> cluster_id. No se vuelve a embeber.
+- CentroidIndex: centroides persistidos (semantic_clusters) en una matriz NumPy; nearest() es un
+  producto matricial por bloques contra los centroides normalizados (coseno).
+- assign_incremental(): nombres nuevos -> centroide más cercano si la distancia es <= threshold;
+  sólo el residuo se agrupa con AgglomerativeClustering y genera clusters nuevos (ids estables).
+
+La distancia es euclidiana entre vectores unitarios (sqrt(2 - 2cos)), la misma escala que
+DISTANCE_THRESHOLD del modo full.
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NEAREST_CHUNK = 4096
+SQL_CHUNK = 900  # < SQLITE_MAX_VARIABLE_NUMBER
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def normalize_rows(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-10)
+
+def cluster_residue(X: np.ndarray, threshold: float) -> np.ndarray:
+    """Labels de AgglomerativeClustering (average, euclidiana sobre unitarios) para el residuo."""
+    if len(X) < 2:
+        return np.zeros(len(X), dtype=np.int64)
+    from sklearn.cluster import AgglomerativeClustering
+
+    model = AgglomerativeClustering(n_clusters=None, metric="euclidean", linkage="average", distance_threshold=threshold)
+    return model.fit_predict(X)
+
+def pick_canonical(names: Sequence[str], counts: Dict[str, int]) -> str:
+    # Mayor frecuencia; desempate: el más corto
+    return sorted(names, key=lambda n: (-counts.get(n, 0), len(n)))[0]
+
+class CentroidIndex:
+    """
+    Uso:
+        idx = CentroidIndex.load(conn, model)
+        pos, dist = idx.nearest(X_unit)      # pos = -1 si el índice está vacío
+        idx.add_members(pos_i, X_rows)
+        p = idx.add_cluster(X_rows, canonical)
+        ids = idx.save(conn, run_id)         # posición -> cluster_id (los nuevos reciben id al guardar)
+    """
+
+    def __init__(self, model: str, dim: Optional[int] = None):
+        self.model = model
+        self.dim = dim
+        self.ids: List[Optional[int]] = []
+        self.canonical: List[str] = []
+        self.means = np.empty((0, dim or 0), dtype=np.float32)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._dirty: set = set()
+        self._unit: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, conn, model: str) -> "CentroidIndex":
+        rows = conn.execute(
+            "SELECT cluster_id, canonical_name, dim, centroid, n_members FROM semantic_clusters WHERE model=? ORDER BY cluster_id",
+            (model,),
+        ).fetchall()
+        idx = cls(model, rows[0][2] if rows else None)
+        if rows:
+            idx.ids = [r[0] for r in rows]
+            idx.canonical = [r[1] for r in rows]
+            idx.means = np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+            idx.counts = np.array([r[4] for r in rows], dtype=np.int64)
+        return idx
+
+    def _units(self) -> np.ndarray:
+        if self._unit is None:
+            self._unit = normalize_rows(self.means) if len(self.means) else self.means
+        return self._unit
+
+    def nearest(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Centroide más cercano de cada fila de X (unitaria): (posición, distancia euclidiana)."""
+        n = len(X)
+        pos = np.full(n, -1, dtype=np.int64)
+        dist = np.full(n, np.inf, dtype=np.float32)
+        if not len(self.ids) or not n:
+            return pos, dist
+        C = self._units()
+        for i in range(0, n, NEAREST_CHUNK):
+            sims = X[i:i + NEAREST_CHUNK] @ C.T
+            best = sims.argmax(axis=1)
+            pos[i:i + NEAREST_CHUNK] = best
+            cos = sims[np.arange(len(best)), best]
+            dist[i:i + NEAREST_CHUNK] = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * cos))
+        return pos, dist
+
+    def add_members(self, p: int, X: np.ndarray):
+        n, k = self.counts[p], len(X)
+        self.means[p] = (self.means[p] * n + X.sum(axis=0)) / (n + k)
+        self.counts[p] = n + k
+        self._dirty.add(p)
+        self._unit = None
+
+    def add_cluster(self, X: np.ndarray, canonical: str) -> int:
+        if self.dim is None:
+            self.dim = X.shape[1]
+            self.means = np.empty((0, self.dim), dtype=np.float32)
+        self.ids.append(None)
+        self.canonical.append(canonical)
+        self.means = np.vstack([self.means, X.mean(axis=0, keepdims=True).astype(np.float32)])
+        self.counts = np.append(self.counts, len(X))
+        p = len(self.ids) - 1
+        self._dirty.add(p)
+        self._unit = None
+        return p
+
+    def save(self, conn, run_id: str) -> List[int]:
+        """Persiste centroides nuevos/modificados (sin commit). Devuelve cluster_id por posición."""
+        ts = now_iso()
+        for p in sorted(self._dirty):
+            blob = self.means[p].astype(np.float32).tobytes()
+            if self.ids[p] is None:
+                cur = conn.execute("""
+                    INSERT INTO semantic_clusters (model, canonical_name, dim, centroid, n_members,
+                                                   created_run_id, updated_run_id, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (self.model, self.canonical[p], self.dim, blob, int(self.counts[p]), run_id, run_id, ts, ts))
+                self.ids[p] = cur.lastrowid
+            else:
+                conn.execute("""
+                    UPDATE semantic_clusters SET centroid=?, n_members=?, updated_run_id=?, updated_at=?
+                    WHERE cluster_id=?
+                """, (blob, int(self.counts[p]), run_id, ts, self.ids[p]))
+        self._dirty.clear()
+        return list(self.ids)
+
+def load_known_members(conn, model: str, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    known: Dict[str, int] = {}
+    for i in range(0, len(names), SQL_CHUNK):
+        chunk = names[i:i + SQL_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for name, cid in conn.execute(
+            f"SELECT original_name, cluster_id FROM semantic_members WHERE model=? AND original_name IN ({marks})",
+            [model, *chunk],
+        ):
+            known[name] = cid
+    return known
+
+def assign_incremental(
+    conn,
+    run_id: str,
+    names: List[str],
+    counts: Dict[str, int],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    model: str,
+    threshold: float,
+    assign_threshold: Optional[float] = None,
+) -> Tuple[List[Tuple[str, str, int, str]], Dict]:
+    """
+    Devuelve (filas para semantic_map, stats). Persiste clusters y members; el commit queda al caller.
+    assign_threshold: distancia máxima al centroide para unir a un cluster existente (default: threshold).
+    """
+    started = time.perf_counter()
+    assign_threshold = threshold if assign_threshold is None else assign_threshold
+
+    known = load_known_members(conn, model, names)
+    new_names = [n for n in names if n not in known]
+
+    idx = CentroidIndex.load(conn, model)
+    clusters_before = len(idx)
+    name_pos: Dict[str, int] = {}
+    assigned = 0
+    new_clusters = 0
+
+    if new_names:
+        X = normalize_rows(embed_fn(new_names))
+        pos, dist = idx.nearest(X)
+        hit = dist <= assign_threshold
+        assigned = int(hit.sum())
+        for p in np.unique(pos[hit]):
+            rows = np.nonzero(hit & (pos == p))[0]
+            idx.add_members(int(p), X[rows])
+            for r in rows:
+                name_pos[new_names[r]] = int(p)
+
+        residue = np.nonzero(~hit)[0]
+        labels = cluster_residue(X[residue], threshold)
+        for label in np.unique(labels):
+            rows = residue[labels == label]
+            group = [new_names[r] for r in rows]
+            p = idx.add_cluster(X[rows], pick_canonical(group, counts))
+            new_clusters += 1
+            for name in group:
+                name_pos[name] = p
+
+    ids = idx.save(conn, run_id)
+    id_to_canonical = {cid: idx.canonical[p] for p, cid in enumerate(ids)}
+    name_to_id = dict(known)
+    name_to_id.update({name: ids[p] for name, p in name_pos.items()})
+
+    conn.executemany("""
+        INSERT INTO semantic_members (model, original_name, cluster_id, first_run_id, last_run_id)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(model, original_name) DO UPDATE SET last_run_id=excluded.last_run_id
+    """, [(model, n, cid, run_id, run_id) for n, cid in name_to_id.items()])
+
+    rows = [(run_id, n, cid, id_to_canonical.get(cid, n)) for n, cid in name_to_id.items()]
+    stats = {
+        "names": len(names),
+        "known_names": len(known),
+        "embedded": len(new_names),
+        "assigned_existing": assigned,
+        "residue": len(new_names) - assigned,
+        "new_clusters": new_clusters,
+        "clusters_before": clusters_before,
+        "clusters_total": len(idx),
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+    return rows, stats
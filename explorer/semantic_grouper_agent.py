@@ -4,16 +4,22 @@
 """
 Explorer Agent 2.5 - Semantic Grouper
 Uses OpenAI Embeddings + Agglomerative Clustering to unify product names.
+
+Modes:
+  --mode full         clustering from scratch over every name of the run (cluster ids local to the run)
+  --mode incremental  names already seen map to their cluster; new names go to the nearest persistent
+                      centroid (semantic_clusters) and only the residue is clustered. Stable ids across runs.
+
+Embeddings are cached in the persistent store (embedding_store.py, float16 mmap): cache hits
+skip the API. --no-embed-cache disables it.
 """
 
 import argparse
-import sqlite3
 import json
 import os
 import numpy as np
 import sys
-from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from collections import Counter
 
 # External libs (pip install scikit-learn numpy openai)
@@ -21,58 +27,52 @@ from sklearn.cluster import AgglomerativeClustering
 from openai import OpenAI
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from explorer.store import connect, get_db_path
+from explorer.semantic_clusters import assign_incremental
+from explorer.embedding_store import EmbeddingStore
+
 load_dotenv()
 
-DB_NAME = "product_memory.db"
 EMBEDDING_MODEL = "text-embedding-3-small"
 DISTANCE_THRESHOLD = 0.45  # Tunable: Lower = stricter, Higher = looser merging
 BATCH_SIZE = 500
 
-def get_db_path() -> Path:
-    return Path(__file__).resolve().parent / "store" / DB_NAME
-
-def ensure_schema(conn: sqlite3.Connection):
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS semantic_map (
-        run_id TEXT,
-        original_name TEXT,
-        cluster_id INTEGER,
-        canonical_name TEXT,
-        PRIMARY KEY (run_id, original_name)
-    );
-    """)
-    conn.commit()
-
-def get_embeddings(client: OpenAI, texts: List[str]) -> List[List[float]]:
-    # OpenAI API limits batch size, let's chunk
-    results = []
+def get_embeddings(client: OpenAI, texts: List[str]) -> np.ndarray:
+    # OpenAI API limits batch size, let's chunk. Vectors go straight into a float32 matrix.
+    X = None
     for i in range(0, len(texts), BATCH_SIZE):
         batch = texts[i : i + BATCH_SIZE]
         try:
             resp = client.embeddings.create(input=batch, model=EMBEDDING_MODEL)
-            # Ensure order is preserved
-            embeds = [d.embedding for d in resp.data]
-            results.extend(embeds)
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             # Fill with zeros or handle errors? For now, we skip or crash.
             # Ideally retry.
             raise e
-    return results
+        for j, d in enumerate(resp.data):  # Ensure order is preserved
+            if X is None:
+                X = np.empty((len(texts), len(d.embedding)), dtype=np.float32)
+            X[i + j] = d.embedding
+    return X if X is not None else np.empty((0, 0), dtype=np.float32)
 
-def main():
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
     parser = argparse.ArgumentParser()
     parser.add_argument("--run-id", required=True)
     parser.add_argument("--threshold", type=float, default=DISTANCE_THRESHOLD)
-    args = parser.parse_args()
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full")
+    parser.add_argument("--assign-threshold", type=float, default=None,
+                        help="Incremental: max distance to an existing centroid (default: --threshold)")
+    parser.add_argument("--no-embed-cache", action="store_true",
+                        help="Skip the persistent embedding store (always call the API)")
+    args = parser.parse_args(argv)
 
     db_path = get_db_path()
     if not db_path.exists():
         print(f"DB not found: {db_path}")
-        return
+        return {"run_id": args.run_id, "names": 0, "mapped": 0}
 
-    conn = sqlite3.connect(str(db_path))
-    ensure_schema(conn)
+    conn = connect(db_path)
     cur = conn.cursor()
 
     print(f"--- Semantic Grouper for Run: {args.run_id} ---")
@@ -90,16 +90,60 @@ def main():
     
     if not unique_names:
         print("No product names found to group.")
-        return
+        conn.close()
+        return {"run_id": args.run_id, "names": 0, "mapped": 0}
 
     print(f"Unique names to cluster: {len(unique_names)}")
 
+    # Get counts for weighting
+    cur.execute("""
+        SELECT product_name_guess, COUNT(*) 
+        FROM ad_extractions 
+        WHERE run_id = ?
+        GROUP BY product_name_guess
+    """, (args.run_id,))
+    counts = dict(cur.fetchall()) # name -> count
+
+    # Client only on a cache miss: a fully cached run never touches the API
+    client = None
+
+    def embed_api(texts: List[str]) -> np.ndarray:
+        nonlocal client
+        client = client or OpenAI()
+        return get_embeddings(client, texts)
+
+    store = None if args.no_embed_cache else EmbeddingStore(conn, EMBEDDING_MODEL)
+
+    def embed(texts: List[str]) -> np.ndarray:
+        if store is None:
+            return embed_api(texts)
+        return store.get_or_embed(texts, embed_api, args.run_id)
+
+    if args.mode == "incremental":
+        to_insert, stats = assign_incremental(
+            conn, args.run_id, unique_names, counts,
+            embed_fn=embed,
+            model=EMBEDDING_MODEL, threshold=args.threshold, assign_threshold=args.assign_threshold,
+        )
+        if store is not None:
+            stats.update(store.stats())
+        print(json.dumps(stats, indent=2))
+        print("Persisting semantic map...")
+        cur.executemany("""
+            INSERT OR REPLACE INTO semantic_map (run_id, original_name, cluster_id, canonical_name, persistent)
+            VALUES (?, ?, ?, ?, 1)
+        """, to_insert)
+        conn.commit()
+        conn.close()
+        print("Done.")
+        return {"run_id": args.run_id, "names": len(unique_names), "mapped": len(to_insert), **stats}
+
     # 2. Generate Embeddings
-    client = OpenAI()
     print("Generating embeddings...")
-    embeddings = get_embeddings(client, unique_names)
-    X = np.array(embeddings)
-    
+    X = embed(unique_names)
+    if store is not None:
+        print(json.dumps(store.stats()))
+
     # Normalize for Cosine Distance (Aglo uses Euclidean, but normalized vectors Euclidean ~ Cosine)
     # text-embedding-3-small is usually normalized, but let's ensure.
     norms = np.linalg.norm(X, axis=1, keepdims=True)
@@ -122,15 +166,6 @@ def main():
     # Let's simple heuristic: Shortest name that is > 3 chars (prefer "Zapato" over "Zapato super increible oferta").
     # Actually, we should probably fetch counts to pick the "Head" term.
     
-    # Get counts for weighting
-    cur.execute("""
-        SELECT product_name_guess, COUNT(*) 
-        FROM ad_extractions 
-        WHERE run_id = ?
-        GROUP BY product_name_guess
-    """, (args.run_id,))
-    counts = dict(cur.fetchall()) # name -> count
-
     clusters: Dict[int, List[str]] = {}
     for name, label in zip(unique_names, labels):
         if label not in clusters:
@@ -166,6 +201,7 @@ def main():
     conn.commit()
     conn.close()
     print("Done.")
+    return {"run_id": args.run_id, "names": len(unique_names), "mapped": len(to_insert), "clusters": len(clusters)}
 
 if __name__ == "__main__":
     main()
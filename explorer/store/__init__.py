@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/store
+
+Capa compartida de acceso a explorer/store/product_memory.db.
+Todos los agentes y dashboards del explorer abren la DB por aquí:
+
+- connect(): conexión con WAL, synchronous=NORMAL, page cache, mmap y busy_timeout.
+  En WAL los lectores (dashboards) no bloquean al writer (ingesta nocturna) y viceversa.
+- ensure_schema(): aplica las migraciones pendientes de store/schema.py
+  (versión en PRAGMA user_version). Si la DB ya está al día es un solo PRAGMA.
+
+Uso:
+  from explorer.store import connect
+  conn = connect()
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from explorer.store.schema import LATEST_VERSION, MIGRATIONS, Migration
+
+DB_NAME = "product_memory.db"
+
+# =============================
+# CONFIG
+# =============================
+
+BUSY_TIMEOUT_MS = 30_000
+PRAGMAS: Dict[str, Union[int, str]] = {
+    "busy_timeout": BUSY_TIMEOUT_MS,   # primero: journal_mode=WAL puede esperar un lock
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",           # seguro en WAL; solo se pierde el último commit si cae el SO
+    "cache_size": -64_000,             # negativo = KiB (~64 MB)
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+def get_db_path() -> Path:
+    return Path(__file__).resolve().parent / DB_NAME
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Optional[Dict[str, Union[int, str]]] = None):
+    for key, value in (pragmas or PRAGMAS).items():
+        conn.execute(f"PRAGMA {key}={value}")
+
+def connect(
+    db_path: Optional[Union[str, Path]] = None,
+    check_same_thread: bool = True,
+    ensure: bool = True,
+) -> sqlite3.Connection:
+    """
+    Abre product_memory.db (o db_path) con los PRAGMAs de PRAGMAS.
+    ensure=True aplica migraciones pendientes.
+    check_same_thread=False para conexiones compartidas (st.cache_resource).
+    """
+    path = Path(db_path) if db_path else get_db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=check_same_thread)
+    apply_pragmas(conn)
+    if ensure:
+        ensure_schema(conn)
+    return conn
+
+# =============================
+# Migrations
+# =============================
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def split_statements(sql: str) -> List[str]:
+    """Parte un script SQL en sentencias completas (respeta strings y triggers)."""
+    statements = []
+    buf = ""
+    for line in sql.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                statements.append(buf.strip())
+            buf = ""
+    rest = "\n".join(l for l in buf.splitlines() if not l.strip().startswith("--")).strip()
+    if rest:
+        raise ValueError(f"Sentencia SQL incompleta: {rest[:80]}")
+    return statements
+
+def apply_migration(conn: sqlite3.Connection, migration: Migration):
+    for stmt in split_statements(migration.sql):
+        conn.execute(stmt)
+    conn.execute(f"PRAGMA user_version={int(migration.version)}")
+
+def ensure_schema(conn: sqlite3.Connection) -> int:
+    """
+    Aplica las migraciones con version > user_version (y el bump de user_version)
+    en una sola transacción. BEGIN IMMEDIATE + relectura de la versión evita que
+    dos agentes que arrancan a la vez migren dos veces.
+    """
+    if get_schema_version(conn) >= LATEST_VERSION:
+        return LATEST_VERSION
+
+    if conn.in_transaction:
+        conn.commit()
+
+    prev_isolation = conn.isolation_level
+    conn.isolation_level = None  # control manual de la transacción
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = get_schema_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version > current:
+                    apply_migration(conn, migration)
+                    current = migration.version
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = prev_isolation
+
+    return current
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+explorer/store/schema.py
+
+Registro versionado del schema de product_memory.db.
+
+- Cada Migration tiene un número de versión estrictamente creciente.
+- La versión aplicada se guarda en PRAGMA user_version.
+- Nunca editar una migración ya publicada: agregar una nueva al final de MIGRATIONS.
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+
+# =============================
+# v1: core (memory_agent)
+# =============================
+
+CORE_SQL = """
+-- 1) runs
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    timestamp TEXT,
+    queries_loaded INTEGER,
+    raw_count INTEGER,
+    dedup_count INTEGER,
+    unique_advertisers INTEGER,
+    apify_run TEXT,
+    config_json TEXT
+);
+
+-- 2) advertisers (Current State)
+CREATE TABLE IF NOT EXISTS advertisers (
+    advertiser_id TEXT PRIMARY KEY, -- page_id
+    current_page_name TEXT,
+    current_profile_uri TEXT,
+    current_like_count INTEGER,
+    current_categories_json TEXT,
+    first_seen_at TEXT,
+    last_seen_at TEXT,
+    status TEXT -- 'active', 'dormant'
+);
+
+-- 3) advertiser_profile_history (SCD)
+CREATE TABLE IF NOT EXISTS advertiser_profile_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    advertiser_id TEXT,
+    observed_at TEXT,
+    page_name TEXT,
+    profile_uri TEXT,
+    like_count INTEGER,
+    categories_json TEXT,
+    FOREIGN KEY(advertiser_id) REFERENCES advertisers(advertiser_id)
+);
+
+-- 4) ads (Current State)
+CREATE TABLE IF NOT EXISTS ads (
+    ad_id TEXT PRIMARY KEY, -- ad_archive_id
+    advertiser_id TEXT,
+    first_seen_at TEXT,
+    last_seen_at TEXT,
+    current_is_active BOOLEAN,
+    current_link_url TEXT,
+    current_domain TEXT,
+    current_body_hash TEXT,
+    current_media_hash TEXT,
+    FOREIGN KEY(advertiser_id) REFERENCES advertisers(advertiser_id)
+);
+
+-- 5) ad_snapshots (One per run per ad)
+CREATE TABLE IF NOT EXISTS ad_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    ad_id TEXT,
+    observed_at TEXT,
+    is_active BOOLEAN,
+    start_date TEXT,
+    end_date TEXT,
+    link_url TEXT,
+    domain TEXT,
+    title TEXT,
+    body_text TEXT,
+    cta_type TEXT,
+    publisher_platform_json TEXT,
+    _query_matched TEXT,
+    _intent_guess TEXT,
+    snapshot_hash TEXT,
+    FOREIGN KEY(run_id) REFERENCES runs(run_id),
+    FOREIGN KEY(ad_id) REFERENCES ads(ad_id),
+    UNIQUE(run_id, ad_id)
+);
+
+-- 6) ad_extractions (Agent 2 output)
+CREATE TABLE IF NOT EXISTS ad_extractions (
+    run_id TEXT,
+    ad_id TEXT,
+    product_name_guess TEXT,
+    category TEXT,
+    subcategory TEXT,
+    signals_json TEXT,
+    evidence_json TEXT,
+    confidence REAL,
+    UNIQUE(run_id, ad_id)
+);
+
+-- Indices
+CREATE INDEX IF NOT EXISTS idx_adv_last_seen ON advertisers(last_seen_at);
+CREATE INDEX IF NOT EXISTS idx_ads_adv_last_seen ON ads(advertiser_id, last_seen_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_domain ON ad_snapshots(domain);
+"""
+
+# =============================
+# v2: media (media_hash_agent)
+# =============================
+
+MEDIA_SQL = """
+-- 7) image_cache (global cache by URL)
+CREATE TABLE IF NOT EXISTS image_cache (
+    image_url TEXT PRIMARY KEY,
+    dhash64 TEXT,
+    fetched_at TEXT
+);
+
+-- 8) ad_media (traceability per run/ad)
+CREATE TABLE IF NOT EXISTS ad_media (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    ad_id TEXT,
+    image_url TEXT,
+    dhash64 TEXT,
+    created_at TEXT,
+    UNIQUE(run_id, ad_id, image_url)
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_cache_hash ON image_cache(dhash64);
+CREATE INDEX IF NOT EXISTS idx_ad_media_ad ON ad_media(ad_id);
+CREATE INDEX IF NOT EXISTS idx_ad_media_hash ON ad_media(dhash64);
+"""
+
+# =============================
+# v3: semantic_map (semantic_grouper_agent)
+# =============================
+
+SEMANTIC_SQL = """
+CREATE TABLE IF NOT EXISTS semantic_map (
+    run_id TEXT,
+    original_name TEXT,
+    cluster_id INTEGER,
+    canonical_name TEXT,
+    PRIMARY KEY (run_id, original_name)
+);
+"""
+
+# =============================
+# v4: product grouping (product_grouper_agent)
+# =============================
+
+PRODUCTS_SQL = """
+CREATE TABLE IF NOT EXISTS product_concepts (
+  product_id TEXT PRIMARY KEY,
+  canonical_name TEXT,
+  category TEXT,
+  subcategory TEXT,
+  signals_json TEXT,
+  rationale_json TEXT,
+  candidate_score REAL,
+  first_seen_at TEXT,
+  last_seen_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS product_observations (
+  run_id TEXT,
+  product_id TEXT,
+  ads_count INTEGER,
+  advertisers_count INTEGER,
+  avg_confidence REAL,
+  created_at TEXT,
+  PRIMARY KEY (run_id, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS ad_to_product (
+  run_id TEXT,
+  ad_id TEXT,
+  product_id TEXT,
+  advertiser_id TEXT,
+  match_basis TEXT,
+  confidence REAL,
+  created_at TEXT,
+  PRIMARY KEY (run_id, ad_id)
+);
+
+CREATE TABLE IF NOT EXISTS advertiser_product_state (
+  advertiser_id TEXT,
+  product_id TEXT,
+  first_seen_at TEXT,
+  last_seen_at TEXT,
+  last_run_id TEXT,
+  status TEXT,
+  PRIMARY KEY (advertiser_id, product_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_prod_obs_run ON product_observations(run_id);
+CREATE INDEX IF NOT EXISTS idx_ad_to_product_prod ON ad_to_product(product_id);
+CREATE INDEX IF NOT EXISTS idx_adv_prod_last ON advertiser_product_state(last_seen_at);
+"""
+
+# =============================
+# v5: advertiser state (advertiser_state_agent)
+# =============================
+
+ADVERTISER_STATE_SQL = """
+-- Snapshots de estadisticas del anunciante por run
+CREATE TABLE IF NOT EXISTS advertiser_run_stats (
+    run_id TEXT,
+    advertiser_id TEXT,
+    total_ads INTEGER,
+    ads_with_cod INTEGER,
+    ads_with_free_shipping INTEGER,
+    ads_with_video INTEGER,
+    main_category TEXT,
+    created_at TEXT,
+    PRIMARY KEY (run_id, advertiser_id)
+);
+
+-- Estado del anunciante para la lógica del agente (separado de 'advertisers')
+CREATE TABLE IF NOT EXISTS advertiser_state (
+    advertiser_id TEXT PRIMARY KEY,
+    current_status TEXT, -- 'new', 'monitoring', 'candidate_pool', 'dormant', 'winner'
+    first_seen_at TEXT,
+    last_seen_at TEXT,
+    total_runs_seen INTEGER DEFAULT 0,
+    last_run_id TEXT,
+    notes TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_adv_run_stats_run ON advertiser_run_stats(run_id);
+CREATE INDEX IF NOT EXISTS idx_adv_state_status ON advertiser_state(current_status);
+"""
+
+# =============================
+# v6: validadores HTTP en image_cache (media_fetcher)
+# =============================
+
+IMAGE_CACHE_VALIDATORS_SQL = """
+ALTER TABLE image_cache ADD COLUMN etag TEXT;
+ALTER TABLE image_cache ADD COLUMN last_modified TEXT;
+ALTER TABLE image_cache ADD COLUMN validated_at TEXT;
+"""
+
+# =============================
+# v7: pHash en image_cache (image_hashing)
+# =============================
+
+IMAGE_CACHE_PHASH_SQL = """
+ALTER TABLE image_cache ADD COLUMN phash64 TEXT;
+"""
+
+# =============================
+# v8: índice Hamming de dHash (hash_index.py), 4 bandas de 16 bits
+# =============================
+
+HASH_INDEX_SQL = """
+-- WITHOUT ROWID: los índices por banda incluyen la PK (dhash64) y son cubrientes
+CREATE TABLE IF NOT EXISTS hash_index (
+    dhash64 TEXT PRIMARY KEY,
+    b0 INTEGER NOT NULL,
+    b1 INTEGER NOT NULL,
+    b2 INTEGER NOT NULL,
+    b3 INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_hash_index_b0 ON hash_index(b0);
+CREATE INDEX IF NOT EXISTS idx_hash_index_b1 ON hash_index(b1);
+CREATE INDEX IF NOT EXISTS idx_hash_index_b2 ON hash_index(b2);
+CREATE INDEX IF NOT EXISTS idx_hash_index_b3 ON hash_index(b3);
+"""
+
+# =============================
+# v9: cache de respuestas LLM (llm_cache.py)
+# =============================
+
+LLM_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,        -- sha256(kind, model, prompt_version, payload normalizado[, extra])
+    kind TEXT,                   -- 'text' | 'vision' | ...
+    model TEXT,
+    response_json TEXT,
+    size_bytes INTEGER,
+    created_at TEXT,
+    last_hit_at TEXT,
+    hit_count INTEGER DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache(last_hit_at);
+"""
+
+# =============================
+# v10: clusters semánticos persistentes (semantic_clusters.py, modo incremental)
+# =============================
+
+SEMANTIC_CLUSTERS_SQL = """
+CREATE TABLE IF NOT EXISTS semantic_clusters (
+    cluster_id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    canonical_name TEXT,
+    dim INTEGER NOT NULL,
+    centroid BLOB NOT NULL,      -- float32[dim], media (sin normalizar) de los embeddings miembros
+    n_members INTEGER NOT NULL,
+    created_run_id TEXT,
+    updated_run_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_semantic_clusters_model ON semantic_clusters(model);
+
+-- nombre ya visto -> cluster (un run nuevo no re-embebe nombres conocidos)
+CREATE TABLE IF NOT EXISTS semantic_members (
+    model TEXT NOT NULL,
+    original_name TEXT NOT NULL,
+    cluster_id INTEGER NOT NULL,
+    first_run_id TEXT,
+    last_run_id TEXT,
+    PRIMARY KEY (model, original_name)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_semantic_members_cluster ON semantic_members(cluster_id);
+"""
+
+# =============================
+# v11: store de embeddings (embedding_store.py): matriz float16 .npy mmap + índice de offsets
+# =============================
+
+EMBEDDING_STORE_SQL = """
+-- una matriz por modelo; el archivo vive en store/embeddings/ junto a la DB
+CREATE TABLE IF NOT EXISTS embedding_matrices (
+    model TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    file_name TEXT NOT NULL,     -- <modelo>.<generation>.f16.npy (compactar crea una generación nueva)
+    generation INTEGER NOT NULL,
+    n_rows INTEGER NOT NULL,     -- filas reservadas (high watermark); las huérfanas se recuperan al compactar
+    capacity INTEGER NOT NULL,   -- filas en el header del .npy
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS embedding_index (
+    model TEXT NOT NULL,
+    text_key TEXT NOT NULL,      -- texto normalizado (NFC + espacios colapsados)
+    row INTEGER NOT NULL,
+    created_run_id TEXT,
+    last_used_run_id TEXT,
+    last_used_at TEXT,
+    PRIMARY KEY (model, text_key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_embedding_index_last_used ON embedding_index(model, last_used_at);
+"""
+
+# =============================
+# v12: índice ANN de productos (product_index.py): qué product_concepts están en la colección qdrant
+# =============================
+
+PRODUCT_ANN_SQL = """
+CREATE TABLE IF NOT EXISTS product_ann (
+    product_id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    canonical_name TEXT,         -- nombre/categoría indexados: si cambian en product_concepts se re-indexa
+    category TEXT,
+    indexed_at TEXT
+) WITHOUT ROWID;
+"""
+
+# =============================
+# v13: rollups por run para los dashboards (rollups.py, refresco al final de product_grouper)
+# =============================
+
+ROLLUPS_SQL = """
+-- search tags (GROUP_CONCAT DISTINCT de _query_matched) por producto y run
+CREATE TABLE IF NOT EXISTS rollup_product_run (
+    run_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    search_tags TEXT,
+    PRIMARY KEY (run_id, product_id)
+) WITHOUT ROWID;
+
+-- primera imagen por anuncio (menor ad_media.id entre todos los runs)
+CREATE TABLE IF NOT EXISTS rollup_ad_image (
+    ad_id TEXT PRIMARY KEY,
+    media_id INTEGER,
+    image_url TEXT
+) WITHOUT ROWID;
+
+-- directorio de anunciantes por run
+CREATE TABLE IF NOT EXISTS rollup_advertiser_run (
+    run_id TEXT NOT NULL,
+    advertiser_id TEXT NOT NULL,
+    ads_in_run INTEGER,
+    categories_seen TEXT,
+    search_tags TEXT,
+    PRIMARY KEY (run_id, advertiser_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_rollup_adv_run_ads ON rollup_advertiser_run(run_id, ads_in_run);
+
+-- runs con rollups al día
+CREATE TABLE IF NOT EXISTS rollup_runs (
+    run_id TEXT PRIMARY KEY,
+    refreshed_at TEXT
+);
+
+-- drilldown: anuncios de un producto en un run
+CREATE INDEX IF NOT EXISTS idx_ad_to_product_run_prod ON ad_to_product(run_id, product_id);
+"""
+
+# =============================
+# v14: export columnar a Parquet (parquet_export.py)
+# =============================
+
+PARQUET_EXPORTS_SQL = """
+-- particiones run_id=<run> escritas por tabla (para exportar sólo runs nuevos)
+CREATE TABLE IF NOT EXISTS parquet_exports (
+    table_name TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    rows INTEGER,
+    bytes INTEGER,
+    exported_at TEXT,
+    PRIMARY KEY (table_name, run_id)
+) WITHOUT ROWID;
+"""
+
+# =============================
+# v15: series de tendencia por run (trends.py)
+# =============================
+
+TRENDS_SQL = """
+-- una fila por producto y run: serie principal = advertisers_count
+CREATE TABLE IF NOT EXISTS product_trends (
+    run_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    advertisers_count INTEGER,
+    ads_count INTEGER,
+    delta INTEGER,              -- vs run anterior
+    growth REAL,                -- delta / max(anterior, 1)
+    rolling_growth REAL,        -- pendiente de log1p(serie) por run en la ventana
+    growth_z REAL,              -- pendiente de sqrt(serie) / ruido Poisson
+    acceleration REAL,          -- cambio de la pendiente entre los dos últimos pasos
+    runs_present INTEGER,       -- runs de la ventana con la serie > 0
+    days_since_first_seen REAL,
+    is_new INTEGER,
+    scaling INTEGER,
+    velocity REAL,              -- rolling_growth * log1p(serie): criterio de ranking
+    PRIMARY KEY (run_id, product_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_product_trends_velocity ON product_trends(run_id, velocity);
+
+-- una fila por anunciante y run: serie principal = advertiser_run_stats.total_ads
+CREATE TABLE IF NOT EXISTS advertiser_trends (
+    run_id TEXT NOT NULL,
+    advertiser_id TEXT NOT NULL,
+    total_ads INTEGER,
+    delta INTEGER,
+    growth REAL,
+    rolling_growth REAL,
+    growth_z REAL,
+    acceleration REAL,
+    runs_present INTEGER,
+    days_since_first_seen REAL,
+    is_new INTEGER,
+    scaling INTEGER,
+    velocity REAL,
+    PRIMARY KEY (run_id, advertiser_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_advertiser_trends_velocity ON advertiser_trends(run_id, velocity);
+
+-- runs con tendencias calculadas (kind: product | advertiser)
+CREATE TABLE IF NOT EXISTS trend_runs (
+    kind TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    window_size INTEGER,
+    rows INTEGER,
+    computed_at TEXT,
+    PRIMARY KEY (kind, run_id)
+) WITHOUT ROWID;
+"""
+
+# =============================
+# v16: cache de scrapes de Ads Library compartido spy_agent / explorer (scrape_cache.py)
+# =============================
+
+SCRAPE_CACHE_SQL = """
+-- cada ad scrapeado una sola vez (ad_key = adArchiveID o hash del item); item JSON comprimido con zlib
+-- sin los campos de URL de origen (se reponen al servirlo para otra query)
+CREATE TABLE IF NOT EXISTS scrape_cache_ads (
+    ad_key TEXT PRIMARY KEY,
+    item_z BLOB,
+    size_bytes INTEGER,
+    first_seen_at TEXT,
+    last_seen_at TEXT
+) WITHOUT ROWID;
+
+-- una búsqueda scrapeada: URL normalizada + país + ventana de fechas
+CREATE TABLE IF NOT EXISTS scrape_cache_queries (
+    cache_key TEXT PRIMARY KEY,      -- sha256(url normalizada, país, ventana)
+    search_url TEXT,                 -- normalizada, sin country
+    country TEXT,
+    date_window TEXT,                -- period del actor ('all' si vacío)
+    limit_per_source INTEGER,        -- NULL = sin límite
+    ad_details INTEGER,
+    item_count INTEGER,
+    scraped_at TEXT,
+    apify_run_id TEXT
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_scrape_cache_queries_scraped ON scrape_cache_queries(scraped_at);
+
+-- items de cada búsqueda en el orden del dataset (pos), con los campos que traían la URL de origen
+CREATE TABLE IF NOT EXISTS scrape_cache_query_ads (
+    cache_key TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    ad_key TEXT NOT NULL,
+    source_fields TEXT,
+    PRIMARY KEY (cache_key, pos)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_scrape_cache_query_ads_ad ON scrape_cache_query_ads(ad_key);
+"""
+
+# =============================
+# v17: origen del cluster_id en semantic_map (semantic_grouper_agent)
+# =============================
+
+SEMANTIC_MAP_PERSISTENT_SQL = """
+-- 0: label local del run (--mode full); 1: cluster_id de semantic_clusters (--mode incremental)
+ALTER TABLE semantic_map ADD COLUMN persistent INTEGER NOT NULL DEFAULT 0;
+"""
+
+# =============================
+# v18: marca de los datos fuente de cada rollup (rollups.py)
+# =============================
+
+ROLLUP_SOURCE_MARK_SQL = """
+-- conteos por run de ad_snapshots/ad_media/ad_extractions/ad_to_product al momento del refresh;
+-- si cambian, ensure_rollups recalcula (un rollup hecho a mitad del pipeline no queda congelado)
+ALTER TABLE rollup_runs ADD COLUMN source_mark TEXT;
+"""
+
+# v1-v5 usan CREATE ... IF NOT EXISTS: una DB creada por las versiones
+# anteriores de los agentes (user_version = 0) se adopta sin cambios.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "core", CORE_SQL),
+    Migration(2, "media", MEDIA_SQL),
+    Migration(3, "semantic_map", SEMANTIC_SQL),
+    Migration(4, "products", PRODUCTS_SQL),
+    Migration(5, "advertiser_state", ADVERTISER_STATE_SQL),
+    Migration(6, "image_cache_validators", IMAGE_CACHE_VALIDATORS_SQL),
+    Migration(7, "image_cache_phash", IMAGE_CACHE_PHASH_SQL),
+    Migration(8, "hash_index", HASH_INDEX_SQL),
+    Migration(9, "llm_cache", LLM_CACHE_SQL),
+    Migration(10, "semantic_clusters", SEMANTIC_CLUSTERS_SQL),
+    Migration(11, "embedding_store", EMBEDDING_STORE_SQL),
+    Migration(12, "product_ann", PRODUCT_ANN_SQL),
+    Migration(13, "rollups", ROLLUPS_SQL),
+    Migration(14, "parquet_exports", PARQUET_EXPORTS_SQL),
+    Migration(15, "trends", TRENDS_SQL),
+    Migration(16, "scrape_cache", SCRAPE_CACHE_SQL),
+    Migration(17, "semantic_map_persistent", SEMANTIC_MAP_PERSISTENT_SQL),
+    Migration(18, "rollup_source_mark", ROLLUP_SOURCE_MARK_SQL),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
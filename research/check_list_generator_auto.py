@@ -33,11 +33,16 @@ if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
 try:
-    from spy_agent.apy_fb_library_agent import run_spy_flow
+    from explorer.apify_pool import load_apify_tokens, probe_tokens
+except ImportError:
+    load_apify_tokens = probe_tokens = None
+
+try:
+    from spy_agent.apy_fb_library_agent import run_research_batch, run_spy_flow, run_spy_batch
     from spy_agent.process_info import slugify
 except ImportError as e:
     logger.warning(f"Could not import Spy Agent modules: {e}")
-    run_spy_flow = None
+    run_research_batch = run_spy_flow = run_spy_batch = None
     slugify = None
 
 # Configuration
@@ -139,8 +144,7 @@ def run_spy_and_get_competitor_status(product_name: str, product_desc: str) -> b
 
     logger.info(f"Running Spy Agent for: {product_name}...")
     
-    # List of keys to try
-    apify_keys = ["APIFY_APY_KEY", "APIFY_APY_KEY_2", "APIFY_APY_KEY_3"]
+    apify_keys = ordered_apify_keys()
     success = False
 
     for key_name in apify_keys:
@@ -171,6 +175,20 @@ def run_spy_and_get_competitor_status(product_name: str, product_desc: str) -> b
          logger.error("All Apify keys failed. Cannot proceed with Spy Agent.")
          return None
 
+    return read_competitor_status(product_name)
+
+def ordered_apify_keys() -> List[str]:
+    """List of keys to try (ordered by remaining Apify quota when available)."""
+    apify_keys = ["APIFY_APY_KEY", "APIFY_APY_KEY_2", "APIFY_APY_KEY_3"]
+    if load_apify_tokens:
+        from apify_client import ApifyClient
+        tokens = dict(load_apify_tokens())
+        slots = probe_tokens(list(tokens.items()), ApifyClient)
+        apify_keys = [s.name for s in sorted(slots, key=lambda s: -s.budget())]
+    return apify_keys
+
+def read_competitor_status(product_name: str) -> bool:
+    """Reads 'producto_test' from the Spy Agent rank report (None if missing/unreadable)."""
     try:
         # Construct path to rank report
         product_slug = slugify(product_name)
@@ -198,6 +216,59 @@ def run_spy_and_get_competitor_status(product_name: str, product_desc: str) -> b
         logger.error(f"Error reading Spy Agent results: {e}")
         return None
 
+def run_spy_batch_and_get_competitor_status(products: List[tuple]) -> Dict[str, Any]:
+    """
+    Batch version of run_spy_and_get_competitor_status for [(product_name, product_desc)]:
+    one shared Spy Agent run for all products (concurrent research, shared Apify run,
+    process-pool reports). Returns {product_name: True/False/None}.
+    """
+    if not run_spy_batch or not slugify:
+        logger.warning("Spy Agent not available. Assuming competitor check failed (None).")
+        return {name: None for name, _ in products}
+
+    logger.info(f"Running Spy Agent batch for {len(products)} products...")
+    results = None
+
+    # Research (OpenAI) once, outside the key failover: retries only repeat the Apify scraping
+    researched, errors = run_research_batch(products)
+    for name, e in errors.items():
+        logger.error(f"Research failed for {name}: {e}")
+    if not researched:
+        logger.error("No product passed research. Cannot proceed with Spy Agent.")
+        return {name: None for name, _ in products}
+    researched_products = [(name, desc) for name, desc in products if name in researched]
+
+    for key_name in ordered_apify_keys():
+        api_token = os.getenv(key_name)
+        if not api_token:
+            logger.warning(f"Skipping {key_name}: Key not found in environment.")
+            continue
+
+        logger.info(f"Attempting Spy Agent batch with key: {key_name}...")
+        try:
+            results = run_spy_batch(
+                products=researched_products,
+                country="CO", # Defaulting to CO
+                limit_per_source=80,
+                scrape_ad_details=False,
+                apify_token=api_token,
+                research=False
+            )
+            break # Exit loop on success
+
+        except Exception as e:
+            logger.error(f"Error running Spy Agent batch with {key_name}: {e}")
+            logger.info("Retrying with next key if available...")
+
+    if results is None:
+        logger.error("All Apify keys failed. Cannot proceed with Spy Agent.")
+        return {name: None for name, _ in products}
+
+    return {
+        name: read_competitor_status(name) if results.get(name, {}).get("ok") else None
+        for name, _ in products
+    }
+
 def main():
     logger.info("Fetching products from info_products.py...")
     try:
@@ -211,6 +282,8 @@ def main():
     logger.info(f"Found {total_products} products to process (Filtered 'SI').")
 
     # Mapping Updated for New Columns (A-L)
+    # Pass 1: parse rows + download images; Spy Agent runs once for the whole batch afterwards
+    pending = []
     for i, (row_idx, row) in enumerate(products_data):
         # Safety check for length (Need at least up to Warranty/Index 8)
         if len(row) < 9:
@@ -244,9 +317,14 @@ def main():
         
         logger.info(f"Ensuring images exist in: {images_dir}")
         download_product_images(p_name, images_dir)
-        
-        # 1. RUN SPY AGENT FIRST
-        competitors_ok = run_spy_and_get_competitor_status(p_name, p_desc)
+        pending.append((i, row_idx, p_name, p_price, p_desc, p_warranty, is_good_margin))
+
+    # 1. RUN SPY AGENT FIRST (all products in one batch)
+    competitor_status = run_spy_batch_and_get_competitor_status([(p[2], p[4]) for p in pending]) if pending else {}
+
+    for i, row_idx, p_name, p_price, p_desc, p_warranty, is_good_margin in pending:
+        logger.info(f"[{i+1}/{total_products}] Market research for Row {row_idx}: {p_name}")
+        competitors_ok = competitor_status.get(p_name)
         
         if competitors_ok is None:
              logger.warning("Spy Agent run failed or inconclusive. Proceeding without competitor check.")
@@ -1,16 +1,20 @@
 import os
 import json
+import sys
 import shutil
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
-from io import BytesIO
 
 from dotenv import load_dotenv
-from PIL import Image
 
 from google import genai
 from google.genai import types
 
+# Quick hack to allow importing from utils if running as script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.image_prep import prepare_image
+
 # -----------------------------
 # CONFIG
 # -----------------------------
@@ -152,18 +156,11 @@ def list_images(folder: Path, max_count: int) -> List[Path]:
 
 def image_path_to_jpeg_part(path: Path, max_side_px: int = MAX_SIDE_PX, jpeg_quality: int = JPEG_QUALITY) -> types.Part:
     """
-    Reads an image from disk, converts to RGB, resizes (thumbnail), encodes to JPEG bytes,
-    and returns a types.Part.from_bytes suitable for Gemini vision input.
+    Image resized to max_side_px and re-encoded to JPEG (shared image cache: once per file/size),
+    as a types.Part.from_bytes suitable for Gemini vision input.
     """
-    with Image.open(path) as img:
-        img = img.convert("RGB")
-        img.thumbnail((max_side_px, max_side_px), Image.LANCZOS)
-
-        buf = BytesIO()
-        img.save(buf, format="JPEG", quality=jpeg_quality, optimize=True)
-        jpeg_bytes = buf.getvalue()
-
-    return types.Part.from_bytes(data=jpeg_bytes, mime_type="image/jpeg")
+    data, mime = prepare_image(path, long_edge=max_side_px, quality=jpeg_quality)
+    return types.Part.from_bytes(data=data, mime_type=mime)
 
 
 def safe_parse_response(response) -> Dict[str, Any]:
@@ -1,11 +1,17 @@
 import os
 import json
+import sys
 import time
 import re
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 from PIL import Image
+
+# Quick hack to allow importing from utils if running as script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.image_prep import load_image
 from openai import OpenAI
 from google import genai
 from google.genai import types
@@ -108,9 +114,7 @@ def load_reference_images(product_dir: Path, max_ref_images: int = 4) -> List[Im
     images = []
     for p in paths:
         try:
-            img = Image.open(p)
-            if img.mode != "RGB": img = img.convert("RGB")
-            images.append(img)
+            images.append(load_image(p))
         except Exception as e:
             print(f"⚠️ Failed to load image {p.name}: {e}")
     return images
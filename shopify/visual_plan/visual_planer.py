@@ -1,18 +1,17 @@
 import os
 import json
-import base64
 import time
 import sys
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Callable
-from io import BytesIO
 from dotenv import load_dotenv
 from openai import OpenAI
-from PIL import Image
 
 # Quick hack to allow importing from utils if running as script
 sys.path.append(os.getcwd())
 
+from utils.image_prep import LOW_DETAIL_LONG_EDGE, image_data_url
+
 try:
     from utils.logger import setup_logger, log_section, update_context
 except ImportError:
@@ -309,22 +308,9 @@ class VisualPlaner:
         self.supported_img_exts = {".png", ".jpg", ".jpeg", ".webp"}
 
     def _encode_image(self, image_path: Path) -> str:
-        """Encodes an image to base64 string, resizing if necessary."""
+        """Data URL of the image for a detail=low vision prompt (shared image cache, resized once per file)."""
         try:
-            with Image.open(image_path) as img:
-                # Convert to RGB if needed
-                if img.mode not in ("RGB", "L"):
-                    img = img.convert("RGB")
-                    
-                # Resize if larger than 1024x1024 to save tokens/bandwidth
-                max_size = (1024, 1024)
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # Save to BytesIO
-                buffered = BytesIO()
-                # Optimize to reduce size further
-                img.save(buffered, format="JPEG", quality=85, optimize=True)
-                return base64.b64encode(buffered.getvalue()).decode('utf-8')
+            return image_data_url(image_path, long_edge=LOW_DETAIL_LONG_EDGE)
         except Exception as e:
             logger.error(f"⚠️ Error encoding image {image_path}: {e}")
             return ""
@@ -432,11 +418,13 @@ class VisualPlaner:
 
         # Add Product Images (Vision)
         for img_path in assets["product_images"]:
-            b64_str = self._encode_image(img_path)
+            data_url = self._encode_image(img_path)
+            if not data_url:
+                continue
             content_list.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{b64_str}",
+                    "url": data_url,
                     "detail": "low"
                 }
             })
@@ -444,7 +432,9 @@ class VisualPlaner:
         # Add Section Images (Vision)
         for key, paths in assets["section_images"].items():
             for img_path in paths:
-                b64_str = self._encode_image(img_path)
+                data_url = self._encode_image(img_path)
+                if not data_url:
+                    continue
                 content_list.append({
                     "type": "text",
                     "text": f"[Image Context: {key} - {img_path.name}]"
@@ -452,7 +442,7 @@ class VisualPlaner:
                 content_list.append({
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{b64_str}",
+                        "url": data_url,
                         "detail": "low"
                     }
                 })
@@ -26,14 +26,17 @@ import json
 import os
 import re
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import quote_plus, urlparse, parse_qs
 
 from dotenv import load_dotenv
 from apify_client import ApifyClient
 
+from explorer.scrape_cache import open_cache
 from utils.logger import setup_logger
 logger = setup_logger("SpyAgent_ApifyActor")
 
@@ -47,6 +50,9 @@ load_dotenv()
 # Nombre del producto (igual al usado para crear la carpeta output)
 NAME = "Ashawanda Ksm 66 X 2 Unidades"
 
+# Root del repo (output/<producto>/ cuelga de aquí)
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
 # Actor (slug o actorId)
 APIFY_ACTOR = "curious_coder/facebook-ads-library-scraper"
 
@@ -73,6 +79,10 @@ SCRAPE_PAGE_ADS_COUNTRY_CODE = None  # si None, se setea igual que SEARCH_COUNTR
 # Proxy opcional (dict). Ej: {"useApifyProxy": True}
 PROXY = None
 
+# Cache de scrapes compartido con el explorer (explorer/scrape_cache.py, en product_memory.db):
+# una query scrapeada hace menos de estas horas se sirve del cache. 0/None = siempre scrapear.
+SCRAPE_CACHE_MAX_AGE_HOURS = 72
+
 
 # =============================
 # Helpers base
@@ -274,6 +284,19 @@ def compute_ad_dedupe_key(item: Dict[str, Any]) -> Tuple[str, str]:
     return advertiser_key, ad_key
 
 
+def enrich_item(item: Dict[str, Any], ukey: str) -> Dict[str, Any]:
+    """Copia del item con _dedupe_key y, si la URL de origen trae ?q=, _source_query_guess."""
+    enriched = dict(item)
+    enriched["_dedupe_key"] = ukey
+
+    possible_url = first_present(enriched, ["sourceUrl", "source_url", "inputUrl", "input_url", "url", "adLibraryUrl"])
+    if isinstance(possible_url, str):
+        q = extract_query_from_url(possible_url)
+        if q:
+            enriched["_source_query_guess"] = q
+    return enriched
+
+
 # =============================
 # Runner principal
 # =============================
@@ -284,22 +307,36 @@ def run_actor_and_save(
     run_input: Dict[str, Any],
     raw_out_path: Path,
     dedup_out_path: Path,
+    cached_items: Iterable[Dict[str, Any]] = (),
+    recorder: Optional[Any] = None,
 ) -> Dict[str, Any]:
-
-    run = client.actor(actor_id).call(run_input=run_input)
-    dataset_id = run.get("defaultDatasetId")
-    if not dataset_id:
-        raise RuntimeError(f"No se encontró defaultDatasetId en la respuesta del run: {run}")
+    """
+    Corre el actor (si run_input trae URLs) y escribe raw/dedup con sus items seguidos de cached_items.
+    recorder: ScrapeRecorder que guarda los items nuevos en el cache (solo si el run termina SUCCEEDED).
+    """
+    run, dataset_id, fresh = None, None, []
+    if run_input.get("urls"):
+        run = client.actor(actor_id).call(run_input=run_input)
+        dataset_id = run.get("defaultDatasetId")
+        if not dataset_id:
+            raise RuntimeError(f"No se encontró defaultDatasetId en la respuesta del run: {run}")
+        fresh = client.dataset(dataset_id).iterate_items()
 
     seen = set()
     advertisers = set()
     raw_count = 0
     dedup_count = 0
+    cached_count = 0
 
     raw_out_path.parent.mkdir(parents=True, exist_ok=True)
 
     with raw_out_path.open("w", encoding="utf-8") as f_raw, dedup_out_path.open("w", encoding="utf-8") as f_dedup:
-        for item in client.dataset(dataset_id).iterate_items():
+        tagged = chain(((False, item) for item in fresh), ((True, item) for item in cached_items))
+        for cached, item in tagged:
+            if cached:
+                cached_count += 1
+            elif recorder is not None:
+                recorder.add(item)
             raw_count += 1
             f_raw.write(json.dumps(item, ensure_ascii=False) + "\n")
 
@@ -311,72 +348,44 @@ def run_actor_and_save(
                 continue
             seen.add(ukey)
 
-            enriched = dict(item)
-            enriched["_dedupe_key"] = ukey
-
-            possible_url = first_present(enriched, ["sourceUrl", "source_url", "inputUrl", "input_url", "url", "adLibraryUrl"])
-            if isinstance(possible_url, str):
-                q = extract_query_from_url(possible_url)
-                if q:
-                    enriched["_source_query_guess"] = q
+            enriched = enrich_item(item, ukey)
 
             dedup_count += 1
             f_dedup.write(json.dumps(enriched, ensure_ascii=False) + "\n")
 
+    if recorder is not None and run and run.get("status") == "SUCCEEDED":
+        recorder.commit(run.get("id"))
+
     return {
-        "run": run,
+        "run": run or {},
         "dataset_id": dataset_id,
         "raw_count": raw_count,
         "dedup_count": dedup_count,
+        "cached_count": cached_count,
         "unique_advertisers": len(advertisers),
     }
 
 
-def run_apify_actor(
-    name: str = NAME,
-    country_code: str = SEARCH_COUNTRY,
-    limit_per_source: int = LIMIT_PER_SOURCE,
-    count_total: Optional[int] = COUNT_TOTAL,
-    period: str = PERIOD,
-    scrape_ad_details: bool = SCRAPE_AD_DETAILS,
+def load_product_urls(
+    name: str,
+    norm_country: str,
     active_status: str = ACTIVE_STATUS,
     ad_type: str = AD_TYPE,
     search_type: str = SEARCH_TYPE,
     media_type: str = MEDIA_TYPE,
-    proxy: Optional[Dict] = PROXY,
-    apify_token: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
-    Función orquestadora que prepara los inputs y corre el actor.
-    Retorna el dict summary.
+    Carpeta del producto (crea apify_results/), querys deduplicadas y sus URLs de Ads Library.
     """
-    if not apify_token:
-        apify_token = os.getenv("APIFY_APY_KEY") or os.getenv("APIFY_API_TOKEN") or os.getenv("APIFY_TOKEN")
-    
-    if not apify_token:
-        raise RuntimeError("Falta APIFY_APY_KEY (o APIFY_API_TOKEN) en variables de entorno.")
-
-    client = ApifyClient(apify_token)
-    
-    # Directorios
-    root_dir = Path(__file__).resolve().parent.parent
     folder_name = slugify(name)
-    product_dir = root_dir / "output" / folder_name
-    
-    apify_results_dir = product_dir / "apify_results"
-    apify_results_dir.mkdir(parents=True, exist_ok=True)
-    
+    product_dir = ROOT_DIR / "output" / folder_name
+    (product_dir / "apify_results").mkdir(parents=True, exist_ok=True)
+
     query_path = product_dir / f"querys_fblibrary_{folder_name}.json"
     if not query_path.exists():
         raise FileNotFoundError(f"No se encontró el archivo de queries: {query_path}")
 
-    # País normalizado
-    norm_country = normalize_country(country_code)
-    # Si scrapePageAds.countryCode es None, usamos el mismo país
-    scrape_country = normalize_country(SCRAPE_PAGE_ADS_COUNTRY_CODE) if SCRAPE_PAGE_ADS_COUNTRY_CODE else norm_country
-
     queries = dedupe_preserve_order(load_queries_json(query_path))
-
     urls = [
         build_ads_library_search_url(
             query=q,
@@ -388,7 +397,25 @@ def run_apify_actor(
         )
         for q in queries
     ]
+    return {
+        "name": name,
+        "folder_name": folder_name,
+        "product_dir": product_dir,
+        "query_path": query_path,
+        "queries": queries,
+        "urls": urls,
+    }
 
+
+def build_run_input(
+    urls: List[str],
+    scrape_ad_details: bool,
+    limit_per_source: Optional[int],
+    count_total: Optional[int],
+    period: str,
+    scrape_country: str,
+    proxy: Optional[Dict],
+) -> Dict[str, Any]:
     run_input: Dict[str, Any] = {
         "urls": [{"url": u} for u in urls],
         "scrapeAdDetails": bool(scrape_ad_details),
@@ -401,7 +428,58 @@ def run_apify_actor(
     }
 
     # limpia None
-    run_input = {k: v for k, v in run_input.items() if v is not None}
+    return {k: v for k, v in run_input.items() if v is not None}
+
+
+def run_apify_actor(
+    name: str = NAME,
+    country_code: str = SEARCH_COUNTRY,
+    limit_per_source: int = LIMIT_PER_SOURCE,
+    count_total: Optional[int] = COUNT_TOTAL,
+    period: str = PERIOD,
+    scrape_ad_details: bool = SCRAPE_AD_DETAILS,
+    active_status: str = ACTIVE_STATUS,
+    ad_type: str = AD_TYPE,
+    search_type: str = SEARCH_TYPE,
+    media_type: str = MEDIA_TYPE,
+    proxy: Optional[Dict] = PROXY,
+    apify_token: Optional[str] = None,
+    client: Optional[Any] = None,
+    cache_max_age_hours: Optional[float] = SCRAPE_CACHE_MAX_AGE_HOURS,
+) -> Dict[str, Any]:
+    """
+    Función orquestadora que prepara los inputs y corre el actor.
+    client: ApifyClient ya construido (opcional; default uno con apify_token).
+    cache_max_age_hours: las querys en el cache de scrapes con menos de estas horas no se mandan al
+    actor (sus ads salen del cache); 0/None lo desactiva. Si todas están en cache no se lanza el actor.
+    Retorna el dict summary.
+    """
+    if client is None:
+        if not apify_token:
+            apify_token = os.getenv("APIFY_APY_KEY") or os.getenv("APIFY_API_TOKEN") or os.getenv("APIFY_TOKEN")
+
+        if not apify_token:
+            raise RuntimeError("Falta APIFY_APY_KEY (o APIFY_API_TOKEN) en variables de entorno.")
+
+        client = ApifyClient(apify_token)
+    
+    # País normalizado
+    norm_country = normalize_country(country_code)
+    # Si scrapePageAds.countryCode es None, usamos el mismo país
+    scrape_country = normalize_country(SCRAPE_PAGE_ADS_COUNTRY_CODE) if SCRAPE_PAGE_ADS_COUNTRY_CODE else norm_country
+
+    # Directorios + querys -> URLs
+    target = load_product_urls(name, norm_country, active_status, ad_type, search_type, media_type)
+    folder_name, product_dir, query_path = target["folder_name"], target["product_dir"], target["query_path"]
+    queries, urls = target["queries"], target["urls"]
+    apify_results_dir = product_dir / "apify_results"
+
+    # Cache de scrapes: solo las querys faltantes o vencidas van al actor
+    cache = open_cache(cache_max_age_hours)
+    hits, missing = cache.lookup(urls, period, limit_per_source, scrape_ad_details) if cache else ({}, urls)
+    recorder = cache.recorder(missing, period, limit_per_source, scrape_ad_details) if cache and not count_total else None
+
+    run_input = build_run_input(missing, scrape_ad_details, limit_per_source, count_total, period, scrape_country, proxy)
 
     # Paths de salida
     raw_out = apify_results_dir / f"fblibrary_ads_raw_{folder_name}.jsonl"
@@ -415,6 +493,8 @@ def run_apify_actor(
     logger.info(f"Actor: {APIFY_ACTOR}")
     logger.info(f"Queries: {len(queries)} | URLs: {len(urls)}")
     logger.info(f"params: limitPerSource={limit_per_source}, details={scrape_ad_details}")
+    if cache:
+        logger.info(f"Scrape cache: {len(hits)} querys en cache | {len(missing)} al actor")
 
     try:
         result = run_actor_and_save(
@@ -423,6 +503,8 @@ def run_apify_actor(
             run_input=run_input,
             raw_out_path=raw_out,
             dedup_out_path=dedup_out,
+            cached_items=cache.iter_items(hits, limit_per_source) if cache else (),
+            recorder=recorder,
         )
 
         summary = {
@@ -434,6 +516,7 @@ def run_apify_actor(
             "actor": APIFY_ACTOR,
             "run_input_meta": {
                 "urls_count": len(urls),
+                "actor_urls_count": len(missing),
                 "scrapeAdDetails": run_input.get("scrapeAdDetails", False),
                 "limitPerSource": run_input.get("limitPerSource"),
                 "count": run_input.get("count"),
@@ -448,6 +531,14 @@ def run_apify_actor(
                 "finishedAt": result["run"].get("finishedAt"),
                 "status": result["run"].get("status"),
             },
+            "cache": {
+                "enabled": bool(cache),
+                "max_age_hours": cache_max_age_hours if cache else None,
+                "cached_urls": len(hits),
+                "scraped_urls": len(missing),
+                "cached_items": result["cached_count"],
+                **(recorder.stats() if recorder else {}),
+            },
             "counts": {
                 "raw_items": result["raw_count"],
                 "dedup_items": result["dedup_count"],
@@ -477,6 +568,254 @@ def run_apify_actor(
         raise e
 
 
+# =============================
+# Batch multi-producto
+# =============================
+
+class ProductDemux:
+    """
+    Reparte los items de runs compartidos a los archivos raw/dedup de cada producto según la query
+    de origen (_source_query_guess / ?q= de la URL fuente). Dedupe por producto: un ad que aparece en
+    querys de dos productos queda en ambos, como si cada uno hubiera corrido su propio actor.
+    Los items sin query reconocible van a unmatched_out.
+    """
+
+    def __init__(self, targets: List[Dict[str, Any]], unmatched_out: Path):
+        self.route: Dict[str, List[str]] = {}
+        self.products: Dict[str, Dict[str, Any]] = {}
+        for t in targets:
+            folder = t["folder_name"]
+            results_dir = t["product_dir"] / "apify_results"
+            self.products[folder] = {
+                "raw_out": results_dir / f"fblibrary_ads_raw_{folder}.jsonl",
+                "dedup_out": results_dir / f"fblibrary_ads_dedup_{folder}.jsonl",
+                "seen": set(),
+                "advertisers": set(),
+                "raw_count": 0,
+                "dedup_count": 0,
+            }
+            for q in t["queries"]:
+                folders = self.route.setdefault(normalize_text(q), [])
+                if folder not in folders:
+                    folders.append(folder)
+        self.unmatched_out = unmatched_out
+        self.unmatched_count = 0
+        self._files: Dict[str, Any] = {}
+
+    def __enter__(self):
+        for folder, p in self.products.items():
+            self._files[f"{folder}:raw"] = p["raw_out"].open("w", encoding="utf-8")
+            self._files[f"{folder}:dedup"] = p["dedup_out"].open("w", encoding="utf-8")
+        self.unmatched_out.parent.mkdir(parents=True, exist_ok=True)
+        self._files["unmatched"] = self.unmatched_out.open("w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc):
+        for f in self._files.values():
+            f.close()
+        return False
+
+    def add(self, item: Dict[str, Any]):
+        line = json.dumps(item, ensure_ascii=False) + "\n"
+        adv_key, ad_key = compute_ad_dedupe_key(item)
+        ukey = f"{adv_key}::{ad_key}"
+        enriched = enrich_item(item, ukey)
+
+        folders = self.route.get(normalize_text(enriched.get("_source_query_guess")))
+        if not folders:
+            self.unmatched_count += 1
+            self._files["unmatched"].write(line)
+            return
+
+        dedup_line = None
+        for folder in folders:
+            p = self.products[folder]
+            p["raw_count"] += 1
+            self._files[f"{folder}:raw"].write(line)
+            p["advertisers"].add(adv_key)
+            if ukey in p["seen"]:
+                continue
+            p["seen"].add(ukey)
+            p["dedup_count"] += 1
+            if dedup_line is None:
+                dedup_line = json.dumps(enriched, ensure_ascii=False) + "\n"
+            self._files[f"{folder}:dedup"].write(dedup_line)
+
+
+def run_apify_actor_batch(
+    names: List[str],
+    country_code: str = SEARCH_COUNTRY,
+    limit_per_source: int = LIMIT_PER_SOURCE,
+    count_total: Optional[int] = COUNT_TOTAL,
+    period: str = PERIOD,
+    scrape_ad_details: bool = SCRAPE_AD_DETAILS,
+    active_status: str = ACTIVE_STATUS,
+    ad_type: str = AD_TYPE,
+    search_type: str = SEARCH_TYPE,
+    media_type: str = MEDIA_TYPE,
+    proxy: Optional[Dict] = PROXY,
+    apify_token: Optional[str] = None,
+    max_urls_per_run: Optional[int] = None,
+    client: Optional[Any] = None,
+    cache_max_age_hours: Optional[float] = SCRAPE_CACHE_MAX_AGE_HOURS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Igual que run_apify_actor pero para varios productos con runs compartidos:
+    - junta las URLs de todos los productos (sin repetir) en un run, o en runs de hasta
+      max_urls_per_run URLs lanzados en paralelo;
+    - limitPerSource es por URL, así que cada query recibe lo mismo que en su run individual;
+      count_total (si se usa) se escala por número de productos;
+    - demultiplexa el dataset por query de origen a los raw/dedup/summary de cada producto
+      (mismos paths que run_apify_actor) y deja los no asignables en output/spy_batch_<ts>/.
+    client: ApifyClient compartido por todos los runs (opcional; default uno por hilo con apify_token).
+    cache_max_age_hours: igual que en run_apify_actor; las URLs en cache no entran a ningún run.
+    Retorna {nombre_producto: summary}; los productos cuyas querys no se pudieron cargar traen
+    {"product_name", "error", "counts": None} y no entran a ningún run.
+    """
+    if client is None:
+        if not apify_token:
+            apify_token = os.getenv("APIFY_APY_KEY") or os.getenv("APIFY_API_TOKEN") or os.getenv("APIFY_TOKEN")
+
+        if not apify_token:
+            raise RuntimeError("Falta APIFY_APY_KEY (o APIFY_API_TOKEN) en variables de entorno.")
+
+    norm_country = normalize_country(country_code)
+    scrape_country = normalize_country(SCRAPE_PAGE_ADS_COUNTRY_CODE) if SCRAPE_PAGE_ADS_COUNTRY_CODE else norm_country
+
+    # un producto sin querys (archivo faltante o vacío) queda fuera del batch sin frenar al resto
+    targets, failed = [], {}
+    for n in names:
+        try:
+            targets.append(load_product_urls(n, norm_country, active_status, ad_type, search_type, media_type))
+        except (OSError, ValueError) as e:
+            logger.error(f"[{n}] sin querys para scrapear: {e}")
+            failed[n] = str(e)
+    all_urls = list(dict.fromkeys(u for t in targets for u in t["urls"]))
+    if not all_urls:
+        raise ValueError("Ningún producto tiene querys para scrapear.")
+
+    cache = open_cache(cache_max_age_hours)
+    hits, missing = cache.lookup(all_urls, period, limit_per_source, scrape_ad_details) if cache else ({}, all_urls)
+
+    size = max_urls_per_run or len(missing) or 1
+    chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+    total = int(count_total) * len(targets) if count_total else None
+
+    batch_id = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    batch_dir = ROOT_DIR / "output" / f"spy_batch_{batch_id}"
+
+    logger.info(f"Batch: {len(targets)} productos | URLs: {len(all_urls)} (en cache: {len(hits)}) | runs: {len(chunks)}")
+    logger.info(f"Country: {norm_country} (scrapePageAds.countryCode={scrape_country})")
+    logger.info(f"params: limitPerSource={limit_per_source}, details={scrape_ad_details}")
+
+    def call(chunk: List[str]) -> Dict[str, Any]:
+        chunk_total = -(-total * len(chunk) // len(missing)) if total else None
+        run_input = build_run_input(chunk, scrape_ad_details, limit_per_source, chunk_total, period, scrape_country, proxy)
+        # un cliente por hilo
+        run = (client or ApifyClient(apify_token)).actor(APIFY_ACTOR).call(run_input=run_input)
+        if not run.get("defaultDatasetId"):
+            raise RuntimeError(f"No se encontró defaultDatasetId en la respuesta del run: {run}")
+        return run
+
+    runs: List[Dict[str, Any]] = []
+    if chunks:
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            runs = list(pool.map(call, chunks))
+
+    client = client or ApifyClient(apify_token)
+    recorded = {"recorded_items": 0, "unattributed_items": 0}
+    with ProductDemux(targets, batch_dir / "fblibrary_ads_unmatched.jsonl") as demux:
+        for run, chunk in zip(runs, chunks):
+            recorder = cache.recorder(chunk, period, limit_per_source, scrape_ad_details) if cache and not total else None
+            for item in client.dataset(run["defaultDatasetId"]).iterate_items():
+                if recorder is not None:
+                    recorder.add(item)
+                demux.add(item)
+            if recorder is not None:
+                if run.get("status") == "SUCCEEDED":
+                    recorder.commit(run.get("id"))
+                for k, v in recorder.stats().items():
+                    recorded[k] += v
+        cached_items = 0
+        if cache:
+            for item in cache.iter_items(hits, limit_per_source):
+                cached_items += 1
+                demux.add(item)
+
+    runs_meta = [{
+        "dataset_id": r.get("defaultDatasetId"),
+        "run_id": r.get("id"),
+        "startedAt": r.get("startedAt"),
+        "finishedAt": r.get("finishedAt"),
+        "status": r.get("status"),
+    } for r in runs]
+    batch_meta = {
+        "batch_id": batch_id,
+        "products": [t["name"] for t in targets],
+        "urls_total": len(all_urls),
+        "cache": {
+            "enabled": bool(cache),
+            "max_age_hours": cache_max_age_hours if cache else None,
+            "cached_urls": len(hits),
+            "scraped_urls": len(missing),
+            "cached_items": cached_items,
+            **recorded,
+        },
+        "unmatched_items": demux.unmatched_count,
+        "unmatched_jsonl": str(demux.unmatched_out),
+    }
+
+    summaries: Dict[str, Dict[str, Any]] = {}
+    for t in targets:
+        p = demux.products[t["folder_name"]]
+        summary_out = t["product_dir"] / "apify_results" / f"fblibrary_scrape_summary_{t['folder_name']}.json"
+        summary = {
+            "timestamp_utc": _now_iso(),
+            "product_name": t["name"],
+            "product_folder": str(t["product_dir"]),
+            "query_file": str(t["query_path"]),
+            "country": norm_country,
+            "actor": APIFY_ACTOR,
+            "run_input_meta": {
+                "urls_count": len(t["urls"]),
+                "scrapeAdDetails": bool(scrape_ad_details),
+                "limitPerSource": int(limit_per_source) if limit_per_source else None,
+                "count": total,
+                "period": period or "",
+                "scrapePageAds.activeStatus": SCRAPE_PAGE_ADS_ACTIVE_STATUS,
+                "scrapePageAds.countryCode": scrape_country,
+            },
+            "apify": {"runs": runs_meta},
+            "batch": batch_meta,
+            "counts": {
+                "raw_items": p["raw_count"],
+                "dedup_items": p["dedup_count"],
+                "unique_advertisers": len(p["advertisers"]),
+            },
+            "files": {
+                "raw_jsonl": str(p["raw_out"]),
+                "dedup_jsonl": str(p["dedup_out"]),
+                "summary_json": str(summary_out),
+            },
+            "dedupe_strategy": "ukey = advertiser(pageId|pageName) + ad(adArchiveId|adId|hash(snapshot/body/title/link/img))",
+        }
+        summary_out.write_text(json.dumps(summary, cls=DateTimeEncoder, ensure_ascii=False, indent=2), encoding="utf-8")
+        summaries[t["name"]] = summary
+        logger.info(f"  - {t['name']}: RAW={p['raw_count']} DEDUP={p['dedup_count']} advertisers={len(p['advertisers'])}")
+
+    (batch_dir / "fblibrary_batch_summary.json").write_text(json.dumps({
+        **batch_meta,
+        "apify": {"runs": runs_meta},
+        "counts": {name: s["counts"] for name, s in summaries.items()},
+    }, cls=DateTimeEncoder, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if demux.unmatched_count:
+        logger.warning(f"{demux.unmatched_count} items sin query de origen reconocible -> {demux.unmatched_out}")
+    for n, error in failed.items():
+        summaries[n] = {"product_name": n, "error": error, "counts": None}
+    return summaries
+
+
 def main():
     run_apify_actor()
 
@@ -9,14 +9,20 @@ Agente orquestador para el flujo de espionaje en Facebook Ads Library.
 2. Ejecuta el scraping (Apify Actor via apify_actor.py)
 3. Procesa los resultados y genera reportes (process_info.py)
 
+Modo batch (run_spy_batch): varios productos a la vez. Research concurrente (hilos), un run de Apify
+compartido con las URLs de todos (demultiplexado por query de origen) y reportes en un pool de
+procesos: N productos cuestan ~1 run de actor de tiempo de pared.
+
 Uso:
     python spy_agent/apy_fb_library_agent.py
     (Configura los parámetros en main())
 """
 
+import os
 import sys
 import logging
-from typing import Optional, List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Optional, List, Tuple
 
 # Configurar logging
 from utils.logger import setup_logger
@@ -25,13 +31,13 @@ logger = setup_logger("SpyAgent_Orchestrator")
 # Importar funciones de los scripts hermanos
 try:
     from spy_agent.research_product_querys import run_research_step
-    from spy_agent.apify_actor import run_apify_actor, NAME as DEFAULT_NAME, SEARCH_COUNTRY as DEFAULT_COUNTRY
+    from spy_agent.apify_actor import run_apify_actor, run_apify_actor_batch, NAME as DEFAULT_NAME, SEARCH_COUNTRY as DEFAULT_COUNTRY, SCRAPE_CACHE_MAX_AGE_HOURS
     from spy_agent.process_info import run_process_info, RANGE_PRODUCT_TEST, NUM_MAX_ESCALING
 except ImportError:
     # Si se ejecuta como script desde dentro de la carpeta
     sys.path.append(".")
     from research_product_querys import run_research_step
-    from apify_actor import run_apify_actor, NAME as DEFAULT_NAME, SEARCH_COUNTRY as DEFAULT_COUNTRY
+    from apify_actor import run_apify_actor, run_apify_actor_batch, NAME as DEFAULT_NAME, SEARCH_COUNTRY as DEFAULT_COUNTRY, SCRAPE_CACHE_MAX_AGE_HOURS
     from process_info import run_process_info, RANGE_PRODUCT_TEST, NUM_MAX_ESCALING
 
 
@@ -109,6 +115,142 @@ def run_spy_flow(
     logger.info("✅ Flujo Spy Agent finalizado correctamente.")
 
 
+def run_research_batch(
+    products: List[Tuple[str, str]],
+    research_workers: int = 4,
+) -> Tuple[List[str], Dict[str, Exception]]:
+    """
+    PASO 0 de run_spy_batch para [(nombre, descripción)], en hilos (las llamadas a OpenAI son I/O).
+    Retorna (nombres investigados en orden de entrada, {nombre: error} de los que fallaron).
+    Sirve para investigar una sola vez y reintentar el scraping con research=False.
+    """
+    researched: List[str] = []
+    errors: Dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(research_workers, len(products)))) as pool:
+        futures = {
+            pool.submit(run_research_step, name=name, description=desc, max_queries=30, model="gpt-5.2", store=False): name
+            for name, desc in products
+        }
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                fut.result()
+                researched.append(name)
+            except Exception as e:
+                errors[name] = e
+    return [name for name, _ in products if name in researched], errors  # orden de entrada
+
+def run_spy_batch(
+    products: List[Tuple[str, str]],
+    country: str = DEFAULT_COUNTRY,
+    limit_per_source: Optional[int] = 80,
+    scrape_ad_details: bool = False,
+    range_product_test: Optional[List[int]] = None,
+    num_max_escaling: Optional[int] = None,
+    dry_run: bool = False,
+    apify_token: Optional[str] = None,
+    research_workers: int = 4,
+    report_workers: Optional[int] = None,
+    max_urls_per_run: Optional[int] = 30,
+    research: bool = True,
+    apify_client: Optional[Any] = None,
+    cache_max_age_hours: Optional[float] = SCRAPE_CACHE_MAX_AGE_HOURS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Research -> Scraping -> Procesamiento para varios productos [(nombre, descripción)]:
+    - PASO 0 en paralelo (hilos; las llamadas a OpenAI son I/O).
+    - PASO 1 con runs de Apify compartidos (run_apify_actor_batch), de hasta max_urls_per_run URLs
+      (default = max_queries de un producto) lanzados en paralelo: el tiempo de pared queda en ~1 run.
+    - PASO 2 en un ProcessPoolExecutor (run_process_info es CPU puro).
+    Un producto que falla en un paso queda fuera de los siguientes sin frenar al resto.
+    research=False reutiliza los querys_fblibrary_*.json ya generados (salta el PASO 0).
+    cache_max_age_hours: frescura del cache de scrapes compartido (0/None = scrapear todo).
+    Retorna {nombre: {"ok", "failed_step", "error", "scrape_counts"}}.
+    """
+    logger.info(f"Iniciando Spy Agent batch: {len(products)} productos ({country})")
+
+    if range_product_test is None:
+        range_product_test = RANGE_PRODUCT_TEST
+    if num_max_escaling is None:
+        num_max_escaling = NUM_MAX_ESCALING
+
+    results: Dict[str, Dict[str, Any]] = {
+        name: {"ok": False, "failed_step": None, "error": None, "scrape_counts": None} for name, _ in products
+    }
+    if dry_run:
+        logger.info("DRY RUN: No se ejecutarán operaciones reales.")
+        return results
+
+    def fail(name: str, step: str, e: Exception):
+        logger.error(f"[{name}] Fallo en {step}: {e}")
+        results[name].update(failed_step=step, error=str(e)[:500])
+
+    # PASO 0: Research (OpenAI) concurrente
+    if research:
+        logger.info(">>> PASO 0: Investigación de Queries (concurrente)...")
+        researched, errors = run_research_batch(products, research_workers)
+        for name, e in errors.items():
+            fail(name, "PASO 0 (Research)", e)
+    else:
+        researched = [name for name, _ in products]
+    if not researched:
+        logger.error("Ningún producto pasó el PASO 0.")
+        return results
+
+    # PASO 1: Scraping (Apify) compartido
+    logger.info(f">>> PASO 1: Apify Scraper compartido ({len(researched)} productos)...")
+    try:
+        summaries = run_apify_actor_batch(
+            names=researched,
+            country_code=country,
+            limit_per_source=limit_per_source,
+            scrape_ad_details=scrape_ad_details,
+            apify_token=apify_token,
+            max_urls_per_run=max_urls_per_run,
+            client=apify_client,
+            cache_max_age_hours=cache_max_age_hours,
+        )
+    except Exception as e:
+        for name in researched:
+            fail(name, "PASO 1 (Scraping)", e)
+        raise e
+    for name in researched:
+        if summaries[name].get("error"):
+            fail(name, "apify", RuntimeError(summaries[name]["error"]))
+        else:
+            results[name]["scrape_counts"] = summaries[name]["counts"]
+    researched = [name for name in researched if not summaries[name].get("error")]
+    if not researched:
+        logger.error("Ningún producto pasó el PASO 1.")
+        return results
+
+    # PASO 2: Reportes en pool de procesos
+    logger.info(">>> PASO 2: Procesando información y generando reportes (pool de procesos)...")
+    workers = max(1, min(report_workers or os.cpu_count() or 1, len(researched)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                run_process_info,
+                name=name,
+                country=country,
+                range_product_test=range_product_test,
+                num_max_escaling=num_max_escaling,
+            ): name
+            for name in researched
+        }
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                fut.result()
+                results[name]["ok"] = True
+            except Exception as e:
+                fail(name, "PASO 2 (Procesamiento)", e)
+
+    ok = sum(1 for r in results.values() if r["ok"])
+    logger.info(f"✅ Spy Agent batch finalizado: {ok}/{len(products)} productos OK.")
+    return results
+
+
 def main():
     # ==========================================
     # CONFIGURACIÓN DEL AGENTE
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+spy_agent/bench/bench_image_prep.py
+
+Benchmark offline de la preparación de imágenes de producto para prompts multimodales:
+- antes: cada agente codifica por su cuenta en cada llamada (research_product_querys y agent 0 mandan
+  el archivo original en base64; visual_planer reescala a 1024 JPEG; los section generators abren el
+  original a resolución completa).
+- ahora: utils/image_prep.py (reescala/re-encode una vez por archivo y tamaño, cache en disco + memoria).
+- --images fotos sintéticas de --size px de lado largo (JPEG de cámara + PNG con transparencia),
+  --rounds pasadas del pipeline completo (research -> agent 0 -> visual planer -> 5 secciones).
+- Reporta bytes subidos por prompt (base64) y tiempo total, en frío (cache vacío) y en caliente.
+- El costo lo pone "antes" (5 PNG a resolución completa por imagen y pasada): ~75s con el default
+  --size 1600; --size 4000 (foto de cámara) tarda varios minutos.
+
+Uso:
+  python spy_agent/bench/bench_image_prep.py --images 6 --size 1600 --rounds 3
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils import image_prep
+
+SECTIONS = 5
+
+def synthetic_photo(rnd: random.Random, size: int, alpha: bool) -> Image.Image:
+    w, h = size, int(size * 0.75)
+    img = Image.new("RGBA" if alpha else "RGB", (w, h), (0, 0, 0, 0) if alpha else (240, 236, 228))
+    draw = ImageDraw.Draw(img)
+    for _ in range(400):
+        x, y = rnd.randrange(w), rnd.randrange(h)
+        r = rnd.randrange(size // 80, size // 8)
+        color = tuple(rnd.randrange(256) for _ in range(3)) + ((rnd.randrange(120, 256),) if alpha else ())
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+    # grano de sensor: que el JPEG no comprima como un dibujo plano
+    noise = Image.effect_noise((w, h), 24).convert("L")
+    base = img.convert("RGB")
+    base = Image.blend(base, Image.merge("RGB", (noise, noise, noise)), 0.08)
+    if alpha:
+        base.putalpha(img.getchannel("A"))
+    return base
+
+def build_images(root: Path, n: int, size: int) -> list:
+    rnd = random.Random(25)
+    paths = []
+    for i in range(n):
+        png = i % 3 == 2
+        img = synthetic_photo(rnd, size, alpha=png)
+        path = root / f"{i + 1}.{'png' if png else 'jpg'}"
+        if png:
+            img.save(path, format="PNG")
+        else:
+            img.save(path, format="JPEG", quality=95)
+        paths.append(path)
+    return paths
+
+# --- antes: una codificación por agente y por llamada ---
+def raw_b64(path: Path) -> str:
+    return base64.b64encode(path.read_bytes()).decode("utf-8")
+
+def visual_planer_b64(path: Path) -> str:
+    with Image.open(path) as img:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=85, optimize=True)
+        return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+def section_ref(path: Path) -> int:
+    img = Image.open(path)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = BytesIO()
+    img.save(buf, format="PNG")   # lo que termina serializando el SDK de Gemini
+    return len(buf.getvalue())
+
+def pipeline_before(paths: list) -> dict:
+    sent = {"research": 0, "agent0": 0, "visual_planer": 0, "sections": 0}
+    for p in paths:
+        sent["research"] += len(raw_b64(p))
+        sent["agent0"] += len(raw_b64(p))
+        sent["visual_planer"] += len(visual_planer_b64(p))
+        for _ in range(SECTIONS):
+            sent["sections"] += section_ref(p)
+    return sent
+
+# --- ahora: utils/image_prep ---
+def pipeline_after(paths: list) -> dict:
+    sent = {"research": 0, "agent0": 0, "visual_planer": 0, "sections": 0}
+    for p in paths:
+        sent["research"] += len(image_prep.image_data_url(p))
+        sent["agent0"] += len(image_prep.image_data_url(p))
+        sent["visual_planer"] += len(image_prep.image_data_url(p, long_edge=image_prep.LOW_DETAIL_LONG_EDGE))
+        for _ in range(SECTIONS):
+            img = image_prep.load_image(p)
+            buf = BytesIO()
+            img.save(buf, format="JPEG" if img.format == "JPEG" else "PNG")
+            sent["sections"] += len(buf.getvalue())
+    return sent
+
+def timed_rounds(fn, paths: list, rounds: int) -> dict:
+    times = []
+    for _ in range(rounds):
+        t = time.perf_counter()
+        sent = fn(paths)
+        times.append(round(time.perf_counter() - t, 3))
+    return {"sec_per_round": times, "bytes_per_round": sent, "mb_per_round": round(sum(sent.values()) / 1024 / 1024, 1)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=6)
+    parser.add_argument("--size", type=int, default=1600, help="Lado largo de las fotos sintéticas")
+    parser.add_argument("--rounds", type=int, default=3, help="Pasadas del pipeline (la 1ra de 'after' es en frío)")
+    args = parser.parse_args()
+
+    report = {"images": args.images, "size": args.size, "rounds": args.rounds}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "images").mkdir()
+        paths = build_images(tmp / "images", args.images, args.size)
+        report["input_mb"] = round(sum(p.stat().st_size for p in paths) / 1024 / 1024, 1)
+
+        image_prep.CACHE_DIR = tmp / "cache"
+        image_prep.clear_memory_cache()
+        report["before"] = timed_rounds(pipeline_before, paths, args.rounds)
+        report["after"] = timed_rounds(pipeline_after, paths, args.rounds)
+
+        # proceso nuevo con el cache en disco ya poblado
+        image_prep.clear_memory_cache()
+        t = time.perf_counter()
+        pipeline_after(paths)
+        report["after"]["disk_warm_sec"] = round(time.perf_counter() - t, 3)
+
+    report["upload_reduction"] = round(report["before"]["mb_per_round"] / max(report["after"]["mb_per_round"], 0.1), 1)
+    report["warm_speedup"] = round(report["before"]["sec_per_round"][-1] / max(report["after"]["sec_per_round"][-1], 1e-3), 1)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+spy_agent/bench/bench_process_info.py
+
+Benchmark offline del matching por ad de process_info: AdMatcher (needles pre-normalizados, el ad se
+normaliza una vez) vs la versión anterior (detect_language + product_name_contained +
+compute_anchor_score + contains_any x2, cada una renormalizando texto y keywords), materializada desde
+git (--baseline-rev).
+
+- --ads ads sintéticos: copy en español/inglés con tildes, emojis, tokens del producto, keywords de
+  bundle y URLs de landing; mismo shape que fblibrary_ads_dedup_*.jsonl.
+- --querys: querys_fblibrary_<producto>.json real (default: meta embebido de ejemplo).
+- Verifica que idioma, nombre contenido, anchor_score/hits e is_bundle coinciden ad por ad.
+
+Uso:
+  python spy_agent/bench/bench_process_info.py --ads 100000
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from spy_agent import process_info
+from spy_agent.process_info import AdMatcher, build_product_name_matcher, build_searchable_text, derive_anchor_tokens, extract_text
+
+REPO = Path(__file__).resolve().parents[2]
+
+PRODUCT_NAME = "Ashawanda Ksm 66 X 2 Unidades"
+PRODUCT_META = {
+    "canonical_product_name": "Ashwagandha KSM-66 5500 mg suplemento en softgels (pack x2)",
+    "product_type": "Suplemento dietario/herbal adaptógeno en cápsulas blandas (softgels)",
+    "short_description": "Pack de 2 frascos de Ashwagandha KSM-66 en softgels de alta absorción, 5500 mg.",
+    "querys": [
+        "ashwagandha ksm-66 5500mg 100 softgels", "ashwagandha ksm 66 5500 mg softgels",
+        "ashwagandha ksm-66 pack 2 unidades", "life natura ashwagandha ksm-66",
+        "ashwagandha ksm-66 envío gratis colombia", "ashwagandha ksm-66 pago contra entrega bogotá",
+        "ginseng indio ksm-66 softgels 5500mg", "precio ashwagandha ksm-66 5500mg pack 2",
+    ],
+}
+
+FILLER_ES = ("envío gratis a toda colombia pago contraentrega oferta por tiempo limitado descuento "
+             "garantía original disponible en bogotá medellín cali compra ya respaldo físico punto "
+             "enviamos el mismo día calidad premium salud bienestar energía sueño estrés").split()
+FILLER_EN = "free shipping sale discount deal buy now official limited offer promo delivery cash".split()
+PRODUCT_WORDS = ("ashwagandha ksm-66 ksm 66 5500mg 5500 mg softgels ginseng indio suplemento cápsulas "
+                 "frascos life natura").split()
+BUNDLE_WORDS = ["combo", "kit", "pack", "paquete", "x2", "2 unidades", "2x1", "incluye", "regalo", "set", "3x"]
+DRIFT_WORDS = "licuadora estufa camping zapatos maleta proyector medias termo lámpara".split()
+EMOJIS = ["🔥", "✅", "👇", "🚚", "💯", "⭐"]
+
+def random_copy(rnd: random.Random) -> str:
+    r = rnd.random()
+    words = []
+    if r < 0.6:
+        words += rnd.sample(PRODUCT_WORDS, rnd.randint(1, 5))
+    else:
+        words += rnd.sample(DRIFT_WORDS, rnd.randint(1, 3))
+    filler = FILLER_EN if rnd.random() < 0.15 else FILLER_ES
+    words += rnd.sample(filler, rnd.randint(4, min(14, len(filler))))
+    if rnd.random() < 0.3:
+        words.append(rnd.choice(BUNDLE_WORDS))
+    rnd.shuffle(words)
+    words = [w.upper() if rnd.random() < 0.1 else w.capitalize() if rnd.random() < 0.2 else w for w in words]
+    text = " ".join(words)
+    if rnd.random() < 0.5:
+        text = f"{rnd.choice(EMOJIS)} {text} {rnd.choice(EMOJIS)}\n\n{' '.join(rnd.sample(FILLER_ES, 6))}"
+    return text
+
+def random_ad(rnd: random.Random, i: int, n_pages: int) -> dict:
+    page = rnd.randrange(n_pages)
+    slug = rnd.choice(["tienda", "natural", "kit-salud", "combo", "store", "shop"])
+    link = rnd.choice([
+        f"https://{slug}{page}.com/products/ashwagandha-ksm-66",
+        f"https://{slug}{page}.co/{rnd.choice(['pack-x2', 'oferta', 'producto', 'combo-2x1'])}",
+        None,
+    ])
+    snap = {
+        "page_id": str(1000 + page),
+        "page_name": f"Página {page} {rnd.choice(['Natural', 'Salud', 'Shop', 'Tienda'])}",
+        "page_profile_uri": f"https://www.facebook.com/{1000 + page}/",
+        "title": random_copy(rnd) if rnd.random() < 0.7 else None,
+        "body": {"text": random_copy(rnd)},
+        "caption": f"{slug}{page}.com",
+        "cta_text": rnd.choice(["Shop now", "Comprar", "Más información", "Send message"]),
+        "link_url": {"text": link} if link and rnd.random() < 0.05 else link,
+    }
+    return {
+        "ad_archive_id": str(10**15 + i),
+        "page_id": str(1000 + page),
+        "page_name": snap["page_name"],
+        "ad_library_url": f"https://www.facebook.com/ads/library/?id={10**15 + i}",
+        "start_date_formatted": "2026-09-01 00:00:00",
+        "is_active": rnd.random() < 0.8,
+        "snapshot": snap,
+    }
+
+def load_baseline(rev: str, tmp: Path):
+    src = subprocess.run(["git", "show", f"{rev}:spy_agent/process_info.py"], cwd=REPO,
+                         capture_output=True, text=True, check=True).stdout
+    path = tmp / "process_info_baseline.py"
+    path.write_text(src, encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("process_info_baseline", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def match_baseline(mod, ads, anchors, name_matcher) -> list:
+    out = []
+    for ad in ads:
+        text = mod.build_searchable_text(ad)
+        landing_url = mod.extract_text((ad.get("snapshot") or {}).get("link_url"))
+        score, hits = mod.compute_anchor_score(text, anchors)
+        out.append((
+            mod.detect_language(text),
+            mod.product_name_contained(text, name_matcher),
+            score,
+            hits,
+            mod.contains_any(text, mod.BUNDLE_KEYWORDS) or mod.contains_any(landing_url or "", mod.BUNDLE_KEYWORDS),
+        ))
+    return out
+
+def match_compiled(ads, anchors, name_matcher) -> list:
+    matcher = AdMatcher(anchors, name_matcher)
+    out = []
+    for ad in ads:
+        text = build_searchable_text(ad)
+        m = matcher.match(text, extract_text((ad.get("snapshot") or {}).get("link_url")))
+        out.append((m["lang"], m["name_contained"], m["anchor_score"], m["anchor_hits"], m["is_bundle"]))
+    return out
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    res = fn(*args)
+    return res, round(time.perf_counter() - t, 3)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=100000)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--querys", default=None, help="querys_fblibrary_<producto>.json (default: meta de ejemplo)")
+    parser.add_argument("--name", default=PRODUCT_NAME)
+    parser.add_argument("--baseline-rev", default="11091e8", help="Commit con la versión sin AdMatcher")
+    args = parser.parse_args()
+
+    meta = json.loads(Path(args.querys).read_text(encoding="utf-8")) if args.querys else PRODUCT_META
+    rnd = random.Random(21)
+    ads = [random_ad(rnd, i, args.pages) for i in range(args.ads)]
+    anchors = derive_anchor_tokens(meta, args.name)
+    name_matcher = build_product_name_matcher(meta, anchors)
+
+    report = {"ads": args.ads, "anchors": anchors, "needles": len(AdMatcher(anchors, name_matcher).needles)}
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = load_baseline(args.baseline_rev, Path(tmp))
+        old, report["baseline_sec"] = timed(match_baseline, baseline, ads, anchors, name_matcher)
+        new, report["compiled_sec"] = timed(match_compiled, ads, anchors, name_matcher)
+    # la parte compartida (build_searchable_text) incluida en ambos tiempos
+    _, report["searchable_text_sec"] = timed(lambda: [build_searchable_text(a) for a in ads])
+    report["speedup"] = round(report["baseline_sec"] / report["compiled_sec"], 1)
+    report["ads_per_sec"] = round(args.ads / report["compiled_sec"])
+    report["mismatches"] = sum(1 for a, b in zip(old, new) if a != b)
+    report["kept_es_and_name"] = sum(1 for r in new if r[0] == process_info.LANG_ALLOWED and r[1])
+    report["bundle"] = sum(1 for r in new if r[4])
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+spy_agent/bench/bench_process_report.py
+
+Benchmark offline de run_process_info completo: versión streaming (estado acotado por anunciante +
+spool de ads + escritura incremental con orjson) vs la versión anterior (ad_records en memoria,
+re-scan por anunciante y un solo json.dumps), materializada desde git (--baseline-rev).
+
+- Genera un fblibrary_ads_dedup_<producto>.jsonl sintético de --ads ads (mismo generador que
+  bench_process_info) y su querys json en un ROOT_DIR temporal.
+- Cada versión corre en un subproceso propio para medir tiempo y pico de RSS (VmHWM; ru_maxrss en
+  Linux arrastra el RSS del padre al hacer fork).
+- Compara ambos reportes (competition + rank) parseados, sin generated_at_utc.
+
+Uso:
+  python spy_agent/bench/bench_process_report.py --ads 200000 --pages 20000
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from spy_agent.bench.bench_process_info import PRODUCT_META, PRODUCT_NAME, random_ad
+from spy_agent.process_info import slugify
+
+REPO = Path(__file__).resolve().parents[2]
+
+def build_input(root: Path, n_ads: int, n_pages: int):
+    folder = slugify(PRODUCT_NAME)
+    results = root / "output" / folder / "apify_results"
+    results.mkdir(parents=True)
+    (root / "output" / folder / f"querys_fblibrary_{folder}.json").write_text(
+        json.dumps(PRODUCT_META, ensure_ascii=False), encoding="utf-8")
+    rnd = random.Random(22)
+    with (results / f"fblibrary_ads_dedup_{folder}.jsonl").open("w", encoding="utf-8") as f:
+        for i in range(n_ads):
+            f.write(json.dumps(random_ad(rnd, i, n_pages), ensure_ascii=False) + "\n")
+    return results, folder
+
+def peak_rss_mb() -> float:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return round(int(line.split()[1]) / 1024, 1)
+    return -1.0
+
+def child(module_path: str, root: str):
+    """Corre run_process_info de module_path sobre root e imprime tiempo y pico de RSS."""
+    spec = importlib.util.spec_from_file_location("process_info_bench", module_path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    mod.ROOT_DIR = Path(root)
+    base_rss = peak_rss_mb()
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    t = time.perf_counter()
+    try:
+        mod.run_process_info(PRODUCT_NAME)
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+    print(json.dumps({
+        "sec": round(time.perf_counter() - t, 3),
+        "import_rss_mb": base_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+def run_child(module_path: Path, root: Path) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--_child", str(module_path), str(root)],
+                         cwd=REPO, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def load_reports(results: Path, folder: str) -> dict:
+    out = {}
+    for kind in ("competition_report", "advertisers_rank"):
+        path = results / f"fblibrary_{kind}_{folder}.json"
+        doc = json.loads(path.read_text(encoding="utf-8"))
+        doc.pop("generated_at_utc", None)
+        doc.pop("input_files", None)
+        out[kind] = {"doc": doc, "bytes": path.stat().st_size}
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=200000)
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--baseline-rev", default="650b3ee", help="Commit con el reporte en memoria")
+    parser.add_argument("--_child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._child:
+        child(*args._child)
+        return
+
+    report = {"ads": args.ads, "pages": args.pages}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        t = time.perf_counter()
+        roots = {"baseline": tmp / "baseline", "streaming": tmp / "streaming"}
+        for root in roots.values():
+            results, folder = build_input(root, args.ads, args.pages)
+        report["build_sec"] = round(time.perf_counter() - t, 2)
+
+        src = subprocess.run(["git", "show", f"{args.baseline_rev}:spy_agent/process_info.py"], cwd=REPO,
+                             capture_output=True, text=True, check=True).stdout
+        baseline_path = tmp / "process_info_baseline.py"
+        baseline_path.write_text(src, encoding="utf-8")
+        modules = {"baseline": baseline_path, "streaming": REPO / "spy_agent" / "process_info.py"}
+
+        for name, root in roots.items():
+            report[name] = run_child(modules[name], root)
+        docs = {name: load_reports(root / "output" / folder / "apify_results", folder)
+                for name, root in roots.items()}
+
+        report["speedup"] = round(report["baseline"]["sec"] / report["streaming"]["sec"], 1)
+        report["reports"] = {
+            kind: {
+                "bytes": docs["streaming"][kind]["bytes"],
+                "identical": docs["baseline"][kind]["doc"] == docs["streaming"][kind]["doc"],
+            }
+            for kind in ("competition_report", "advertisers_rank")
+        }
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
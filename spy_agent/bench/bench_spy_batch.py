@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+spy_agent/bench/bench_spy_batch.py
+
+Benchmark offline de run_spy_batch (PASO 1 + PASO 2, sin research) contra explorer/bench/fake_apify.py:
+- serial: lo que hacía check_list_generator_auto producto a producto (run_apify_actor + run_process_info).
+- batch: runs de actor compartidos (--urls-per-run URLs por run, en paralelo) + demux por
+  _source_query_guess + reportes en pool de procesos.
+- Cada run del fake cuesta --start-sec de arranque + items / --items-per-sec (como un actor real).
+- Compara por producto el set de _dedupe_key y el rank report (sin generated_at_utc).
+- Cache de scrapes desactivado en ambos (si no, el batch se serviría de lo que scrapeó el serial).
+
+Uso:
+  python spy_agent/bench/bench_spy_batch.py --products 20 --queries 30
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from explorer.bench.fake_apify import FakeApifyClient
+from spy_agent import apify_actor, process_info
+from spy_agent.apify_actor import build_ads_library_search_url, normalize_country, run_apify_actor, slugify
+from spy_agent.apy_fb_library_agent import run_spy_batch
+
+class SlowStartApifyClient(FakeApifyClient):
+    def __init__(self, start_sec: float = 1.0, **kw):
+        super().__init__(**kw)
+        self.start_sec = start_sec
+
+    def call(self, run_input=None, **kwargs):
+        time.sleep(self.start_sec)
+        return super().call(run_input, **kwargs)
+
+def product_meta(k: int, n_queries: int) -> dict:
+    return {
+        "canonical_product_name": f"Producto {k} envío gratis",
+        "product_type": "Producto de prueba",
+        "short_description": f"Producto sintético {k} para el benchmark del modo batch.",
+        "disambiguation_notes": "Sin notas.",
+        "querys": [f"producto {k} variante {q}" for q in range(n_queries)],
+    }
+
+def setup(root: Path, n_products: int, n_queries: int) -> list:
+    names = []
+    country = normalize_country("CO")
+    urls = []
+    for k in range(n_products):
+        name = f"Producto Bench {k}"
+        folder = slugify(name)
+        (root / "output" / folder).mkdir(parents=True)
+        meta = product_meta(k, n_queries)
+        (root / "output" / folder / f"querys_fblibrary_{folder}.json").write_text(
+            json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        urls += [build_ads_library_search_url(q, country, apify_actor.ACTIVE_STATUS, apify_actor.AD_TYPE,
+                                              apify_actor.SEARCH_TYPE, apify_actor.MEDIA_TYPE) for q in meta["querys"]]
+        names.append(name)
+    return names, urls
+
+def make_client(urls, args) -> SlowStartApifyClient:
+    return SlowStartApifyClient(start_sec=args.start_sec, items_per_sec=args.items_per_sec, urls=urls,
+                                per_url=True, dup_every=args.dup_every)
+
+def collect(root: Path, names: list) -> dict:
+    out = {}
+    for name in names:
+        folder = slugify(name)
+        results = root / "output" / folder / "apify_results"
+        with (results / f"fblibrary_ads_dedup_{folder}.jsonl").open(encoding="utf-8") as f:
+            keys = {json.loads(line)["_dedupe_key"] for line in f}
+        rank = json.loads((results / f"fblibrary_advertisers_rank_{folder}.json").read_text(encoding="utf-8"))
+        rank.pop("generated_at_utc", None)
+        out[name] = (keys, rank)
+    return out
+
+def use_root(root: Path):
+    apify_actor.ROOT_DIR = root
+    process_info.ROOT_DIR = root
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--limit-per-source", type=int, default=80)
+    parser.add_argument("--items-per-sec", type=float, default=3000.0, help="Ritmo de producción por run del actor")
+    parser.add_argument("--start-sec", type=float, default=1.0, help="Arranque por run del actor")
+    parser.add_argument("--dup-every", type=int, default=10)
+    parser.add_argument("--urls-per-run", type=int, default=30)
+    parser.add_argument("--report-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    report = {"products": args.products, "queries_per_product": args.queries}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        devnull = open(os.devnull, "w")
+        stdout = sys.stdout
+
+        serial_root, batch_root = tmp / "serial", tmp / "batch"
+        names, urls = setup(serial_root, args.products, args.queries)
+        setup(batch_root, args.products, args.queries)
+
+        use_root(serial_root)
+        client = make_client(urls, args)
+        sys.stdout = devnull
+        t = time.perf_counter()
+        for name in names:
+            run_apify_actor(name=name, country_code="CO", limit_per_source=args.limit_per_source, client=client,
+                            cache_max_age_hours=0)
+            process_info.run_process_info(name=name, country="CO")
+        sys.stdout = stdout
+        report["serial"] = {"sec": round(time.perf_counter() - t, 2), "actor_runs": client.stats["actor_starts"]}
+
+        use_root(batch_root)
+        client = make_client(urls, args)
+        sys.stdout = devnull
+        t = time.perf_counter()
+        results = run_spy_batch([(n, "") for n in names], country="CO", limit_per_source=args.limit_per_source,
+                                research=False, apify_client=client, max_urls_per_run=args.urls_per_run,
+                                report_workers=args.report_workers, cache_max_age_hours=0)
+        sys.stdout = stdout
+        devnull.close()
+        report["batch"] = {"sec": round(time.perf_counter() - t, 2), "actor_runs": client.stats["actor_starts"],
+                           "ok": sum(1 for r in results.values() if r["ok"])}
+        report["speedup"] = round(report["serial"]["sec"] / report["batch"]["sec"], 1)
+
+        serial, batch = collect(serial_root, names), collect(batch_root, names)
+        report["dedup_keys_equal"] = all(serial[n][0] == batch[n][0] for n in names)
+        report["rank_reports_equal"] = all(serial[n][1] == batch[n][1] for n in names)
+        report["dedup_items"] = sum(len(serial[n][0]) for n in names)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -21,18 +21,26 @@ Notas:
 - "EXACTAMENTE el mismo producto" no se puede garantizar con texto únicamente. Este script:
   (a) filtra / etiqueta candidatos con heurísticas (anchor_score + bundle)
   (b) deja un "agent_queue" listo para validar con un agente multimodal (landing + creativos)
-- Solo usa stdlib. No requiere pandas, pydantic, etc.
+- Solo usa stdlib + orjson. No requiere pandas, pydantic, etc.
+- Streaming: cada ad se agrega a un estado acotado por anunciante (counts, URLs con tope, top-K por
+  heap) y su fila se serializa a un spool temporal; el reporte se escribe campo por campo, así la
+  memoria no crece con el número de ads (salvo el set de claves para deduplicar).
 """
 
 import hashlib
+import heapq
 import json
 import re
+import shutil
+import tempfile
 import unicodedata
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Tuple
 from urllib.parse import urlparse
 
+import orjson
+
 from utils.logger import setup_logger
 logger = setup_logger("SpyAgent_ProcessInfo")
 
@@ -113,9 +121,25 @@ def now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
+_LATIN_COMBINING_RE = re.compile("[\u0300-\u034e\u0350-\u036f]+")  # U+034F (CGJ) tiene combining() == 0
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]+")
+
+
+def _drop_combining(m: re.Match) -> str:
+    return "".join(ch for ch in m.group() if not unicodedata.combining(ch))
+
+
 def strip_accents(text: str) -> str:
+    if text.isascii():
+        return text  # NFKD no cambia ASCII
     text = unicodedata.normalize("NFKD", text)
-    return "".join(ch for ch in text if not unicodedata.combining(ch))
+    if text.isascii():
+        return text
+    # tildes/diéresis latinas (bloque U+0300–U+036F) en C; el resto (emojis, otros combining) char a char
+    text = _LATIN_COMBINING_RE.sub("", text)
+    if text.isascii():
+        return text
+    return _NON_ASCII_RE.sub(_drop_combining, text)
 
 
 def slugify(text: str) -> str:
@@ -413,6 +437,260 @@ def product_name_contained(search_text: str, matcher: Dict[str, Any]) -> bool:
     return hits >= min_hits
 
 
+class AdMatcher:
+    """
+    Matcher compilado una vez por producto para los filtros/scores por ad.
+
+    Anchors, frases y tokens núcleo (build_product_name_matcher), BUNDLE_KEYWORDS y marcadores de
+    idioma se normalizan al construirlo y se juntan en una sola lista de needles. Cada ad se normaliza
+    una única vez y match() hace una pasada por los needles; de ese set de hits salen idioma,
+    nombre contenido, anchor_score e is_bundle.
+    Mismos resultados que detect_language / product_name_contained / compute_anchor_score /
+    contains_any, que renormalizaban el texto (y cada keyword) en cada llamada.
+    """
+
+    def __init__(self, anchors: List[str], name_matcher: Dict[str, Any], bundle_keywords: List[str] = BUNDLE_KEYWORDS):
+        self.anchors = list(anchors)
+        self.phrases = [p for p in name_matcher.get("core_phrases", []) if p]
+        self.core_tokens = [t for t in name_matcher.get("core_tokens", []) if t]
+        self.min_token_hits = int(name_matcher.get("min_token_hits", 2))
+        self.bundle = [k for k in (norm(strip_accents(kw)) for kw in bundle_keywords) if k]
+        # los tokens del texto ya vienen sin tildes: "envío" nunca coincidía, "envio" sí
+        self.es_markers = {strip_accents(m) for m in SPANISH_MARKERS}
+        self.en_markers = {strip_accents(m) for m in ENGLISH_MARKERS}
+        self.needles = sorted({n for n in [*self.anchors, *self.phrases, *self.core_tokens, *self.bundle] if n})
+        self._bundle = set(self.bundle)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return strip_accents(norm(text))
+
+    def hits(self, t: str) -> set:
+        return {n for n in self.needles if n in t}
+
+    def language(self, text: str, t: str) -> str:
+        if not t:
+            return "und"
+        tokens = re.findall(r"[a-z]+", t)
+        if not tokens:
+            return "und"
+        es = sum(1 for w in tokens if w in self.es_markers)
+        en = sum(1 for w in tokens if w in self.en_markers)
+        has_spanish_chars = any(ch in (text or "") for ch in "ñÑáéíóúÁÉÍÓÚüÜ")
+        if (es >= 2 and es > en) or (has_spanish_chars and es >= 1) or (es >= 1 and en == 0):
+            return "es"
+        if (en >= 2 and en > es) or (en >= 1 and es == 0):
+            return "en"
+        return "und"
+
+    def match(self, text: str, landing_url: str = "") -> Dict[str, Any]:
+        """
+        text: build_searchable_text(ad). landing_url solo se escanea (bundle) si no está ya
+        contenida en text.
+        """
+        t = self.normalize(text)
+        found = self.hits(t)
+
+        name_contained = bool(t) and (
+            any(p in found for p in self.phrases)
+            or sum(1 for tok in self.core_tokens if tok in found) >= self.min_token_hits
+        )
+
+        anchor_hits = [a for a in self.anchors if a and a in found]
+        anchor_score = len(anchor_hits) / float(len(self.anchors)) if self.anchors else 0.0
+
+        is_bundle = not found.isdisjoint(self._bundle)
+        if not is_bundle and landing_url and landing_url not in text:
+            lu = self.normalize(landing_url)
+            is_bundle = any(k in lu for k in self.bundle)
+
+        return {
+            "lang": self.language(text, t),
+            "name_contained": name_contained,
+            "anchor_score": anchor_score,
+            "anchor_hits": anchor_hits,
+            "is_bundle": is_bundle,
+        }
+
+
+# =============================
+# Agregación streaming + escritura incremental
+# =============================
+
+def ad_snippet(body: str, limit: int = 240) -> str:
+    snippet = (body or "").replace("\n", " ").strip()
+    if len(snippet) > limit:
+        snippet = snippet[:limit] + "..."
+    return snippet
+
+
+class AdvertiserAccumulator:
+    """
+    Estado acotado de un anunciante mientras se recorre el dedup jsonl (sin guardar sus ads):
+    - counts por candidato/idioma
+    - landing_urls / ad_library_urls: primeros MAX_URLS_STORED_PER_ADVERTISER únicos (orden de llegada)
+    - top ads: min-heap de tamaño max(MAX_TOP_ADS_PER_ADVERTISER, MAX_AGENT_SAMPLES_PER_ADVERTISER)
+      por (anchor_score, -orden); empates por score quedan en orden de llegada, igual que el
+      sorted(..., reverse=True) estable de antes.
+    Solo landing_domains queda sin tope (el reporte lista todos los dominios).
+    """
+
+    TOP_K = max(MAX_TOP_ADS_PER_ADVERTISER, MAX_AGENT_SAMPLES_PER_ADVERTISER)
+
+    def __init__(self, advertiser_key: str, page_name: str, page_id: str, page_profile_uri: str):
+        self.record: Dict[str, Any] = {
+            "advertiser_key": advertiser_key,
+            "page_name": page_name,
+            "page_id": page_id,
+            "page_profile_uri": page_profile_uri,
+            "counts": {
+                "ads_total": 0,
+                "ads_candidate_same": 0,
+                "ads_candidate_bundle": 0,
+                "ads_candidate_drift": 0,
+                "ads_lang_es": 0,
+                "ads_lang_en": 0,
+                "ads_lang_und": 0,
+            },
+            "landing_domains": [],
+            "landing_urls": [],
+            "ad_library_urls": [],
+            "top_ads": [],
+            "flags": {"is_scaling_candidate_same": False},
+        }
+        self.counts = self.record["counts"]
+        self.domains: set = set()
+        self.landing_urls: Dict[str, None] = {}
+        self.ad_library_urls: Dict[str, None] = {}
+        self.heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self.selected_ad_ids: List[str] = []
+
+    @staticmethod
+    def _add_capped(urls: Dict[str, None], url: str):
+        if len(urls) < MAX_URLS_STORED_PER_ADVERTISER:
+            url = url.strip()
+            if url:
+                urls.setdefault(url)
+
+    def add(self, ad_row: Dict[str, Any], seq: int):
+        match = ad_row["match"]
+        c = self.counts
+        c["ads_total"] += 1
+        c["ads_candidate_same"] += 1 if match["candidate_same_product"] else 0
+        c["ads_candidate_bundle"] += 1 if match["candidate_bundle"] else 0
+        c["ads_candidate_drift"] += 1 if match["candidate_drift"] else 0
+        lang = ad_row["lang"]
+        if lang == "es":
+            c["ads_lang_es"] += 1
+        elif lang == "en":
+            c["ads_lang_en"] += 1
+        else:
+            c["ads_lang_und"] += 1
+
+        if ad_row["landing_domain"]:
+            self.domains.add(ad_row["landing_domain"])
+        if ad_row["landing_url"]:
+            self._add_capped(self.landing_urls, ad_row["landing_url"])
+        if ad_row["ad_library_url"]:
+            self._add_capped(self.ad_library_urls, ad_row["ad_library_url"])
+
+        score = match["anchor_score"]
+        # lleno: un score igual al mínimo llega después y pierde el empate
+        if len(self.heap) >= self.TOP_K and score <= self.heap[0][0]:
+            return
+        top_ad = {
+            "ad_id": ad_row["ad_id"],
+            "ad_library_url": ad_row["ad_library_url"],
+            "landing_url": ad_row["landing_url"],
+            "anchor_score": score,
+            "flags": {
+                "candidate_same_product": match["candidate_same_product"],
+                "candidate_bundle": match["candidate_bundle"],
+                "candidate_drift": match["candidate_drift"],
+                "is_bundle": match["is_bundle"],
+            },
+            "snippet": ad_snippet(ad_row["text"]["body"]),
+        }
+        item = (score, -seq, top_ad)
+        if len(self.heap) < self.TOP_K:
+            heapq.heappush(self.heap, item)
+        else:
+            heapq.heapreplace(self.heap, item)
+
+    def finalize(self, num_max_escaling: int) -> Dict[str, Any]:
+        ranked = [a for _, _, a in sorted(self.heap, key=lambda x: (-x[0], -x[1]))]
+        adv = self.record
+        adv["landing_domains"] = sorted(self.domains)
+        adv["landing_urls"] = list(self.landing_urls)
+        adv["ad_library_urls"] = list(self.ad_library_urls)
+        adv["top_ads"] = ranked[:MAX_TOP_ADS_PER_ADVERTISER]
+        adv["flags"]["is_scaling_candidate_same"] = self.counts["ads_candidate_same"] > num_max_escaling
+        self.selected_ad_ids = [a["ad_id"] for a in ranked[:MAX_AGENT_SAMPLES_PER_ADVERTISER]]
+        return adv
+
+
+def dump_json(value: Any, level: int = 0) -> bytes:
+    """
+    orjson con indent 2 (mismo layout que json.dumps(indent=2, ensure_ascii=False)), re-indentado
+    para anidarlo a `level` niveles. Los strings JSON nunca llevan saltos de línea literales.
+    """
+    out = orjson.dumps(value, option=orjson.OPT_INDENT_2)
+    if level:
+        out = out.replace(b"\n", b"\n" + b"  " * level)
+    return out
+
+
+class JsonArraySpool:
+    """
+    Elementos de un array JSON ya serializados (nivel 2 dentro del reporte) en un archivo temporal;
+    se copian tal cual al escribir el reporte. Arriba de max_size bytes pasa de memoria a disco.
+    """
+
+    def __init__(self, dir: Path, max_size: int = 8 * 1024 * 1024):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size, dir=dir)
+        self.count = 0
+
+    def append(self, value: Any):
+        self.file.write(b",\n    " if self.count else b"\n    ")
+        self.file.write(dump_json(value, 2))
+        self.count += 1
+
+    def copy_to(self, out):
+        if not self.count:
+            out.write(b"[]")
+            return
+        out.write(b"[")
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, out)
+        out.write(b"\n  ]")
+
+    def close(self):
+        self.file.close()
+
+
+def write_json_object(path: Path, fields: Iterable[Tuple[str, Any]]):
+    """
+    Escribe un objeto JSON de primer nivel campo por campo: las listas se serializan elemento a
+    elemento y un JsonArraySpool se vuelca desde disco, así nunca se arma el documento completo.
+    """
+    with path.open("wb") as out:
+        out.write(b"{")
+        for i, (key, value) in enumerate(fields):
+            out.write(b",\n  " if i else b"\n  ")
+            out.write(orjson.dumps(key) + b": ")
+            if isinstance(value, JsonArraySpool):
+                value.copy_to(out)
+            elif isinstance(value, list) and value:
+                out.write(b"[")
+                for j, item in enumerate(value):
+                    out.write(b",\n    " if j else b"\n    ")
+                    out.write(dump_json(item, 2))
+                out.write(b"\n  ]")
+            else:
+                out.write(dump_json(value, 1))
+        out.write(b"\n}")
+
+
 # =============================
 # Main
 # =============================
@@ -447,9 +725,11 @@ def run_process_info(
     product_meta = json.loads(querys_path.read_text(encoding="utf-8"))
     anchors = derive_anchor_tokens(product_meta, name)
     name_matcher = build_product_name_matcher(product_meta, anchors)
+    matcher = AdMatcher(anchors, name_matcher)
 
-    advertisers: Dict[str, Dict[str, Any]] = {}
-    ad_records: List[Dict[str, Any]] = []
+    # estado acotado por anunciante; las filas de ads van directo al spool (no se guardan en memoria)
+    advertisers: Dict[str, AdvertiserAccumulator] = {}
+    ads_spool = JsonArraySpool(apify_results_dir)
 
     stats = {
         "input_ads_lines": 0,
@@ -488,14 +768,11 @@ def run_process_info(
         landing_domain = get_domain(landing_url)
 
         searchable_text = build_searchable_text(ad)
+        m = matcher.match(searchable_text, landing_url)
 
         # FILTRO 1: IDIOMA
-        # Nota: detect_language y language_allowed usan parámetros globales
-        # Para ser purista deberían pasarse, pero por ahora se mantiene la lógica
-        # asumiendo que el script de llamada configura o acepta el default.
-        # Mejora: usaremos el arg lang_allowed aquí.
-        
-        lang = detect_language(searchable_text)
+        # Nota: language_allowed usa parámetros globales; aquí se respeta el arg lang_allowed.
+        lang = m["lang"]
         
         # Lógica local de language_allowed para respetar el argumento
         is_allowed = False
@@ -510,12 +787,11 @@ def run_process_info(
 
         # FILTRO 2: NOMBRE PRODUCTO CONTENIDO
         if require_product_name_contained:
-            if not product_name_contained(searchable_text, name_matcher):
+            if not m["name_contained"]:
                 stats["skipped_product_name"] += 1
                 continue
 
-        score, hits = compute_anchor_score(searchable_text, anchors)
-        is_bundle = contains_any(searchable_text, BUNDLE_KEYWORDS) or contains_any(landing_url or "", BUNDLE_KEYWORDS)
+        score, hits, is_bundle = m["anchor_score"], m["anchor_hits"], m["is_bundle"]
 
         candidate_same = (score >= CANDIDATE_SCORE_THRESHOLD) and (not is_bundle)
         candidate_bundle = is_bundle and (score >= BUNDLE_SCORE_THRESHOLD)
@@ -549,84 +825,18 @@ def run_process_info(
                 "candidate_drift": bool(candidate_drift),
             },
         }
-        ad_records.append(ad_row)
+        ads_spool.append(ad_row)
+
+        adv = advertisers.get(advertiser_key)
+        if adv is None:
+            adv = advertisers[advertiser_key] = AdvertiserAccumulator(
+                advertiser_key, page_name, page_id, page_profile_uri
+            )
+        adv.add(ad_row, stats["kept_ads"])
         stats["kept_ads"] += 1
 
-        if advertiser_key not in advertisers:
-            advertisers[advertiser_key] = {
-                "advertiser_key": advertiser_key,
-                "page_name": page_name,
-                "page_id": page_id,
-                "page_profile_uri": page_profile_uri,
-                "counts": {
-                    "ads_total": 0,
-                    "ads_candidate_same": 0,
-                    "ads_candidate_bundle": 0,
-                    "ads_candidate_drift": 0,
-                    "ads_lang_es": 0,
-                    "ads_lang_en": 0,
-                    "ads_lang_und": 0,
-                },
-                "landing_domains": [],
-                "landing_urls": [],
-                "ad_library_urls": [],
-                "top_ads": [],
-                "flags": {"is_scaling_candidate_same": False},
-            }
-
-        adv = advertisers[advertiser_key]
-        adv["counts"]["ads_total"] += 1
-        adv["counts"]["ads_candidate_same"] += 1 if candidate_same else 0
-        adv["counts"]["ads_candidate_bundle"] += 1 if candidate_bundle else 0
-        adv["counts"]["ads_candidate_drift"] += 1 if candidate_drift else 0
-
-        if lang == "es":
-            adv["counts"]["ads_lang_es"] += 1
-        elif lang == "en":
-            adv["counts"]["ads_lang_en"] += 1
-        else:
-            adv["counts"]["ads_lang_und"] += 1
-
-        if landing_domain:
-            adv["landing_domains"].append(landing_domain)
-        if landing_url:
-            adv["landing_urls"].append(landing_url)
-        if ad_library_url:
-            adv["ad_library_urls"].append(ad_library_url)
-
-    for adv_key, adv in advertisers.items():
-        adv["landing_domains"] = sorted({d for d in adv["landing_domains"] if isinstance(d, str) and d})
-        adv["landing_urls"] = safe_list_unique(adv["landing_urls"], MAX_URLS_STORED_PER_ADVERTISER)
-        adv["ad_library_urls"] = safe_list_unique(adv["ad_library_urls"], MAX_URLS_STORED_PER_ADVERTISER)
-
-        adv_ads = [a for a in ad_records if a["advertiser_key"] == adv_key]
-        adv_ads_sorted = sorted(adv_ads, key=lambda x: x["match"]["anchor_score"], reverse=True)
-
-        top_ads = []
-        for a in adv_ads_sorted[:MAX_TOP_ADS_PER_ADVERTISER]:
-            body = extract_text(a["text"].get("body"))
-            snippet = body.replace("\n", " ").strip()
-            if len(snippet) > 240:
-                snippet = snippet[:240] + "..."
-            top_ads.append({
-                "ad_id": a["ad_id"],
-                "ad_library_url": a["ad_library_url"],
-                "landing_url": a["landing_url"],
-                "anchor_score": a["match"]["anchor_score"],
-                "flags": {
-                    "candidate_same_product": a["match"]["candidate_same_product"],
-                    "candidate_bundle": a["match"]["candidate_bundle"],
-                    "candidate_drift": a["match"]["candidate_drift"],
-                    "is_bundle": a["match"]["is_bundle"],
-                },
-                "snippet": snippet
-            })
-
-        adv["top_ads"] = top_ads
-        # Flag escalamiento: > NUM_MAX_ESCALING
-        adv["flags"]["is_scaling_candidate_same"] = adv["counts"]["ads_candidate_same"] > num_max_escaling
-
-    advertisers_list = list(advertisers.values())
+    advertisers_list = [acc.finalize(num_max_escaling) for acc in advertisers.values()]
+    selected_by_adv = {k: acc.selected_ad_ids for k, acc in advertisers.items()}
     advertisers_total = len(advertisers_list)
     advertisers_candidate_same = sum(1 for a in advertisers_list if a["counts"]["ads_candidate_same"] > 0)
     advertisers_candidate_bundle = sum(1 for a in advertisers_list if a["counts"]["ads_candidate_bundle"] > 0)
@@ -663,14 +873,7 @@ def run_process_info(
         if adv["counts"]["ads_candidate_same"] == 0 and adv["counts"]["ads_candidate_bundle"] == 0:
             continue
 
-        adv_ads = [a for a in ad_records if a["advertiser_key"] == adv["advertiser_key"]]
-        adv_ads_sorted = sorted(adv_ads, key=lambda x: x["match"]["anchor_score"], reverse=True)
-
-        selected = []
-        for a in adv_ads_sorted:
-            if len(selected) >= MAX_AGENT_SAMPLES_PER_ADVERTISER:
-                break
-            selected.append(a["ad_id"])
+        selected = selected_by_adv[adv["advertiser_key"]]
 
         agent_queue.append({
             "task_type": "VALIDATE_PRODUCT_MATCH",
@@ -727,7 +930,7 @@ def run_process_info(
         },
         "summary": {
             "stats": stats,
-            "ads_total_after_filters": len(ad_records),
+            "ads_total_after_filters": ads_spool.count,
             "advertisers_total": advertisers_total,
             "advertisers_candidate_same": advertisers_candidate_same,
             "advertisers_candidate_bundle": advertisers_candidate_bundle,
@@ -735,12 +938,15 @@ def run_process_info(
             "rule_evaluation_heuristic": rule_eval
         },
         "advertisers": advertisers_sorted,
-        "ads": ad_records,
+        "ads": ads_spool,
         "agent_queue": agent_queue
     }
 
     out_path = apify_results_dir / f"fblibrary_competition_report_{product_folder}.json"
-    out_path.write_text(json.dumps(competition_report, ensure_ascii=False, indent=2), encoding="utf-8")
+    try:
+        write_json_object(out_path, competition_report.items())
+    finally:
+        ads_spool.close()
 
     # OUTPUT 2: Ranking simple
     advertisers_ranked = sorted(
@@ -798,14 +1004,14 @@ def run_process_info(
     }
 
     rank_path = apify_results_dir / f"fblibrary_advertisers_rank_{product_folder}.json"
-    rank_path.write_text(json.dumps(advertisers_rank_report, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json_object(rank_path, advertisers_rank_report.items())
 
     print(f"[{now_iso()}] OK ✅ Reports generados:")
     print(f"  1) {out_path}")
     print(f"  2) {rank_path}")
     print(
         f"  advertisers_total={advertisers_total} | candidate_same={advertisers_candidate_same} | "
-        f"scaling_candidates={len(scaling_advertisers)} | kept_ads={len(ad_records)}"
+        f"scaling_candidates={len(scaling_advertisers)} | kept_ads={stats['kept_ads']}"
     )
 
 
@@ -24,9 +24,7 @@ Uso:
 """
 
 
-import base64
 import json
-import mimetypes
 import os
 from pathlib import Path
 from typing import List, Literal, Optional
@@ -35,6 +33,7 @@ from dotenv import load_dotenv
 from openai import OpenAI
 from pydantic import BaseModel, Field, confloat, conint, field_validator
 
+from utils.image_prep import image_data_url
 from utils.logger import setup_logger
 logger = setup_logger("SpyAgent_ResearchQuerys")
 
@@ -84,15 +83,8 @@ def list_images(images_dir: Path, max_images: int) -> List[Path]:
     return files[:max_images]
 
 def encode_image_to_data_url(image_path: Path) -> str:
-    mime, _ = mimetypes.guess_type(str(image_path))
-    if mime is None:
-        # fallback razonable
-        mime = "image/jpeg"
-
-    with open(image_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-
-    return f"data:{mime};base64,{b64}"
+    # reescalada/re-encodeada una sola vez por archivo (cache compartido con los demás agentes)
+    return image_data_url(image_path)
 
 def build_prompt(name: str, description: str, max_queries: int) -> str:
     # Prompt “duro” en constraints, suave en estilo: deja que el modelo piense,
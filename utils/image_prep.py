@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+utils/image_prep.py
+
+Cache compartido de imágenes de producto para prompts multimodales (OpenAI vision, Gemini).
+Antes cada agente (research_product_querys, ads_generator_v2 agent 0, visual_planer, los section
+generators de shopify) leía y mandaba la imagen original (o la reescalaba por su cuenta) en cada llamada.
+
+- prepare_image(path, long_edge): lado largo <= long_edge (nunca agranda), orientación EXIF aplicada,
+  transparencia aplanada sobre blanco, re-encode JPEG (o WEBP). Si la original ya es más chica que
+  el re-encode y no hubo que tocarla, se usa tal cual.
+- Una vez por (sha256 del archivo, long_edge, formato, calidad): en disco (output/.image_cache/) y
+  en memoria por proceso. El sha del archivo se memoiza por (path, mtime, size).
+- image_data_url() / image_b64() para OpenAI; load_image() devuelve un PIL.Image para Gemini.
+
+Uso:
+  from utils.image_prep import image_data_url, load_image
+  url = image_data_url(path)                        # "data:image/jpeg;base64,..."
+  url = image_data_url(path, long_edge=LOW_DETAIL_LONG_EDGE)
+  refs = [load_image(p) for p in paths]
+"""
+
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+from PIL import Image, ImageOps
+
+# =============================
+# CONFIG
+# =============================
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "output" / ".image_cache"
+VISION_LONG_EDGE = 1536      # OpenAI detail=high/auto no usa más (2048 -> lado corto 768); alcanza para leer etiquetas
+LOW_DETAIL_LONG_EDGE = 512   # detail=low: el modelo ve 512x512
+JPEG_QUALITY = 85
+MEMORY_ITEMS = 64            # imágenes preparadas en memoria por proceso (LRU)
+
+FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+PASSTHROUGH_MIME = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+EXT_BY_MIME = {"image/jpeg": ".jpg", "image/webp": ".webp", "image/png": ".png"}
+EXIF_ORIENTATION = 0x0112
+
+PathLike = Union[str, Path]
+
+_lock = threading.Lock()
+_sha_by_stat: Dict[Tuple[str, int, int], str] = {}
+_memory: "OrderedDict[Tuple, Tuple[bytes, str]]" = OrderedDict()
+
+def file_sha256(path: PathLike) -> str:
+    path = Path(path)
+    st = path.stat()
+    key = (str(path.resolve()), st.st_mtime_ns, st.st_size)
+    sha = _sha_by_stat.get(key)
+    if sha is None:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        sha = h.hexdigest()
+        _sha_by_stat[key] = sha
+    return sha
+
+def prepare_image_bytes(
+    content: bytes,
+    long_edge: int = VISION_LONG_EDGE,
+    fmt: str = "JPEG",
+    quality: int = JPEG_QUALITY,
+) -> Tuple[bytes, str]:
+    """(bytes, mime) de la imagen reescalada y re-encodeada (sin cache)."""
+    fmt = fmt.upper()
+    with Image.open(BytesIO(content)) as src:
+        src_format = src.format
+        rotated = src.getexif().get(EXIF_ORIENTATION, 1) not in (None, 1)
+        alpha = src.mode in ("RGBA", "LA", "PA") or (src.mode == "P" and "transparency" in src.info)
+        touched = rotated or alpha or max(src.size) > long_edge
+        img = ImageOps.exif_transpose(src)
+        if max(img.size) > long_edge:
+            img.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+        if alpha:
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        buf = BytesIO()
+        if fmt == "WEBP":
+            img.save(buf, format="WEBP", quality=quality, method=4)
+        else:
+            img.save(buf, format="JPEG", quality=quality, optimize=True)
+        out = buf.getvalue()
+
+    if not touched and src_format in PASSTHROUGH_MIME and len(content) <= len(out):
+        return content, PASSTHROUGH_MIME[src_format]
+    return out, FORMATS[fmt]
+
+def prepare_image(
+    path: PathLike,
+    long_edge: int = VISION_LONG_EDGE,
+    fmt: str = "JPEG",
+    quality: int = JPEG_QUALITY,
+) -> Tuple[bytes, str]:
+    """(bytes, mime) de path preparada para un prompt; desde memoria, disco o generándola."""
+    fmt = fmt.upper()
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt} (usar {', '.join(FORMATS)})")
+    sha = file_sha256(path)
+    key = (sha, long_edge, fmt, quality)
+    with _lock:
+        hit = _memory.get(key)
+        if hit is not None:
+            _memory.move_to_end(key)
+            return hit
+
+    # la extensión en disco es la del mime final (puede ser la original si no hubo que tocarla)
+    stem = f"{sha}_{long_edge}_{fmt.lower()}_q{quality}"
+    cache_dir = CACHE_DIR / sha[:2]
+    cached = None
+    for mime, ext in EXT_BY_MIME.items():
+        p = cache_dir / f"{stem}{ext}"
+        if p.exists():
+            cached = (p.read_bytes(), mime)
+            break
+    if cached is None:
+        data, mime = prepare_image_bytes(Path(path).read_bytes(), long_edge, fmt, quality)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = cache_dir / f"{stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, cache_dir / f"{stem}{EXT_BY_MIME[mime]}")
+        cached = (data, mime)
+
+    with _lock:
+        _memory[key] = cached
+        while len(_memory) > MEMORY_ITEMS:
+            _memory.popitem(last=False)
+    return cached
+
+def image_b64(path: PathLike, long_edge: int = VISION_LONG_EDGE, fmt: str = "JPEG", quality: int = JPEG_QUALITY) -> str:
+    data, _ = prepare_image(path, long_edge, fmt, quality)
+    return base64.b64encode(data).decode("utf-8")
+
+def image_data_url(path: PathLike, long_edge: int = VISION_LONG_EDGE, fmt: str = "JPEG", quality: int = JPEG_QUALITY) -> str:
+    data, mime = prepare_image(path, long_edge, fmt, quality)
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+def load_image(path: PathLike, long_edge: int = VISION_LONG_EDGE, fmt: str = "JPEG", quality: int = JPEG_QUALITY) -> Image.Image:
+    """PIL.Image (RGB) de la versión preparada, para SDKs que reciben imágenes (Gemini)."""
+    data, _ = prepare_image(path, long_edge, fmt, quality)
+    img = Image.open(BytesIO(data))
+    img.load()
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+def clear_memory_cache():
+    with _lock:
+        _memory.clear()
+        _sha_by_stat.clear()